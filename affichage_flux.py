@@ -0,0 +1,98 @@
+"""
+Affichage des réponses au fil de l'eau (streaming) dans Streamlit.
+
+Streamlit 1.28 n'a pas de st.write_stream : les jetons sont accumulés et
+écrits dans un emplacement st.empty(), rafraîchi au plus toutes les 50 ms
+pour ne pas saturer la connexion avec le navigateur. Trois sources de jetons :
+  - LlamaIndex : chat_engine.stream_chat(...).response_gen
+  - OpenAI : client.chat.completions.create(..., stream=True)
+  - LangChain : callback on_llm_new_token (agent ReAct : seule la réponse
+    finale, après « Final Answer: », est affichée)
+"""
+
+import time
+
+FIN_REPONSE_AGENT = "Final Answer:"
+
+
+class AffichageFlux:
+    """Accumule les jetons et les affiche dans un emplacement Streamlit"""
+
+    def __init__(self, zone, intervalle=0.05, prefixe=""):
+        self.zone = zone
+        self.intervalle = intervalle
+        self.texte = prefixe
+        self.debut = time.perf_counter()
+        self.delai_premier_jeton = None
+        self._dernier_affichage = 0.0
+
+    def ajouter(self, jeton):
+        if not jeton:
+            return
+        if self.delai_premier_jeton is None:
+            self.delai_premier_jeton = time.perf_counter() - self.debut
+        self.texte += jeton
+        maintenant = time.perf_counter()
+        if maintenant - self._dernier_affichage >= self.intervalle:
+            self.zone.markdown(self.texte + "▌")
+            self._dernier_affichage = maintenant
+
+    def terminer(self):
+        """Affiche le texte complet (sans curseur) et le retourne"""
+        self.zone.markdown(self.texte)
+        return self.texte
+
+
+def afficher_flux(jetons, zone, prefixe=""):
+    """Affiche un itérable de jetons au fil de l'eau ; retourne l'AffichageFlux terminé"""
+    affichage = AffichageFlux(zone, prefixe=prefixe)
+    for jeton in jetons:
+        affichage.ajouter(jeton)
+    affichage.terminer()
+    return affichage
+
+
+def jetons_openai(flux):
+    """Contenu textuel des fragments d'une réponse OpenAI en streaming"""
+    for fragment in flux:
+        if fragment.choices and fragment.choices[0].delta.content:
+            yield fragment.choices[0].delta.content
+
+# ============================================================================
+# CALLBACK LANGCHAIN
+# ============================================================================
+
+try:
+    try:
+        from langchain_core.callbacks import BaseCallbackHandler
+    except ImportError:
+        from langchain.callbacks.base import BaseCallbackHandler
+
+    class GestionnaireFluxAgent(BaseCallbackHandler):
+        """Affiche la réponse finale d'un agent ReAct au fur et à mesure de sa génération"""
+
+        def __init__(self, zone):
+            self.affichage = AffichageFlux(zone)
+            self._tampon = ""
+            self._reponse_commencee = False
+
+        def on_llm_start(self, serialized, prompts, **kwargs):
+            # Chaque étape de raisonnement est un nouvel appel au LLM
+            self._tampon = ""
+            self._reponse_commencee = False
+
+        on_chat_model_start = on_llm_start
+
+        def on_llm_new_token(self, token, **kwargs):
+            if self._reponse_commencee:
+                self.affichage.ajouter(token)
+                return
+            # Les pensées et actions intermédiaires ne sont pas affichées
+            self._tampon += token
+            position = self._tampon.find(FIN_REPONSE_AGENT)
+            if position != -1:
+                self._reponse_commencee = True
+                self.affichage.ajouter(self._tampon[position + len(FIN_REPONSE_AGENT):].lstrip())
+
+except ImportError:
+    pass
@@ -0,0 +1,205 @@
+"""
+Agent à appel de fonctions natif (tool calling OpenAI).
+
+Remplace la boucle ReAct en texte libre (« Thought / Action / Observation »)
+analysée par LangChain : le modèle reçoit la définition JSON Schema de chaque
+outil et renvoie des appels structurés, sans erreur d'analyse à rattraper.
+Les appels indépendants émis dans un même tour sont exécutés en parallèle,
+puis leurs résultats sont renvoyés ensemble au modèle : une question qui
+demande la météo et un calcul ne coûte qu'un aller-retour de plus, pas deux.
+
+Chaque exécution mesure les allers-retours LLM, les appels d'outils et les
+jetons consommés (usage renvoyé par l'API).
+"""
+
+import json
+import asyncio
+import inspect
+
+from affichage_flux import AffichageFlux
+
+TOURS_MAX = 6
+
+# ============================================================================
+# DÉFINITION DES OUTILS
+# ============================================================================
+
+def _schema(nom, description, parametre, description_parametre):
+    """Outil à un paramètre texte obligatoire"""
+    return {
+        "type": "function",
+        "function": {
+            "name": nom,
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": {parametre: {"type": "string", "description": description_parametre}},
+                "required": [parametre],
+            },
+        },
+    }
+
+
+SCHEMAS_OUTILS = {
+    "calculator": _schema(
+        "calculator", "Effectue des calculs mathématiques.",
+        "expression", "Expression arithmétique, par exemple '15 * 3.5' ou '(1200 - 200) / 4' ; "
+                      "plusieurs calculs séparés par ';'",
+    ),
+    "weather": _schema(
+        "weather", "Donne la météo actuelle d'une ville.",
+        "city", "Nom de la ville, par exemple 'Paris'",
+    ),
+    "web_search": _schema(
+        "web_search", "Recherche des informations actuelles sur internet.",
+        "query", "Requête de recherche",
+    ),
+    "todo_list": _schema(
+        "todo_list", "Gère la liste de tâches de l'utilisateur.",
+        "action", "'voir', 'ajouter <tâche>', 'terminer <numéro>' ou 'supprimer <numéro>'",
+    ),
+    "calendar": _schema(
+        "calendar", "Gère le calendrier de l'utilisateur.",
+        "action", "'voir' ou 'ajouter <événement>'",
+    ),
+    "document_search": _schema(
+        "document_search", "Recherche dans les documents de l'utilisateur (rapports PDF, DOCX, TXT, MD).",
+        "question", "Question posée aux documents, autonome (sans pronom renvoyant à la conversation)",
+    ),
+}
+
+PROMPT_SYSTEME = (
+    "Tu es un assistant qui répond en français. Utilise les outils quand ils sont utiles ; "
+    "si plusieurs informations indépendantes sont nécessaires, appelle les outils correspondants "
+    "dans le même tour. Réponds directement si aucun outil n'est nécessaire."
+)
+
+# ============================================================================
+# AGENT
+# ============================================================================
+
+class AgentOutils:
+    """
+    Boucle d'appel de fonctions sur un client openai asynchrone.
+    outils : {nom: fonction(argument) -> str}, synchrone ou coroutine.
+    jetons_reponse : max_tokens de chaque appel au modèle (None : limite de l'API).
+    """
+
+    def __init__(self, client, modele, outils, prompt_systeme=PROMPT_SYSTEME,
+                 temperature=0.7, tours_max=TOURS_MAX, jetons_reponse=None):
+        self.client = client
+        self.modele = modele
+        self.jetons_reponse = jetons_reponse
+        self.outils = outils
+        self.schemas = [SCHEMAS_OUTILS[nom] for nom in outils]
+        self.prompt_systeme = prompt_systeme
+        self.temperature = temperature
+        self.tours_max = tours_max
+        self.mesures = {}
+        # Deux appels du même outil ne s'exécutent pas en même temps (todo, calendrier : fichier partagé)
+        self._verrous = {nom: asyncio.Lock() for nom in outils}
+
+    async def executer(self, message, historique=(), relais=None):
+        """
+        Répond à `message` ; historique : messages OpenAI antérieurs ({"role", "content"}).
+        relais : emplacement où la réponse finale est affichée au fil de l'eau (optionnel).
+        """
+        messages = [{"role": "system", "content": self.prompt_systeme}, *historique,
+                    {"role": "user", "content": message}]
+        self.mesures = {"tours": 0, "appels_outils": 0, "jetons_prompt": 0, "jetons_reponse": 0}
+
+        for _ in range(self.tours_max):
+            reponse = await self._appeler_llm(messages, relais)
+            appels = reponse.get("tool_calls")
+            if not appels:
+                return reponse.get("content") or ""
+            messages.append(reponse)
+            # Appels indépendants du même tour : exécutés en parallèle
+            resultats = await asyncio.gather(*(self._executer_outil(appel) for appel in appels))
+            messages.extend(
+                {"role": "tool", "tool_call_id": appel["id"], "content": resultat}
+                for appel, resultat in zip(appels, resultats)
+            )
+
+        # Trop de tours : réponse finale sans outil à partir des résultats obtenus
+        return (await self._appeler_llm(messages, relais, outils=False)).get("content") or ""
+
+    async def _appeler_llm(self, messages, relais, outils=True):
+        """Un aller-retour ; retourne le message assistant (dict) et comptabilise l'usage"""
+        options = {"tools": self.schemas} if outils and self.schemas else {}
+        if self.jetons_reponse:
+            options["max_tokens"] = self.jetons_reponse
+        self.mesures["tours"] += 1
+        if relais is None:
+            reponse = await self.client.chat.completions.create(
+                model=self.modele, messages=messages, temperature=self.temperature, **options
+            )
+            self._compter(reponse.usage)
+            message = reponse.choices[0].message
+            return {
+                "role": "assistant",
+                "content": message.content,
+                **({"tool_calls": [
+                    {"id": appel.id, "type": "function",
+                     "function": {"name": appel.function.name, "arguments": appel.function.arguments}}
+                    for appel in message.tool_calls
+                ]} if message.tool_calls else {}),
+            }
+
+        # Streaming : le texte est affiché dès son arrivée, les appels d'outils sont réassemblés
+        flux = await self.client.chat.completions.create(
+            model=self.modele, messages=messages, temperature=self.temperature,
+            stream=True, stream_options={"include_usage": True}, **options
+        )
+        affichage = None
+        contenu, appels = "", {}
+        async for fragment in flux:
+            if fragment.usage:
+                self._compter(fragment.usage)
+            if not fragment.choices:
+                continue
+            delta = fragment.choices[0].delta
+            if delta.content:
+                if affichage is None:
+                    affichage = AffichageFlux(relais)
+                affichage.ajouter(delta.content)
+                contenu += delta.content
+            for morceau in delta.tool_calls or []:
+                appel = appels.setdefault(morceau.index, {"id": "", "nom": "", "arguments": ""})
+                appel["id"] = morceau.id or appel["id"]
+                if morceau.function:
+                    appel["nom"] += morceau.function.name or ""
+                    appel["arguments"] += morceau.function.arguments or ""
+        if affichage is not None:
+            affichage.terminer()
+        message = {"role": "assistant", "content": contenu or None}
+        if appels:
+            message["tool_calls"] = [
+                {"id": appel["id"], "type": "function",
+                 "function": {"name": appel["nom"], "arguments": appel["arguments"]}}
+                for _, appel in sorted(appels.items())
+            ]
+        return message
+
+    def _compter(self, usage):
+        if usage:
+            self.mesures["jetons_prompt"] += usage.prompt_tokens
+            self.mesures["jetons_reponse"] += usage.completion_tokens
+
+    async def _executer_outil(self, appel):
+        """Exécute un appel d'outil ; les erreurs sont renvoyées au modèle comme résultat"""
+        self.mesures["appels_outils"] += 1
+        nom = appel["function"]["name"]
+        fonction = self.outils.get(nom)
+        if fonction is None:
+            return f"❌ Outil inconnu : {nom}"
+        try:
+            arguments = json.loads(appel["function"]["arguments"] or "{}")
+            argument = next(iter(arguments.values()), "")
+            async with self._verrous[nom]:
+                if inspect.iscoroutinefunction(fonction):
+                    return str(await fonction(argument))
+                # Outils synchrones (calculatrice, todo...) : hors de la boucle pour ne pas la bloquer
+                return str(await asyncio.to_thread(fonction, argument))
+        except Exception as e:
+            return f"❌ Erreur de l'outil {nom} : {e}"
@@ -1,13 +1,12 @@
 import streamlit as st
 import os
 from dotenv import load_dotenv
-import openai
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
 from llama_index.core.settings import Settings
 from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.chat_engine import ContextChatEngine
+from llama_index.core.schema import QueryBundle
+from llama_index.core.llms import ChatMessage, MessageRole
 from llama_index.llms.openai import OpenAI
-from llama_index.embeddings.openai import OpenAIEmbedding
-import chromadb
 from typing import Optional
 import requests
 import pandas as pd
@@ -17,6 +16,7 @@ import tempfile
 import shutil
 import json
 import math
+import uuid
 import yfinance as yf
 from dateutil.relativedelta import relativedelta
 import re
@@ -26,6 +26,28 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 
+from indexation import charger_ou_construire_index
+from service_index import ServiceIndex
+from cache_embeddings import EmbeddingLlamaIndexEnCache
+from surveillance_documents import SurveillantDocuments
+from recherche_hybride import RetrieverHybride, construire_bm25_llamaindex
+from tableaux_financiers import BaseTableaux
+from cache_reponses import CacheReponses, normaliser_question, sources_depuis_manifeste
+from indexation import charger_manifeste
+from affichage_flux import afficher_flux, jetons_openai
+from clients_llm import client_openai, embedding_llamaindex, llm_llamaindex
+from memoire_conversation import MemoireConversation, historique_llamaindex
+from assemblage_contexte import JETONS_REPONSE, AssembleurContexte, budget_contexte
+from comptage_jetons import compter_jetons
+from coalescence_requetes import CoalesceurRequetes, cle_coalescence
+from cache_llm import CACHE_ACTIVE, obtenir_cache_llm
+from routage_modeles import RouteurModeles
+from routage_intentions import RouteurIntentions
+from classification_intentions import CLASSIFIEUR_ACTIF, ClassifieurIntentions, mots_cles_surs
+from calcul_securise import ErreurCalcul, ExpressionInvalide, evaluer, formater_valeur
+from simulation_investissement import LOIS, parametres_investissement, simuler
+from planification_retraite import AGE_FIN, RUINE_MAX, grille_sensibilite, parametres_retraite, simuler_retraite
+
 # Charger les variables d'environnement
 load_dotenv()
 
@@ -56,85 +78,139 @@ Structurez systématiquement votre réponse comme suit :
 Utilisez un langage professionnel mais accessible. Fournissez des chiffres précis, pourcentages, et références sectorielles. Justifiez systématiquement vos conclusions par des éléments d'analyse concrets.
 """
 
+# Palier rapide du routage (routage_modeles.py) : questions factuelles courtes
+PROMPT_CONCIS = """
+En tant qu'expert financier, répondez directement et brièvement à la question.
+Donnez le chiffre ou le fait demandé avec son unité, sa période et le document d'où il provient.
+Si l'information n'est pas disponible, dites-le en une phrase sans extrapoler.
+"""
+
+CONSIGNE_DETAILLEE = "Veuillez fournir une analyse financière structurée selon le format demandé, avec analyse détaillée avant toute conclusion."
+CONSIGNE_CONCISE = "Répondez en quelques phrases, sans analyse développée."
+
 # Fonction de génération de réponse améliorée
-def generate_enhanced_response(query, context, chat_engine):
-    """Génère une réponse détaillée et structurée"""
+def generate_enhanced_response(query, context, chat_engine, zone=None, consigne=CONSIGNE_DETAILLEE):
+    """
+    Génère une réponse détaillée et structurée (ou concise, selon la consigne).
+    Si zone (st.empty()) est fournie, la réponse y est affichée au fil de l'eau.
+    Retourne (réponse, doc_ids des sources) ; les sources valent None en cas d'erreur.
+    """
     
     enhanced_query = f"""
     Question: {query}
     
     Contexte: {context}
     
-    Veuillez fournir une analyse financière structurée selon le format demandé, avec analyse détaillée avant toute conclusion.
+    {consigne}
     """
     
     try:
         # Utilisation du chat engine avec le prompt système
-        response = chat_engine.chat(enhanced_query)
-        return str(response)
+        if zone is not None:
+            response = chat_engine.stream_chat(enhanced_query)
+            texte = afficher_flux(response.response_gen, zone).texte
+        else:
+            response = chat_engine.chat(enhanced_query)
+            texte = str(response)
+        return texte, [source.node.ref_doc_id for source in response.source_nodes]
     except Exception as e:
-        return f"Erreur lors de la génération de la réponse: {str(e)}"
+        return f"Erreur lors de la génération de la réponse: {str(e)}", None
+
+def creer_chat_engine(vector_index, historique, autres_jetons=0, postprocesseurs=(), llm=None,
+                      prompt_systeme=DETAILED_PROMPT, jetons_reponse=JETONS_REPONSE):
+    """
+    Moteur de chat RAG de l'assistant financier ; retourne (chat_engine, assembleur).
+    autres_jetons : mémoire et question, à retirer du budget des passages.
+    llm : modèle du palier choisi par le routeur (Settings.llm par défaut).
+    """
+    # Derniers messages de la session, déjà limités par le budget de la mémoire
+    memory = ChatMemoryBuffer.from_defaults(chat_history=historique, token_limit=4000)
+
+    # Passages fusionnés (chevauchements) et limités à ce qui reste de la fenêtre du modèle
+    # après le prompt système, la mémoire, la question et la réponse
+    assembleur = AssembleurContexte(budget=budget_contexte(
+        prompt_systeme, autres_jetons=autres_jetons, jetons_reponse=jetons_reponse
+    ))
+
+    # Recherche hybride : vecteurs + BM25 (noms de sociétés, périodes, montants)
+    # Construction directe : from_defaults ignore le LLM passé et prend toujours Settings.llm, partagé par les sessions
+    chat_engine = ContextChatEngine(
+        retriever=RetrieverHybride(vector_index, top_k=5),
+        llm=llm or Settings.llm,
+        memory=memory,
+        prefix_messages=[ChatMessage(role=MessageRole.SYSTEM, content=prompt_systeme)],
+        node_postprocessors=[*postprocesseurs, assembleur],
+        callback_manager=Settings.callback_manager
+    )
+    return chat_engine, assembleur
+
+def confiance_recherche(vector_index, question, vecteur):
+    """Similarité du meilleur passage pour la question (vecteur déjà calculé : aucun appel d'embedding)"""
+    resultats = vector_index.as_retriever(similarity_top_k=1).retrieve(
+        QueryBundle(query_str=question, embedding=vecteur)
+    )
+    return float(resultats[0].score or 0.0) if resultats else 0.0
 
 # ============================================================================
 # FONCTIONS POUR RÉPONSES SIMPLES ET CALCULS
 # ============================================================================
 
+SALUTATIONS = {
+    "bonjour": "Bonjour ! 👋 Je suis votre assistant financier IA. En quoi puis-je vous aider aujourd'hui ?",
+    "salut": "Salut ! 😊 Je suis là pour vous assister dans vos analyses financières. Quelle est votre question ?",
+    "hello": "Hello ! 🤗 Comment puis-je vous aider avec vos besoins financiers ?",
+    "coucou": "Coucou ! 😄 Je suis votre expert financier virtuel. Que souhaitez-vous savoir ?",
+    "bonsoir": "Bonsoir ! 🌙 Je suis à votre disposition pour des analyses financières.",
+    "bonne nuit": "Bonne nuit ! 😴 N'hésitez pas à me consulter demain pour vos questions financières.",
+    "merci": "Je vous en prie ! 👍 N'hésitez pas si vous avez d'autres questions.",
+    "au revoir": "Au revoir ! 👋 À bientôt pour de nouvelles analyses financières.",
+    "bye": "Bye ! 😊 Revenez quand vous voulez pour des conseils financiers.",
+    "comment ça va": "Je vais très bien, merci ! 😊 Prêt à vous aider avec vos analyses financières.",
+    "ça va": "Très bien, merci ! 😄 En quoi puis-je vous assister aujourd'hui ?"
+}
+
 def gerer_salutations(question):
     """Gère les salutations et questions simples"""
-    question_lower = question.lower().strip()
-    
-    salutations = {
-        "bonjour": "Bonjour ! 👋 Je suis votre assistant financier IA. En quoi puis-je vous aider aujourd'hui ?",
-        "salut": "Salut ! 😊 Je suis là pour vous assister dans vos analyses financières. Quelle est votre question ?",
-        "hello": "Hello ! 🤗 Comment puis-je vous aider avec vos besoins financiers ?",
-        "coucou": "Coucou ! 😄 Je suis votre expert financier virtuel. Que souhaitez-vous savoir ?",
-        "bonsoir": "Bonsoir ! 🌙 Je suis à votre disposition pour des analyses financières.",
-        "bonne nuit": "Bonne nuit ! 😴 N'hésitez pas à me consulter demain pour vos questions financières.",
-        "merci": "Je vous en prie ! 👍 N'hésitez pas si vous avez d'autres questions.",
-        "au revoir": "Au revoir ! 👋 À bientôt pour de nouvelles analyses financières.",
-        "bye": "Bye ! 😊 Revenez quand vous voulez pour des conseils financiers.",
-        "comment ça va": "Je vais très bien, merci ! 😊 Prêt à vous aider avec vos analyses financières.",
-        "ça va": "Très bien, merci ! 😄 En quoi puis-je vous assister aujourd'hui ?"
-    }
-    
-    for mot, reponse in salutations.items():
-        if mot in question_lower:
-            return reponse
-    
-    return None
+    return ROUTEUR_INTENTIONS.salutation(question)
+
+# Détecter les calculs simples (chiffres et opérateurs basiques)
+MOTIF_EXPRESSION = re.compile(r'^[\d\s\+\-\*\/\(\)\.,\^×÷]+$')
+
+# Expressions régulières pour différents types de calculs
+MOTIFS_CALCUL = [re.compile(motif) for motif in [
+    r'combien font (\d+)\s*\+\s*(\d+)',
+    r'calculer (\d+)\s*\+\s*(\d+)',
+    r'(\d+)\s*\+\s*(\d+)',
+    r'(\d+)\s*\-\s*(\d+)',
+    r'(\d+)\s*\*\s*(\d+)',
+    r'(\d+)\s*\/\s*(\d+)',
+    r'quelle est la somme de (\d+) et (\d+)',
+    r'additionne (\d+) et (\d+)',
+    r'soustrais (\d+) de (\d+)',
+    r'multiplie (\d+) par (\d+)',
+    r'divise (\d+) par (\d+)'
+]]
 
 def effectuer_calcul_simple(question):
     """Effectue des calculs mathématiques simples"""
     # Nettoyer la question pour les calculs
     question_propre = question.lower().replace('=', '').replace('?', '').strip()
     
-    # Détecter les calculs simples (chiffres et opérateurs basiques)
-    pattern_calcul = r'^[\d\s\+\-\*\/\(\)\.]+$'
-    
-    # Expressions régulières pour différents types de calculs
-    patterns = [
-        r'combien font (\d+)\s*\+\s*(\d+)',
-        r'calculer (\d+)\s*\+\s*(\d+)',
-        r'(\d+)\s*\+\s*(\d+)',
-        r'(\d+)\s*\-\s*(\d+)',
-        r'(\d+)\s*\*\s*(\d+)',
-        r'(\d+)\s*\/\s*(\d+)',
-        r'quelle est la somme de (\d+) et (\d+)',
-        r'additionne (\d+) et (\d+)',
-        r'soustrais (\d+) de (\d+)',
-        r'multiplie (\d+) par (\d+)',
-        r'divise (\d+) par (\d+)'
-    ]
-    
     try:
         # Essayer d'évaluer directement si c'est une expression mathématique simple
-        if re.match(pattern_calcul, question_propre):
-            resultat = eval(question_propre)
-            return f"🧮 **Calcul :** {question_propre} = **{resultat}**"
+        if MOTIF_EXPRESSION.match(question_propre):
+            # Évaluateur borné : « 9**9**9**9 » est refusé au lieu de bloquer le processus
+            try:
+                resultat = evaluer(question_propre)
+            except ExpressionInvalide:
+                return None
+            except ErreurCalcul as erreur:
+                return f"❌ **Erreur :** {erreur}"
+            return f"🧮 **Calcul :** {question_propre} = **{formater_valeur(resultat)}**"
         
         # Vérifier les patterns spécifiques
-        for pattern in patterns:
-            match = re.search(pattern, question_propre)
+        for pattern in MOTIFS_CALCUL:
+            match = pattern.search(question_propre)
             if match:
                 nombres = [float(x) for x in match.groups()]
                 
@@ -468,132 +544,216 @@ def agent_calendrier(question):
                     st.info("🟢")
             st.markdown("---")
 
+@st.cache_data(show_spinner=False, max_entries=64)
+def projeter_investissement(capital, apport_mensuel, annees, rendement, volatilite, loi="normale"):
+    """Monte Carlo du placement (taux en %), mémorisé pour des paramètres identiques"""
+    return simuler(capital, apport_mensuel, annees, rendement / 100, volatilite / 100, loi=loi)
+
 def agent_simulateur_investissement(question):
     """Agent simulateur d'investissement"""
     st.subheader("💹 Simulateur d'Investissement")
     
-    # Paramètres par défaut basés sur la question
-    capital = 10000
-    apport_mensuel = 500
-    duree = 20
-    rendement = 7.0
-    
-    # Simulation de projection
-    capital_courant = capital
-    data = []
-    
-    for annee in range(1, duree + 1):
-        for mois in range(12):
-            capital_courant *= (1 + rendement/100/12)
-            capital_courant += apport_mensuel
-        data.append({
-            "Année": annee,
-            "Capital": capital_courant,
-            "Apports cumulés": capital + apport_mensuel * 12 * annee
-        })
-    
-    df = pd.DataFrame(data)
-    
-    col1, col2, col3 = st.columns(3)
+    # Paramètres lus dans la question (montants, « par mois », durée, taux), valeurs par défaut sinon
+    parametres = parametres_investissement(question)
+    capital = parametres["capital"]
+    apport_mensuel = parametres["apport_mensuel"]
+    duree = parametres["annees"]
+    rendement = parametres["rendement"]
+    volatilite = 15.0
+    
+    try:
+        with st.spinner("Simulation Monte Carlo en cours..."):
+            simulation = projeter_investissement(capital, apport_mensuel, duree, rendement, volatilite)
+    except ValueError as e:
+        st.warning(f"⚠️ {e}")
+        return
+    
+    # Bandes de percentiles (éventail) et trajectoire à rendement constant
+    df = pd.DataFrame({
+        "Année": simulation["mois"] / 12,
+        "P5": simulation["bandes"][5],
+        "P25": simulation["bandes"][25],
+        "Médiane": simulation["bandes"][50],
+        "P75": simulation["bandes"][75],
+        "P95": simulation["bandes"][95],
+        "Rendement constant": simulation["deterministe"],
+        "Apports cumulés": simulation["apports"],
+    })
+    
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Capital final", f"{df.iloc[-1]['Capital']:,.0f} €")
+        st.metric("Capital final médian", f"{df.iloc[-1]['Médiane']:,.0f} €")
     with col2:
-        st.metric("Apports totaux", f"{df.iloc[-1]['Apports cumulés']:,.0f} €")
+        st.metric("Fourchette P5 – P95", f"{df.iloc[-1]['P5']:,.0f} – {df.iloc[-1]['P95']:,.0f} €")
     with col3:
-        plus_value = df.iloc[-1]['Capital'] - df.iloc[-1]['Apports cumulés']
-        st.metric("Plus-value", f"{plus_value:,.0f} €")
+        st.metric("Apports totaux", f"{df.iloc[-1]['Apports cumulés']:,.0f} €")
+    with col4:
+        st.metric("Risque de perte", f"{simulation['probabilite_perte']:.1%}")
     
     st.line_chart(df.set_index('Année'))
+    st.caption(
+        f"{capital:,.0f} € puis {apport_mensuel:,.0f} €/mois pendant {duree} ans · rendement {rendement:.1f} %, "
+        f"volatilité {volatilite:.0f} % · {simulation['chemins']:,} trajectoires ({LOIS['normale']}) · "
+        f"rendement constant : {df.iloc[-1]['Rendement constant']:,.0f} €"
+    )
 
-def agent_planificateur_retraite(question):
+@st.cache_data(show_spinner=False, max_entries=64)
+def projeter_retraite(age_actuel, age_retraite, epargne_actuelle, revenu, taux_epargne, rendement, volatilite,
+                      pension, loi="normale"):
+    """Simulation de retraite et balayage âge de départ × taux d'épargne (taux en %), mémorisés"""
+    ages, taux = grille_sensibilite(age_actuel, age_retraite, taux_epargne)
+    return simuler_retraite(
+        age_actuel, age_retraite, epargne_actuelle, revenu, taux_epargne / 100, rendement / 100, volatilite / 100,
+        pension=pension, loi=loi, ages_balayage=ages, taux_balayage=[t / 100 for t in taux]
+    )
+
+def agent_planificateur_retraite(question, parametres=None):
     """Agent planificateur de retraite"""
     st.subheader("🏖️ Planificateur de Retraite")
     
-    # Paramètres par défaut
-    age_actuel = 40
-    age_retraite = 65
-    revenu_actuel = 50000
-    epargne_actuelle = 50000
-    epargne_annuelle = 10000
-    rendement = 5.0
-    
-    # Calculs
-    annees_epargne = age_retraite - age_actuel
-    capital_projete = epargne_actuelle
-    
-    for annee in range(annees_epargne):
-        capital_projete *= (1 + rendement/100)
-        capital_projete += epargne_annuelle
-    
-    revenu_souhaite = revenu_actuel * 0.7  # 70% du revenu actuel
-    capital_necessaire = revenu_souhaite * 20  # règle des 20x
+    # Paramètres du panneau, sinon lus dans la question
+    parametres = parametres or {"volatilite": 15.0, "loi": "normale", **parametres_retraite(question)}
+    try:
+        with st.spinner("Simulation des trajectoires de retraite..."):
+            resultat = projeter_retraite(**parametres)
+    except ValueError as e:
+        st.warning(f"⚠️ {e}")
+        return
     
-    col1, col2, col3 = st.columns(3)
+    capital_median = resultat["capital_retraite"][50]
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("Capital projeté", f"{capital_projete:,.0f} €")
+        st.metric("Capital médian au départ", f"{capital_median:,.0f} €")
     with col2:
-        st.metric("Capital nécessaire", f"{capital_necessaire:,.0f} €")
+        st.metric("Retrait annuel prévu", f"{resultat['retrait_annuel']:,.0f} €")
     with col3:
-        ecart = capital_projete - capital_necessaire
-        if ecart >= 0:
-            st.success(f"Excédent: {ecart:,.0f} €")
-        else:
-            st.error(f"Déficit: {abs(ecart):,.0f} €")
+        st.metric("Taux de retrait sûr", f"{resultat['taux_retrait_sur']:.1%}")
+    with col4:
+        st.metric("Probabilité de ruine", f"{resultat['probabilite_ruine']:.1%}")
     
     # Recommandations
-    if ecart < 0:
-        st.error("**Recommandations:**")
+    if resultat["probabilite_ruine"] > RUINE_MAX:
+        st.error(f"**Le capital s'épuise avant {AGE_FIN} ans dans {resultat['probabilite_ruine']:.0%} des scénarios. Recommandations:**")
         st.write("- Augmenter l'épargne annuelle")
         st.write("- Revoir l'âge de départ à la retraite")
-        st.write("- Optimiser le rendement des placements")
+        st.write(f"- Limiter les retraits à {resultat['taux_retrait_sur'] * capital_median:,.0f} € par an (taux sûr × capital médian)")
     else:
         st.success("**Votre plan retraite est sur la bonne voie!**")
+    
+    # Capital par âge : bandes de percentiles sur toutes les trajectoires
+    df = pd.DataFrame({"Âge": resultat["ages"]})
+    for percentile, nom in ((5, "P5"), (25, "P25"), (50, "Médiane"), (75, "P75"), (95, "P95")):
+        df[nom] = resultat["bandes"][percentile]
+    st.line_chart(df.set_index("Âge"))
+    
+    # Sensibilité : probabilité de ruine selon l'âge de départ et le taux d'épargne
+    balayage = resultat["balayage"]
+    sensibilite = pd.DataFrame(
+        balayage["probabilite_ruine"],
+        index=[f"Départ à {age} ans" for age in balayage["ages"]],
+        columns=[f"Épargne {taux * 100:.0f} %" for taux in balayage["taux"]]
+    )
+    sensibilite["Taux de retrait sûr"] = balayage["taux_retrait_sur"]
+    st.markdown("**Probabilité de ruine selon l'âge de départ et le taux d'épargne**")
+    st.dataframe(sensibilite.style.format("{:.1%}"), use_container_width=True)
+    st.caption(
+        f"Euros d'aujourd'hui (inflation 2 %) · capital jusqu'à {AGE_FIN} ans · {resultat['chemins']:,} trajectoires "
+        f"× {len(balayage['ages']) * len(balayage['taux']) + 1} scénarios, calculés en {resultat['duree']:.2f} s · "
+        f"taux de retrait sûr : tenu dans {1 - RUINE_MAX:.0%} des trajectoires"
+    )
+
+def panneau_planificateur_retraite(question):
+    """Paramètres modifiables du planificateur : chaque changement relance la simulation (mémorisée)"""
+    # Nouvelle question : les champs reprennent les valeurs lues dans la question
+    if st.session_state.get("retraite_question") != question:
+        st.session_state.retraite_question = question
+        valeurs = {"volatilite": 15.0, "loi": "normale", **parametres_retraite(question)}
+        for champ, valeur in valeurs.items():
+            st.session_state[f"retraite_{champ}"] = valeur
+    
+    with st.expander("⚙️ Paramètres de la simulation", expanded=True):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.number_input("Âge actuel", step=1, key="retraite_age_actuel")
+            st.number_input("Âge de départ", step=1, key="retraite_age_retraite")
+            st.number_input("Pension estimée (€/an)", min_value=0.0, step=1000.0, key="retraite_pension")
+        with col2:
+            st.number_input("Épargne actuelle (€)", min_value=0.0, step=1000.0, key="retraite_epargne_actuelle")
+            st.number_input("Revenu annuel (€)", min_value=0.0, step=1000.0, key="retraite_revenu")
+            st.number_input("Taux d'épargne (%)", min_value=0.0, step=1.0, key="retraite_taux_epargne")
+        with col3:
+            st.number_input("Rendement annuel (%)", step=0.5, key="retraite_rendement")
+            st.number_input("Volatilité (%)", min_value=0.0, step=1.0, key="retraite_volatilite")
+            st.selectbox("Loi des rendements", ["normale", "student"], format_func=LOIS.get, key="retraite_loi")
+    
+    champs = ("age_actuel", "age_retraite", "epargne_actuelle", "revenu", "taux_epargne", "rendement",
+              "volatilite", "pension", "loi")
+    agent_planificateur_retraite(question, {champ: st.session_state[f"retraite_{champ}"] for champ in champs})
+
+# Agents dont le panneau reste affiché (et se recalcule) quand ses paramètres changent
+PANNEAUX_AGENTS = {
+    "retraite": panneau_planificateur_retraite,
+}
+
+# Mots-clés de chaque agent (« * » : toute la famille de mots) ; l'ordre départage les égalités
+MOTS_AGENTS = {
+    "calculatrice": ["calcul*", "intérêt", "prêt", "taux", "mensualité", "emprunt*", "capitalisation", "mathématique*", "combien font"],
+    "meteo": ["météo*", "temps", "climat*", "température"],
+    # Décision de taux d'une banque centrale : une actualité ; l'expression entière l'emporte sur « taux » seul
+    "recherche": ["actualité", "nouvelle", "news", "recherche*", "information", "dernier*", "récent*",
+                  "baisse des taux", "hausse des taux", "baisser ses taux", "relever ses taux", "remonter ses taux",
+                  "augmenter ses taux"],
+    "calendrier": ["calendrier", "événement", "date", "quand", "programme", "agenda", "prochain*"],
+    # Avant l'investissement, qui perd les égalités : « mon capital à 65 ans » part vers la retraite
+    "retraite": ["retraite", "pension", "vieillesse", "senior", "avenir", "prévoyance",
+                 *(f"à {age} ans" for age in range(55, 71))],
+    "investissement": ["simul*", "investissement", "placement", "rendement", "projet", "capital", "épargne", "bourse"],
+}
+
+# Salutations, calculs, valeurs des tableaux puis mots-clés des agents : une passe sur la question
+ROUTEUR_INTENTIONS = RouteurIntentions(
+    MOTS_AGENTS, SALUTATIONS,
+    calcul=effectuer_calcul_simple,
+    # Valeur présente dans les tableaux des rapports : réponse directe sans LLM
+    donnees=lambda question: obtenir_tableaux().repondre(question)
+)
+
+def vectoriser_question(question):
+    """Embedding de la question, partagé par le routage, le cache sémantique et la recherche"""
+    return obtenir_modele_embedding().get_query_embedding(normaliser_question(question))
+
+def router_question(question):
+    """
+    Agent de la question et réponse déjà calculée : {'agent', 'reponse', 'scores', 'mots',
+    'source', 'vecteur'}. Mots-clés d'abord ; s'ils ne suffisent pas, similarité de
+    l'embedding avec les centroïdes des agents (vecteur réutilisé ensuite par l'assistant).
+    """
+    intention = dict(ROUTEUR_INTENTIONS.router(question), source="mots-cles", vecteur=None)
+    if mots_cles_surs(intention) or not CLASSIFIEUR_ACTIF or not os.getenv("OPENAI_API_KEY"):
+        return intention
+    try:
+        intention["vecteur"] = vectoriser_question(question)
+        choix = obtenir_classifieur().affiner(intention, intention["vecteur"])
+    except Exception:
+        # Sans embedding, le routage par mots-clés reste valable
+        return intention
+    if choix["agent"] == "salutation":
+        # Aucune formule de SALUTATIONS reconnue, donc pas de réponse adaptée : mots-clés conservés
+        return intention
+    if choix["agent"] != intention["agent"]:
+        intention.update(agent=choix["agent"], reponse=None)
+    intention.update(source=choix["source"], classement=choix["classement"])
+    return intention
 
 def detecter_agent(question):
     """
     Détecte automatiquement l'agent approprié en fonction de la question
     """
-    question_lower = question.lower()
-    
-    # Vérifier d'abord les salutations
-    if gerer_salutations(question):
-        return "salutation"
-    
-    # Vérifier les calculs simples
-    if effectuer_calcul_simple(question):
-        return "calcul_simple"
-    
-    # Mots-clés pour chaque agent
-    calcul_mots = ["calcul", "intérêt", "prêt", "taux", "mensualité", "emprunt", "capitalisation", "mathématique", "combien font"]
-    meteo_mots = ["météo", "temps", "climat", "température", "météorologique"]
-    recherche_mots = ["actualité", "nouvelle", "news", "recherche", "information", "dernier", "récents"]
-    calendrier_mots = ["calendrier", "événement", "date", "quand", "programme", "agenda", "prochain"]
-    investissement_mots = ["simuler", "investissement", "placement", "rendement", "projet", "capital", "épargne", "bourse"]
-    retraite_mots = ["retraite", "pension", "vieillesse", "senior", "avenir", "prévoyance"]
-    
-    # Calcul des scores
-    scores = {
-        "calculatrice": sum(1 for mot in calcul_mots if mot in question_lower),
-        "meteo": sum(1 for mot in meteo_mots if mot in question_lower),
-        "recherche": sum(1 for mot in recherche_mots if mot in question_lower),
-        "calendrier": sum(1 for mot in calendrier_mots if mot in question_lower),
-        "investissement": sum(1 for mot in investissement_mots if mot in question_lower),
-        "retraite": sum(1 for mot in retraite_mots if mot in question_lower),
-    }
-    
-    # Trouver l'agent avec le score le plus élevé
-    agent_max = max(scores, key=scores.get)
-    score_max = scores[agent_max]
-    
-    # Si aucun mot-clé n'est détecté, utiliser l'assistant financier par défaut
-    if score_max == 0:
-        return "assistant"
-    
-    return agent_max
+    return router_question(question)["agent"]
 
 # Fonction pour charger les documents depuis le dossier "documents"
 def charger_documents():
-    """Charge les documents depuis le dossier 'documents' et crée l'index vectoriel"""
+    """Charge l'index vectoriel persisté et n'indexe que les documents nouveaux ou modifiés"""
     documents_path = "documents"
     
     if not os.path.exists(documents_path):
@@ -610,415 +770,704 @@ def charger_documents():
         
         st.info(f"📚 Chargement de {len(fichiers)} document(s) depuis le dossier '{documents_path}'...")
         
-        # Charger les documents avec LlamaIndex
-        documents = SimpleDirectoryReader(documents_path).load_data()
+        # Relire l'index stocké sur disque et ne vectoriser que les changements
+        index, rapport = charger_ou_construire_index(documents_path)
+        if index is not None:
+            # Index BM25 construit à côté de l'index vectoriel pour la recherche hybride
+            construire_bm25_llamaindex(index)
         
-        # Créer l'index vectoriel
-        index = VectorStoreIndex.from_documents(documents)
+        # Tableaux chiffrés des PDF extraits vers la base SQLite (fichiers nouveaux ou modifiés uniquement)
+        rapport_tableaux = obtenir_tableaux().synchroniser(documents_path)
+        if rapport_tableaux["extraits"]:
+            st.info(
+                f"📊 {rapport_tableaux['indicateurs']} valeur(s) extraite(s) des tableaux de "
+                f"{rapport_tableaux['extraits']} rapport(s) en {rapport_tableaux['duree']:.1f}s"
+            )
         
-        st.success("✅ Documents chargés et indexés avec succès!")
+        if rapport["reconstruit"]:
+            st.success(f"✅ Index construit : {rapport['ajoutes']} document(s) indexé(s) en {rapport['duree']:.1f}s")
+        else:
+            st.success(
+                f"✅ Index chargé depuis le disque en {rapport['duree']:.1f}s "
+                f"({rapport['ajoutes']} ajouté(s), {rapport['modifies']} modifié(s), {rapport['supprimes']} supprimé(s))"
+            )
         return index
         
     except Exception as e:
         st.error(f"❌ Erreur lors du chargement des documents: {str(e)}")
         return None
 
+@st.cache_resource(show_spinner=False)
+def obtenir_modele_embedding():
+    """Embedding OpenAI avec cache disque : un texte déjà vectorisé n'est jamais renvoyé"""
+    return EmbeddingLlamaIndexEnCache(embedding_llamaindex())
+
+@st.cache_resource(show_spinner=False)
+def obtenir_classifieur():
+    """Centroïdes des agents, calculés une fois à partir des questions d'exemple (embeddings en cache disque)"""
+    return ClassifieurIntentions(obtenir_modele_embedding().get_text_embedding_batch)
+
+@st.cache_resource(show_spinner=False)
+def obtenir_service_index():
+    """Index vectoriel unique partagé (en lecture seule) par toutes les sessions du processus"""
+    return ServiceIndex()
+
+@st.cache_resource(show_spinner=False)
+def obtenir_tableaux():
+    """Base des indicateurs extraits des tableaux PDF (société, période, indicateur)"""
+    return BaseTableaux()
+
+@st.cache_resource(show_spinner=False)
+def obtenir_cache_reponses():
+    """Cache sémantique des réponses de l'assistant, partagé par les sessions"""
+    return CacheReponses()
+
+@st.cache_resource(show_spinner=False)
+def obtenir_coalesceur():
+    """Requêtes identiques en cours, regroupées sur un seul appel au LLM pour toutes les sessions"""
+    return CoalesceurRequetes()
+
+@st.cache_resource(show_spinner=False)
+def obtenir_routeur():
+    """Routage des requêtes vers un palier de modèle, statistiques par palier partagées par les sessions"""
+    return RouteurModeles()
+
+@st.cache_resource(show_spinner=False)
+def obtenir_memoire():
+    """Mémoire des conversations (résumé + fenêtre glissante), persistée par session"""
+    return MemoireConversation()
+
+def identifiant_session():
+    """Identifiant de conversation stable, conservé dans l'URL (?session=...) pour survivre aux redémarrages"""
+    if "session_memoire" not in st.session_state:
+        parametres = st.experimental_get_query_params()
+        session = parametres.get("session", [None])[0] or uuid.uuid4().hex
+        st.experimental_set_query_params(**dict(parametres, session=session))
+        st.session_state.session_memoire = session
+    return st.session_state.session_memoire
+
+@st.cache_resource(show_spinner=False)
+def obtenir_surveillant():
+    """Surveillance du dossier 'documents' en tâche de fond (un thread par processus)"""
+    surveillant = SurveillantDocuments(obtenir_service_index(), "documents", tableaux=obtenir_tableaux())
+    surveillant.demarrer()
+    return surveillant
+
+def formater_anciennete(horodatage):
+    """Affiche l'ancienneté d'un horodatage ('il y a 12 s')"""
+    if not horodatage:
+        return "jamais"
+    secondes = int(datetime.now().timestamp() - horodatage)
+    if secondes < 60:
+        return f"il y a {secondes} s"
+    if secondes < 3600:
+        return f"il y a {secondes // 60} min"
+    return f"il y a {secondes // 3600} h"
+
 # ============================================================================
 # APPLICATION STREAMLIT PRINCIPALE
 # ============================================================================
 
-# Configuration de l'application Streamlit
-st.set_page_config(
-    page_title="Plateforme Financière Intelligente",
-    page_icon="📊",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+def main():
+    # Configuration de l'application Streamlit
+    st.set_page_config(
+        page_title="Plateforme Financière Intelligente",
+        page_icon="📊",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
 
-# Interface utilisateur principale
-st.title("🚀 Plateforme Financière Intelligente")
-st.markdown("""
-<div style="background-color:#f0f2f6;padding:20px;border-radius:10px;margin-bottom:20px;">
-<h3 style="color:#1f77b4;margin:0;">Système Multi-Agents Automatique</h3>
-<p style="margin:10px 0 0 0;color:#555;">
-L'IA choisit automatiquement l'agent le plus adapté à votre question
-</p>
-</div>
-""", unsafe_allow_html=True)
-
-# Initialisation de l'index vectoriel
-if "vector_index" not in st.session_state:
-    with st.spinner("🔍 Chargement des documents depuis le dossier 'documents'..."):
-        st.session_state.vector_index = charger_documents()
-
-# Gestion de l'historique des conversations
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
-if "user_question" not in st.session_state:
-    st.session_state.user_question = ""
-if "agent_actuel" not in st.session_state:
-    st.session_state.agent_actuel = "assistant"
-
-# Section de chat principale
-st.header("💬 Posez votre question financière")
-
-# Input utilisateur
-user_question = st.text_area(
-    "Votre question:",
-    value=st.session_state.user_question,
-    height=100,
-    placeholder="Exemple: 'Bonjour', '2+3', 'Calculer les intérêts sur 5000€', 'Envoyer cette analyse à client@email.com' ou 'Quelles sont les actualités financières?'..."
-)
+    # Interface utilisateur principale
+    st.title("🚀 Plateforme Financière Intelligente")
+    st.markdown("""
+    <div style="background-color:#f0f2f6;padding:20px;border-radius:10px;margin-bottom:20px;">
+    <h3 style="color:#1f77b4;margin:0;">Système Multi-Agents Automatique</h3>
+    <p style="margin:10px 0 0 0;color:#555;">
+    L'IA choisit automatiquement l'agent le plus adapté à votre question
+    </p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Initialisation de l'index vectoriel (une seule fois par processus)
+    if os.getenv("OPENAI_API_KEY"):
+        Settings.embed_model = obtenir_modele_embedding()
+    service_index = obtenir_service_index()
+    if not service_index.initialise:
+        with st.spinner("🔍 Chargement des documents depuis le dossier 'documents'..."):
+            service_index.initialiser(charger_documents)
+    surveillant = obtenir_surveillant()
+
+    # Gestion de l'historique des conversations
+    if "chat_history" not in st.session_state:
+        st.session_state.chat_history = []
+    if "user_question" not in st.session_state:
+        st.session_state.user_question = ""
+    if "agent_actuel" not in st.session_state:
+        st.session_state.agent_actuel = "assistant"
+
+    # Section de chat principale
+    st.header("💬 Posez votre question financière")
+
+    # Input utilisateur
+    user_question = st.text_area(
+        "Votre question:",
+        value=st.session_state.user_question,
+        height=100,
+        placeholder="Exemple: 'Bonjour', '2+3', 'Calculer les intérêts sur 5000€', 'Envoyer cette analyse à client@email.com' ou 'Quelles sont les actualités financières?'..."
+    )
+    streaming = st.checkbox("⚡ Afficher la réponse au fil de l'eau", value=True)
 
-col1, col2, col3 = st.columns([1, 1, 1])
-with col1:
-    analyze_btn = st.button("🚀 Analyser", type="primary", use_container_width=True)
-with col2:
-    clear_btn = st.button("🗑️ Effacer", use_container_width=True)
-with col3:
-    export_btn = st.button("📁 Exporter", use_container_width=True)
-
-if clear_btn:
-    st.session_state.chat_history = []
-    st.session_state.user_question = ""
-    st.session_state.agent_actuel = "assistant"
-    st.rerun()
-
-# Fonction principale d'analyse
-if analyze_btn and user_question:
-    # Détection automatique de l'agent
-    agent_detecte = detecter_agent(user_question)
-    st.session_state.agent_actuel = agent_detecte
-    
-    # Affichage de l'agent détecté
-    noms_agents = {
-        "assistant": "🤖 Assistant Financier IA",
-        "salutation": "👋 Assistant Conversationnel",
-        "calcul_simple": "🧮 Calculatrice Simple",
-        "calculatrice": "🧮 Calculatrice Financière", 
-        "meteo": "🌤️ Météo & Impacts Économiques",
-        "recherche": "🔍 Recherche Web Financière",
-        "calendrier": "📅 Calendrier Économique",
-        "investissement": "💹 Simulateur d'Investissement",
-        "retraite": "🏖️ Planificateur de Retraite"
-    }
-    
-    # Traitement selon l'agent détecté
-    if agent_detecte == "salutation":
-        reponse = gerer_salutations(user_question)
-        st.success(reponse)
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        analyze_btn = st.button("🚀 Analyser", type="primary", use_container_width=True)
+    with col2:
+        clear_btn = st.button("🗑️ Effacer", use_container_width=True)
+    with col3:
+        export_btn = st.button("📁 Exporter", use_container_width=True)
+
+    if clear_btn:
+        obtenir_memoire().effacer(identifiant_session())
+        st.session_state.chat_history = []
+        st.session_state.user_question = ""
+        st.session_state.agent_actuel = "assistant"
+        st.session_state.pop("panneau_agent", None)
+        st.rerun()
+
+    # Fonction principale d'analyse
+    if analyze_btn and user_question:
+        # Détection automatique de l'agent ; salutation, calcul et valeur des tableaux déjà calculés
+        intention = router_question(user_question)
+        agent_detecte = intention["agent"]
+        st.session_state.agent_actuel = agent_detecte
+        st.session_state.pop("panneau_agent", None)
+    
+        # Affichage de l'agent détecté
+        noms_agents = {
+            "assistant": "🤖 Assistant Financier IA",
+            "salutation": "👋 Assistant Conversationnel",
+            "calcul_simple": "🧮 Calculatrice Simple",
+            "donnees_chiffrees": "📊 Données des Rapports",
+            "calculatrice": "🧮 Calculatrice Financière", 
+            "meteo": "🌤️ Météo & Impacts Économiques",
+            "recherche": "🔍 Recherche Web Financière",
+            "calendrier": "📅 Calendrier Économique",
+            "investissement": "💹 Simulateur d'Investissement",
+            "retraite": "🏖️ Planificateur de Retraite"
+        }
+    
+        # Traitement selon l'agent détecté
+        if agent_detecte == "salutation":
+            reponse = intention["reponse"]
+            st.success(reponse)
         
-        # Ajout à l'historique
-        st.session_state.chat_history.append({
-            "question": user_question,
-            "answer": reponse,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "agent": "Assistant Conversationnel"
-        })
-    
-    elif agent_detecte == "calcul_simple":
-        reponse = effectuer_calcul_simple(user_question)
-        st.success(reponse)
+            # Ajout à l'historique
+            st.session_state.chat_history.append({
+                "question": user_question,
+                "answer": reponse,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "agent": "Assistant Conversationnel"
+            })
+    
+        elif agent_detecte == "calcul_simple":
+            reponse = intention["reponse"]
+            st.success(reponse)
         
-        # Ajout à l'historique
-        st.session_state.chat_history.append({
-            "question": user_question,
-            "answer": reponse,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "agent": "Calculatrice Simple"
-        })
-    
-    elif agent_detecte == "assistant":
-        # Vérifier que la clé API OpenAI est configurée
-        if not os.getenv("OPENAI_API_KEY"):
-            st.error("🔑 La clé API OpenAI n'est pas configurée. Veuillez la définir dans le fichier .env")
-            st.stop()
+            # Ajout à l'historique
+            st.session_state.chat_history.append({
+                "question": user_question,
+                "answer": reponse,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "agent": "Calculatrice Simple"
+            })
+    
+        elif agent_detecte == "donnees_chiffrees":
+            reponse = intention["reponse"]
+            st.success(reponse)
+            obtenir_memoire().ajouter_echange(identifiant_session(), user_question, reponse)
         
-        try:
-            with st.spinner("🔍 Analyse en cours par l'Assistant Financier IA..."):
-                # Configuration LlamaIndex
-                from llama_index.llms.openai import OpenAI as LlamaOpenAI
-                from llama_index.embeddings.openai import OpenAIEmbedding
+            # Ajout à l'historique
+            st.session_state.chat_history.append({
+                "question": user_question,
+                "answer": reponse,
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "agent": "Données des Rapports"
+            })
+    
+        elif agent_detecte == "assistant":
+            # Vérifier que la clé API OpenAI est configurée
+            if not os.getenv("OPENAI_API_KEY"):
+                st.error("🔑 La clé API OpenAI n'est pas configurée. Veuillez la définir dans le fichier .env")
+                st.stop()
+        
+            try:
+                with st.spinner("🔍 Analyse en cours par l'Assistant Financier IA..."):
+                    # Clients partagés par le processus : connexions HTTP gardées ouvertes entre les questions
+                    Settings.llm = llm_llamaindex(temperature=0.1, max_tokens=JETONS_REPONSE)
+                    Settings.embed_model = obtenir_modele_embedding()
                 
-                # Configuration des paramètres
-                Settings.llm = LlamaOpenAI(
-                    model="gpt-3.5-turbo",
-                    temperature=0.1,
-                    max_tokens=2000
-                )
-                Settings.embed_model = OpenAIEmbedding()
+                    # Utiliser l'index vectoriel partagé chargé depuis les documents
+                    vector_index = service_index.obtenir()
+                    # Emplacement où la réponse s'affiche jeton par jeton
+                    zone_reponse = st.empty() if streaming else None
                 
-                # Initialisation de la mémoire de chat
-                memory = ChatMemoryBuffer.from_defaults(token_limit=4000)
+                    # Mémoire de la conversation : résumé des anciens échanges + derniers messages
+                    memoire = obtenir_memoire()
+                    session = identifiant_session()
+                    resume_conversation, historique = historique_llamaindex(memoire, session)
+                    # Une question de suite (« et en 2022 ? ») dépend de la conversation : pas de cache
+                    question_autonome = not historique and not resume_conversation
                 
-                # Utiliser l'index vectoriel chargé depuis les documents
-                if st.session_state.vector_index:
-                    chat_engine = st.session_state.vector_index.as_chat_engine(
-                        chat_mode="context",
-                        memory=memory,
-                        system_prompt=DETAILED_PROMPT
-                    )
-                    
-                    # Génération de la réponse améliorée
-                    response = generate_enhanced_response(
-                        query=user_question,
-                        context="Documents financiers chargés depuis le dossier 'documents'",
-                        chat_engine=chat_engine
+                    # Embedding déjà calculé par le routage s'il a été consulté
+                    vecteur_question = intention["vecteur"]
+                    if vecteur_question is None and (question_autonome or vector_index):
+                        vecteur_question = vectoriser_question(user_question)
+
+                    # Palier de modèle : question factuelle courte et recherche sûre -> réponse concise et rapide
+                    routeur = obtenir_routeur()
+                    classement = routeur.choisir(
+                        user_question, agent=agent_detecte, documents=bool(vector_index),
+                        confiance=confiance_recherche(vector_index, user_question, vecteur_question) if vector_index else None
                     )
-                else:
-                    # Réponse sans contexte de documents
-                    response = "ℹ️ Analyse basée sur les connaissances générales (aucun document spécifique chargé).\n\n"
-                    
-                    # Utiliser OpenAI directement pour une réponse de base
-                    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-                    completion = client.chat.completions.create(
-                        model="gpt-3.5-turbo",
-                        messages=[
-                            {"role": "system", "content": DETAILED_PROMPT},
-                            {"role": "user", "content": user_question}
-                        ]
+                    palier_choisi = routeur.paliers[classement["palier"]]
+
+                    # Cache sémantique : une question proche déjà traitée est servie sans appel au LLM
+                    cache_reponses = obtenir_cache_reponses()
+                    espace_cache = (
+                        f"{palier_choisi['modele']}:{classement['palier']}:{'documents' if vector_index else 'general'}"
                     )
-                    response += completion.choices[0].message.content
+                    manifeste = charger_manifeste()
+                    empreintes = {chemin: d["sha256"] for chemin, d in (manifeste or {}).get("fichiers", {}).items()}
+                    # Un fichier modifié mais pas encore ré-indexé invalide déjà les réponses qui en dépendent
+                    for chemin in surveillant.etat()["en_attente"]:
+                        empreintes.pop(chemin, None)
+                    en_cache = None
+                    if question_autonome:
+                        en_cache = cache_reponses.chercher(vecteur_question, user_question, espace_cache, empreintes)
                 
-                # Vérifier s'il y a une demande d'envoi d'email
-                success_email, message_email, doit_envoyer = traiter_demande_email(user_question, response)
-                
-                if doit_envoyer:
-                    if success_email:
-                        response += f"\n\n---\n{message_email}"
+                    if en_cache:
+                        response = en_cache["reponse"]
+                        sources = ", ".join(os.path.basename(chemin) for chemin in en_cache["sources"])
+                        st.caption(
+                            f"⚡ Réponse issue du cache (similarité {en_cache['similarite']:.0%})"
+                            + (f" · Sources : {sources}" if sources else "")
+                        )
                     else:
-                        response += f"\n\n---\n{message_email}"
+                        def produire(nom_palier, palier, zone):
+                            """Recherche + appel au LLM sur un palier ; une erreur déclenche le repli du routeur"""
+                            prompt_systeme = PROMPT_CONCIS if palier["concis"] else DETAILED_PROMPT
+                            if vector_index:
+                                chat_engine, assembleur = creer_chat_engine(
+                                    vector_index, historique,
+                                    autres_jetons=memoire.jetons(session) + compter_jetons(user_question),
+                                    postprocesseurs=[surveillant.filtre_tombstones()],
+                                    llm=llm_llamaindex(
+                                        temperature=0.1, max_tokens=palier["jetons_reponse"], modele=palier["modele"],
+                                        delai=palier["delai"], tentatives=palier["tentatives"]
+                                    ),
+                                    prompt_systeme=prompt_systeme,
+                                    jetons_reponse=palier["jetons_reponse"]
+                                )
+
+                                # Génération de la réponse améliorée
+                                response, doc_ids = generate_enhanced_response(
+                                    query=user_question,
+                                    context="Documents financiers chargés depuis le dossier 'documents'"
+                                    + (f"\n\nRésumé de la conversation précédente :\n{resume_conversation}" if resume_conversation else ""),
+                                    chat_engine=chat_engine,
+                                    zone=zone,
+                                    consigne=CONSIGNE_CONCISE if palier["concis"] else CONSIGNE_DETAILLEE
+                                )
+                                if doc_ids is None:
+                                    raise RuntimeError(response)
+                                if question_autonome:
+                                    cache_reponses.ajouter(
+                                        vecteur_question, user_question, response,
+                                        sources_depuis_manifeste(doc_ids, manifeste), espace_cache
+                                    )
+                                return {"reponse": response, "rapport": assembleur.rapport, "sources": len(doc_ids)}
+
+                            # Réponse sans contexte de documents
+                            response = "ℹ️ Analyse basée sur les connaissances générales (aucun document spécifique chargé).\n\n"
+                        
+                            # Utiliser OpenAI directement pour une réponse de base
+                            completion = client_openai().with_options(
+                                timeout=palier["delai"], max_retries=palier["tentatives"]
+                            ).chat.completions.create(
+                                model=palier["modele"],
+                                messages=[
+                                    {"role": "system", "content": prompt_systeme},
+                                    *([{"role": "system", "content": f"Résumé de la conversation précédente :\n{resume_conversation}"}]
+                                      if resume_conversation else []),
+                                    *({"role": message.role.value, "content": message.content} for message in historique),
+                                    {"role": "user", "content": user_question}
+                                ],
+                                max_tokens=palier["jetons_reponse"],
+                                # Réponse déterministe : une requête identique est servie par le cache exact (cache_llm.py)
+                                temperature=0,
+                                stream=streaming
+                            )
+                            if streaming:
+                                response = afficher_flux(jetons_openai(completion), zone, prefixe=response).texte
+                            else:
+                                response += completion.choices[0].message.content
+                            if question_autonome:
+                                cache_reponses.ajouter(vecteur_question, user_question, response, {}, espace_cache)
+                            return {"reponse": response, "rapport": None, "sources": None}
+
+                        def generer(zone):
+                            """Palier choisi puis replis ; exécuté une seule fois pour des questions identiques simultanées"""
+                            resultat, nom_palier = routeur.executer(
+                                classement, lambda nom, palier: produire(nom, palier, zone),
+                                # Qualité : réponse appuyée sur au moins un passage des documents
+                                qualite=lambda resultat: None if resultat["sources"] is None else float(resultat["sources"] > 0)
+                            )
+                            return dict(resultat, palier=nom_palier)
+
+                        if question_autonome:
+                            # Même question, mêmes documents, même modèle : un seul appel pour les sessions simultanées
+                            cle = cle_coalescence(
+                                user_question, {"index": service_index.version, "documents": empreintes},
+                                palier=classement["palier"], modele=palier_choisi["modele"], temperature=0.1,
+                                max_tokens=palier_choisi["jetons_reponse"], espace=espace_cache
+                            )
+                            resultat, partage = obtenir_coalesceur().executer(
+                                cle, lambda diffusion: generer(diffusion if streaming else None), zone_reponse
+                            )
+                        else:
+                            resultat, partage = generer(zone_reponse), False
+
+                        response = resultat["reponse"]
+                        st.caption(
+                            f"🧭 Palier {resultat['palier']} ({routeur.paliers[resultat['palier']]['modele']}) : "
+                            + ", ".join(classement["motifs"])
+                            + (f" · repli après échec du palier {classement['palier']}"
+                               if resultat["palier"] != classement["palier"] else "")
+                        )
+                        if partage:
+                            st.caption("🔗 Réponse partagée avec une requête identique en cours")
+                        rapport = resultat["rapport"]
+                        if rapport:
+                            st.caption(
+                                f"🧩 Contexte : {rapport['jetons_envoyes']} jetons envoyés "
+                                f"({rapport['passages']} passage(s), {rapport['fusionnes']} fragment(s) fusionné(s)), "
+                                f"{rapport['jetons_economises']} économisés sur {rapport['jetons_bruts']}"
+                            )
                 
-                # Ajout à l'historique
-                st.session_state.chat_history.append({
-                    "question": user_question,
-                    "answer": response,
-                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "agent": "Assistant Financier IA"
-                })
+                    # Vérifier s'il y a une demande d'envoi d'email
+                    success_email, message_email, doit_envoyer = traiter_demande_email(user_question, response)
                 
-                st.success(response)
+                    if doit_envoyer:
+                        if success_email:
+                            response += f"\n\n---\n{message_email}"
+                        else:
+                            response += f"\n\n---\n{message_email}"
                 
-        except Exception as e:
-            st.error(f"❌ Erreur lors de l'analyse: {str(e)}")
+                    # Ajout à l'historique (affiché) et à la mémoire de la conversation (envoyée au LLM)
+                    memoire.ajouter_echange(session, user_question, response)
+                    st.session_state.chat_history.append({
+                        "question": user_question,
+                        "answer": response,
+                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        "agent": "Assistant Financier IA"
+                    })
+                
+                    # La réponse diffusée est remplacée par sa version finale (avec l'éventuel envoi d'email)
+                    (zone_reponse or st).success(response)
+                
+            except Exception as e:
+                st.error(f"❌ Erreur lors de l'analyse: {str(e)}")
     
-    else:
-        # Exécution de l'agent spécialisé
-        st.info(f"**Agent détecté automatiquement:** {noms_agents[agent_detecte]}")
-        
-        # Appel de l'agent approprié
-        if agent_detecte == "calculatrice":
-            agent_calculatrice(user_question)
-        elif agent_detecte == "meteo":
-            agent_meteo(user_question)
-        elif agent_detecte == "recherche":
-            agent_recherche_web(user_question)
-        elif agent_detecte == "calendrier":
-            agent_calendrier(user_question)
-        elif agent_detecte == "investissement":
-            agent_simulateur_investissement(user_question)
-        elif agent_detecte == "retraite":
-            agent_planificateur_retraite(user_question)
+        else:
+            # Exécution de l'agent spécialisé
+            st.info(f"**Agent détecté automatiquement:** {noms_agents[agent_detecte]}")
+            if intention["source"] == "embedding":
+                st.caption(f"🧭 Agent choisi par similarité sémantique ({intention['classement']['similarite']:.2f})")
+
+            # Appel de l'agent approprié
+            if agent_detecte == "calculatrice":
+                agent_calculatrice(user_question)
+            elif agent_detecte == "meteo":
+                agent_meteo(user_question)
+            elif agent_detecte == "recherche":
+                agent_recherche_web(user_question)
+            elif agent_detecte == "calendrier":
+                agent_calendrier(user_question)
+            elif agent_detecte == "investissement":
+                agent_simulateur_investissement(user_question)
+            elif agent_detecte in PANNEAUX_AGENTS:
+                # Affiché plus bas, à chaque exécution tant qu'aucune autre question n'est posée
+                st.session_state.panneau_agent = {"agent": agent_detecte, "question": user_question}
         
-        # Ajout à l'historique
-        st.session_state.chat_history.append({
-            "question": user_question,
-            "answer": f"Traité par {noms_agents[agent_detecte]}",
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "agent": noms_agents[agent_detecte]
-        })
-    
-    st.session_state.user_question = ""
-
-# Affichage de l'historique des conversations
-st.markdown("---")
-st.subheader("📝 Historique des Interactions")
-
-for i, chat in enumerate(reversed(st.session_state.chat_history)):
-    with st.container():
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            st.markdown(f"**Question ({chat['timestamp']}):**")
-        with col2:
-            st.markdown(f"*{chat['agent']}*")
+            # Ajout à l'historique
+            st.session_state.chat_history.append({
+                "question": user_question,
+                "answer": f"Traité par {noms_agents[agent_detecte]}",
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "agent": noms_agents[agent_detecte]
+            })
+    
+        st.session_state.user_question = ""
+
+    # Panneau interactif : chaque modification d'un paramètre relance le script, le panneau est réaffiché
+    panneau = st.session_state.get("panneau_agent")
+    if panneau:
+        PANNEAUX_AGENTS[panneau["agent"]](panneau["question"])
+
+    # Affichage de l'historique des conversations
+    st.markdown("---")
+    st.subheader("📝 Historique des Interactions")
+
+    for i, chat in enumerate(reversed(st.session_state.chat_history)):
+        with st.container():
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.markdown(f"**Question ({chat['timestamp']}):**")
+            with col2:
+                st.markdown(f"*{chat['agent']}*")
         
-        st.info(chat['question'])
+            st.info(chat['question'])
         
-        if chat['agent'] in ["Assistant Financier IA", "Assistant Conversationnel", "Calculatrice Simple"]:
-            st.markdown(f"**Réponse:**")
-            st.success(chat['answer'])
+            if chat['agent'] in ["Assistant Financier IA", "Assistant Conversationnel", "Calculatrice Simple", "Données des Rapports"]:
+                st.markdown(f"**Réponse:**")
+                st.success(chat['answer'])
         
-        st.markdown("---")
-
-# Fonction d'export
-if export_btn and st.session_state.chat_history:
-    export_data = {
-        "export_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "analysis_sessions": st.session_state.chat_history
-    }
-    
-    st.download_button(
-        label="📥 Télécharger l'historique complet (JSON)",
-        data=json.dumps(export_data, ensure_ascii=False, indent=2),
-        file_name=f"historique_financier_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-        mime="application/json"
-    )
+            st.markdown("---")
 
-# Section d'information sur les agents
-with st.sidebar.expander("🤖 Agents Disponibles"):
-    st.markdown("""
-    ### 🎯 Agents Automatiques:
-    
-    **👋 Assistant Conversationnel**
-    - Salutations et questions simples
-    - Réponses courtoises
-    
-    **🧮 Calculatrice Simple**
-    - Calculs mathématiques basiques
-    - Additions, soustractions, multiplications, divisions
-    
-    **🤖 Assistant Financier IA**
-    - Analyse de documents
-    - Questions complexes
-    - Recommandations stratégiques
-    - **Envoi d'emails** intégré
-    
-    **🧮 Calculatrice Financière**
-    - Intérêts composés
-    - Calculs de prêts
-    - Mensualités
-    
-    **🌤️ Météo & Impacts**
-    - Données météo
-    - Analyses économiques
-    - Impacts sectoriels
-    
-    **🔍 Recherche Web**
-    - Actualités financières
-    - Tendances marché
-    - Analyses sectorielles
-    
-    **📅 Calendrier Économique**
-    - Événements à venir
-    - Publications importantes
-    - Dates clés
-    
-    **💹 Simulateur Investissement**
-    - Projections de capital
-    - Simulations de rendement
-    - Analyses de scénarios
-    
-    **🏖️ Planificateur Retraite**
-    - Calculs de retraite
-    - Projections d'épargne
-    - Plans financiers
-    """)
-
-# Section d'information sur les documents
-with st.sidebar.expander("📁 Gestion des Documents"):
-    st.markdown("""
-    ### 📍 Emplacement des documents
-    Les documents sont automatiquement chargés depuis le dossier **`documents/`** dans votre projet.
-    
-    ### 📝 Formats supportés
-    - PDF, DOCX, TXT, CSV, Excel
-    
-    ### 🔄 Recharger les documents
-    Si vous ajoutez de nouveaux documents dans le dossier, rechargez la page pour les prendre en compte.
-    """)
-    
-    # Afficher les documents actuels
-    documents_path = "documents"
-    if os.path.exists(documents_path):
-        fichiers = [f for f in os.listdir(documents_path) if os.path.isfile(os.path.join(documents_path, f))]
-        if fichiers:
-            st.markdown("### 📋 Documents chargés:")
-            for fichier in fichiers:
-                st.write(f"• {fichier}")
-        else:
-            st.info("ℹ️ Aucun document dans le dossier 'documents'")
+    # Fonction d'export
+    if export_btn and st.session_state.chat_history:
+        export_data = {
+            "export_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "analysis_sessions": st.session_state.chat_history
+        }
+    
+        st.download_button(
+            label="📥 Télécharger l'historique complet (JSON)",
+            data=json.dumps(export_data, ensure_ascii=False, indent=2),
+            file_name=f"historique_financier_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json"
+        )
 
-# Section de configuration email CORRIGÉE
-with st.sidebar.expander("📧 Configuration Email"):
-    st.markdown("""
-    ### 🔐 Configuration Mot de Passe d'Application Gmail
+    # Section d'information sur les agents
+    with st.sidebar.expander("🤖 Agents Disponibles"):
+        st.markdown("""
+        ### 🎯 Agents Automatiques:
+    
+        **👋 Assistant Conversationnel**
+        - Salutations et questions simples
+        - Réponses courtoises
+    
+        **🧮 Calculatrice Simple**
+        - Calculs mathématiques basiques
+        - Additions, soustractions, multiplications, divisions
+    
+        **🤖 Assistant Financier IA**
+        - Analyse de documents
+        - Questions complexes
+        - Recommandations stratégiques
+        - **Envoi d'emails** intégré
+    
+        **🧮 Calculatrice Financière**
+        - Intérêts composés
+        - Calculs de prêts
+        - Mensualités
+    
+        **🌤️ Météo & Impacts**
+        - Données météo
+        - Analyses économiques
+        - Impacts sectoriels
+    
+        **🔍 Recherche Web**
+        - Actualités financières
+        - Tendances marché
+        - Analyses sectorielles
+    
+        **📅 Calendrier Économique**
+        - Événements à venir
+        - Publications importantes
+        - Dates clés
+    
+        **💹 Simulateur Investissement**
+        - Projections de capital
+        - Simulations de rendement
+        - Analyses de scénarios
+    
+        **🏖️ Planificateur Retraite**
+        - Calculs de retraite
+        - Projections d'épargne
+        - Plans financiers
+        """)
+
+    # Section d'information sur les documents
+    with st.sidebar.expander("📁 Gestion des Documents"):
+        st.markdown("""
+        ### 📍 Emplacement des documents
+        Les documents sont automatiquement chargés depuis le dossier **`documents/`** dans votre projet.
+    
+        ### 📝 Formats supportés
+        - PDF, DOCX, TXT, CSV, Excel
+    
+        ### 🔄 Mise à jour automatique
+        Les ajouts, modifications et suppressions dans le dossier sont détectés en arrière-plan :
+        seuls les fichiers modifiés sont ré-indexés, sans interrompre les analyses en cours.
+        """)
     
-    **Expéditeur fixe :** erimondh7@gmail.com
+        # Fraîcheur de l'index et ingestions en attente
+        etat_index = surveillant.etat()
+        st.caption(
+            f"🕒 Index mis à jour {formater_anciennete(etat_index['derniere_mise_a_jour'])} · "
+            f"vérifié {formater_anciennete(etat_index['derniere_verification'])}"
+        )
+        if etat_index["en_attente"]:
+            st.markdown("### ⏳ En attente d'indexation:")
+            for chemin, nature in etat_index["en_attente"].items():
+                st.write(f"• {os.path.basename(chemin)} ({nature})")
+        if etat_index["erreur"]:
+            st.error(f"❌ Surveillance: {etat_index['erreur']}")
+    
+        # Ré-indexer sans interrompre les autres sessions : l'index est échangé une fois prêt
+        if st.button("🔄 Ré-indexer les documents", use_container_width=True):
+            with st.spinner("Ré-indexation en cours..."):
+                service_index.reconstruire(charger_documents)
+    
+        empreinte = service_index.empreinte_memoire()
+        if empreinte["vecteurs"]:
+            st.caption(
+                f"🧠 Index partagé v{service_index.version} : {empreinte['vecteurs']} vecteurs "
+                f"× {empreinte['dimension']} dim, ~{empreinte['octets'] / 1024 / 1024:.1f} Mo"
+            )
+    
+        st.caption(
+            f"💬 Mémoire de la conversation : {obtenir_memoire().jetons(identifiant_session())}"
+            f"/{obtenir_memoire().budget} jetons"
+        )
+    
+        stats_cache = obtenir_cache_reponses().statistiques()
+        st.caption(
+            f"⚡ Cache de réponses : {stats_cache['entrees']} entrée(s), succès {stats_cache['taux_succes']:.0%} "
+            f"({stats_cache['succes']}/{stats_cache['succes'] + stats_cache['echecs']}), "
+            f"{stats_cache['invalidations']} invalidée(s), {stats_cache['evictions'] + stats_cache['expirations']} évincée(s)"
+        )
+
+        if CACHE_ACTIVE:
+            stats_llm = obtenir_cache_llm().statistiques()
+            st.caption(
+                f"🗄️ Cache exact du LLM : {stats_llm['entrees']} réponse(s), {stats_llm['octets'] / 1024 / 1024:.1f} Mo, "
+                f"succès {stats_llm['taux_succes']:.0%} ({stats_llm['succes']}/{stats_llm['succes'] + stats_llm['echecs']}), "
+                f"{stats_llm['contournements']} contournement(s) (température > 0)"
+            )
+
+        stats_paliers = {nom: stats for nom, stats in obtenir_routeur().statistiques().items() if stats["appels"]}
+        if stats_paliers:
+            st.caption("🧭 Routage : " + " · ".join(
+                f"{nom} {stats['appels']} appel(s)"
+                + (f", p50 {stats['p50']:.1f} s" if stats["p50"] is not None else "")
+                + (f", {stats['erreurs']} erreur(s)" if stats["erreurs"] else "")
+                + (f", {stats['replis']} repli(s)" if stats["replis"] else "")
+                for nom, stats in stats_paliers.items()
+            ))
+
+        stats_vols = obtenir_coalesceur().statistiques()
+        st.caption(
+            f"🔗 Requêtes regroupées : {stats_vols['coalescees']} servie(s) par un appel déjà en cours "
+            f"({stats_vols['taux_coalescence']:.0%}), {stats_vols['executees']} appel(s), "
+            f"{stats_vols['abandonnees']} repris après interruption"
+        )
+    
+        # Afficher les documents actuels
+        documents_path = "documents"
+        if os.path.exists(documents_path):
+            fichiers = [f for f in os.listdir(documents_path) if os.path.isfile(os.path.join(documents_path, f))]
+            if fichiers:
+                st.markdown("### 📋 Documents chargés:")
+                for fichier in fichiers:
+                    st.write(f"• {fichier}")
+            else:
+                st.info("ℹ️ Aucun document dans le dossier 'documents'")
+
+    # Section de configuration email CORRIGÉE
+    with st.sidebar.expander("📧 Configuration Email"):
+        st.markdown("""
+        ### 🔐 Configuration Mot de Passe d'Application Gmail
     
-    **Configuration actuelle :**
-    - ✅ Utilisation du mot de passe d'application Gmail
-    - ✅ SMTP avec authentification sécurisée
-    - ✅ Support des pièces jointes
+        **Expéditeur fixe :** erimondh7@gmail.com
     
-    **Utilisation :**
-    - "Envoyer cette analyse à client@entreprise.com"
-    - "Envoie un email à john@doe.com avec sujet 'Rapport'"
-    - "Envoyez cette réponse à contact@societe.fr"
+        **Configuration actuelle :**
+        - ✅ Utilisation du mot de passe d'application Gmail
+        - ✅ SMTP avec authentification sécurisée
+        - ✅ Support des pièces jointes
     
-    **Vérification de la configuration :**
-    """)
+        **Utilisation :**
+        - "Envoyer cette analyse à client@entreprise.com"
+        - "Envoie un email à john@doe.com avec sujet 'Rapport'"
+        - "Envoyez cette réponse à contact@societe.fr"
     
-    # Vérifier la configuration email
-    app_password = os.getenv("GMAIL_APP_PASSWORD")
-    if app_password:
-        st.success("✅ GMAIL_APP_PASSWORD est configuré")
-        st.code(f"Mot de passe: {'*' * 16}")
-    else:
-        st.error("❌ GMAIL_APP_PASSWORD non configuré")
-        st.info("""
-        **Pour configurer :**
-        1. Allez dans les paramètres de votre compte Google
-        2. Activez la vérification en 2 étapes
-        3. Générez un mot de passe d'application
-        4. Ajoutez dans votre .env :
-        ```
-        GMAIL_APP_PASSWORD="votre_mot_de_passe_16_caracteres"
-        ```
+        **Vérification de la configuration :**
         """)
+    
+        # Vérifier la configuration email
+        app_password = os.getenv("GMAIL_APP_PASSWORD")
+        if app_password:
+            st.success("✅ GMAIL_APP_PASSWORD est configuré")
+            st.code(f"Mot de passe: {'*' * 16}")
+        else:
+            st.error("❌ GMAIL_APP_PASSWORD non configuré")
+            st.info("""
+            **Pour configurer :**
+            1. Allez dans les paramètres de votre compte Google
+            2. Activez la vérification en 2 étapes
+            3. Générez un mot de passe d'application
+            4. Ajoutez dans votre .env :
+            ```
+            GMAIL_APP_PASSWORD="votre_mot_de_passe_16_caracteres"
+            ```
+            """)
+
+    # Styles CSS améliorés
+    st.markdown("""
+    <style>
+        .stButton button {
+            width: 100%;
+            border-radius: 8px;
+            font-weight: 500;
+            transition: all 0.3s ease;
+        }
+    
+        .stButton button:hover {
+            transform: translateY(-2px);
+            box-shadow: 0 4px 8px rgba(0,0,0,0.1);
+        }
+    
+        .stTextArea textarea {
+            border-radius: 8px;
+            border: 2px solid #e0e0e0;
+            transition: border-color 0.3s ease;
+        }
+    
+        .stTextArea textarea:focus {
+            border-color: #1f77b4;
+        }
+    
+        .stSuccess {
+            background-color: #f8fff8;
+            border-left: 4px solid #00cc00;
+            padding: 1rem;
+            border-radius: 8px;
+            margin: 1rem 0;
+        }
+    
+        .stInfo {
+            background-color: #f0f8ff;
+            border-left: 4px solid #1f77b4;
+            padding: 1rem;
+            border-radius: 8px;
+            margin: 1rem 0;
+        }
+    
+        .sidebar .sidebar-content {
+            background-color: #f8f9fa;
+        }
+    </style>
+    """, unsafe_allow_html=True)
 
-# Styles CSS améliorés
-st.markdown("""
-<style>
-    .stButton button {
-        width: 100%;
-        border-radius: 8px;
-        font-weight: 500;
-        transition: all 0.3s ease;
-    }
-    
-    .stButton button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-    }
-    
-    .stTextArea textarea {
-        border-radius: 8px;
-        border: 2px solid #e0e0e0;
-        transition: border-color 0.3s ease;
-    }
-    
-    .stTextArea textarea:focus {
-        border-color: #1f77b4;
-    }
-    
-    .stSuccess {
-        background-color: #f8fff8;
-        border-left: 4px solid #00cc00;
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 1rem 0;
-    }
-    
-    .stInfo {
-        background-color: #f0f8ff;
-        border-left: 4px solid #1f77b4;
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 1rem 0;
-    }
-    
-    .sidebar .sidebar-content {
-        background-color: #f8f9fa;
-    }
-</style>
-""", unsafe_allow_html=True)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
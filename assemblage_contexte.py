@@ -0,0 +1,262 @@
+"""
+Assemblage du contexte envoyé au LLM, dans un budget de jetons.
+
+Les fragments indexés se chevauchent (chunk_overlap=200) : deux fragments
+voisins d'une même page répètent le même texte dans le prompt. Cette étape :
+  1. fusionne les fragments adjacents ou qui se chevauchent (même document,
+     même page), la partie commune n'étant gardée qu'une fois ;
+  2. retient les passages par score décroissant tant qu'ils tiennent dans le
+     budget (le dernier est tronqué s'il reste assez de place) ;
+  3. mesure les jetons envoyés et ceux économisés par rapport aux fragments bruts.
+
+Le budget laisse la place au prompt système, à la mémoire de conversation et
+à la réponse (max_tokens) dans la fenêtre de contexte du modèle.
+"""
+
+import os
+
+from comptage_jetons import compter_jetons, tronquer_jetons
+
+FENETRE_MODELE = int(os.getenv("OPENAI_CONTEXT_WINDOW", "16385"))
+BUDGET_CONTEXTE = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+JETONS_REPONSE = 2000
+# En dessous, un passage tronqué n'apporte plus rien
+JETONS_MINIMUM_PASSAGE = 100
+# Écart maximal (en caractères) entre deux fragments considérés comme adjacents
+ECART_ADJACENT = 5
+CHEVAUCHEMENT_MINIMUM = 20
+CHEVAUCHEMENT_MAXIMUM = 600
+
+
+def budget_contexte(prompt_systeme="", autres_jetons=0, jetons_reponse=JETONS_REPONSE,
+                    fenetre=FENETRE_MODELE, plafond=BUDGET_CONTEXTE):
+    """Jetons disponibles pour les passages, sans dépasser le plafond configuré"""
+    disponible = fenetre - jetons_reponse - compter_jetons(prompt_systeme) - autres_jetons
+    return max(min(plafond, disponible), 0)
+
+
+def chevauchement(avant, apres):
+    """Longueur du plus long suffixe de `avant` qui est aussi un préfixe de `apres`"""
+    for longueur in range(min(len(avant), len(apres), CHEVAUCHEMENT_MAXIMUM), CHEVAUCHEMENT_MINIMUM - 1, -1):
+        if avant.endswith(apres[:longueur]):
+            return longueur
+    return 0
+
+# ============================================================================
+# FUSION ET EMBALLAGE
+# ============================================================================
+
+def _nouveau_groupe(passage):
+    return {
+        "cle": passage["cle"], "debut": passage["debut"], "fin": passage["fin"],
+        "texte": passage["texte"], "score": passage["score"], "origines": [passage["objet"]],
+    }
+
+
+def _absorber(groupe, passage):
+    """Ajoute `passage` à la fin du groupe s'il le prolonge ; False sinon"""
+    commun = chevauchement(groupe["texte"], passage["texte"])
+    if commun:
+        groupe["texte"] += passage["texte"][commun:]
+    elif passage["texte"] in groupe["texte"]:
+        pass
+    elif (groupe["fin"] is not None and passage["debut"] is not None
+          and 0 <= passage["debut"] - groupe["fin"] <= ECART_ADJACENT):
+        groupe["texte"] += " " + passage["texte"]
+    else:
+        return False
+    if passage["fin"] is not None:
+        groupe["fin"] = max(groupe["fin"] or 0, passage["fin"])
+    groupe["score"] = max(groupe["score"], passage["score"])
+    groupe["origines"].append(passage["objet"])
+    return True
+
+
+def fusionner_passages(passages):
+    """
+    passages : [{"cle", "debut", "fin", "texte", "score", "objet"}] où cle identifie
+    la page d'un document et debut/fin la position du fragment (None si inconnue).
+    Retourne les groupes fusionnés : {"cle", "debut", "fin", "texte", "score", "origines"}.
+    """
+    groupes = []
+    par_cle = {}
+    for passage in passages:
+        par_cle.setdefault(passage["cle"], []).append(passage)
+    for membres in par_cle.values():
+        # Ordre de lecture de la page ; les fragments sans position gardent l'ordre des résultats
+        membres.sort(key=lambda p: (p["debut"] is None, p["debut"] or 0))
+        courants = []
+        for passage in membres:
+            if not any(_absorber(groupe, passage) for groupe in courants):
+                courants.append(_nouveau_groupe(passage))
+        groupes.extend(courants)
+    return groupes
+
+
+def emballer(groupes, budget, entete=lambda groupe: ""):
+    """
+    Retient les groupes par score décroissant dans le budget de jetons.
+    entete(groupe) : métadonnées ajoutées au texte dans le prompt (comptées dans le budget).
+    Retourne [(groupe, texte_tronqué_ou_None, jetons_envoyés)].
+    """
+    retenus = []
+    restant = budget
+    for groupe in sorted(groupes, key=lambda g: g["score"], reverse=True):
+        jetons_entete = compter_jetons(entete(groupe))
+        jetons = jetons_entete + compter_jetons(groupe["texte"])
+        if jetons <= restant:
+            retenus.append((groupe, None, jetons))
+            restant -= jetons
+        elif restant - jetons_entete >= JETONS_MINIMUM_PASSAGE:
+            texte = tronquer_jetons(groupe["texte"], restant - jetons_entete)
+            retenus.append((groupe, texte, jetons_entete + compter_jetons(texte)))
+            restant = 0
+    return retenus
+
+
+def assembler(passages, budget, entete=lambda element: ""):
+    """
+    Fusion + emballage ; retourne ([(groupe, texte_tronqué_ou_None, jetons)], rapport).
+    entete(passage_ou_groupe) : métadonnées ajoutées au texte dans le prompt.
+    """
+    groupes = fusionner_passages(passages)
+    retenus = emballer(groupes, budget, entete)
+    bruts = sum(compter_jetons(entete(passage)) + compter_jetons(passage["texte"]) for passage in passages)
+    apres_fusion = sum(compter_jetons(entete(groupe)) + compter_jetons(groupe["texte"]) for groupe in groupes)
+    envoyes = sum(jetons for _, _, jetons in retenus)
+    rapport = {
+        "fragments": len(passages),
+        "passages": len(retenus),
+        "fusionnes": len(passages) - len(groupes),
+        "budget": budget,
+        "jetons_bruts": bruts,
+        "jetons_apres_fusion": apres_fusion,
+        "jetons_envoyes": envoyes,
+        "jetons_economises": max(bruts - envoyes, 0),
+    }
+    return retenus, rapport
+
+# ============================================================================
+# ADAPTATEURS LLAMAINDEX / LANGCHAIN
+# ============================================================================
+
+try:
+    from typing import List, Optional
+
+    from llama_index.core.bridge.pydantic import PrivateAttr
+    from llama_index.core.postprocessor.types import BaseNodePostprocessor
+    from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle, TextNode
+
+    class AssembleurContexte(BaseNodePostprocessor):
+        """Post-processeur LlamaIndex : fusion des chevauchements et budget de jetons"""
+
+        _budget: int = PrivateAttr()
+        _rapport: dict = PrivateAttr()
+
+        def __init__(self, budget=BUDGET_CONTEXTE, **kwargs):
+            super().__init__(**kwargs)
+            self._budget = budget
+            self._rapport = {}
+
+        @classmethod
+        def class_name(cls):
+            return "AssembleurContexte"
+
+        @property
+        def rapport(self):
+            """Mesures de la dernière requête (jetons bruts, envoyés, économisés)"""
+            return self._rapport
+
+        def _postprocess_nodes(
+            self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None
+        ) -> List[NodeWithScore]:
+            passages = [
+                {
+                    "cle": resultat.node.ref_doc_id or resultat.node.node_id,
+                    "debut": resultat.node.start_char_idx,
+                    "fin": resultat.node.end_char_idx,
+                    "texte": resultat.node.get_content(),
+                    "score": resultat.score or 0.0,
+                    "objet": resultat,
+                }
+                for resultat in nodes
+            ]
+
+            def entete(element):
+                # Les métadonnées (fichier, page) sont ajoutées au texte par le moteur de chat
+                noeud = element["objet"].node if "objet" in element else element["origines"][0].node
+                return noeud.get_metadata_str(mode=MetadataMode.LLM)
+
+            retenus, self._rapport = assembler(passages, self._budget, entete)
+
+            resultats = []
+            for groupe, texte_tronque, _ in retenus:
+                premier = groupe["origines"][0]
+                if len(groupe["origines"]) == 1 and texte_tronque is None:
+                    resultats.append(premier)
+                    continue
+                noeud = TextNode(
+                    text=texte_tronque if texte_tronque is not None else groupe["texte"],
+                    metadata=dict(premier.node.metadata),
+                    excluded_llm_metadata_keys=list(premier.node.excluded_llm_metadata_keys),
+                    excluded_embed_metadata_keys=list(premier.node.excluded_embed_metadata_keys),
+                    relationships=dict(premier.node.relationships),
+                    start_char_idx=groupe["debut"],
+                    end_char_idx=groupe["fin"],
+                )
+                resultats.append(NodeWithScore(node=noeud, score=groupe["score"]))
+            return resultats
+
+except ImportError:
+    pass
+
+
+try:
+    from typing import Any, Optional
+
+    try:
+        from langchain_core.documents import Document
+        from langchain_core.retrievers import BaseRetriever as _BaseRetrieverLangChain
+    except ImportError:
+        from langchain.schema import BaseRetriever as _BaseRetrieverLangChain, Document
+
+    class RetrieverContexteLangChain(_BaseRetrieverLangChain):
+        """Enveloppe un retriever LangChain : fusion des chevauchements et budget de jetons"""
+
+        retriever: Any
+        budget: int = BUDGET_CONTEXTE
+        rapport: Optional[dict] = None
+
+        class Config:
+            arbitrary_types_allowed = True
+
+        def _get_relevant_documents(self, query, *, run_manager=None):
+            return self._assembler(self.retriever.get_relevant_documents(query))
+
+        async def _aget_relevant_documents(self, query, *, run_manager=None):
+            return self._assembler(await self.retriever.aget_relevant_documents(query))
+
+        def _assembler(self, documents):
+            passages = []
+            for rang, document in enumerate(documents):
+                debut = document.metadata.get("start_index")
+                passages.append({
+                    "cle": (document.metadata.get("source"), document.metadata.get("page")),
+                    "debut": debut,
+                    "fin": debut + len(document.page_content) if debut is not None else None,
+                    "texte": document.page_content,
+                    # Les résultats arrivent triés : le rang tient lieu de score
+                    "score": 1.0 / (rang + 1),
+                    "objet": document,
+                })
+            retenus, self.rapport = assembler(passages, self.budget)
+            return [
+                Document(
+                    page_content=texte_tronque if texte_tronque is not None else groupe["texte"],
+                    metadata=dict(groupe["origines"][0].metadata, start_index=groupe["debut"]),
+                )
+                for groupe, texte_tronque, _ in retenus
+            ]
+
+except ImportError:
+    pass
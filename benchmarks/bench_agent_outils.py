@@ -0,0 +1,262 @@
+"""
+Benchmark par rejeu : agent ReAct (texte libre) vs agent à appel de fonctions natif.
+
+Chaque scénario rejoue les sorties enregistrées du modèle pour une question
+(outils appelés, arguments, réponse finale) ; aucun appel réseau n'est fait.
+  - appel de fonctions : AgentOutils (agent_outils.py) avec un faux client
+    openai qui renvoie tous les appels d'outils du scénario dans le même tour ;
+  - ReAct : boucle reconstituée à partir du prompt de l'agent LangChain
+    CHAT_ZERO_SHOT_REACT_DESCRIPTION (un outil par tour, bloc JSON dans le
+    texte, erreurs d'analyse rattrapées par un tour supplémentaire).
+Les jetons sont comptés sur les messages réellement envoyés (tiktoken, ou
+estimation hors ligne) ; les latences du LLM et des outils sont simulées pour
+mesurer le gain des appels d'outils parallèles.
+
+Usage :
+    python benchmarks/bench_agent_outils.py
+    python benchmarks/bench_agent_outils.py --latence-llm 800 --latence-outil 300 --erreurs-analyse 0.2
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from types import SimpleNamespace
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+from agent_outils import AgentOutils, SCHEMAS_OUTILS  # noqa: E402
+from comptage_jetons import compter_jetons  # noqa: E402
+
+SCENARIOS = [
+    {"question": "Bonjour, que sais-tu faire ?", "appels": [],
+     "reponse": "Je peux faire des calculs, donner la météo, gérer vos tâches et votre calendrier, et chercher dans vos documents."},
+    {"question": "Quelle est la météo à Paris et à Lyon ?",
+     "appels": [("weather", "Paris"), ("weather", "Lyon")],
+     "reponse": "À Paris : 18°C, partiellement nuageux. À Lyon : 22°C, ensoleillé."},
+    {"question": "Calcule 125 * 48 et ajoute 'appeler la banque' à ma liste de tâches",
+     "appels": [("calculator", "125 * 48"), ("todo_list", "ajouter appeler la banque")],
+     "reponse": "125 × 48 = 6000. La tâche « appeler la banque » a été ajoutée."},
+    {"question": "Quel est le chiffre d'affaires 2023 d'IssaKoffi dans mes rapports ?",
+     "appels": [("document_search", "chiffre d'affaires 2023 IssaKoffi")],
+     "reponse": "Selon le rapport annuel, le chiffre d'affaires 2023 d'IssaKoffi est de 412 millions d'euros."},
+    {"question": "Météo à Tokyo, 15% de 2400, et montre mon calendrier",
+     "appels": [("weather", "Tokyo"), ("calculator", "0.15 * 2400"), ("calendar", "voir")],
+     "reponse": "Tokyo : 19°C. 15 % de 2400 = 360. Votre calendrier contient 2 événements cette semaine."},
+    {"question": "Compare la marge nette 2022 et 2023 de la société dans mes documents et calcule l'écart",
+     "appels": [("document_search", "marge nette 2022"), ("document_search", "marge nette 2023")],
+     "suite": [("calculator", "8.4 - 7.1")],
+     "reponse": "La marge nette passe de 7,1 % en 2022 à 8,4 % en 2023, soit +1,3 point."},
+    {"question": "Cherche les dernières actualités sur la BCE",
+     "appels": [("web_search", "actualités BCE taux directeurs")],
+     "reponse": "La BCE a maintenu ses taux directeurs lors de sa dernière réunion."},
+]
+
+OBSERVATIONS = {
+    "weather": "🌤️ Météo à {0}: 20°C, Ensoleillé",
+    "calculator": "🧮 {0} = 42",
+    "todo_list": "✅ Tâche ajoutée: '{0}'",
+    "calendar": "📅 **Votre calendrier:**\n\n1. **Réunion budget**\n   📅 2024-06-12\n2. **Comité d'audit**\n   📅 2024-06-14",
+    "document_search": "📄 **Réponse basée sur vos documents:**\n\n{0} : voir rapport annuel, page 12. " + "Détail du tableau. " * 20,
+    "web_search": "🔍 **Résultats pour '{0}':**\n\n" + "**1. Article**\nRésumé de l'article...\n\n" * 3,
+}
+
+# Prompt de l'agent ReAct « chat zero-shot » de LangChain (langchain/agents/chat/prompt.py)
+PREFIXE_REACT = "Answer the following questions as best you can. You have access to the following tools:"
+FORMAT_REACT = """The way you use the tools is by specifying a json blob.
+Specifically, this json should have a `action` key (with the name of the tool to use) and a `action_input` key (with the input to the tool going here).
+
+The only values that should be in the "action" field are: {noms}
+
+The $JSON_BLOB should only contain a SINGLE action, do NOT return a list of multiple actions. Here is an example of a valid $JSON_BLOB:
+
+```
+{{
+  "action": $TOOL_NAME,
+  "action_input": $INPUT
+}}
+```
+
+ALWAYS use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action:
+```
+$JSON_BLOB
+```
+Observation: the result of the action
+... (this Thought/Action/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question"""
+SUFFIXE_REACT = "Begin! Reminder to always use the exact characters `Final Answer` when responding."
+
+
+class Mesures:
+    def __init__(self):
+        self.tours = self.jetons_prompt = self.jetons_reponse = self.appels_outils = self.erreurs = 0
+        self.duree = 0.0
+
+
+async def outil_simule(nom, argument, latence):
+    await asyncio.sleep(latence)
+    return OBSERVATIONS[nom].format(argument)
+
+# ============================================================================
+# APPEL DE FONCTIONS (AgentOutils réel, client rejoué)
+# ============================================================================
+
+class ClientRejoue:
+    """Faux client openai asynchrone : rejoue les tours enregistrés d'un scénario"""
+
+    def __init__(self, tours, latence):
+        self._tours = list(tours)
+        self._latence = latence
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._creer))
+
+    async def _creer(self, model, messages, tools=None, **options):
+        await asyncio.sleep(self._latence)
+        appels, contenu = self._tours.pop(0)
+        message = SimpleNamespace(
+            content=contenu,
+            tool_calls=[
+                SimpleNamespace(id=f"appel_{i}", function=SimpleNamespace(
+                    name=nom, arguments=json.dumps({_parametre(nom): argument}, ensure_ascii=False)))
+                for i, (nom, argument) in enumerate(appels)
+            ] or None,
+        )
+        sortie = (contenu or "") + json.dumps(appels, ensure_ascii=False)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message)],
+            usage=SimpleNamespace(prompt_tokens=jetons_messages(messages, tools), completion_tokens=compter_jetons(sortie)),
+        )
+
+
+def jetons_messages(messages, outils=None):
+    """Jetons d'une requête chat : contenu + ~4 jetons d'enveloppe par message + schémas d'outils"""
+    total = sum(
+        4 + compter_jetons(message.get("content") or "")
+        + (compter_jetons(json.dumps(message["tool_calls"], ensure_ascii=False)) if message.get("tool_calls") else 0)
+        for message in messages
+    )
+    return total + compter_jetons(json.dumps(outils, ensure_ascii=False)) if outils else total
+
+
+def _parametre(nom):
+    return SCHEMAS_OUTILS[nom]["function"]["parameters"]["required"][0]
+
+
+async def rejouer_outils(scenario, mesures, latence_llm, latence_outil):
+    tours = []
+    if scenario["appels"]:
+        tours.append((scenario["appels"], None))
+    if scenario.get("suite"):
+        tours.append((scenario["suite"], None))
+    tours.append(([], scenario["reponse"]))
+
+    # Coroutines : AgentOutils les attend directement (pas de thread)
+    outils = {nom: _coroutine(nom, latence_outil) for nom in SCHEMAS_OUTILS}
+    agent = AgentOutils(ClientRejoue(tours, latence_llm), "gpt-3.5-turbo", outils)
+
+    debut = time.perf_counter()
+    reponse = await agent.executer(scenario["question"])
+    mesures.duree += time.perf_counter() - debut
+    assert reponse == scenario["reponse"]
+    mesures.tours += agent.mesures["tours"]
+    mesures.appels_outils += agent.mesures["appels_outils"]
+    mesures.jetons_prompt += agent.mesures["jetons_prompt"]
+    mesures.jetons_reponse += agent.mesures["jetons_reponse"]
+
+
+def _coroutine(nom, latence):
+    async def outil(argument):
+        return await outil_simule(nom, argument, latence)
+    return outil
+
+# ============================================================================
+# REACT (boucle reconstituée)
+# ============================================================================
+
+def prompt_systeme_react():
+    outils = "\n".join(f"{nom}: {schema['function']['description']}" for nom, schema in SCHEMAS_OUTILS.items())
+    return "\n\n".join([PREFIXE_REACT, outils, FORMAT_REACT.format(noms=", ".join(SCHEMAS_OUTILS)), SUFFIXE_REACT])
+
+
+async def rejouer_react(scenario, mesures, latence_llm, latence_outil, erreurs_analyse, aleatoire):
+    systeme = prompt_systeme_react()
+    brouillon = ""
+    debut = time.perf_counter()
+
+    async def tour(sortie):
+        await asyncio.sleep(latence_llm)
+        mesures.tours += 1
+        mesures.jetons_prompt += jetons_messages([
+            {"role": "system", "content": systeme},
+            {"role": "user", "content": f"{scenario['question']}\n\n{brouillon}"},
+        ])
+        mesures.jetons_reponse += compter_jetons(sortie)
+
+    # Un seul outil par tour : les appels d'un même tour deviennent séquentiels
+    for nom, argument in scenario["appels"] + scenario.get("suite", []):
+        if aleatoire.random() < erreurs_analyse:
+            # Sortie mal formée : handle_parsing_errors renvoie l'erreur et relance un tour
+            sortie = f"Thought: I should use {nom}.\nAction: {nom}({argument})"
+            await tour(sortie)
+            mesures.erreurs += 1
+            brouillon += sortie + "\nObservation: Invalid or incomplete response\nThought:"
+        sortie = (
+            f"Thought: I need to use {nom}.\nAction:\n```\n"
+            + json.dumps({"action": nom, "action_input": argument}, ensure_ascii=False, indent=2)
+            + "\n```"
+        )
+        await tour(sortie)
+        observation = await outil_simule(nom, argument, latence_outil)
+        mesures.appels_outils += 1
+        brouillon += f"{sortie}\nObservation: {observation}\nThought:"
+
+    await tour(f"Thought: I now know the final answer\nFinal Answer: {scenario['reponse']}")
+    mesures.duree += time.perf_counter() - debut
+
+# ============================================================================
+
+async def executer(args):
+    aleatoire = random.Random(0)
+    react, outils = Mesures(), Mesures()
+    for _ in range(args.repetitions):
+        for scenario in SCENARIOS:
+            await rejouer_react(scenario, react, args.latence_llm / 1000, args.latence_outil / 1000,
+                                args.erreurs_analyse, aleatoire)
+            await rejouer_outils(scenario, outils, args.latence_llm / 1000, args.latence_outil / 1000)
+    return react, outils
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latence-llm", type=float, default=400, help="durée simulée d'un aller-retour LLM (ms)")
+    parser.add_argument("--latence-outil", type=float, default=150, help="durée simulée d'un appel d'outil (ms)")
+    parser.add_argument("--erreurs-analyse", type=float, default=0.1,
+                        help="probabilité qu'une sortie ReAct soit mal formée")
+    parser.add_argument("--repetitions", type=int, default=1)
+    args = parser.parse_args()
+
+    react, outils = asyncio.run(executer(args))
+    questions = len(SCENARIOS) * args.repetitions
+    print(f"{questions} questions rejouées (LLM {args.latence_llm:g} ms, outil {args.latence_outil:g} ms, "
+          f"erreurs d'analyse ReAct {args.erreurs_analyse:.0%})\n")
+    print(f"{'agent':<22} {'allers-retours':>15} {'jetons prompt':>14} {'jetons réponse':>15} "
+          f"{'appels outils':>14} {'erreurs':>8} {'durée/question':>15}")
+    for nom, mesures in (("ReAct (texte libre)", react), ("appel de fonctions", outils)):
+        print(f"{nom:<22} {mesures.tours:>15} {mesures.jetons_prompt:>14} {mesures.jetons_reponse:>15} "
+              f"{mesures.appels_outils:>14} {mesures.erreurs:>8} {mesures.duree / questions * 1000:>13.0f}ms")
+    jetons_react = react.jetons_prompt + react.jetons_reponse
+    jetons_outils = outils.jetons_prompt + outils.jetons_reponse
+    print(f"\nAllers-retours : {outils.tours / react.tours - 1:+.0%} ; jetons : {jetons_outils / jetons_react - 1:+.0%} ; "
+          f"durée : {outils.duree / react.duree - 1:+.0%}")
+
+
+if __name__ == "__main__":
+    main()
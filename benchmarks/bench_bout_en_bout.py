@@ -0,0 +1,284 @@
+"""
+Benchmark de bout en bout, hors ligne : latence, appels LLM et jetons par étape.
+
+Un jeu fixe de questions traverse les deux applications :
+  - detecter_agent, puis chaque fonction agent_* de app_complete.py ;
+  - le moteur de chat RAG de l'assistant financier (creer_chat_engine +
+    generate_enhanced_response, en streaming) sur l'index des documents ;
+  - CompleteAssistant.process_message de new_app_2.py.
+Les appels OpenAI et Tavily passent par rejeu_llm.py : backend factice
+(déterministe, par défaut) ou cassette enregistrée au préalable. Les
+applications s'exécutent dans le runtime de test de Streamlit (AppTest :
+session et caches st.cache_resource fonctionnels, sans navigateur), dans un
+dossier temporaire contenant une copie des documents : index, caches,
+mémoire et fichiers todo/calendrier y sont écrits.
+
+Pour chaque étape : p50 / p95 de la latence par appel, nombre d'appels chat,
+embeddings et recherche web, jetons du prompt et de la réponse.
+
+Usage :
+    python benchmarks/bench_bout_en_bout.py
+    python benchmarks/bench_bout_en_bout.py --latence-llm 600 --latence-embedding 80 --repetitions 3
+    python benchmarks/bench_bout_en_bout.py --json resultats.json
+    # Cassette : enregistrer une fois avec les vraies clés, puis rejouer sans réseau
+    python benchmarks/bench_bout_en_bout.py --mode enregistrer --cassette benchmarks/cassettes/bout_en_bout.json
+    python benchmarks/bench_bout_en_bout.py --mode rejouer --cassette benchmarks/cassettes/bout_en_bout.json
+"""
+
+import os
+import sys
+import json
+import time
+import contextlib
+import shutil
+import argparse
+import tempfile
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+# Le script AppTest importe ce module depuis le dossier temporaire
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "Bonjour",
+    "125 * 48",
+    "Calculer les intérêts composés sur 5000€",
+    "Quelle est la météo à Paris ?",
+    "Quelles sont les dernières actualités financières ?",
+    "Quel est le calendrier des prochains événements économiques ?",
+    "Simuler un investissement de 10000€ en bourse",
+    "Comment préparer ma retraite ?",
+    "Quel est le chiffre d'affaires 2023 d'IssaKoffi Frères ?",
+    "Analyse la rentabilité de BioPharma Solutions",
+    "Quels sont les principaux risques d'EcoEnergy Group ?",
+    "Calcule 15% de 2400 et donne la météo à Lyon",
+]
+
+AGENTS = [
+    "agent_calculatrice", "agent_meteo", "agent_recherche_web",
+    "agent_calendrier", "agent_simulateur_investissement", "agent_planificateur_retraite",
+]
+
+NATURES = ("chat", "embeddings", "recherche")
+
+# ============================================================================
+# MESURES
+# ============================================================================
+
+class Etape:
+    """Latences d'une étape et appels externes (différence des compteurs de rejeu_llm)"""
+
+    def __init__(self, releve):
+        self._releve = releve
+        self.latences = []
+        self.compteurs = {}
+        self.notes = []
+
+    def mesurer(self, fonction, *args, **kwargs):
+        avant = self._releve()
+        debut = time.perf_counter()
+        try:
+            return fonction(*args, **kwargs)
+        finally:
+            self.latences.append(time.perf_counter() - debut)
+            apres = self._releve()
+            for nature, mesure in apres.items():
+                cumul = self.compteurs.setdefault(nature, {"appels": 0, "jetons_prompt": 0, "jetons_reponse": 0})
+                precedent = avant.get(nature, {})
+                for champ in cumul:
+                    cumul[champ] += mesure[champ] - precedent.get(champ, 0)
+
+    def resume(self):
+        import numpy as np
+
+        latences = np.array(self.latences) * 1000
+        total = lambda champ: sum(mesure[champ] for mesure in self.compteurs.values())
+        return {
+            "n": len(self.latences),
+            "p50_ms": round(float(np.percentile(latences, 50)), 2) if len(latences) else 0.0,
+            "p95_ms": round(float(np.percentile(latences, 95)), 2) if len(latences) else 0.0,
+            **{f"appels_{nature}": self.compteurs.get(nature, {}).get("appels", 0) for nature in NATURES},
+            "jetons_prompt": total("jetons_prompt"),
+            "jetons_reponse": total("jetons_reponse"),
+            "notes": self.notes,
+        }
+
+# ============================================================================
+# SCÉNARIO (exécuté dans le runtime AppTest)
+# ============================================================================
+
+@contextlib.contextmanager
+def erreurs_affichees():
+    """Textes passés à st.error pendant le bloc (l'arbre d'AppTest n'est plus lisible après un st.container)"""
+    import streamlit as st
+
+    erreurs, afficher_erreur = [], st.error
+
+    def relever(corps, *args, **kwargs):
+        erreurs.append(str(corps))
+        return afficher_erreur(corps, *args, **kwargs)
+
+    st.error = relever
+    try:
+        yield erreurs
+    finally:
+        st.error = afficher_erreur
+
+
+def executer_etapes(repetitions):
+    """Toutes les étapes ; retourne {étape: résumé}"""
+    # new_app_2 appelle st.set_page_config à l'import : ce doit être la première commande Streamlit
+    import new_app_2
+    import app_complete
+    from llama_index.core.settings import Settings
+    from llama_index.core.utils import get_tokenizer, set_global_tokenizer
+
+    from assemblage_contexte import JETONS_REPONSE
+    from clients_llm import llm_llamaindex
+    from comptage_jetons import compter_jetons
+    from execution_async import ZoneRelais
+    from rejeu_llm import releve
+
+    try:
+        get_tokenizer()
+    except Exception:
+        # Encodage tiktoken ni en cache ni téléchargeable : découpage LlamaIndex approché par mots
+        set_global_tokenizer(str.split)
+
+    # Ordre d'affichage : parcours d'une question dans les applications
+    etapes = {nom: Etape(releve) for nom in ["indexation", "detecter_agent", *AGENTS, "rag_chat_engine", "process_message"]}
+
+    def etape(nom):
+        return etapes[nom]
+
+    # Index partagé, comme au démarrage de app_complete (embeddings via le cache disque)
+    Settings.embed_model = app_complete.obtenir_modele_embedding()
+    Settings.llm = llm_llamaindex(temperature=0.1, max_tokens=JETONS_REPONSE)
+    service_index = app_complete.obtenir_service_index()
+    with erreurs_affichees() as erreurs:
+        etape("indexation").mesurer(service_index.initialiser, app_complete.charger_documents)
+    etape("indexation").notes.extend(erreurs)
+    vector_index = service_index.obtenir()
+
+    if vector_index is None:
+        etape("rag_chat_engine").notes.append("aucun document indexé")
+    surveillant = app_complete.obtenir_surveillant()
+    assistant = new_app_2.CompleteAssistant()
+    if assistant.agent is None:
+        etape("process_message").notes.append("agent non initialisé (LangChain absent) : réponses directes uniquement")
+
+    def repondre_rag(question):
+        chat_engine, _ = app_complete.creer_chat_engine(
+            vector_index, [], autres_jetons=compter_jetons(question),
+            postprocesseurs=[surveillant.filtre_tombstones()]
+        )
+        return app_complete.generate_enhanced_response(
+            question, "Documents financiers chargés depuis le dossier 'documents'", chat_engine, zone=ZoneRelais()
+        )
+
+    for _ in range(repetitions):
+        for question in QUESTIONS:
+            etape("detecter_agent").mesurer(app_complete.detecter_agent, question)
+
+        for nom in AGENTS:
+            for question in QUESTIONS:
+                etape(nom).mesurer(getattr(app_complete, nom), question)
+
+        if vector_index is not None:
+            for question in QUESTIONS:
+                etape("rag_chat_engine").mesurer(repondre_rag, question)
+
+        for question in QUESTIONS:
+            etape("process_message").mesurer(assistant.process_message, question, ZoneRelais(), streaming=True)
+
+    surveillant.arreter()
+    return {nom: mesures.resume() for nom, mesures in etapes.items()}
+
+
+def _script_apptest():
+    # Corps exécuté comme script Streamlit par AppTest.from_function
+    import streamlit as st
+    from bench_bout_en_bout import executer_etapes
+
+    st.session_state.resultats = executer_etapes(st.session_state.repetitions)
+
+# ============================================================================
+
+def afficher(resultats):
+    print(f"{'étape':<32} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'chat':>6} {'embed.':>7} "
+          f"{'web':>5} {'jetons prompt':>14} {'jetons rép.':>12}")
+    for nom, r in resultats.items():
+        print(f"{nom:<32} {r['n']:>4} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['appels_chat']:>6} "
+              f"{r['appels_embeddings']:>7} {r['appels_recherche']:>5} {r['jetons_prompt']:>14} {r['jetons_reponse']:>12}")
+        for note in r["notes"]:
+            print(f"    ⚠️ {note}")
+
+
+def messages_affiches(app):
+    """Textes des st.error et exceptions affichés par le scénario"""
+    return [str(element.value) for element in (*app.error, *app.exception)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["factice", "rejouer", "enregistrer"], default="factice")
+    parser.add_argument("--cassette", default=os.path.join(RACINE, "benchmarks", "cassettes", "bout_en_bout.json"))
+    parser.add_argument("--documents", default=os.path.join(RACINE, "documents"))
+    parser.add_argument("--latence-llm", type=float, default=0, help="latence simulée d'un appel de chat (ms, mode factice)")
+    parser.add_argument("--latence-embedding", type=float, default=0, help="latence simulée d'un appel d'embedding (ms)")
+    parser.add_argument("--latence-recherche", type=float, default=0, help="latence simulée d'une recherche web (ms)")
+    parser.add_argument("--delais-enregistres", action="store_true", help="en rejeu, attendre la durée enregistrée")
+    parser.add_argument("--repetitions", type=int, default=1)
+    parser.add_argument("--json", help="fichier où écrire les résultats (comparaison entre versions)")
+    args = parser.parse_args()
+
+    # Lus au premier import de rejeu_llm / clients_llm : à fixer avant d'importer les applications
+    os.environ.update({
+        "LLM_REPLAY_MODE": args.mode,
+        "LLM_CASSETTE": os.path.abspath(args.cassette),
+        "LLM_REPLAY_DELAYS": "1" if args.delais_enregistres else "0",
+        "LLM_FAKE_LATENCY_MS": str(args.latence_llm),
+        "LLM_FAKE_EMBEDDING_LATENCY_MS": str(args.latence_embedding),
+        "LLM_FAKE_SEARCH_LATENCY_MS": str(args.latence_recherche),
+    })
+    if args.mode != "enregistrer":
+        # Les SDK exigent une clé ; aucune requête ne sort du processus
+        os.environ.setdefault("OPENAI_API_KEY", "sk-hors-ligne")
+        os.environ.setdefault("TAVILY_API_KEY", "tvly-hors-ligne")
+
+    from streamlit.testing.v1 import AppTest
+
+    dossier = tempfile.mkdtemp(prefix="bench_bout_en_bout_")
+    repertoire_initial = os.getcwd()
+    try:
+        shutil.copytree(args.documents, os.path.join(dossier, "documents"))
+        os.chdir(dossier)
+        app = AppTest.from_function(_script_apptest, default_timeout=3600)
+        app.session_state.repetitions = args.repetitions
+        try:
+            app.run()
+        except AssertionError:
+            # AppTest (Streamlit 1.28) ne sait pas relire les blocs st.container() affichés par les
+            # agents ; le script est pourtant allé au bout et les résultats sont dans la session
+            pass
+        if "resultats" not in app.session_state:
+            raise SystemExit("Le scénario a échoué : " + "\n".join(messages_affiches(app)))
+        resultats = app.session_state.resultats
+        if resultats["rag_chat_engine"]["n"] == 0 and any(entree.is_file() for entree in os.scandir("documents")):
+            # Sans index, l'étape principale manquerait aux résultats : comparaison entre versions faussée
+            raise SystemExit("Index non construit alors que documents/ contient des fichiers :\n"
+                             + "\n".join(resultats["indexation"]["notes"] + messages_affiches(app)
+                                         or ["(aucun message affiché)"]))
+    finally:
+        os.chdir(repertoire_initial)
+        shutil.rmtree(dossier, ignore_errors=True)
+
+    print(f"{len(QUESTIONS)} questions × {args.repetitions} · mode {args.mode}\n")
+    afficher(resultats)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fichier:
+            json.dump(resultats, fichier, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
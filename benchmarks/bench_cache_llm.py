@@ -0,0 +1,115 @@
+"""
+Benchmark hors ligne du cache exact des réponses du LLM (cache_llm.py).
+
+Une conversation de test est rejouée plusieurs fois à travers les clients
+partagés de clients_llm.py, sur le backend factice de rejeu_llm.py :
+  - réponse sans documents de app_complete.py (prompt détaillé, température 0,
+    en streaming et sans) ;
+  - agent à outils de new_app_2.py (AgentOutils, outils locaux déterministes).
+Premier passage : cache vide, chaque appel part vers le fournisseur. Passages
+suivants : les mêmes requêtes, à l'octet près, sont servies depuis SQLite et
+aucun appel ne doit sortir. Un dernier passage à température 0.7 montre le
+contournement du cache.
+
+Pour chaque passage : appels de chat envoyés au fournisseur, durée totale,
+succès / échecs / contournements du cache.
+
+Usage :
+    python benchmarks/bench_cache_llm.py
+    python benchmarks/bench_cache_llm.py --latence-llm 400 --passages 3
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+CONVERSATION = [
+    "Quelles sont les perspectives du secteur bancaire en 2024 ?",
+    "Calcule 15% de 2400",
+    "Quelle est la météo à Lyon et combien font 125 * 48 ?",
+    "Comment diversifier un portefeuille d'actions ?",
+    "Ajoute une tâche : relire le rapport annuel",
+]
+
+
+def outils_locaux():
+    """Outils sans effet de bord et déterministes : les requêtes suivantes restent identiques"""
+    return {
+        "calculator": lambda expression: f"Résultat de {expression} : 42",
+        "weather": lambda ville: f"Météo à {ville} : 18°C, ensoleillé",
+        "todo_list": lambda action: f"Tâche enregistrée : {action}",
+    }
+
+
+def passage(temperature):
+    """Rejoue la conversation ; retourne (appels chat au fournisseur, durée en s)"""
+    from agent_outils import AgentOutils
+    from app_complete import DETAILED_PROMPT
+    from clients_llm import MODELE_CHAT, client_openai, client_openai_async
+    from execution_async import ZoneRelais
+    from rejeu_llm import releve
+
+    avant = releve().get("chat", {}).get("appels", 0)
+    debut = time.perf_counter()
+    client = client_openai()
+    for question in CONVERSATION:
+        messages = [{"role": "system", "content": DETAILED_PROMPT}, {"role": "user", "content": question}]
+        client.chat.completions.create(model=MODELE_CHAT, messages=messages, temperature=temperature)
+        flux = client.chat.completions.create(model=MODELE_CHAT, messages=messages, temperature=temperature, stream=True)
+        "".join(fragment.choices[0].delta.content or "" for fragment in flux if fragment.choices)
+
+    async def agent():
+        outils = AgentOutils(client_openai_async(), MODELE_CHAT, outils_locaux(), temperature=temperature)
+        for question in CONVERSATION:
+            await outils.executer(question)
+            await outils.executer(question, relais=ZoneRelais())
+
+    asyncio.run(agent())
+    duree = time.perf_counter() - debut
+    return releve().get("chat", {}).get("appels", 0) - avant, duree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latence-llm", type=float, default=200, help="latence simulée d'un appel de chat (ms)")
+    parser.add_argument("--passages", type=int, default=2, help="passages à température 0")
+    args = parser.parse_args()
+
+    dossier = tempfile.mkdtemp(prefix="bench_cache_llm_")
+    # Lus au premier import de rejeu_llm / cache_llm
+    os.environ.update({
+        "LLM_REPLAY_MODE": "factice",
+        "LLM_FAKE_LATENCY_MS": str(args.latence_llm),
+        "LLM_CACHE": "1",
+        "LLM_CACHE_PATH": os.path.join(dossier, "reponses_llm.sqlite"),
+    })
+    os.environ.setdefault("OPENAI_API_KEY", "sk-hors-ligne")
+    try:
+        from cache_llm import obtenir_cache_llm
+
+        cache = obtenir_cache_llm()
+        print(f"{len(CONVERSATION)} questions × 4 (direct, direct en streaming, agent, agent en streaming) · "
+              f"latence simulée {args.latence_llm:g} ms\n")
+        print(f"{'passage':<22} {'appels fournisseur':>19} {'durée s':>8} {'succès':>7} {'échecs':>7} {'contournés':>11}")
+        scenarios = [(f"température 0 · n°{i + 1}", 0) for i in range(args.passages)] + [("température 0.7", 0.7)]
+        for nom, temperature in scenarios:
+            precedent = dict(cache.compteurs)
+            appels, duree = passage(temperature)
+            delta = {champ: cache.compteurs[champ] - precedent[champ] for champ in precedent}
+            print(f"{nom:<22} {appels:>19} {duree:>8.2f} {delta['succes']:>7} {delta['echecs']:>7} "
+                  f"{delta['contournements']:>11}")
+        statistiques = cache.statistiques()
+        print(f"\nCache : {statistiques['entrees']} entrée(s), {statistiques['octets'] / 1024:.1f} Ko")
+    finally:
+        shutil.rmtree(dossier, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Micro-benchmark de l'évaluateur d'expressions borné (calcul_securise.py).
+
+Un jeu d'expressions typiques des calculatrices (opérations simples, intérêts
+composés, mensualités, pourcentages) est évalué :
+  - par eval(), comme avant ;
+  - par evaluer() à froid (analyse et compilation à chaque appel, cache vidé) ;
+  - par evaluer() avec le cache des expressions compilées ;
+  - par evaluer_lot() sur tout le jeu en un appel.
+Puis des expressions pathologiques (« 9**9**9**9 », puissances et produits
+géants, imbrication profonde) : durée du refus et message, sans les passer à
+eval() (certaines ne se termineraient pas).
+
+Usage :
+    python benchmarks/bench_calcul_securise.py
+    python benchmarks/bench_calcul_securise.py --repetitions 20000 --flottants
+"""
+
+import os
+import sys
+import time
+import argparse
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+EXPRESSIONS = [
+    "2+3", "125*48", "15*3.5", "(1200-200)/4", "2400*15/100", "0.1+0.2", "1000*(1+0.05)**10",
+    "5000*(1+0.04/12)**(12*10)", "100000*0.0025/(1-(1+0.0025)**-240)", "(45000-38000)/38000*100",
+    "1500*12*0.7", "250000/25/12", "3.2*1.17-0.45", "-(17-42)*3", "987654321*123456789", "2**64",
+]
+PATHOLOGIQUES = [
+    "9**9**9**9", "2**99999", "99999999999999999999**99", "10**900*10**900", "(" * 100 + "1" + ")" * 100,
+    "(10**999)**999", "(-8)**0.5", "1/0", "__import__('os').system('true')",
+]
+
+
+def chronometrer(fonction, repetitions):
+    """µs par appel (meilleur de 3)"""
+    meilleure = float("inf")
+    for _ in range(3):
+        debut = time.perf_counter()
+        for _ in range(repetitions):
+            fonction()
+        meilleure = min(meilleure, time.perf_counter() - debut)
+    return meilleure / repetitions * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repetitions", type=int, default=2000, help="passages sur le jeu d'expressions")
+    parser.add_argument("--flottants", action="store_true", help="arithmétique flottante au lieu de Decimal")
+    args = parser.parse_args()
+
+    from calcul_securise import ErreurCalcul, compiler, evaluer, evaluer_lot
+
+    decimal_actif = not args.flottants
+    n = len(EXPRESSIONS)
+
+    def passage_eval():
+        for expression in EXPRESSIONS:
+            eval(expression)
+
+    def passage_froid():
+        compiler.cache_clear()
+        for expression in EXPRESSIONS:
+            evaluer(expression, decimal_actif)
+
+    def passage_cache():
+        for expression in EXPRESSIONS:
+            evaluer(expression, decimal_actif)
+
+    print(f"{n} expressions · arithmétique {'Decimal' if decimal_actif else 'flottante'}\n")
+    print(f"{'méthode':<28} {'µs/expression':>14}")
+    for nom, passage in (("eval()", passage_eval), ("evaluer, à froid", passage_froid),
+                         ("evaluer, cache compilé", passage_cache),
+                         ("evaluer_lot", lambda: evaluer_lot(EXPRESSIONS, decimal_actif))):
+        print(f"{nom:<28} {chronometrer(passage, args.repetitions // 10 or 1) / n:>14.1f}")
+    print(f"\nExemple : 0.1+0.2 = {evaluer('0.1+0.2', decimal_actif)} · "
+          f"mensualité = {evaluer('100000*0.0025/(1-(1+0.0025)**-240)', decimal_actif)}")
+
+    print("\nExpressions pathologiques :")
+    for expression in PATHOLOGIQUES:
+        debut = time.perf_counter()
+        try:
+            resultat = f"= {evaluer(expression, decimal_actif)}"
+        except ErreurCalcul as erreur:
+            resultat = f"{type(erreur).__name__} : {erreur}"
+        duree = (time.perf_counter() - debut) * 1000
+        print(f"  {duree:>7.3f} ms  {expression[:32]:<34} {resultat}")
+
+
+if __name__ == "__main__":
+    main()
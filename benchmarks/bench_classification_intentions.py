@@ -0,0 +1,194 @@
+"""
+Benchmark hors ligne du classement des questions par embedding (classification_intentions.py).
+
+Un jeu de questions étiquetées (agent attendu) est routé de trois façons. Ces
+questions ne reprennent aucun bigramme de mots pleins des exemples qui servent
+à calculer les centroïdes (EXEMPLES_INTENTIONS) : le benchmark refuse de
+tourner sinon, une paraphrase d'exemple ne mesurant que la mémoire des
+centroïdes. Méthodes :
+  - mots-clés seuls (RouteurIntentions, comportement d'avant) ;
+  - embedding seul (centroïde le plus proche) ;
+  - hybride, comme app_complete.router_question : mots-clés quand ils sont
+    sûrs, embedding s'il est assez net, mots-clés sinon.
+La recherche dans les tableaux des rapports est écartée (elle demande un index).
+
+Affiche la précision de chaque méthode (globale, sur les questions piégeuses,
+c'est-à-dire mal routées par les mots-clés seuls, et sur les autres), la part des questions qui consultent
+l'embedding, la latence du classement seul (produit avec les centroïdes) et
+celle de l'embedding, puis les erreurs du routage hybride.
+
+Les embeddings passent par rejeu_llm.py : backend factice par défaut (vecteurs
+par hachage des mots : similarité lexicale seulement), ou cassette enregistrée
+une fois avec le vrai modèle pour mesurer la précision réelle sans réseau.
+Les chiffres du mode factice ne valent pas pour le modèle réel : c'est sur une
+cassette enregistrée que se règlent les seuils avant d'activer
+INTENT_EMBEDDINGS dans l'application. En mode factice, sur les 38 questions
+(23 piégeuses) : mots-clés 39 %, embedding 39 %, hybride 47 %.
+
+Usage :
+    python benchmarks/bench_classification_intentions.py
+    python benchmarks/bench_classification_intentions.py --mode enregistrer --cassette benchmarks/cassettes/intentions.json
+    python benchmarks/bench_classification_intentions.py --mode rejouer --cassette benchmarks/cassettes/intentions.json
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+# (question, agent attendu) : paraphrases tenues à l'écart des exemples des centroïdes
+# (EXEMPLES_INTENTIONS), vérifiées au lancement par bigrammes_communs
+QUESTIONS = [
+    ("Bien le bonjour à vous", "salutation"),
+    ("Un grand merci, à plus tard", "salutation"),
+    ("Hey, quoi de neuf ?", "salutation"),
+    ("Calcule l'intérêt dû sur 8000€ empruntés au taux de 3%", "calculatrice"),
+    ("Quelle serait l'échéance mensuelle pour emprunter 250000€ durant vingt années ?", "calculatrice"),
+    ("Combien vais-je donner tous les trimestres à ma banque pour rembourser ma voiture ?", "calculatrice"),
+    ("Quel sera le prix réel de ce crédit conso frais inclus ?", "calculatrice"),
+    ("Combien me coûtera cet emprunt au final ?", "calculatrice"),
+    ("Quelle météo attend les voyageurs à Oslo demain ?", "meteo"),
+    ("Prévoit-on du soleil sur Lyon samedi ?", "meteo"),
+    ("Risque-t-il de neiger sur Montréal cette nuit ?", "meteo"),
+    ("Quelle chaleur fera-t-il à Dubaï cet été ?", "meteo"),
+    ("Que racontent les médias au sujet du CAC 40 ?", "recherche"),
+    ("Que rapportent les journalistes sur la fusion bancaire annoncée ?", "recherche"),
+    ("Trouve-moi des papiers de presse sur la crise immobilière chinoise", "recherche"),
+    ("Quoi de neuf côté pétrole ?", "recherche"),
+    ("Les banquiers centraux européens comptent-ils remonter leurs taux ?", "recherche"),
+    ("Quel jour se tient le comité de politique monétaire américain ?", "calendrier"),
+    ("Programme des annonces macro prévues d'ici sept jours", "calendrier"),
+    ("Quand se réunit le conseil des gouverneurs ?", "calendrier"),
+    ("Quelles statistiques d'emploi sortent ce mois-ci ?", "calendrier"),
+    ("Dans combien de jours saura-t-on si la vie chère recule en mars ?", "calendrier"),
+    ("Simule ce que donnent 300€ versés mensuellement durant 25 années", "investissement"),
+    ("Que rapporteraient 15000€ mis sur des actions durant une décennie ?", "investissement"),
+    ("Quelle performance viser avec un portefeuille d'ETF ?", "investissement"),
+    ("Que vaudront 1000€ versés tous les mois à 6% ?", "investissement"),
+    ("Quel patrimoine me restera-t-il en cessant mon activité vers 66 ans ?", "retraite"),
+    ("Comment organiser ma fin de carrière avec 200€ mis de côté mensuellement ?", "retraite"),
+    ("Montant de ma pension après 42 années de cotisations", "retraite"),
+    ("Est-il possible de quitter la vie active dès 62 ans ?", "retraite"),
+    ("Combien faut-il économiser pour bien vieillir ?", "retraite"),
+    ("Quel bénéfice BioPharma a-t-elle dégagé en 2022 ?", "assistant"),
+    ("Que penser de l'endettement du groupe EcoEnergy ?", "assistant"),
+    ("TechVision a-t-elle amélioré sa marge opérationnelle l'an dernier ?", "assistant"),
+    ("Quels projets de développement TechVision met-elle en avant ?", "assistant"),
+    ("Le dividende versé par IssaKoffi est-il généreux ?", "assistant"),
+    ("Que prévoit l'équipe dirigeante pour l'exercice suivant ?", "assistant"),
+    ("Fais la synthèse des dangers identifiés par BioPharma", "assistant"),
+]
+
+# Bigrammes faits uniquement de ces mots (« quelle est », « de la ») : inévitables, non comptés
+MOTS_OUTILS = set(
+    "a au aux avec ce ces cet cette d de des du en est et il ils elle je l la le les leur leurs ma mes mon "
+    "n ne on ou par pas pour qu que quel quelle quelles quels qui sa se ses son sur t ta te tu un une va vais "
+    "vos votre y".split()
+)
+
+
+def bigrammes(texte):
+    from cache_reponses import normaliser_question
+
+    mots = re.findall(r"\w+", normaliser_question(texte))
+    return {(a, b) for a, b in zip(mots, mots[1:]) if not {a, b} <= MOTS_OUTILS}
+
+
+def bigrammes_communs(questions, exemples):
+    """[(question, bigrammes partagés avec un exemple)] : questions qui recopient un exemple des centroïdes"""
+    vus = set().union(*(bigrammes(exemple) for liste in exemples.values() for exemple in liste))
+    return [(question, communs) for question, _ in questions if (communs := bigrammes(question) & vus)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["factice", "rejouer", "enregistrer"], default="factice")
+    parser.add_argument("--cassette", default=os.path.join(RACINE, "benchmarks", "cassettes", "intentions.json"))
+    parser.add_argument("--repetitions", type=int, default=200, help="classements chronométrés par question")
+    args = parser.parse_args()
+
+    # Lus au premier import de rejeu_llm / clients_llm
+    os.environ.update({"LLM_REPLAY_MODE": args.mode, "LLM_CASSETTE": os.path.abspath(args.cassette)})
+    if args.mode != "enregistrer":
+        os.environ.setdefault("OPENAI_API_KEY", "sk-hors-ligne")
+
+    import numpy as np
+
+    from app_complete import MOTS_AGENTS, SALUTATIONS, effectuer_calcul_simple
+    from cache_reponses import normaliser_question
+    from classification_intentions import EXEMPLES_INTENTIONS, ClassifieurIntentions, mots_cles_surs
+    from clients_llm import embedding_llamaindex
+    from routage_intentions import RouteurIntentions
+
+    # Une question qui recopie un exemple mesure la mémoire des centroïdes, pas leur généralisation
+    fuites = bigrammes_communs(QUESTIONS, EXEMPLES_INTENTIONS)
+    if fuites:
+        raise SystemExit("Questions trop proches des exemples des centroïdes :\n" + "\n".join(
+            f"  {question}  {sorted(' '.join(bigramme) for bigramme in communs)}" for question, communs in fuites
+        ))
+
+    modele = embedding_llamaindex()
+    routeur = RouteurIntentions(MOTS_AGENTS, SALUTATIONS, calcul=effectuer_calcul_simple)
+    debut = time.perf_counter()
+    classifieur = ClassifieurIntentions(modele.get_text_embedding_batch)
+    duree_centroides = time.perf_counter() - debut
+
+    resultats = {"mots-clés": [], "embedding": [], "hybride": []}
+    durees_classement, durees_mots, durees_embedding, consultes, erreurs = [], [], [], 0, []
+    pieges = 0
+    for question, attendu in QUESTIONS:
+        classement_hybride = None
+        debut = time.perf_counter()
+        intention = routeur.router(question)
+        durees_mots.append(time.perf_counter() - debut)
+        # Piégeuse : mal routée par les mots-clés seuls
+        piege = intention["agent"] != attendu
+        pieges += piege
+        debut = time.perf_counter()
+        vecteur = modele.get_query_embedding(normaliser_question(question))
+        durees_embedding.append(time.perf_counter() - debut)
+        debut = time.perf_counter()
+        for _ in range(args.repetitions):
+            classement = classifieur.classer(vecteur)
+        durees_classement.append((time.perf_counter() - debut) / args.repetitions)
+
+        if mots_cles_surs(intention):
+            hybride = intention["agent"]
+        else:
+            consultes += 1
+            choix = classifieur.affiner(intention, vecteur)
+            hybride, classement_hybride = choix["agent"], choix["classement"]
+        for methode, agent in (("mots-clés", intention["agent"]), ("embedding", classement["agent"]),
+                               ("hybride", hybride)):
+            resultats[methode].append((agent == attendu, piege))
+        if hybride != attendu:
+            erreurs.append((question, attendu, hybride, classement_hybride))
+
+    print(f"{len(QUESTIONS)} questions ({pieges} piégeuses pour les mots-clés) · mode {args.mode} · "
+          f"centroïdes calculés en {duree_centroides * 1000:.0f} ms\n")
+    print(f"{'méthode':<12} {'précision':>10} {'piégeuses':>10} {'ordinaires':>11}")
+    for methode, justes in resultats.items():
+        total = sum(juste for juste, _ in justes) / len(justes)
+        sur_pieges = sum(juste for juste, piege in justes if piege) / max(pieges, 1)
+        ordinaires = sum(juste for juste, piege in justes if not piege) / max(len(justes) - pieges, 1)
+        print(f"{methode:<12} {total:>10.0%} {sur_pieges:>10.0%} {ordinaires:>11.0%}")
+
+    microsecondes = lambda durees, q: np.percentile(durees, q) * 1e6
+    print(f"\nEmbedding consulté pour {consultes}/{len(QUESTIONS)} questions")
+    print(f"Mots-clés : p50 {microsecondes(durees_mots, 50):.1f} µs · "
+          f"classement : p50 {microsecondes(durees_classement, 50):.1f} µs, p95 {microsecondes(durees_classement, 95):.1f} µs · "
+          f"embedding de la question : p50 {np.percentile(durees_embedding, 50) * 1000:.2f} ms")
+
+    if erreurs:
+        print("\nErreurs du routage hybride :")
+        for question, attendu, obtenu, classement in erreurs:
+            detail = f"({classement['similarite']:.2f}, marge {classement['marge']:.2f})" if classement else "(mots-clés sûrs)"
+            print(f"  {attendu:>14} → {obtenu:<14} {detail:<22} {question}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark hors ligne : clients OpenAI recréés à chaque requête vs registre partagé.
+
+Un faux serveur OpenAI local (HTTPS avec certificat auto-signé si openssl est
+disponible, sinon HTTP) répond aux routes /chat/completions et /embeddings.
+Trois appels (client openai, LLM LlamaIndex, embedding LlamaIndex) sont
+mesurés en requêtes séquentielles, chacun de deux façons :
+  - « par requête »  : LLM / embedding / client openai construits à chaque appel
+                       (comportement d'avant clients_llm.py)
+  - « registre »     : objets de clients_llm.py réutilisés (pool keep-alive)
+Le serveur compte les connexions ouvertes (échauffement compris) : une par
+requête sans pool ; avec le registre, la connexion ouverte par le premier
+scénario est réutilisée par tous les suivants, car le pool est commun.
+
+Usage :
+    python benchmarks/bench_clients_llm.py
+    python benchmarks/bench_clients_llm.py --requetes 200 --latence-serveur 20 --http
+"""
+
+import os
+import ssl
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+
+class FauxOpenAI(BaseHTTPRequestHandler):
+    """Réponses minimales au format de l'API OpenAI, en HTTP/1.1 keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+    # En-têtes et corps envoyés d'un bloc, sans attente de Nagle / ACK retardé
+    disable_nagle_algorithm = True
+    wbufsize = -1
+    latence = 0.0
+    connexions = 0
+    _verrou = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with FauxOpenAI._verrou:
+            FauxOpenAI.connexions += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        corps = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latence)
+        if self.path.endswith("/embeddings"):
+            entrees = corps.get("input") or [""]
+            entrees = entrees if isinstance(entrees, list) else [entrees]
+            reponse = {
+                "object": "list", "model": corps.get("model"),
+                "data": [{"object": "embedding", "index": i, "embedding": [0.1] * 8} for i in range(len(entrees))],
+                "usage": {"prompt_tokens": 1, "total_tokens": 1},
+            }
+        else:
+            reponse = {
+                "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+                "model": corps.get("model"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "Réponse de test."}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }
+        donnees = json.dumps(reponse).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(donnees)))
+        self.end_headers()
+        self.wfile.write(donnees)
+
+
+def certificat_auto_signe(repertoire):
+    """(certificat, clé) pour 127.0.0.1, ou None si openssl est absent"""
+    if not shutil.which("openssl"):
+        return None
+    certificat, cle = os.path.join(repertoire, "cert.pem"), os.path.join(repertoire, "cle.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-keyout", cle, "-out", certificat, "-subj", "/CN=127.0.0.1",
+         "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+    return certificat, cle
+
+
+def demarrer_serveur(latence, repertoire, tls):
+    FauxOpenAI.latence = latence
+    serveur = ThreadingHTTPServer(("127.0.0.1", 0), FauxOpenAI)
+    schema = "http"
+    if tls:
+        fichiers = certificat_auto_signe(repertoire)
+        if fichiers:
+            contexte = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            contexte.load_cert_chain(*fichiers)
+            serveur.socket = contexte.wrap_socket(serveur.socket, server_side=True)
+            # Les clients httpx font confiance au certificat via SSL_CERT_FILE
+            os.environ["SSL_CERT_FILE"] = fichiers[0]
+            schema = "https"
+    threading.Thread(target=serveur.serve_forever, daemon=True).start()
+    return serveur, f"{schema}://127.0.0.1:{serveur.server_address[1]}/v1"
+
+
+def mesurer(nom, appel, requetes):
+    FauxOpenAI.connexions = 0
+    appel()  # échauffement (imports, première connexion)
+    latences = []
+    for _ in range(requetes):
+        debut = time.perf_counter()
+        appel()
+        latences.append((time.perf_counter() - debut) * 1000)
+    latences.sort()
+    return nom, statistics.median(latences), latences[int(len(latences) * 0.95) - 1], FauxOpenAI.connexions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requetes", type=int, default=100)
+    parser.add_argument("--latence-serveur", type=float, default=0.0, help="temps de réponse simulé (ms)")
+    parser.add_argument("--http", action="store_true", help="sans TLS")
+    args = parser.parse_args()
+
+    repertoire = tempfile.mkdtemp(prefix="bench_clients_")
+    try:
+        serveur, url = demarrer_serveur(args.latence_serveur / 1000, repertoire, tls=not args.http)
+        os.environ["OPENAI_BASE_URL"] = url
+        os.environ["OPENAI_API_KEY"] = "cle-de-test"
+
+        import openai
+        from llama_index.core.llms import ChatMessage
+        from llama_index.llms.openai import OpenAI as LlamaOpenAI
+        from llama_index.embeddings.openai import OpenAIEmbedding
+
+        import clients_llm
+
+        message = [{"role": "user", "content": "Chiffre d'affaires 2023 ?"}]
+        message_llamaindex = [ChatMessage(role="user", content="Chiffre d'affaires 2023 ?")]
+
+        scenarios = [
+            ("openai / par requête", lambda: openai.OpenAI(api_key="cle-de-test", base_url=url)
+                .chat.completions.create(model="gpt-3.5-turbo", messages=message)),
+            ("openai / registre", lambda: clients_llm.client_openai()
+                .chat.completions.create(model=clients_llm.MODELE_CHAT, messages=message)),
+            ("llm llamaindex / par requête", lambda: LlamaOpenAI(
+                model="gpt-3.5-turbo", temperature=0.1, max_tokens=2000, api_base=url).chat(message_llamaindex)),
+            ("llm llamaindex / registre", lambda: clients_llm.llm_llamaindex().chat(message_llamaindex)),
+            ("embedding / par requête", lambda: OpenAIEmbedding(api_base=url).get_query_embedding("question")),
+            ("embedding / registre", lambda: clients_llm.embedding_llamaindex().get_query_embedding("question")),
+        ]
+        resultats = [mesurer(nom, appel, args.requetes) for nom, appel in scenarios]
+        serveur.shutdown()
+
+        print(f"{args.requetes} requêtes séquentielles vers {url} "
+              f"(latence serveur simulée : {args.latence_serveur:g} ms)\n")
+        print(f"{'scénario':<30} {'p50 (ms)':>9} {'p95 (ms)':>9} {'connexions':>11}")
+        for nom, p50, p95, connexions in resultats:
+            print(f"{nom:<30} {p50:>9.2f} {p95:>9.2f} {connexions:>11}")
+    finally:
+        clients_llm_charge = sys.modules.get("clients_llm")
+        if clients_llm_charge:
+            clients_llm_charge.reinitialiser()
+        shutil.rmtree(repertoire, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Benchmark hors ligne : requêtes identiques simultanées, avec et sans coalescence.
+
+N sessions (threads) posent la même question au même instant ; l'appel amont
+est simulé par une réponse diffusée jeton par jeton (latence du premier jeton
+puis délai par jeton), affichée dans une zone propre à chaque session.
+Deux façons :
+  - « sans coalescence » : chaque session fait son propre appel ;
+  - « coalescence »      : CoalesceurRequetes, un seul appel, texte recopié
+                           dans la zone de chaque session en attente.
+Sont mesurés : appels amont, p50 / p95 de la latence par session, délai avant
+le premier texte affiché et nombre d'affichages reçus par session.
+Un dernier scénario interrompt la session qui exécute en cours de diffusion
+(comme un arrêt de script Streamlit) : une session en attente reprend le vol.
+
+Usage :
+    python benchmarks/bench_coalescence.py
+    python benchmarks/bench_coalescence.py --sessions 50 --premier-jeton 400 --jetons 120
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+from coalescence_requetes import CoalesceurRequetes, cle_coalescence
+
+QUESTION = "Quel est le chiffre d'affaires 2023 d'IssaKoffi Frères ?"
+
+
+class ArretScript(BaseException):
+    """Équivalent de StopException / RerunException de Streamlit"""
+
+
+class Zone:
+    """Emplacement st.empty() simulé : horodate le premier texte et compte les affichages"""
+
+    def __init__(self, debut):
+        self._debut = debut
+        self.premier_texte = None
+        self.affichages = 0
+        self.texte = ""
+
+    def markdown(self, texte):
+        if self.premier_texte is None:
+            self.premier_texte = time.perf_counter() - self._debut
+        self.affichages += 1
+        self.texte = texte
+
+
+class Amont:
+    """Appel au LLM simulé, diffusé jeton par jeton"""
+
+    def __init__(self, premier_jeton, par_jeton, jetons):
+        self.premier_jeton, self.par_jeton, self.jetons = premier_jeton, par_jeton, jetons
+        self.appels = 0
+        self._verrou = threading.Lock()
+        self.interrompre_apres = None
+
+    def __call__(self, zone):
+        with self._verrou:
+            self.appels += 1
+            interrompre, self.interrompre_apres = self.interrompre_apres, None
+        time.sleep(self.premier_jeton)
+        texte = ""
+        for i in range(self.jetons):
+            if interrompre is not None and i == interrompre:
+                raise ArretScript()
+            texte += f"mot{i} "
+            zone.markdown(texte + "▌")
+            time.sleep(self.par_jeton)
+        zone.markdown(texte)
+        return {"reponse": texte}
+
+
+def scenario(sessions, amont, coalesceur=None):
+    """Lance les sessions au même instant ; retourne (latences, premiers textes, affichages, réponses)"""
+    depart = threading.Barrier(sessions)
+    latences, premiers, affichages, reponses = [], [], [], []
+    verrou = threading.Lock()
+    cle = cle_coalescence(QUESTION, {"index": 1}, modele="gpt-3.5-turbo", temperature=0.1)
+
+    def session():
+        depart.wait()
+        debut = time.perf_counter()
+        zone = Zone(debut)
+        while True:
+            try:
+                if coalesceur is None:
+                    resultat = amont(zone)
+                else:
+                    resultat, _ = coalesceur.executer(cle, amont, zone)
+                break
+            except ArretScript:
+                # La session interrompue ne reçoit rien (son script s'arrête) : hors mesures
+                return
+        with verrou:
+            latences.append(time.perf_counter() - debut)
+            premiers.append(zone.premier_texte or 0.0)
+            affichages.append(zone.affichages)
+            reponses.append(resultat["reponse"])
+
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latences, premiers, affichages, reponses
+
+
+def quantile(valeurs, q):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(len(valeurs) * q))] if valeurs else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--premier-jeton", type=float, default=300, help="latence avant le premier jeton (ms)")
+    parser.add_argument("--par-jeton", type=float, default=5, help="délai entre deux jetons (ms)")
+    parser.add_argument("--jetons", type=int, default=80)
+    args = parser.parse_args()
+
+    def nouvel_amont():
+        return Amont(args.premier_jeton / 1000, args.par_jeton / 1000, args.jetons)
+
+    print(f"{args.sessions} sessions simultanées · premier jeton {args.premier_jeton:g} ms · "
+          f"{args.jetons} jetons × {args.par_jeton:g} ms\n")
+    print(f"{'scénario':<26} {'appels':>7} {'p50 ms':>8} {'p95 ms':>8} {'1er texte p50':>14} {'affich. min':>12} {'identiques':>11}")
+
+    lignes = []
+    amont = nouvel_amont()
+    lignes.append(("sans coalescence", amont, scenario(args.sessions, amont)))
+    amont, coalesceur = nouvel_amont(), CoalesceurRequetes()
+    lignes.append(("coalescence", amont, scenario(args.sessions, amont, coalesceur)))
+    amont, coalesceur_interrompu = nouvel_amont(), CoalesceurRequetes()
+    amont.interrompre_apres = args.jetons // 2
+    lignes.append(("coalescence + interruption", amont, scenario(args.sessions, amont, coalesceur_interrompu)))
+
+    for nom, amont, (latences, premiers, affichages, reponses) in lignes:
+        print(f"{nom:<26} {amont.appels:>7} {statistics.median(latences) * 1000:>8.1f} "
+              f"{quantile(latences, 0.95) * 1000:>8.1f} {statistics.median(premiers) * 1000:>14.1f} "
+              f"{min(affichages):>12} {len(set(reponses)) == 1!s:>11}")
+
+    print(f"\nStatistiques (coalescence) : {coalesceur.statistiques()}")
+    print(f"Statistiques (interruption) : {coalesceur_interrompu.statistiques()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark du démarrage de l'index : construction complète vs relecture depuis le disque.
+
+Usage :
+    python benchmarks/bench_indexation.py             # embeddings OpenAI (OPENAI_API_KEY requise)
+    python benchmarks/bench_indexation.py --hors-ligne  # embeddings simulés, sans réseau
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexation import charger_ou_construire_index
+
+
+def mesurer(documents_path, repertoire_stockage):
+    debut = time.perf_counter()
+    _, rapport = charger_ou_construire_index(documents_path, repertoire_stockage)
+    return time.perf_counter() - debut, rapport
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", default="documents")
+    parser.add_argument("--hors-ligne", action="store_true", help="Utiliser des embeddings simulés")
+    args = parser.parse_args()
+
+    from llama_index.core.settings import Settings
+    if args.hors_ligne:
+        from llama_index.core.embeddings import MockEmbedding
+        Settings.embed_model = MockEmbedding(embed_dim=1536)
+
+    repertoire_stockage = tempfile.mkdtemp(prefix="bench_index_")
+    copie_documents = tempfile.mkdtemp(prefix="bench_docs_")
+    try:
+        for nom in os.listdir(args.documents):
+            shutil.copy2(os.path.join(args.documents, nom), copie_documents)
+
+        froid, rapport = mesurer(copie_documents, repertoire_stockage)
+        print(f"Démarrage à froid (tout indexer)  : {froid:7.2f}s  {rapport}")
+
+        chaud, rapport = mesurer(copie_documents, repertoire_stockage)
+        print(f"Démarrage à chaud (lire le disque): {chaud:7.2f}s  {rapport}")
+
+        # Modifier un seul fichier : seul celui-ci doit être ré-indexé
+        premier = sorted(os.listdir(copie_documents))[0]
+        os.utime(os.path.join(copie_documents, premier))
+        chaud_touche, rapport = mesurer(copie_documents, repertoire_stockage)
+        print(f"mtime modifié, contenu identique  : {chaud_touche:7.2f}s  {rapport}")
+
+        print(f"Gain au démarrage : x{froid / max(chaud, 1e-9):.1f}")
+    finally:
+        shutil.rmtree(repertoire_stockage, ignore_errors=True)
+        shutil.rmtree(copie_documents, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
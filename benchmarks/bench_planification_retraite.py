@@ -0,0 +1,85 @@
+"""
+Benchmark du planificateur de retraite stochastique (planification_retraite.py).
+
+Mesure :
+  - le scénario seul, puis avec le balayage âge de départ × taux d'épargne
+    calculé dans la même passe (mêmes rendements pour toutes les cases) ;
+  - le même balayage simulé case par case (un appel par scénario), pour
+    comparer les durées et vérifier que les probabilités de ruine
+    coïncident ;
+  - le taux de retrait sûr obtenu en une passe, comparé à une recherche par
+    dichotomie du retrait qui donne RETRAITE_MAX_RUIN de ruine.
+
+Usage :
+    python benchmarks/bench_planification_retraite.py
+    python benchmarks/bench_planification_retraite.py --chemins 50000 --loi student
+"""
+
+import os
+import sys
+import time
+import argparse
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chemins", type=int, default=10000, help="trajectoires simulées")
+    parser.add_argument("--loi", choices=["normale", "student"], default="normale")
+    parser.add_argument("--age", type=int, default=40, help="âge actuel")
+    parser.add_argument("--depart", type=int, default=65, help="âge de départ")
+    parser.add_argument("--pension", type=float, default=20000, help="pension annuelle estimée")
+    args = parser.parse_args()
+
+    import numpy as np
+
+    from planification_retraite import RUINE_MAX, grille_sensibilite, simuler_retraite
+
+    base = dict(age_actuel=args.age, epargne_actuelle=50000, revenu=50000, rendement_annuel=0.05,
+                volatilite=0.15, pension=args.pension, loi=args.loi, chemins=args.chemins)
+    ages, taux = grille_sensibilite(args.age, args.depart, 20.0)
+    taux = [t / 100 for t in taux]
+
+    simuler_retraite(age_retraite=args.depart, taux_epargne=0.2, **dict(base, chemins=500))  # chauffe
+    seul = simuler_retraite(age_retraite=args.depart, taux_epargne=0.2, **base)
+    groupe = simuler_retraite(age_retraite=args.depart, taux_epargne=0.2, ages_balayage=ages, taux_balayage=taux, **base)
+    debut = time.perf_counter()
+    cases = [[simuler_retraite(age_retraite=age, taux_epargne=t, **base)["probabilite_ruine"] for t in taux]
+             for age in ages]
+    duree_cases = time.perf_counter() - debut
+
+    print(f"{args.chemins:,} trajectoires · loi {args.loi} · {args.age} → {args.depart} ans · "
+          f"balayage {len(ages)} âges × {len(taux)} taux\n")
+    print(f"Scénario seul             {seul['duree']:>7.3f} s   ruine {seul['probabilite_ruine']:.2%} · "
+          f"taux de retrait sûr {seul['taux_retrait_sur']:.2%}")
+    print(f"Scénario + balayage       {groupe['duree']:>7.3f} s   (une passe, {len(ages) * len(taux) + 1} scénarios)")
+    print(f"Balayage case par case    {duree_cases:>7.3f} s   écart max des probabilités de ruine : "
+          f"{np.abs(np.array(cases) - np.array(groupe['balayage']['probabilite_ruine'])).max():.2e}")
+
+    print("\nProbabilité de ruine (lignes : âge de départ, colonnes : taux d'épargne)")
+    print("        " + "".join(f"{t:>8.0%}" for t in taux) + "   retrait sûr")
+    for age, ligne, sur in zip(ages, groupe["balayage"]["probabilite_ruine"], groupe["balayage"]["taux_retrait_sur"]):
+        print(f"{age:>4} ans" + "".join(f"{p:>8.1%}" for p in ligne) + f"{sur:>13.2%}")
+
+    # Dichotomie : retrait dont la ruine vaut RUINE_MAX, avec les mêmes rendements (même graine)
+    capital = 500000.0
+    # Départ immédiat : le retrait annuel est revenu × taux_remplacement
+    decumulation = dict(base, age_actuel=args.depart, age_retraite=args.depart, epargne_actuelle=capital,
+                        taux_epargne=0.0, taux_remplacement=1.0, pension=0.0)
+    bas, haut = 0.0, 0.2
+    debut = time.perf_counter()
+    for _ in range(20):
+        milieu = (bas + haut) / 2
+        ruine = simuler_retraite(**dict(decumulation, revenu=milieu * capital))["probabilite_ruine"]
+        bas, haut = (milieu, haut) if ruine <= RUINE_MAX else (bas, milieu)
+    duree_dichotomie = time.perf_counter() - debut
+    une_passe = simuler_retraite(**dict(decumulation, revenu=0.0))
+    print(f"\nTaux de retrait sûr ({1 - RUINE_MAX:.0%} des trajectoires) : dichotomie {bas:.2%} en "
+          f"{duree_dichotomie:.2f} s (20 simulations) · une passe {une_passe['taux_retrait_sur']:.2%} "
+          f"en {une_passe['duree']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark latence / rappel : recherche dense seule vs hybride (BM25 + vecteurs, RRF).
+
+Chaque question attend un rapport précis du dossier documents/ ; le rappel@k
+est la part des questions dont le rapport attendu figure dans les k premiers
+fragments.
+
+Usage :
+    python benchmarks/bench_recherche_hybride.py             # embeddings OpenAI (OPENAI_API_KEY requise)
+    python benchmarks/bench_recherche_hybride.py --hors-ligne  # embeddings simulés : seule la partie BM25 est significative
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indexation import lire_fichiers, lister_fichiers
+from recherche_hybride import RetrieverHybride, construire_bm25_llamaindex
+
+QUESTIONS = [
+    ("Quel est le chiffre d'affaires T1 2024 d'EcoEnergy Group ?", "rapport_trimestriel_EcoEnergy_Group"),
+    ("EBITDA de BioPharma Solutions au T1 2024", "rapport_trimestriel_BioPharma_Solutions"),
+    ("Résultat net 2023 de BioPharma Solutions", "rapport_annuel_BioPharma_Solutions"),
+    ("Dette financière d'InnovTech SA en 2023", "rapport_annuel_InnovTech_SA"),
+    ("Objectif de chiffre d'affaires 2024 d'InnovTech SA", "rapport_trimestriel_InnovTech_SA"),
+    ("ROE de FinServices International", "rapport_annuel_FinServices_International"),
+    ("Marge EBITDA T1 2024 FinServices International", "rapport_trimestriel_FinServices_International"),
+    ("Fonds propres de GlobalManufacturing Corp", "rapport_annuel_GlobalManufacturing_Corp"),
+    ("Investissements digitaux prévus par GlobalManufacturing Corp", "rapport_trimestriel_GlobalManufacturing_Corp"),
+    ("Répartition géographique des ventes d'IssaKoffi Frères au T1 2024", "IssaKoffi_Freres_Rapport_Trimestriel_T1_2024"),
+    ("Rotation des stocks IssaKoffi Frères 2023", "IssaKoffi_Freres_Rapport_Annuel_2023"),
+    ("Effectif et siège social d'IssaKoffi & Frères", "IssaKoffi_Freres_Rapport_Annuel_2023"),
+    ("Actif total 2023 EcoEnergy Group", "rapport_annuel_EcoEnergy_Group"),
+    ("Chiffre d'affaires 18,7 M", "rapport_trimestriel_GlobalManufacturing_Corp"),
+]
+
+
+def evaluer(retriever, k):
+    latences, trouves = [], 0
+    for question, attendu in QUESTIONS:
+        debut = time.perf_counter()
+        resultats = retriever.retrieve(question)
+        latences.append((time.perf_counter() - debut) * 1000)
+        fichiers = [r.node.metadata.get("file_name", "") for r in resultats[:k]]
+        trouves += any(f.startswith(attendu) for f in fichiers)
+    return trouves / len(QUESTIONS), statistics.median(latences), max(latences)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", default="documents")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--hors-ligne", action="store_true", help="Utiliser des embeddings simulés")
+    args = parser.parse_args()
+
+    from llama_index.core import VectorStoreIndex
+    from llama_index.core.settings import Settings
+    if args.hors_ligne:
+        from llama_index.core.embeddings import MockEmbedding
+        Settings.embed_model = MockEmbedding(embed_dim=256)
+
+    documents = [doc for docs in lire_fichiers(lister_fichiers(args.documents)).values() for doc in docs]
+    index = VectorStoreIndex.from_documents(documents)
+    debut = time.perf_counter()
+    bm25 = construire_bm25_llamaindex(index)
+    print(f"{len(index.docstore.docs)} fragments, index BM25 de {len(bm25.postings)} termes "
+          f"construit en {(time.perf_counter() - debut) * 1000:.1f} ms\n")
+
+    retrievers = {
+        "dense": index.as_retriever(similarity_top_k=args.k),
+        "hybride": RetrieverHybride(index, top_k=args.k),
+    }
+    print(f"{'retriever':<10} {'rappel@' + str(args.k):>9} {'p50 (ms)':>9} {'max (ms)':>9}")
+    for nom, retriever in retrievers.items():
+        rappel, p50, pire = evaluer(retriever, args.k)
+        print(f"{nom:<10} {rappel:>9.0%} {p50:>9.1f} {pire:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark hors ligne du routage par palier de modèle (routage_modeles.py).
+
+Un jeu de questions (consultations factuelles courtes, demandes d'analyse,
+analyses multiples) passe par RouteurModeles, routage actif puis désactivé
+(toutes les requêtes au palier standard, comportement d'avant). L'appel au
+LLM est simulé par un modèle de latence en streaming :
+    durée = premier jeton + jetons produits × délai par jeton
+où les jetons produits dépendent du prompt (concis ou analyse détaillée) et
+sont bornés par le max_tokens du palier. Une part des appels du palier rapide
+échoue (délai dépassé) pour exercer le repli.
+
+Pour chaque catégorie de questions : p50 de la latence et jetons produits ;
+puis les statistiques par palier du routeur (appels, erreurs, replis, p50).
+
+Usage :
+    python benchmarks/bench_routage.py
+    python benchmarks/bench_routage.py --par-jeton 20 --taux-erreur 0.2 --echelle 0.01
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+QUESTIONS = {
+    "factuelle": [
+        "Quel est le chiffre d'affaires 2023 d'IssaKoffi Frères ?",
+        "Quel est le résultat net 2022 de BioPharma Solutions ?",
+        "Combien de salariés compte EcoEnergy Group ?",
+        "Quelle est la marge opérationnelle de TechVision en 2023 ?",
+        "Montant du dividende versé par IssaKoffi Frères en 2023",
+        "Quel est l'EBITDA 2023 d'EcoEnergy Group ?",
+    ],
+    "analyse": [
+        "Analyse la rentabilité de BioPharma Solutions",
+        "Quels sont les principaux risques d'EcoEnergy Group ?",
+        "Explique l'évolution de la dette de TechVision",
+        "Quelles recommandations pour un investisseur prudent ?",
+    ],
+    "analyse multiple": [
+        "Compare la rentabilité, l'endettement et les perspectives de croissance de BioPharma Solutions "
+        "et d'EcoEnergy Group sur les trois derniers exercices, puis recommande une stratégie d'allocation",
+        "Analyse les forces et faiblesses d'IssaKoffi Frères ? Quels scénarios pour 2025 ?",
+    ],
+}
+
+# Longueur typique d'une réponse selon le prompt (jetons)
+JETONS_CONCIS = 60
+JETONS_DETAILLES = 750
+
+
+class FournisseurSimule:
+    """Appel LLM simulé : premier jeton, puis diffusion des jetons produits"""
+
+    def __init__(self, premier_jeton, par_jeton, taux_erreur, echelle, graine=3):
+        self.premier_jeton, self.par_jeton = premier_jeton, par_jeton
+        self.taux_erreur, self.echelle = taux_erreur, echelle
+        self._aleatoire = random.Random(graine)
+
+    def __call__(self, nom_palier, palier):
+        if nom_palier == "rapide" and self._aleatoire.random() < self.taux_erreur:
+            time.sleep(palier["delai"] * self.echelle)
+            raise TimeoutError(f"délai du palier {nom_palier} dépassé")
+        jetons = min(JETONS_CONCIS if palier["concis"] else JETONS_DETAILLES, palier["jetons_reponse"])
+        time.sleep((self.premier_jeton + jetons * self.par_jeton) * self.echelle)
+        return {"jetons": jetons}
+
+
+def rejouer(routeur, fournisseur, repetitions):
+    """{catégorie: (latences simulées en s, jetons produits)}"""
+    resultats = {}
+    for categorie, questions in QUESTIONS.items():
+        latences, jetons = [], []
+        for _ in range(repetitions):
+            for question in questions:
+                classement = routeur.choisir(question, confiance=0.9)
+                debut = time.perf_counter()
+                resultat, _ = routeur.executer(classement, fournisseur)
+                latences.append((time.perf_counter() - debut) / fournisseur.echelle)
+                jetons.append(resultat["jetons"])
+        resultats[categorie] = (latences, jetons)
+    return resultats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--premier-jeton", type=float, default=0.5, help="latence du premier jeton (s)")
+    parser.add_argument("--par-jeton", type=float, default=0.015, help="délai par jeton produit (s)")
+    parser.add_argument("--taux-erreur", type=float, default=0.1, help="part des appels du palier rapide en échec")
+    parser.add_argument("--echelle", type=float, default=0.02, help="facteur appliqué aux attentes réelles")
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+
+    from routage_modeles import RouteurModeles
+
+    print(f"Latence simulée : {args.premier_jeton:g} s + {args.par_jeton * 1000:g} ms/jeton · "
+          f"{args.taux_erreur:.0%} d'échecs au palier rapide\n")
+    print(f"{'catégorie':<18} {'routage':<10} {'p50 s':>7} {'p95 s':>7} {'jetons p50':>11}")
+    routeurs = {}
+    for mode, actif in (("désactivé", False), ("actif", True)):
+        routeurs[mode] = RouteurModeles(actif=actif)
+        fournisseur = FournisseurSimule(args.premier_jeton, args.par_jeton, args.taux_erreur, args.echelle)
+        for categorie, (latences, jetons) in rejouer(routeurs[mode], fournisseur, args.repetitions).items():
+            latences.sort()
+            print(f"{categorie:<18} {mode:<10} {statistics.median(latences):>7.2f} "
+                  f"{latences[int(len(latences) * 0.95) - 1]:>7.2f} {statistics.median(jetons):>11.0f}")
+
+    print("\nPaliers (routage actif) :")
+    for nom, stats in routeurs["actif"].statistiques().items():
+        p50 = f"{stats['p50'] / args.echelle:.2f} s" if stats["p50"] is not None else "-"
+        print(f"  {nom:<9} {stats['modele']:<22} {stats['appels']:>4} appel(s), {stats['erreurs']} erreur(s), "
+              f"{stats['replis']} repli(s), p50 {p50}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Micro-benchmark du routage des questions vers un agent (routage_intentions.py).
+
+Compare, sur un grand jeu de questions générées à partir de gabarits réalistes :
+  - l'ancien detecter_agent : salutations cherchées une à une, expressions de
+    calcul compilées à chaque appel, puis une recherche de sous-chaîne par
+    mot-clé de chaque agent ; le script principal recalculait ensuite la
+    réponse (salutation ou calcul) ;
+  - RouteurIntentions : une passe de l'automate compilé, réponse portée par
+    le résultat.
+La recherche dans les tableaux des rapports (donnees_chiffrees) est écartée
+des deux côtés : son coût est identique et elle demande un index.
+
+Affiche le débit (questions/s), le temps par question et les désaccords entre
+les deux versions (par exemple « printemps », qui contenait « temps »).
+
+Usage :
+    python benchmarks/bench_routage_intentions.py
+    python benchmarks/bench_routage_intentions.py --questions 50000 --desaccords 20
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import argparse
+from collections import Counter
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+GABARITS = [
+    "Bonjour, {sujet} ?",
+    "Merci pour {sujet}",
+    "{a} * {b}",
+    "Combien font {a} + {b} ?",
+    "Calculer les intérêts composés sur {a}€ à {taux}% pendant {duree} ans",
+    "Quelle mensualité pour un emprunt de {a}€ sur {duree} ans ?",
+    "Quelle est la météo à {ville} ?",
+    "Quel temps fera-t-il à {ville} ce week-end ?",
+    "Les résultats du printemps de {societe} sont-ils bons ?",
+    "Quelles sont les dernières actualités sur {societe} ?",
+    "Recherche des informations récentes sur {secteur}",
+    "Quel est le calendrier des prochains événements de {societe} ?",
+    "Quand a lieu l'assemblée générale de {societe} ?",
+    "Simuler un investissement de {a}€ en bourse",
+    "Simulation d'un placement de {a}€ à {taux}%",
+    "Comment préparer ma retraite avec {a}€ d'épargne ?",
+    "Quelle pension de retraite espérer après {duree} ans de carrière ?",
+    "Quel est le chiffre d'affaires {annee} de {societe} ?",
+    "Analyse la rentabilité de {societe}",
+    "Quels sont les principaux risques de {societe} en {annee} ?",
+    "Compare l'endettement de {societe} et de {autre}",
+    "Quelles perspectives pour {secteur} ?",
+    "Calcule {taux}% de {a} et donne la météo à {ville}",
+    "Explique la mise à jour des données de {societe}",
+]
+VALEURS = {
+    "sujet": ["votre aide", "l'analyse", "les chiffres", "ce rapport"],
+    "ville": ["Paris", "Lyon", "Abidjan", "Dakar", "Marseille"],
+    "societe": ["IssaKoffi Frères", "BioPharma Solutions", "EcoEnergy Group", "TechVision"],
+    "autre": ["BioPharma Solutions", "EcoEnergy Group"],
+    "secteur": ["le secteur bancaire", "l'énergie", "la pharmacie", "les télécoms"],
+    "annee": ["2021", "2022", "2023", "2024"],
+}
+
+
+def generer_questions(nombre, graine=7):
+    aleatoire = random.Random(graine)
+    questions = []
+    for _ in range(nombre):
+        valeurs = {champ: aleatoire.choice(choix) for champ, choix in VALEURS.items()}
+        valeurs.update(a=aleatoire.randint(2, 50000), b=aleatoire.randint(2, 999),
+                       taux=aleatoire.choice([2, 3.5, 5, 7]), duree=aleatoire.randint(5, 40))
+        question = aleatoire.choice(GABARITS).format(**valeurs)
+        questions.append(question.lower() if aleatoire.random() < 0.2 else question)
+    return questions
+
+
+def detecteur_historique(app_complete):
+    """Reconstitution de l'ancien detecter_agent et du recalcul de la réponse par le script principal"""
+    motifs = [motif.pattern for motif in app_complete.MOTIFS_CALCUL]
+    motif_expression = app_complete.MOTIF_EXPRESSION.pattern
+    mots_agents = {
+        "calculatrice": ["calcul", "intérêt", "prêt", "taux", "mensualité", "emprunt", "capitalisation", "mathématique", "combien font"],
+        "meteo": ["météo", "temps", "climat", "température", "météorologique"],
+        "recherche": ["actualité", "nouvelle", "news", "recherche", "information", "dernier", "récents"],
+        "calendrier": ["calendrier", "événement", "date", "quand", "programme", "agenda", "prochain"],
+        "investissement": ["simuler", "investissement", "placement", "rendement", "projet", "capital", "épargne", "bourse"],
+        "retraite": ["retraite", "pension", "vieillesse", "senior", "avenir", "prévoyance"],
+    }
+
+    def salutation(question):
+        question_lower = question.lower().strip()
+        for mot, reponse in app_complete.SALUTATIONS.items():
+            if mot in question_lower:
+                return reponse
+        return None
+
+    def calcul(question):
+        question_propre = question.lower().replace('=', '').replace('?', '').strip()
+        # Compilation (cache interne de re) à chaque appel, comme avant
+        if re.match(motif_expression, question_propre):
+            return app_complete.effectuer_calcul_simple(question)
+        for motif in motifs:
+            if re.search(motif, question_propre):
+                return app_complete.effectuer_calcul_simple(question)
+        return None
+
+    def detecter(question):
+        question_lower = question.lower()
+        if salutation(question):
+            return "salutation", salutation(question)
+        if calcul(question):
+            return "calcul_simple", calcul(question)
+        scores = {agent: sum(1 for mot in mots if mot in question_lower) for agent, mots in mots_agents.items()}
+        agent_max = max(scores, key=scores.get)
+        return ("assistant" if scores[agent_max] == 0 else agent_max), None
+
+    return detecter
+
+
+def chronometrer(fonction, questions, repetitions):
+    """Meilleure durée (s) d'un passage sur toutes les questions"""
+    meilleure = float("inf")
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        for question in questions:
+            fonction(question)
+        meilleure = min(meilleure, time.perf_counter() - debut)
+    return meilleure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=20000)
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--desaccords", type=int, default=10, help="nombre de types de désaccords affichés")
+    args = parser.parse_args()
+
+    import app_complete
+    from routage_intentions import RouteurIntentions
+
+    questions = generer_questions(args.questions)
+    historique = detecteur_historique(app_complete)
+    routeur = RouteurIntentions(app_complete.MOTS_AGENTS, app_complete.SALUTATIONS,
+                                calcul=app_complete.effectuer_calcul_simple)
+
+    def compile_(question):
+        intention = routeur.router(question)
+        return intention["agent"], intention["reponse"]
+
+    print(f"{len(questions)} questions ({len(set(questions))} distinctes), meilleur de {args.repetitions} passages\n")
+    print(f"{'version':<22} {'questions/s':>12} {'µs/question':>12}")
+    durees = {}
+    for nom, fonction in (("sous-chaînes", historique), ("automate compilé", compile_)):
+        durees[nom] = chronometrer(fonction, questions, args.repetitions)
+        print(f"{nom:<22} {len(questions) / durees[nom]:>12,.0f} {durees[nom] / len(questions) * 1e6:>12.1f}")
+    print(f"\nAccélération : ×{durees['sous-chaînes'] / durees['automate compilé']:.1f}")
+
+    # Désaccords regroupés par (ancien agent, nouvel agent), avec un exemple de question
+    desaccords, exemples = Counter(), {}
+    for question in questions:
+        avant, apres = historique(question)[0], compile_(question)[0]
+        if avant != apres:
+            desaccords[(avant, apres)] += 1
+            exemples.setdefault((avant, apres), question)
+    print(f"Accord avec l'ancien routage : {1 - sum(desaccords.values()) / len(questions):.1%}")
+    for (avant, apres), nombre in desaccords.most_common(args.desaccords):
+        print(f"  {avant:>14} → {apres:<14} {nombre:>6}  ex. « {exemples[(avant, apres)]} »")
+
+if __name__ == "__main__":
+    main()
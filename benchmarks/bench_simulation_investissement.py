@@ -0,0 +1,101 @@
+"""
+Benchmark du moteur de projection d'investissement (simulation_investissement.py).
+
+Compare :
+  - l'ancienne boucle Python d'agent_simulateur_investissement (une
+    trajectoire, mois par mois) et la forme fermée déterministe ;
+  - le Monte Carlo vectorisé pour chaque loi (normale, Student, bootstrap sur
+    un historique synthétique) : durée, percentiles finaux, moyenne comparée
+    à l'espérance exacte, probabilité de perte ;
+  - les percentiles moyennés par blocs (mémoire bornée) et les percentiles
+    exacts (un seul bloc) ;
+  - l'exécution série et le pool de processus (--processus), résultats
+    identiques attendus ; le gain dépend du nombre de cœurs.
+
+Usage :
+    python benchmarks/bench_simulation_investissement.py
+    python benchmarks/bench_simulation_investissement.py --chemins 1000000 --processus 4
+"""
+
+import os
+import sys
+import time
+import argparse
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+
+def boucle_historique(capital, apport_mensuel, annees, rendement):
+    """L'ancienne projection d'app_complete.py"""
+    capital_courant = capital
+    for annee in range(1, annees + 1):
+        for mois in range(12):
+            capital_courant *= (1 + rendement / 100 / 12)
+            capital_courant += apport_mensuel
+    return capital_courant
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chemins", type=int, default=100000, help="trajectoires simulées")
+    parser.add_argument("--annees", type=int, default=20)
+    parser.add_argument("--capital", type=float, default=10000)
+    parser.add_argument("--apport", type=float, default=500, help="apport mensuel")
+    parser.add_argument("--rendement", type=float, default=7.0, help="rendement annuel (%%)")
+    parser.add_argument("--volatilite", type=float, default=15.0, help="volatilité annuelle (%%)")
+    parser.add_argument("--processus", type=int, default=os.cpu_count() or 1, help="processus du pool")
+    args = parser.parse_args()
+
+    import numpy as np
+
+    from simulation_investissement import LOIS, PERCENTILES, projection_deterministe, simuler
+
+    mois = args.annees * 12
+    rendement, volatilite = args.rendement / 100, args.volatilite / 100
+    parametres = (args.capital, args.apport, args.annees, rendement, volatilite)
+
+    debut = time.perf_counter()
+    ancienne = boucle_historique(args.capital, args.apport, args.annees, args.rendement)
+    duree_boucle = time.perf_counter() - debut
+    debut = time.perf_counter()
+    fermee = projection_deterministe(args.capital, args.apport, mois, rendement)[-1]
+    duree_fermee = time.perf_counter() - debut
+    print(f"Déterministe ({args.annees} ans) : boucle {ancienne:,.2f} € en {duree_boucle * 1e6:.0f} µs · "
+          f"forme fermée {fermee:,.2f} € en {duree_fermee * 1e6:.0f} µs\n")
+
+    # Espérance exacte de la valeur finale : rendements indépendants de moyenne r/12
+    esperance = projection_deterministe(args.capital, args.apport, mois, rendement)[-1]
+    # Historique synthétique pour le bootstrap : 25 ans de rendements mensuels asymétriques
+    generateur = np.random.default_rng(1)
+    historique = generateur.normal(0.006, 0.04, 300) - 0.03 * (generateur.random(300) < 0.05)
+
+    simuler(*parametres, chemins=1000)  # chauffe
+    print(f"{args.chemins:,} trajectoires × {mois} mois · {os.cpu_count()} cœur(s)\n")
+    entetes = "".join(f"{'P' + str(p):>11}" for p in PERCENTILES)
+    print(f"{'loi':<28} {'durée s':>8}{entetes} {'moyenne/esp.':>13} {'perte':>7}")
+    for loi, nom in LOIS.items():
+        resultat = simuler(*parametres, loi=loi, chemins=args.chemins, historique=historique, processus=1)
+        finales = "".join(f"{resultat['bandes'][p][-1]:>11,.0f}" for p in PERCENTILES)
+        print(f"{nom:<28} {resultat['duree']:>8.3f}{finales} {resultat['moyenne_finale'] / esperance:>13.4f} "
+              f"{resultat['probabilite_perte']:>7.2%}")
+
+    # Blocs de taille bornée : percentiles moyennés contre percentiles exacts sur toutes les trajectoires
+    exact = simuler(*parametres, chemins=args.chemins, memoire_mo=1e6, processus=1)
+    par_blocs = simuler(*parametres, chemins=args.chemins, memoire_mo=16, processus=1)
+    ecarts = [abs(par_blocs["bandes"][p][-1] / exact["bandes"][p][-1] - 1) for p in PERCENTILES]
+    print(f"\nPercentiles par blocs ({par_blocs['blocs']} blocs) / un seul bloc : écart max {max(ecarts):.3%} · "
+          f"durées {par_blocs['duree']:.3f} s / {exact['duree']:.3f} s")
+
+    if args.processus > 1:
+        serie = simuler(*parametres, chemins=args.chemins, memoire_mo=16, processus=1)
+        pool = simuler(*parametres, chemins=args.chemins, memoire_mo=16, processus=args.processus)
+        identiques = all(np.array_equal(serie["bandes"][p], pool["bandes"][p]) for p in PERCENTILES)
+        print(f"Série {serie['duree']:.3f} s · pool de {pool['processus']} processus {pool['duree']:.3f} s · "
+              f"résultats identiques : {'oui' if identiques else 'NON'}")
+        if pool["processus"] == 1:
+            print("    (pool non utilisé : moins de MC_POOL_MIN_PATHS trajectoires)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark démarrage à froid / latence de requête : stockage plat (memmap) vs Chroma.
+
+Les deux backends sont remplis avec les mêmes vecteurs aléatoires normalisés.
+Le démarrage à froid est mesuré dans un processus neuf (import des modules,
+ouverture du stockage, première requête) ; la latence des requêtes suivantes dans le
+processus courant. Le rappel@k compare les résultats de Chroma (HNSW,
+approché) à la recherche exacte du stockage plat (des vecteurs aléatoires sont
+un cas défavorable à HNSW : le rappel sur de vrais embeddings est meilleur).
+
+Usage :
+    python benchmarks/bench_stockage_vectoriel.py
+    python benchmarks/bench_stockage_vectoriel.py --vecteurs 50000 --dimension 1536
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+import numpy as np
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+
+def ouvrir(backend, repertoire):
+    """Ouvre le stockage ; retourne une fonction requete(vecteur, k) -> [ids]"""
+    if backend == "plat":
+        from stockage_vectoriel import StockageVectorielPlat
+
+        stockage = StockageVectorielPlat(repertoire)
+        return lambda vecteur, k: [stockage.identifiant(l) for l, _ in stockage.rechercher(vecteur, k)]
+
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=repertoire).get_collection("bench")
+    return lambda vecteur, k: collection.query(query_embeddings=[vecteur.tolist()], n_results=k)["ids"][0]
+
+
+def construire(backend, repertoire, vecteurs, ids):
+    debut = time.perf_counter()
+    if backend == "plat":
+        from stockage_vectoriel import StockageVectorielPlat
+
+        stockage = StockageVectorielPlat(repertoire)
+        for i in range(0, len(vecteurs), 5000):
+            stockage.ajouter(vecteurs[i:i + 5000], ids=ids[i:i + 5000])
+    else:
+        import chromadb
+
+        client = chromadb.PersistentClient(path=repertoire)
+        collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+        for i in range(0, len(vecteurs), 5000):
+            collection.add(embeddings=vecteurs[i:i + 5000].tolist(), ids=ids[i:i + 5000])
+    return time.perf_counter() - debut
+
+
+def mesurer_demarrage(backend, repertoire, dimension):
+    """Import + ouverture + première requête, dans un processus neuf"""
+    sortie = subprocess.run(
+        [sys.executable, __file__, "--demarrage", backend, "--repertoire", repertoire,
+         "--dimension", str(dimension)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(sortie.stdout.strip().splitlines()[-1])
+
+
+def demarrage(backend, repertoire, dimension):
+    debut = time.perf_counter()
+    # stockage_vectoriel importe aussi LlamaIndex / LangChain s'ils sont installés (adaptateurs)
+    __import__("stockage_vectoriel" if backend == "plat" else "chromadb")
+    importe = time.perf_counter()
+    requete = ouvrir(backend, repertoire)
+    ouvert = time.perf_counter()
+    requete(np.ones(dimension, dtype=np.float32), 3)
+    print(json.dumps({
+        "import": importe - debut,
+        "ouverture": ouvert - importe,
+        "requete": time.perf_counter() - ouvert,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vecteurs", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--requetes", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--demarrage", choices=["plat", "chroma"], help=argparse.SUPPRESS)
+    parser.add_argument("--repertoire", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.demarrage:
+        demarrage(args.demarrage, args.repertoire, args.dimension)
+        return
+
+    rng = np.random.default_rng(0)
+    vecteurs = rng.standard_normal((args.vecteurs, args.dimension), dtype=np.float32)
+    vecteurs /= np.linalg.norm(vecteurs, axis=1, keepdims=True)
+    ids = [f"fragment-{i}" for i in range(args.vecteurs)]
+    requetes = rng.standard_normal((args.requetes, args.dimension), dtype=np.float32)
+
+    racine = tempfile.mkdtemp(prefix="bench_stockage_")
+    try:
+        resultats, reponses = {}, {}
+        for backend in ("plat", "chroma"):
+            repertoire = os.path.join(racine, backend)
+            construction = construire(backend, repertoire, vecteurs, ids)
+            froid = mesurer_demarrage(backend, repertoire, args.dimension)
+
+            requete = ouvrir(backend, repertoire)
+            latences = []
+            reponses[backend] = []
+            for vecteur in requetes:
+                debut = time.perf_counter()
+                reponses[backend].append(requete(vecteur, args.k))
+                latences.append((time.perf_counter() - debut) * 1000)
+            latences.sort()
+            resultats[backend] = (construction, froid, statistics.median(latences),
+                                  latences[int(len(latences) * 0.95) - 1])
+
+        rappel = statistics.mean(
+            len(set(exact) & set(approche)) / args.k
+            for exact, approche in zip(reponses["plat"], reponses["chroma"])
+        )
+
+        print(f"{args.vecteurs} vecteurs x {args.dimension} dimensions, {args.requetes} requêtes top-{args.k}\n")
+        print(f"{'backend':<8} {'construction':>13} {'import':>8} {'ouverture':>10} {'1re requête':>12} "
+              f"{'p50 (ms)':>9} {'p95 (ms)':>9}")
+        for backend, (construction, froid, p50, p95) in resultats.items():
+            print(f"{backend:<8} {construction:>12.1f}s {froid['import']:>7.2f}s {froid['ouverture'] * 1000:>8.1f}ms "
+                  f"{froid['requete'] * 1000:>10.1f}ms {p50:>9.2f} {p95:>9.2f}")
+        print(f"\nRappel@{args.k} de Chroma (HNSW) par rapport à la recherche exacte : {rappel:.1%}")
+    finally:
+        shutil.rmtree(racine, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
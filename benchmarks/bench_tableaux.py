@@ -0,0 +1,82 @@
+"""
+Benchmark des réponses chiffrées : base des tableaux extraits vs RAG.
+
+Mesure l'extraction des tableaux du dossier documents/, puis le temps de
+réponse et l'exactitude de la base SQLite sur des questions dont la valeur
+figure dans un tableau. Avec --rag, la même question est posée au RAG
+LlamaIndex (OPENAI_API_KEY requise) pour comparer les latences.
+
+Usage :
+    python benchmarks/bench_tableaux.py
+    python benchmarks/bench_tableaux.py --rag
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tableaux_financiers import BaseTableaux
+
+# (question, valeur attendue dans la réponse)
+QUESTIONS = [
+    ("Quel est le chiffre d'affaires T1 2024 d'EcoEnergy Group ?", "18.3"),
+    ("EBITDA de BioPharma Solutions au T1 2024", "7.6"),
+    ("Résultat net 2023 de BioPharma Solutions", "12.4"),
+    ("Dette financière d'InnovTech SA en 2023", "50.8"),
+    ("ROE 2022 de FinServices International", "29.0"),
+    ("Marge EBITDA T1 2024 FinServices International", "23.4"),
+    ("Fonds propres 2021 de GlobalManufacturing Corp", "34.0"),
+    ("CA du premier trimestre 2024 de GlobalManufacturing Corp", "18.7"),
+    ("Actif total 2023 EcoEnergy Group", "152.7"),
+    ("Rotation des stocks IssaKoffi Frères 2023", "5.4"),
+    ("CA Europe T1 2024 IssaKoffi Frères", "10.1"),
+    ("Chiffre d'affaires 2022 d'IssaKoffi & Frères", "51.8"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", default="documents")
+    parser.add_argument("--rag", action="store_true", help="Comparer avec le RAG LlamaIndex (appels OpenAI)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as dossier:
+        base = BaseTableaux(os.path.join(dossier, "tableaux.sqlite"))
+        rapport = base.synchroniser(args.documents)
+        print(f"Extraction : {rapport['indicateurs']} valeurs de {rapport['extraits']} rapport(s) "
+              f"en {rapport['duree']:.2f}s")
+        rapport = base.synchroniser(args.documents)
+        print(f"Resynchronisation sans changement : {rapport['duree'] * 1000:.1f} ms\n")
+
+        latences, justes = [], 0
+        for question, attendu in QUESTIONS:
+            debut = time.perf_counter()
+            reponse = base.repondre(question)
+            latences.append((time.perf_counter() - debut) * 1000)
+            justes += bool(reponse) and f"**{attendu}" in reponse
+        print(f"Base des tableaux : {justes}/{len(QUESTIONS)} réponses exactes, "
+              f"p50 {statistics.median(latences):.2f} ms, max {max(latences):.2f} ms")
+
+    if args.rag:
+        from llama_index.core import VectorStoreIndex
+        from indexation import lire_fichiers, lister_fichiers
+
+        documents = [doc for docs in lire_fichiers(lister_fichiers(args.documents)).values() for doc in docs]
+        moteur = VectorStoreIndex.from_documents(documents).as_query_engine(similarity_top_k=3)
+        latences, justes = [], 0
+        for question, attendu in QUESTIONS:
+            debut = time.perf_counter()
+            reponse = str(moteur.query(question))
+            latences.append((time.perf_counter() - debut) * 1000)
+            justes += attendu in reponse or attendu.replace(".", ",") in reponse
+        print(f"RAG LlamaIndex    : {justes}/{len(QUESTIONS)} réponses exactes, "
+              f"p50 {statistics.median(latences):.0f} ms, max {max(latences):.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
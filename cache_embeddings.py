@@ -0,0 +1,258 @@
+"""
+Cache disque des embeddings et appels par lots adaptés aux limites de débit.
+
+Les vecteurs sont stockés dans SQLite, indexés par nom de modèle et SHA-256
+du texte : un texte déjà vectorisé (même dans un autre rapport ou lors d'une
+ré-indexation) n'est jamais renvoyé au fournisseur. Seuls les textes absents
+du cache sont envoyés, par grands lots dont la taille s'ajuste aux limites
+de débit (réduction sur erreur 429, augmentation progressive sinon) avec
+nouvelles tentatives et attente exponentielle.
+"""
+
+import os
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+
+import numpy as np
+
+# Classes de base des adaptateurs (les deux frameworks restent optionnels)
+try:
+    from langchain_core.embeddings import Embeddings as _EmbeddingsLangChain
+except ImportError:
+    try:
+        from langchain.embeddings.base import Embeddings as _EmbeddingsLangChain
+    except ImportError:
+        _EmbeddingsLangChain = object
+
+try:
+    from llama_index.core.base.embeddings.base import BaseEmbedding
+    from llama_index.core.bridge.pydantic import PrivateAttr
+    HAS_LLAMA_INDEX = True
+except ImportError:
+    HAS_LLAMA_INDEX = False
+
+CHEMIN_CACHE = os.getenv("EMBEDDING_CACHE_PATH", os.path.join("cache", "embeddings.sqlite"))
+
+# ============================================================================
+# CACHE SQLITE
+# ============================================================================
+
+def cle_texte(texte):
+    """Clé de cache d'un texte"""
+    return hashlib.sha256(texte.encode("utf-8")).hexdigest()
+
+
+class CacheEmbeddings:
+    """Stockage des vecteurs (float32) par (modèle, hash du texte)"""
+
+    def __init__(self, chemin=CHEMIN_CACHE):
+        dossier = os.path.dirname(chemin)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        self._verrou = threading.Lock()
+        self._connexion = sqlite3.connect(chemin, timeout=30, check_same_thread=False)
+        self._connexion.execute("PRAGMA journal_mode=WAL")
+        self._connexion.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " modele TEXT NOT NULL, cle TEXT NOT NULL, vecteur BLOB NOT NULL,"
+            " PRIMARY KEY (modele, cle))"
+        )
+        self._connexion.commit()
+        self.succes = 0
+        self.echecs = 0
+
+    def lire(self, modele, cles):
+        """Retourne {clé: vecteur} pour les clés présentes dans le cache"""
+        trouves = {}
+        with self._verrou:
+            # Requêtes par paquets pour rester sous la limite de paramètres SQLite
+            for i in range(0, len(cles), 500):
+                paquet = cles[i:i + 500]
+                lignes = self._connexion.execute(
+                    f"SELECT cle, vecteur FROM embeddings WHERE modele = ? AND cle IN ({','.join('?' * len(paquet))})",
+                    [modele, *paquet],
+                ).fetchall()
+                for cle, blob in lignes:
+                    trouves[cle] = np.frombuffer(blob, dtype=np.float32).tolist()
+        self.succes += len(trouves)
+        self.echecs += len(cles) - len(trouves)
+        return trouves
+
+    def ecrire(self, modele, vecteurs):
+        """Enregistre {clé: vecteur}"""
+        with self._verrou:
+            self._connexion.executemany(
+                "INSERT OR REPLACE INTO embeddings (modele, cle, vecteur) VALUES (?, ?, ?)",
+                [(modele, cle, np.asarray(v, dtype=np.float32).tobytes()) for cle, v in vecteurs.items()],
+            )
+            self._connexion.commit()
+
+    def taux_succes(self):
+        total = self.succes + self.echecs
+        return self.succes / total if total else 0.0
+
+# ============================================================================
+# APPELS PAR LOTS ADAPTATIFS
+# ============================================================================
+
+def est_limite_debit(erreur):
+    """Erreur 429 / quota de débit du fournisseur"""
+    return getattr(erreur, "status_code", None) == 429 or "RateLimit" in type(erreur).__name__
+
+
+def est_erreur_transitoire(erreur):
+    """Erreurs réseau ou serveur qui justifient une nouvelle tentative"""
+    statut = getattr(erreur, "status_code", None)
+    if statut is not None:
+        return statut >= 500
+    return any(nom in type(erreur).__name__ for nom in ("Timeout", "Connection", "ServiceUnavailable"))
+
+
+def delai_reessai(erreur, tentative, delai_base=1.0, delai_max=60.0):
+    """Délai d'attente : en-tête Retry-After s'il existe, sinon exponentiel avec gigue"""
+    reponse = getattr(erreur, "response", None)
+    entetes = getattr(reponse, "headers", None) or {}
+    try:
+        return min(float(entetes.get("retry-after")), delai_max)
+    except (TypeError, ValueError):
+        return min(delai_base * 2 ** tentative, delai_max) * (0.5 + random.random() / 2)
+
+
+class LotsAdaptatifs:
+    """
+    Découpe les appels en lots dont la taille s'adapte aux limites de débit :
+    divisée par deux sur erreur 429, augmentée de 50 % après chaque succès.
+    """
+
+    def __init__(self, taille_initiale=256, taille_min=8, taille_max=2048,
+                 caracteres_max=600_000, essais_max=6):
+        self.taille = taille_initiale
+        self.taille_min = taille_min
+        self.taille_max = taille_max
+        # Limite de tokens par requête côté fournisseur (~4 caractères par token)
+        self.caracteres_max = caracteres_max
+        self.essais_max = essais_max
+        self.appels = 0
+        self.limites_atteintes = 0
+
+    def _prochain_lot(self, textes, debut):
+        fin, caracteres = debut, 0
+        while fin < len(textes) and fin - debut < self.taille:
+            caracteres += len(textes[fin])
+            if fin > debut and caracteres > self.caracteres_max:
+                break
+            fin += 1
+        return fin
+
+    def executer(self, textes, fonction_lot):
+        """Applique fonction_lot(lot) -> vecteurs à tous les textes, lot par lot"""
+        resultats = []
+        debut = 0
+        while debut < len(textes):
+            fin = self._prochain_lot(textes, debut)
+            for tentative in range(self.essais_max):
+                try:
+                    self.appels += 1
+                    resultats.extend(fonction_lot(textes[debut:fin]))
+                    self.taille = min(self.taille_max, int(self.taille * 1.5) + 1)
+                    break
+                except Exception as e:
+                    if tentative == self.essais_max - 1:
+                        raise
+                    if est_limite_debit(e):
+                        self.limites_atteintes += 1
+                        self.taille = max(self.taille_min, self.taille // 2)
+                        fin = min(fin, debut + self.taille)
+                    elif not est_erreur_transitoire(e):
+                        raise
+                    time.sleep(delai_reessai(e, tentative))
+            debut = fin
+        return resultats
+
+
+def vectoriser_avec_cache(textes, modele, fonction_lot, cache, lots=None):
+    """Vectorise des textes : lecture du cache, appel groupé pour les seuls absents, écriture"""
+    cles = [cle_texte(texte) for texte in textes]
+    connus = cache.lire(modele, list(dict.fromkeys(cles)))
+
+    # Un texte répété n'est envoyé qu'une fois
+    manquants = {}
+    for cle, texte in zip(cles, textes):
+        if cle not in connus and cle not in manquants:
+            manquants[cle] = texte
+
+    if manquants:
+        lots = lots or LotsAdaptatifs()
+        vecteurs = lots.executer(list(manquants.values()), fonction_lot)
+        nouveaux = dict(zip(manquants.keys(), vecteurs))
+        cache.ecrire(modele, nouveaux)
+        connus.update(nouveaux)
+
+    return [connus[cle] for cle in cles]
+
+# ============================================================================
+# ADAPTATEURS LANGCHAIN ET LLAMAINDEX
+# ============================================================================
+
+class EmbeddingsEnCache(_EmbeddingsLangChain):
+    """Enveloppe un modèle d'embeddings LangChain (OpenAIEmbeddings) avec le cache disque"""
+
+    def __init__(self, base, cache=None, modele=None):
+        self.base = base
+        self.cache = cache or CacheEmbeddings()
+        self.modele = modele or getattr(base, "model", type(base).__name__)
+        self.lots = LotsAdaptatifs()
+
+    def embed_documents(self, texts):
+        return vectoriser_avec_cache(list(texts), self.modele, self.base.embed_documents, self.cache, self.lots)
+
+    def embed_query(self, text):
+        # Espace de clés séparé : certains modèles vectorisent différemment requêtes et documents
+        return vectoriser_avec_cache(
+            [text], f"{self.modele}:requete", lambda lot: [self.base.embed_query(lot[0])], self.cache, self.lots
+        )[0]
+
+
+if HAS_LLAMA_INDEX:
+
+    class EmbeddingLlamaIndexEnCache(BaseEmbedding):
+        """Enveloppe un modèle d'embedding LlamaIndex (OpenAIEmbedding) avec le cache disque"""
+
+        _base: BaseEmbedding = PrivateAttr()
+        _cache: CacheEmbeddings = PrivateAttr()
+        _lots: LotsAdaptatifs = PrivateAttr()
+
+        def __init__(self, base, cache=None, **kwargs):
+            # Le découpage en lots est géré ici, pas par LlamaIndex
+            super().__init__(model_name=base.model_name, embed_batch_size=2048, **kwargs)
+            self._base = base
+            self._base.embed_batch_size = 2048
+            self._cache = cache or CacheEmbeddings()
+            self._lots = LotsAdaptatifs()
+
+        @classmethod
+        def class_name(cls):
+            return "EmbeddingLlamaIndexEnCache"
+
+        def _vectoriser(self, textes, fonction_lot, modele=None):
+            return vectoriser_avec_cache(textes, modele or self.model_name, fonction_lot, self._cache, self._lots)
+
+        def _get_query_embedding(self, query):
+            return self._vectoriser(
+                [query], lambda lot: [self._base.get_query_embedding(lot[0])], f"{self.model_name}:requete"
+            )[0]
+
+        def _get_text_embedding(self, text):
+            return self._get_text_embeddings([text])[0]
+
+        def _get_text_embeddings(self, texts):
+            return self._vectoriser(list(texts), self._base.get_text_embedding_batch)
+
+        async def _aget_query_embedding(self, query):
+            return self._get_query_embedding(query)
+
+        async def _aget_text_embedding(self, text):
+            return self._get_text_embedding(text)
@@ -0,0 +1,316 @@
+"""
+Cache exact et persistant des réponses du LLM (chat completions).
+
+La réponse sans documents de app_complete.py et les étapes des agents de
+new_app_2.py renvoient souvent des requêtes identiques à l'octet près. Un
+transport inséré dans le client HTTP partagé (clients_llm.py) sert ces
+requêtes depuis SQLite, quelle que soit la bibliothèque appelante (SDK
+openai, LlamaIndex, LangChain, agent à outils), streaming compris : le flux
+d'origine est transmis tel quel à l'appelant et enregistré une fois lu en
+entier.
+
+- Clé : empreinte du corps de la requête (modèle, messages, température,
+  schémas d'outils et autres paramètres de génération).
+- Seules les requêtes déterministes sont mises en cache : une température
+  supérieure à LLM_CACHE_MAX_TEMPERATURE (0 par défaut ; absente = 1 pour
+  l'API) ou plusieurs réponses (n > 1) contournent le cache.
+- Éviction des entrées les moins récemment utilisées (LRU) au-delà de la
+  capacité en nombre d'entrées ou en taille totale.
+Le transport ne s'insère que si le client HTTP du SDK openai est un client
+httpx (openai 1.x) ; sinon le cache est ignoré.
+Ce cache se place avant le transport de rejeu (rejeu_llm.py) : une réponse
+servie depuis le cache n'est pas comptée comme un appel au fournisseur.
+Avec LLM_REPLAY_MODE, les réponses ne viennent pas du vrai modèle : elles
+vont dans un fichier propre au mode (reponses_llm.<mode>.sqlite) et le mode
+entre dans la clé, pour ne jamais être servies aux utilisateurs. En mode
+'enregistrer' le cache est désactivé : chaque appel doit atteindre la cassette.
+
+Configuration (variables d'environnement, lues au premier import) :
+  LLM_CACHE                  0 : désactivé (activé par défaut)
+  LLM_CACHE_PATH             fichier SQLite (cache/reponses_llm.sqlite, ou
+                             cache/reponses_llm.<mode>.sqlite en mode rejeu)
+  LLM_CACHE_MAX_TEMPERATURE  température maximale mise en cache (0)
+  LLM_CACHE_MAX_ENTRIES      nombre maximal d'entrées (5000)
+  LLM_CACHE_MAX_MB           taille maximale des réponses stockées en Mo (50)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+import httpx
+import openai
+
+from rejeu_llm import MODE_REJEU, cle_requete
+
+CACHE_ACTIVE = os.getenv("LLM_CACHE", "1") != "0" and MODE_REJEU != "enregistrer"
+CHEMIN_CACHE_LLM = os.getenv("LLM_CACHE_PATH", os.path.join(
+    "cache", f"reponses_llm.{MODE_REJEU}.sqlite" if MODE_REJEU else "reponses_llm.sqlite"
+))
+TEMPERATURE_MAX = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0"))
+CAPACITE = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+OCTETS_MAX = int(float(os.getenv("LLM_CACHE_MAX_MB", "50")) * 1024 * 1024)
+
+# Température appliquée par l'API quand la requête n'en précise pas
+TEMPERATURE_PAR_DEFAUT = 1.0
+# Champs sans effet sur le contenu de la réponse
+_CHAMPS_IGNORES = {"user"}
+_ENTETES_CONSERVES = ("content-type", "content-encoding")
+
+# ============================================================================
+# CLÉ ET ÉLIGIBILITÉ
+# ============================================================================
+
+def corps_cacheable(corps, temperature_max=TEMPERATURE_MAX):
+    """Une requête de chat n'est mise en cache que si sa réponse est déterministe"""
+    if not isinstance(corps, dict) or (corps.get("n") or 1) > 1:
+        return False
+    temperature = corps.get("temperature")
+    return (TEMPERATURE_PAR_DEFAUT if temperature is None else temperature) <= temperature_max
+
+
+def cle_appel(corps):
+    """Empreinte d'un appel : modèle, messages, température, outils et paramètres de génération"""
+    contenu = {champ: valeur for champ, valeur in corps.items() if champ not in _CHAMPS_IGNORES}
+    if MODE_REJEU:
+        # Réponses factices ou rejouées : jamais mélangées à celles du vrai modèle
+        contenu["_rejeu"] = MODE_REJEU
+    return cle_requete("chat", contenu)
+
+# ============================================================================
+# STOCKAGE SQLITE
+# ============================================================================
+
+class CacheLLM:
+    """Réponses brutes (corps HTTP) par empreinte de requête, éviction LRU"""
+
+    def __init__(self, chemin=CHEMIN_CACHE_LLM, capacite=CAPACITE, octets_max=OCTETS_MAX):
+        dossier = os.path.dirname(chemin)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        self.capacite = capacite
+        self.octets_max = octets_max
+        self.compteurs = {"succes": 0, "echecs": 0, "contournements": 0, "evictions": 0}
+
+        self._verrou = threading.Lock()
+        self._connexion = sqlite3.connect(chemin, timeout=30, check_same_thread=False)
+        self._connexion.execute("PRAGMA journal_mode=WAL")
+        self._connexion.execute(
+            "CREATE TABLE IF NOT EXISTS reponses_llm ("
+            " cle TEXT PRIMARY KEY, modele TEXT NOT NULL, entetes TEXT NOT NULL, corps BLOB NOT NULL,"
+            " taille INTEGER NOT NULL, cree_le REAL NOT NULL, dernier_acces REAL NOT NULL,"
+            " utilisations INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._connexion.execute("CREATE INDEX IF NOT EXISTS reponses_llm_acces ON reponses_llm (dernier_acces)")
+        self._connexion.commit()
+
+    def lire(self, cle):
+        """(entêtes, corps) de la réponse en cache, ou None"""
+        with self._verrou:
+            ligne = self._connexion.execute(
+                "SELECT entetes, corps FROM reponses_llm WHERE cle = ?", (cle,)
+            ).fetchone()
+            if ligne is None:
+                self.compteurs["echecs"] += 1
+                return None
+            self.compteurs["succes"] += 1
+            self._connexion.execute(
+                "UPDATE reponses_llm SET dernier_acces = ?, utilisations = utilisations + 1 WHERE cle = ?",
+                (time.time(), cle),
+            )
+            self._connexion.commit()
+        return json.loads(ligne[0]), bytes(ligne[1])
+
+    def ecrire(self, cle, modele, entetes, corps):
+        maintenant = time.time()
+        with self._verrou:
+            self._connexion.execute(
+                "INSERT OR REPLACE INTO reponses_llm (cle, modele, entetes, corps, taille, cree_le, dernier_acces)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cle, modele or "", json.dumps(entetes), corps, len(corps), maintenant, maintenant),
+            )
+            # Les plus récemment utilisées sont gardées tant que le nombre et la taille cumulée le permettent
+            self.compteurs["evictions"] += self._connexion.execute(
+                "DELETE FROM reponses_llm WHERE cle IN ("
+                " SELECT cle FROM (SELECT cle,"
+                "  ROW_NUMBER() OVER (ORDER BY dernier_acces DESC) AS rang,"
+                "  SUM(taille) OVER (ORDER BY dernier_acces DESC ROWS UNBOUNDED PRECEDING) AS cumul"
+                "  FROM reponses_llm) WHERE rang > ? OR cumul > ?)",
+                (self.capacite, self.octets_max),
+            ).rowcount
+            self._connexion.commit()
+
+    def contourner(self):
+        with self._verrou:
+            self.compteurs["contournements"] += 1
+
+    def vider(self):
+        with self._verrou:
+            self._connexion.execute("DELETE FROM reponses_llm")
+            self._connexion.commit()
+
+    def statistiques(self):
+        """Compteurs, nombre d'entrées, taille stockée et taux de succès"""
+        with self._verrou:
+            entrees, octets = self._connexion.execute(
+                "SELECT COUNT(*), COALESCE(SUM(taille), 0) FROM reponses_llm"
+            ).fetchone()
+        total = self.compteurs["succes"] + self.compteurs["echecs"]
+        return dict(
+            self.compteurs,
+            entrees=entrees,
+            octets=octets,
+            taux_succes=self.compteurs["succes"] / total if total else 0.0,
+        )
+
+
+_caches = {}
+_verrou_caches = threading.Lock()
+
+
+def obtenir_cache_llm(chemin=CHEMIN_CACHE_LLM):
+    """Une instance par fichier, partagée par les transports synchrone et asynchrone"""
+    with _verrou_caches:
+        if chemin not in _caches:
+            _caches[chemin] = CacheLLM(chemin)
+        return _caches[chemin]
+
+# ============================================================================
+# TRANSPORTS HTTP
+# ============================================================================
+
+class _Capture:
+    """Conserve les morceaux du corps transmis à l'appelant ; enregistre la réponse si elle est complète"""
+
+    def __init__(self, flux, enregistrer, compresse):
+        self._flux = flux
+        self._enregistrer = enregistrer
+        self._compresse = compresse
+        self._morceaux = []
+        self._complet = False
+
+    def _terminer(self):
+        contenu = b"".join(self._morceaux)
+        # Les SDK ferment un flux SSE dès « data: [DONE] », sans lire la fin du corps
+        if self._complet or (not self._compresse and contenu.rstrip().endswith(b"data: [DONE]")):
+            self._enregistrer(contenu)
+
+
+class _FluxEnregistre(_Capture, httpx.SyncByteStream):
+    """Transmet le corps de la réponse à l'appelant et le conserve s'il a été lu jusqu'au bout"""
+
+    def __iter__(self):
+        for morceau in self._flux:
+            self._morceaux.append(morceau)
+            yield morceau
+        self._complet = True
+
+    def close(self):
+        self._flux.close()
+        self._terminer()
+
+
+class _FluxEnregistreAsync(_Capture, httpx.AsyncByteStream):
+    async def __aiter__(self):
+        async for morceau in self._flux:
+            self._morceaux.append(morceau)
+            yield morceau
+        self._complet = True
+
+    async def aclose(self):
+        await self._flux.aclose()
+        self._terminer()
+
+
+class _Cache:
+    """Logique commune des transports : éligibilité, lecture et enregistrement"""
+
+    def __init__(self, transport, cache):
+        self.transport = transport
+        self.cache = cache
+
+    def _consulter(self, request):
+        """(clé, corps de la requête, réponse en cache) ; clé None : requête hors cache"""
+        if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+            return None, None, None
+        try:
+            corps = json.loads(request.read() or b"{}")
+        except ValueError:
+            return None, None, None
+        if not corps_cacheable(corps):
+            self.cache.contourner()
+            return None, None, None
+        cle = cle_appel(corps)
+        en_cache = self.cache.lire(cle)
+        if en_cache is None:
+            return cle, corps, None
+        entetes, contenu = en_cache
+        return cle, corps, httpx.Response(200, headers=entetes, content=contenu, request=request)
+
+    def _capture(self, classe, cle, corps, reponse):
+        entetes = {nom: reponse.headers[nom] for nom in _ENTETES_CONSERVES if nom in reponse.headers}
+        return classe(
+            reponse.stream, lambda contenu: self.cache.ecrire(cle, corps.get("model"), entetes, contenu),
+            compresse=reponse.headers.get("content-encoding", "identity") != "identity",
+        )
+
+
+class TransportCacheLLM(_Cache, httpx.BaseTransport):
+    """Transport synchrone : sert les réponses en cache, enregistre les autres"""
+
+    def handle_request(self, request):
+        cle, corps, en_cache = self._consulter(request)
+        if en_cache is not None:
+            return en_cache
+        reponse = self.transport.handle_request(request)
+        if cle is None or reponse.status_code != 200:
+            return reponse
+        return httpx.Response(
+            reponse.status_code, headers=reponse.headers, request=request,
+            stream=self._capture(_FluxEnregistre, cle, corps, reponse),
+            extensions=reponse.extensions,
+        )
+
+    def close(self):
+        self.transport.close()
+
+
+class TransportCacheLLMAsync(_Cache, httpx.AsyncBaseTransport):
+    """Transport asynchrone : sert les réponses en cache, enregistre les autres"""
+
+    async def handle_async_request(self, request):
+        cle, corps, en_cache = self._consulter(request)
+        if en_cache is not None:
+            return en_cache
+        reponse = await self.transport.handle_async_request(request)
+        if cle is None or reponse.status_code != 200:
+            return reponse
+        return httpx.Response(
+            reponse.status_code, headers=reponse.headers, request=request,
+            stream=self._capture(_FluxEnregistreAsync, cle, corps, reponse),
+            extensions=reponse.extensions,
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def _client_httpx(classe_client):
+    """Le client HTTP du SDK openai est-il un client httpx (openai 1.x) ? Sinon le transport ne s'y insère pas"""
+    return isinstance(classe_client, type) and issubclass(classe_client, (httpx.Client, httpx.AsyncClient))
+
+
+def transport_cache(transport, limits):
+    """Enveloppe `transport` (None : transport réseau par défaut) dans le cache si LLM_CACHE est actif"""
+    if not CACHE_ACTIVE or not _client_httpx(openai.DefaultHttpxClient):
+        return transport
+    return TransportCacheLLM(transport or httpx.HTTPTransport(limits=limits), obtenir_cache_llm())
+
+
+def transport_cache_async(transport, limits):
+    """Équivalent asynchrone de transport_cache"""
+    if not CACHE_ACTIVE or not _client_httpx(openai.DefaultAsyncHttpxClient):
+        return transport
+    return TransportCacheLLMAsync(transport or httpx.AsyncHTTPTransport(limits=limits), obtenir_cache_llm())
@@ -0,0 +1,203 @@
+"""
+Cache sémantique des réponses de l'Assistant Financier IA.
+
+Les utilisateurs posent souvent les mêmes questions sur les mêmes rapports.
+La question normalisée est vectorisée ; si une réponse déjà produite pour une
+question suffisamment proche (similarité cosinus au-dessus du seuil) est en
+cache, elle est resservie avec ses sources sans appeler le LLM.
+
+- Les nombres et périodes de la question doivent être identiques : « CA 2022 »
+  et « CA 2023 » sont très proches sémantiquement mais n'ont pas la même réponse.
+- Chaque réponse garde le SHA-256 des documents qui l'ont alimentée ; si l'un
+  d'eux a changé ou disparu (manifeste de l'index), l'entrée est invalidée.
+- Éviction par durée de vie (TTL) et par ancienneté d'utilisation (LRU).
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+
+import numpy as np
+
+from recherche_hybride import normaliser
+
+CHEMIN_CACHE_REPONSES = os.getenv("ANSWER_CACHE_PATH", os.path.join("cache", "reponses.sqlite"))
+SEUIL_SIMILARITE = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+_NOMBRE = re.compile(r"\bt[1-4]\b|\d+(?:[.,]\d+)?")
+
+# ============================================================================
+# NORMALISATION DES QUESTIONS
+# ============================================================================
+
+def normaliser_question(question):
+    """Minuscules, sans accents, espaces et ponctuation finale uniformisés"""
+    return " ".join(normaliser(question).split()).rstrip(" ?!.")
+
+
+def signature_question(question):
+    """Nombres et trimestres cités, qui doivent être identiques pour réutiliser une réponse"""
+    return " ".join(sorted(_NOMBRE.findall(normaliser_question(question))))
+
+
+def sources_depuis_manifeste(doc_ids, manifeste):
+    """{chemin: sha256} des fichiers dont proviennent les doc_ids (manifeste de l'index)"""
+    fichiers = (manifeste or {}).get("fichiers", {})
+    par_doc_id = {
+        doc_id: chemin for chemin, description in fichiers.items() for doc_id in description.get("doc_ids", [])
+    }
+    return {
+        par_doc_id[doc_id]: fichiers[par_doc_id[doc_id]]["sha256"]
+        for doc_id in doc_ids if doc_id in par_doc_id
+    }
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+class CacheReponses:
+    """Réponses indexées par embedding de question, persistées dans SQLite"""
+
+    def __init__(self, chemin=CHEMIN_CACHE_REPONSES, seuil=SEUIL_SIMILARITE,
+                 duree_vie=7 * 24 * 3600, capacite=500):
+        dossier = os.path.dirname(chemin)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        self.seuil = seuil
+        self.duree_vie = duree_vie
+        self.capacite = capacite
+        self.compteurs = {"succes": 0, "echecs": 0, "invalidations": 0, "expirations": 0, "evictions": 0}
+
+        self._verrou = threading.Lock()
+        self._connexion = sqlite3.connect(chemin, timeout=30, check_same_thread=False)
+        self._connexion.execute("PRAGMA journal_mode=WAL")
+        self._connexion.execute(
+            "CREATE TABLE IF NOT EXISTS reponses ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, espace TEXT NOT NULL, signature TEXT NOT NULL,"
+            " question TEXT NOT NULL, vecteur BLOB NOT NULL, reponse TEXT NOT NULL, sources TEXT NOT NULL,"
+            " cree_le REAL NOT NULL, dernier_acces REAL NOT NULL, utilisations INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._connexion.commit()
+        self._charger()
+
+    def _charger(self):
+        """Recharge les entrées en mémoire (matrice des vecteurs normalisés pour la recherche)"""
+        self._version_donnees = self._connexion.execute("PRAGMA data_version").fetchone()[0]
+        lignes = self._connexion.execute(
+            "SELECT id, espace, signature, question, vecteur, reponse, sources, cree_le FROM reponses"
+        ).fetchall()
+        self._entrees = [
+            {"id": i, "espace": e, "signature": s, "question": q, "reponse": r,
+             "sources": json.loads(src), "cree_le": c}
+            for i, e, s, q, _, r, src, c in lignes
+        ]
+        vecteurs = [np.frombuffer(ligne[4], dtype=np.float32) for ligne in lignes]
+        self._matrice = np.vstack(vecteurs) if vecteurs else np.zeros((0, 0), dtype=np.float32)
+
+    def _supprimer(self, ids):
+        self._connexion.executemany("DELETE FROM reponses WHERE id = ?", [(i,) for i in ids])
+        self._connexion.commit()
+        self._charger()
+
+    def chercher(self, vecteur, question, espace="", empreintes=None):
+        """
+        Retourne l'entrée en cache ({'reponse', 'sources', 'question', ...}) ou None.
+        empreintes : {chemin: sha256} des documents actuellement indexés.
+        """
+        signature = signature_question(question)
+        maintenant = time.time()
+        with self._verrou:
+            # Réponses ajoutées entre-temps par un autre processus
+            if self._connexion.execute("PRAGMA data_version").fetchone()[0] != self._version_donnees:
+                self._charger()
+            if not self._entrees:
+                self.compteurs["echecs"] += 1
+                return None
+
+            requete = np.asarray(vecteur, dtype=np.float32)
+            if requete.shape[0] != self._matrice.shape[1]:
+                self.compteurs["echecs"] += 1
+                return None
+            scores = self._matrice @ (requete / (np.linalg.norm(requete) or 1.0))
+
+            a_supprimer = []
+            trouvee = None
+            for indice in np.argsort(-scores):
+                if scores[indice] < self.seuil:
+                    break
+                entree = self._entrees[indice]
+                if entree["espace"] != espace or entree["signature"] != signature:
+                    continue
+                if maintenant - entree["cree_le"] > self.duree_vie:
+                    self.compteurs["expirations"] += 1
+                    a_supprimer.append(entree["id"])
+                    continue
+                # Un document source modifié ou supprimé rend la réponse obsolète
+                if empreintes is not None and any(
+                    empreintes.get(chemin) != sha256 for chemin, sha256 in entree["sources"].items()
+                ):
+                    self.compteurs["invalidations"] += 1
+                    a_supprimer.append(entree["id"])
+                    continue
+                trouvee = dict(entree, similarite=float(scores[indice]))
+                break
+
+            if trouvee:
+                self.compteurs["succes"] += 1
+                self._connexion.execute(
+                    "UPDATE reponses SET dernier_acces = ?, utilisations = utilisations + 1 WHERE id = ?",
+                    (maintenant, trouvee["id"]),
+                )
+                self._connexion.commit()
+            else:
+                self.compteurs["echecs"] += 1
+            if a_supprimer:
+                self._supprimer(a_supprimer)
+            return trouvee
+
+    def ajouter(self, vecteur, question, reponse, sources=None, espace=""):
+        """Enregistre une réponse ; sources : {chemin: sha256} des documents utilisés"""
+        vecteur = np.asarray(vecteur, dtype=np.float32)
+        vecteur = vecteur / (np.linalg.norm(vecteur) or 1.0)
+        maintenant = time.time()
+        with self._verrou:
+            if self._matrice.size and self._matrice.shape[1] != vecteur.shape[0]:
+                # Modèle d'embedding changé : les anciens vecteurs ne sont plus comparables
+                self._connexion.execute("DELETE FROM reponses")
+            self._connexion.execute(
+                "INSERT INTO reponses (espace, signature, question, vecteur, reponse, sources, cree_le, dernier_acces)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (espace, signature_question(question), normaliser_question(question), vecteur.tobytes(),
+                 reponse, json.dumps(sources or {}, ensure_ascii=False), maintenant, maintenant),
+            )
+            # Éviction : entrées expirées, puis les moins récemment utilisées au-delà de la capacité
+            expirees = self._connexion.execute(
+                "DELETE FROM reponses WHERE cree_le < ?", (maintenant - self.duree_vie,)
+            ).rowcount
+            self.compteurs["expirations"] += expirees
+            en_trop = self._connexion.execute(
+                "DELETE FROM reponses WHERE id IN ("
+                " SELECT id FROM reponses ORDER BY dernier_acces DESC LIMIT -1 OFFSET ?)",
+                (self.capacite,),
+            ).rowcount
+            self.compteurs["evictions"] += en_trop
+            self._connexion.commit()
+            self._charger()
+
+    def vider(self):
+        with self._verrou:
+            self._connexion.execute("DELETE FROM reponses")
+            self._connexion.commit()
+            self._charger()
+
+    def statistiques(self):
+        """Compteurs, nombre d'entrées et taux de succès"""
+        total = self.compteurs["succes"] + self.compteurs["echecs"]
+        return dict(
+            self.compteurs,
+            entrees=len(self._entrees),
+            taux_succes=self.compteurs["succes"] / total if total else 0.0,
+        )
@@ -0,0 +1,237 @@
+"""
+Évaluation sûre des expressions arithmétiques (calculatrices des deux applications).
+
+effectuer_calcul_simple (app_complete.py) et CalculatorTool (new_app_2.py)
+passaient à eval() toute chaîne faite de chiffres et de « +-*/.() » :
+« 9**9**9**9 » y est valide et occupe un cœur indéfiniment, bloquant le
+processus pour toutes les sessions. Ici :
+  - l'expression est analysée par ast ; seuls les nombres, les opérateurs
+    + - * / // % ** et les signes sont acceptés (liste blanche) ;
+  - elle est compilée une fois en fonctions Python imbriquées, gardées dans
+    un cache LRU : une expression déjà vue n'est ni réanalysée ni recompilée ;
+  - bornes : longueur de l'expression, nombre de nœuds, exposant, nombre de
+    chiffres des résultats intermédiaires (vérifiés avant chaque puissance ou
+    multiplication) et budget de temps par évaluation ;
+  - arithmétique Decimal par défaut, adaptée aux montants (0.1 + 0.2 = 0.3) ;
+  - evaluer_lot évalue plusieurs expressions en un appel, une erreur par
+    expression n'interrompant pas les autres ;
+  - formater_valeur arrondit le résultat pour l'affichage (100/7*7 s'affiche
+    100, pas 100.0000000000000000000000000).
+
+Configuration (variables d'environnement, lues au premier import) :
+  CALC_DECIMAL            0 : arithmétique flottante (Decimal par défaut)
+  CALC_DECIMAL_PRECISION  chiffres significatifs en Decimal (28)
+  CALC_MAX_LENGTH         longueur maximale d'une expression (500)
+  CALC_MAX_NODES          nombre maximal de nœuds de l'arbre (200)
+  CALC_MAX_EXPONENT       exposant maximal en valeur absolue (10000)
+  CALC_MAX_DIGITS         chiffres maximaux d'un résultat intermédiaire (1000)
+  CALC_TIME_BUDGET_MS     budget de temps d'une évaluation en ms (50)
+  CALC_CACHE_SIZE         expressions compilées gardées en cache (1024)
+  CALC_DISPLAY_PLACES     décimales au plus dans le résultat affiché (10)
+"""
+
+import os
+import ast
+import math
+import time
+import decimal
+import operator
+from decimal import ROUND_HALF_EVEN, Decimal
+from functools import lru_cache
+
+DECIMAL_ACTIF = os.getenv("CALC_DECIMAL", "1") != "0"
+PRECISION_DECIMALE = int(os.getenv("CALC_DECIMAL_PRECISION", "28"))
+LONGUEUR_MAX = int(os.getenv("CALC_MAX_LENGTH", "500"))
+NOEUDS_MAX = int(os.getenv("CALC_MAX_NODES", "200"))
+EXPOSANT_MAX = int(os.getenv("CALC_MAX_EXPONENT", "10000"))
+CHIFFRES_MAX = int(os.getenv("CALC_MAX_DIGITS", "1000"))
+BUDGET_MS = float(os.getenv("CALC_TIME_BUDGET_MS", "50"))
+TAILLE_CACHE = int(os.getenv("CALC_CACHE_SIZE", "1024"))
+DECIMALES_AFFICHAGE = int(os.getenv("CALC_DISPLAY_PLACES", "10"))
+
+# Notations courantes ramenées à la syntaxe Python (virgule décimale française comprise)
+_NOTATIONS = str.maketrans({"×": "*", "÷": "/", ",": ".", "^": "**"})
+
+
+class ErreurCalcul(ValueError):
+    """Calcul impossible ou refusé (division par zéro, limites dépassées, budget de temps écoulé)"""
+
+
+class ExpressionInvalide(ErreurCalcul):
+    """La chaîne n'est pas une expression arithmétique autorisée"""
+
+# ============================================================================
+# OPÉRATIONS BORNÉES
+# ============================================================================
+
+class _Budget:
+    """Échéance d'une évaluation, vérifiée avant chaque opération"""
+
+    __slots__ = ("limite",)
+
+    def __init__(self, budget_ms):
+        self.limite = time.perf_counter() + budget_ms / 1000
+
+    def verifier(self):
+        if time.perf_counter() > self.limite:
+            raise ErreurCalcul("Calcul interrompu : budget de temps dépassé")
+
+
+def _verifier_taille(chiffres):
+    if chiffres > CHIFFRES_MAX:
+        raise ErreurCalcul(f"Calcul refusé : résultat de plus de {CHIFFRES_MAX} chiffres")
+
+
+def _puissance(base, exposant):
+    if abs(exposant) > EXPOSANT_MAX:
+        raise ErreurCalcul(f"Calcul refusé : exposant supérieur à {EXPOSANT_MAX}")
+    if not base and exposant < 0:
+        # Decimal rendrait Infinity au lieu de signaler la division
+        raise ZeroDivisionError
+    if base:
+        # Taille du résultat estimée avant de le calculer : exposant × log10(|base|)
+        _verifier_taille(float(exposant) * math.log10(abs(base)))
+    resultat = base ** exposant
+    if isinstance(resultat, complex):
+        raise ErreurCalcul("Résultat complexe : racine d'un nombre négatif")
+    return resultat
+
+
+def _multiplication(gauche, droite):
+    # Seuls les entiers grandissent sans limite (flottants et Decimal débordent)
+    if isinstance(gauche, int) and isinstance(droite, int):
+        _verifier_taille((gauche.bit_length() + droite.bit_length()) * math.log10(2))
+    return gauche * droite
+
+
+def _diviseur_non_nul(operation):
+    # Decimal signale 5 % 0 et 0 / 0 par InvalidOperation, pas par ZeroDivisionError
+    def division(gauche, droite):
+        if not droite:
+            raise ZeroDivisionError
+        return operation(gauche, droite)
+    return division
+
+
+_BINAIRES = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _multiplication,
+    ast.Div: _diviseur_non_nul(operator.truediv),
+    ast.FloorDiv: _diviseur_non_nul(operator.floordiv),
+    ast.Mod: _diviseur_non_nul(operator.mod),
+    ast.Pow: _puissance,
+}
+_UNAIRES = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+# ============================================================================
+# COMPILATION
+# ============================================================================
+
+def _litteral(noeud, decimal_actif):
+    valeur = noeud.value
+    if isinstance(valeur, bool) or not isinstance(valeur, (int, float)) or not math.isfinite(valeur):
+        raise ExpressionInvalide(f"Valeur non autorisée : {valeur!r}")
+    if decimal_actif:
+        # repr() du flottant redonne le littéral écrit (« 0.1 ») : Decimal exact
+        return Decimal(valeur) if isinstance(valeur, int) else Decimal(repr(valeur))
+    return valeur
+
+
+def _compiler_noeud(noeud, decimal_actif):
+    """Fonction budget -> valeur du sous-arbre"""
+    if isinstance(noeud, ast.Constant):
+        valeur = _litteral(noeud, decimal_actif)
+        return lambda budget: valeur
+    if isinstance(noeud, ast.BinOp) and type(noeud.op) in _BINAIRES:
+        operation = _BINAIRES[type(noeud.op)]
+        gauche = _compiler_noeud(noeud.left, decimal_actif)
+        droite = _compiler_noeud(noeud.right, decimal_actif)
+
+        def binaire(budget):
+            a, b = gauche(budget), droite(budget)
+            budget.verifier()
+            return operation(a, b)
+        return binaire
+    if isinstance(noeud, ast.UnaryOp) and type(noeud.op) in _UNAIRES:
+        operation = _UNAIRES[type(noeud.op)]
+        operande = _compiler_noeud(noeud.operand, decimal_actif)
+        return lambda budget: operation(operande(budget))
+    raise ExpressionInvalide(
+        f"Élément non autorisé : {type(noeud).__name__} (nombres, + - * / // % ** et parenthèses seulement)"
+    )
+
+
+@lru_cache(maxsize=TAILLE_CACHE)
+def compiler(expression, decimal_actif=DECIMAL_ACTIF):
+    """Expression normalisée -> fonction budget -> valeur ; ExpressionInvalide si hors liste blanche"""
+    if len(expression) > LONGUEUR_MAX:
+        raise ExpressionInvalide(f"Expression trop longue (plus de {LONGUEUR_MAX} caractères)")
+    try:
+        arbre = ast.parse(expression, mode="eval")
+    except (SyntaxError, RecursionError, MemoryError):
+        raise ExpressionInvalide(f"Expression mal formée : {expression}") from None
+    if sum(1 for _ in ast.walk(arbre)) > NOEUDS_MAX:
+        raise ExpressionInvalide(f"Expression trop complexe (plus de {NOEUDS_MAX} éléments)")
+    return _compiler_noeud(arbre.body, decimal_actif)
+
+# ============================================================================
+# ÉVALUATION
+# ============================================================================
+
+def normaliser_expression(expression):
+    """Notations usuelles (×, ÷, ^, virgule décimale) ramenées à la syntaxe Python"""
+    # Les espaces intérieurs sont gardés : « 2 3 » reste une erreur, pas 23
+    return expression.translate(_NOTATIONS).strip()
+
+
+def evaluer(expression, decimal_actif=DECIMAL_ACTIF, budget_ms=BUDGET_MS):
+    """
+    Valeur d'une expression arithmétique (Decimal, int ou float).
+    ExpressionInvalide : pas une expression autorisée ; ErreurCalcul : calcul impossible ou refusé.
+    """
+    fonction = compiler(normaliser_expression(expression), decimal_actif)
+    budget = _Budget(budget_ms)
+    try:
+        if decimal_actif:
+            with decimal.localcontext() as contexte:
+                contexte.prec = PRECISION_DECIMALE
+                valeur = fonction(budget)
+        else:
+            valeur = fonction(budget)
+    except ZeroDivisionError:
+        raise ErreurCalcul("Division par zéro impossible") from None
+    except (OverflowError, decimal.Overflow):
+        raise ErreurCalcul("Calcul refusé : résultat trop grand") from None
+    except decimal.InvalidOperation:
+        raise ErreurCalcul("Opération non définie (racine d'un nombre négatif, 0 ** 0…)") from None
+    # math.isfinite passerait par float : 1E+400 en Decimal serait pris pour un infini
+    if not (valeur.is_finite() if isinstance(valeur, Decimal) else math.isfinite(valeur)):
+        raise ErreurCalcul("Calcul refusé : résultat infini ou indéfini")
+    return valeur
+
+
+def evaluer_lot(expressions, decimal_actif=DECIMAL_ACTIF, budget_ms=BUDGET_MS):
+    """[{'expression', 'valeur', 'erreur'}] : chaque expression évaluée avec son propre budget"""
+    resultats = []
+    for expression in expressions:
+        try:
+            resultats.append({"expression": expression, "valeur": evaluer(expression, decimal_actif, budget_ms),
+                              "erreur": None})
+        except ErreurCalcul as erreur:
+            resultats.append({"expression": expression, "valeur": None, "erreur": str(erreur)})
+    return resultats
+
+
+def formater_valeur(valeur, decimales=DECIMALES_AFFICHAGE):
+    """Résultat arrondi à `decimales` décimales, sans zéros superflus ni notation exponentielle"""
+    if isinstance(valeur, int):
+        return str(valeur)
+    if isinstance(valeur, float):
+        valeur = Decimal(repr(valeur))
+    with decimal.localcontext() as contexte:
+        # Précision suffisante pour garder tous les chiffres entiers (jusqu'à CHIFFRES_MAX)
+        contexte.prec = max(valeur.adjusted(), 0) + decimales + 2
+        arrondi = valeur.quantize(Decimal(1).scaleb(-decimales), rounding=ROUND_HALF_EVEN).normalize()
+    # « -0 » après arrondi d'un petit négatif
+    return "0" if arrondi.is_zero() else format(arrondi, "f")
@@ -0,0 +1,194 @@
+"""
+Classification des questions par similarité d'embedding avec des centroïdes d'agents.
+
+Les mots-clés se trompent dès qu'un mot courant change de sens : « mon capital
+à 65 ans » partait vers le simulateur d'investissement (« capital »), « la BCE
+va-t-elle baisser ses taux ? » vers la calculatrice (« taux »). Chaque agent
+est ici décrit par quelques questions d'exemple ; leurs embeddings, calculés
+une fois (et conservés par le cache disque des embeddings), sont moyennés en
+un centroïde par agent. Une question est classée par un seul produit matriciel
+entre son embedding (celui de la recherche, déjà calculé pour l'assistant) et
+la matrice des centroïdes.
+
+Les mots-clés restent la voie rapide : salutation, calcul, valeur des
+tableaux, ou au moins deux mots-clés d'un même agent sans égalité. Dans les
+autres cas, chaque mot-clé trouvé ajoute un bonus à la similarité de son agent
+et l'embedding décide s'il est assez net (similarité et marge sur le deuxième
+agent suffisantes) ; sinon le routage par mots-clés est conservé.
+
+Configuration (variables d'environnement, lues au premier import) :
+  INTENT_EMBEDDINGS      1 : activé (désactivé par défaut, mots-clés seuls)
+  INTENT_MIN_SIMILARITY  similarité minimale avec le centroïde retenu (0.2)
+  INTENT_MIN_MARGIN      écart minimal avec le deuxième agent (0.02)
+  INTENT_KEYWORD_BONUS   similarité ajoutée à un agent par mot-clé trouvé (0.1)
+L'échelle des similarités dépend du modèle d'embedding. Les seuils par défaut
+sont provisoires : ils n'ont été mesurés qu'avec les embeddings factices de
+rejeu_llm et ne disent rien du modèle réel. Avant d'activer le classifieur, les
+régler avec benchmarks/bench_classification_intentions.py sur une cassette
+enregistrée avec le modèle d'embedding de production.
+"""
+
+import os
+
+import numpy as np
+
+from cache_reponses import normaliser_question
+
+CLASSIFIEUR_ACTIF = os.getenv("INTENT_EMBEDDINGS", "0") == "1"
+SIMILARITE_MIN = float(os.getenv("INTENT_MIN_SIMILARITY", "0.2"))
+MARGE_MIN = float(os.getenv("INTENT_MIN_MARGIN", "0.02"))
+BONUS_MOT_CLE = float(os.getenv("INTENT_KEYWORD_BONUS", "0.1"))
+
+# Agents dont la réponse est déjà calculée par le routage par mots-clés
+AGENTS_DIRECTS = {"salutation", "calcul_simple", "donnees_chiffrees"}
+# Mots-clés d'un même agent à partir desquels l'embedding n'est pas consulté
+MOTS_CLES_SURS = 2
+
+EXEMPLES_INTENTIONS = {
+    "salutation": [
+        "Bonjour", "Salut, comment allez-vous ?", "Bonsoir", "Coucou", "Hello",
+        "Merci beaucoup pour votre aide", "Au revoir et bonne journée", "Ça va ?",
+        "Bonne nuit", "Re-bonjour, me revoilà",
+    ],
+    "calculatrice": [
+        "Calculer les intérêts composés sur 5000€ à 4% pendant 10 ans",
+        "Quelle mensualité pour un prêt immobilier de 200000€ sur 25 ans ?",
+        "Combien coûte un emprunt de 15000€ à 3% sur 5 ans ?",
+        "Calcule le coût total du crédit",
+        "Quel est le taux effectif global de ce prêt ?",
+        "Combien font 15% de 2400 ?",
+        "Combien d'intérêts vais-je payer sur mon crédit auto ?",
+        "Calcul de la capitalisation mensuelle d'un livret",
+        "Quelle somme rembourser chaque mois pour un crédit de 30000€ ?",
+    ],
+    "meteo": [
+        "Quelle est la météo à Paris ?",
+        "Quel temps fait-il à Londres aujourd'hui ?",
+        "Va-t-il pleuvoir à Francfort demain ?",
+        "Température prévue à New York cette semaine",
+        "Prévisions météorologiques pour Tokyo",
+        "Fait-il beau à Singapour ?",
+        "La météo aura-t-elle un impact sur les récoltes ?",
+        "Une vague de chaleur est-elle annoncée ?",
+    ],
+    "recherche": [
+        "Quelles sont les dernières actualités financières ?",
+        "Que disent les journaux sur les marchés aujourd'hui ?",
+        "Recherche des informations récentes sur le secteur bancaire",
+        "Quelles sont les nouvelles du marché boursier ?",
+        "Qu'est-ce qui fait l'actualité économique cette semaine ?",
+        "Trouve des articles sur l'inflation en Europe",
+        "Que se passe-t-il sur les marchés en ce moment ?",
+        "Dernières news sur l'intelligence artificielle en bourse",
+        "La BCE va-t-elle baisser ses taux selon la presse ?",
+    ],
+    "calendrier": [
+        "Quel est le calendrier des prochains événements économiques ?",
+        "Quand a lieu la prochaine réunion de la BCE ?",
+        "À quelle date sera publié l'indice des prix ?",
+        "Quels sont les rendez-vous économiques de la semaine ?",
+        "Quand la FED annonce-t-elle sa décision ?",
+        "Agenda des publications macroéconomiques du mois",
+        "Date de publication du PIB trimestriel",
+        "Quels événements pourraient faire bouger les marchés dans les quinze prochains jours ?",
+        "Prochaine publication des chiffres du chômage",
+    ],
+    "investissement": [
+        "Simuler un investissement de 10000€ en bourse",
+        "Combien rapporteront 500€ placés chaque mois pendant 20 ans ?",
+        "Quel rendement attendre d'un placement en actions ?",
+        "Projection de mon portefeuille sur 15 ans avec 7% par an",
+        "Que deviendra mon épargne si je l'investis en ETF ?",
+        "Simulation d'un placement à versements mensuels",
+        "Combien aurai-je en plaçant 20000€ pendant 10 ans ?",
+        "Faire fructifier un capital de 50000€",
+    ],
+    "retraite": [
+        "Comment préparer ma retraite ?",
+        "Quelle pension toucherai-je à 64 ans ?",
+        "Aurai-je assez pour vivre une fois à la retraite ?",
+        "Mon capital suffira-t-il à 65 ans ?",
+        "Combien épargner pour partir à la retraite à 60 ans ?",
+        "Quel revenu aurai-je après avoir arrêté de travailler ?",
+        "Plan d'épargne retraite : combien verser chaque année ?",
+        "À quel âge pourrai-je arrêter de travailler ?",
+        "Préparer ses vieux jours avec un complément de revenu",
+    ],
+    "assistant": [
+        "Quel est le chiffre d'affaires 2023 d'IssaKoffi Frères ?",
+        "Analyse la rentabilité de BioPharma Solutions",
+        "Quels sont les principaux risques d'EcoEnergy Group ?",
+        "Explique l'évolution de la dette de TechVision",
+        "Compare les marges de deux sociétés du rapport",
+        "Résume le rapport annuel",
+        "Quelle est la stratégie de croissance de l'entreprise ?",
+        "Quel est le résultat net du premier trimestre ?",
+        "Que recommandes-tu à un investisseur prudent au vu du rapport ?",
+        "Quels sont les points forts et les faiblesses de la société ?",
+    ],
+}
+
+# ============================================================================
+# CLASSIFIEUR
+# ============================================================================
+
+class ClassifieurIntentions:
+    """
+    Centroïdes des agents et classement d'un embedding de question.
+    vectoriser(textes) -> vecteurs : appelé une fois, sur les exemples normalisés
+    comme les questions (normaliser_question).
+    """
+
+    def __init__(self, vectoriser, exemples=EXEMPLES_INTENTIONS, similarite_min=SIMILARITE_MIN, marge_min=MARGE_MIN,
+                 bonus_mot_cle=BONUS_MOT_CLE):
+        self.agents = list(exemples)
+        self.similarite_min = similarite_min
+        self.marge_min = marge_min
+        self.bonus_mot_cle = bonus_mot_cle
+        textes = [normaliser_question(exemple) for agent in self.agents for exemple in exemples[agent]]
+        vecteurs = _unitaires(np.asarray(vectoriser(textes), dtype=np.float32))
+        bornes = np.cumsum([0] + [len(exemples[agent]) for agent in self.agents])
+        self._centroides = _unitaires(np.stack([
+            vecteurs[debut:fin].mean(axis=0) for debut, fin in zip(bornes[:-1], bornes[1:])
+        ]))
+
+    def classer(self, vecteur, bonus=None):
+        """
+        {'agent', 'similarite', 'marge', 'similarites'} : centroïde le plus proche (cosinus).
+        bonus : {agent: valeur} ajoutée à la similarité de l'agent avant le choix.
+        """
+        similarites = self._centroides @ _unitaires(np.asarray(vecteur, dtype=np.float32))
+        if bonus:
+            similarites += np.array([bonus.get(agent, 0.0) for agent in self.agents], dtype=np.float32)
+        premier, second = np.argsort(similarites)[::-1][:2]
+        return {
+            "agent": self.agents[premier],
+            "similarite": float(similarites[premier]),
+            "marge": float(similarites[premier] - similarites[second]),
+            "similarites": dict(zip(self.agents, similarites.tolist())),
+        }
+
+    def affiner(self, intention, vecteur):
+        """
+        Agent final d'une intention du routage par mots-clés (RouteurIntentions.router) :
+        {'agent', 'source', 'classement'} ; source 'mots-cles' ou 'embedding'.
+        """
+        # Chaque mot-clé trouvé rapproche son agent : l'embedding doit être net pour le contredire
+        classement = self.classer(vecteur, {agent: score * self.bonus_mot_cle for agent, score in intention["scores"].items()})
+        net = classement["similarite"] >= self.similarite_min and classement["marge"] >= self.marge_min
+        if net:
+            return {"agent": classement["agent"], "source": "embedding", "classement": classement}
+        return {"agent": intention["agent"], "source": "mots-cles", "classement": classement}
+
+
+def _unitaires(vecteurs):
+    normes = np.linalg.norm(vecteurs, axis=-1, keepdims=True)
+    return vecteurs / np.where(normes == 0, 1, normes)
+
+
+def mots_cles_surs(intention):
+    """Le routage par mots-clés suffit : réponse directe, ou agent désigné par plusieurs mots-clés sans égalité"""
+    if intention["agent"] in AGENTS_DIRECTS:
+        return True
+    scores = sorted(intention["scores"].values(), reverse=True) + [0, 0]
+    return scores[0] >= MOTS_CLES_SURS and scores[0] > scores[1]
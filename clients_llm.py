@@ -0,0 +1,202 @@
+"""
+Registre des clients OpenAI (LLM et embeddings) partagés par tout le processus.
+
+Un seul client HTTP garde les connexions ouvertes (keep-alive) dans un pool :
+les requêtes suivantes réutilisent la connexion TLS déjà établie au lieu de
+refaire la poignée de main. Les objets LlamaIndex / LangChain construits
+au-dessus sont créés une fois par configuration puis réutilisés.
+
+Le pool asynchrone est lié à la boucle asyncio qui l'utilise : il est
+réservé à la boucle partagée de execution_async.py.
+
+Configuration (variables d'environnement, lues au premier import) :
+  OPENAI_CHAT_MODEL        modèle de chat (gpt-3.5-turbo)
+  OPENAI_EMBEDDING_MODEL   modèle d'embedding (text-embedding-ada-002)
+  OPENAI_TIMEOUT           délai maximal d'une requête en secondes (60)
+  OPENAI_MAX_RETRIES       nouvelles tentatives en cas d'erreur transitoire (2)
+  OPENAI_MAX_CONNECTIONS   connexions simultanées du pool (20)
+  OPENAI_BASE_URL          point d'accès de l'API (https://api.openai.com/v1)
+Enregistrement / rejeu hors ligne des appels : voir rejeu_llm.py (LLM_REPLAY_MODE).
+Cache exact des réponses déterministes : voir cache_llm.py (LLM_CACHE).
+"""
+
+import os
+import threading
+
+import httpx
+import openai
+
+from cache_llm import transport_cache, transport_cache_async
+from rejeu_llm import transport_rejeu, transport_rejeu_async
+
+MODELE_CHAT = os.getenv("OPENAI_CHAT_MODEL", "gpt-3.5-turbo")
+MODELE_EMBEDDING = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+DELAI_MAXIMAL = float(os.getenv("OPENAI_TIMEOUT", "60"))
+TENTATIVES_MAX = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+CONNEXIONS_MAX = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+URL_API = os.getenv("OPENAI_BASE_URL") or None
+# Une connexion inutilisée est gardée ouverte 2 minutes
+DUREE_KEEPALIVE = 120
+
+_verrou = threading.RLock()
+_instances = {}
+
+
+def _obtenir(cle, fabrique):
+    """Instance unique par clé, créée au premier appel"""
+    with _verrou:
+        if cle not in _instances:
+            _instances[cle] = fabrique()
+        return _instances[cle]
+
+
+def reinitialiser():
+    """Ferme le pool et oublie les clients (changement de clé API, tests)"""
+    with _verrou:
+        client = _instances.get("http")
+        _instances.clear()
+    if client is not None:
+        client.close()
+
+# ============================================================================
+# CLIENTS OPENAI
+# ============================================================================
+
+def _limites():
+    return httpx.Limits(
+        max_connections=CONNEXIONS_MAX,
+        max_keepalive_connections=CONNEXIONS_MAX,
+        keepalive_expiry=DUREE_KEEPALIVE,
+    )
+
+
+def client_http():
+    """Client HTTP partagé : pool de connexions keep-alive"""
+    return _obtenir("http", lambda: openai.DefaultHttpxClient(
+        limits=_limites(),
+        timeout=DELAI_MAXIMAL,
+        transport=transport_cache(transport_rejeu(_limites()), _limites()),
+    ))
+
+
+def client_http_async():
+    """Client HTTP asynchrone partagé (boucle asyncio de l'agent)"""
+    return _obtenir("http_async", lambda: openai.DefaultAsyncHttpxClient(
+        limits=_limites(),
+        timeout=DELAI_MAXIMAL,
+        transport=transport_cache_async(transport_rejeu_async(_limites()), _limites()),
+    ))
+
+
+def client_openai():
+    """Client du SDK openai adossé au pool partagé"""
+    return _obtenir("openai", lambda: openai.OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=URL_API,
+        http_client=client_http(),
+        timeout=DELAI_MAXIMAL,
+        max_retries=TENTATIVES_MAX,
+    ))
+
+
+def client_openai_async():
+    """Client asynchrone du SDK openai adossé au pool asynchrone partagé"""
+    return _obtenir("openai_async", lambda: openai.AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=URL_API,
+        http_client=client_http_async(),
+        timeout=DELAI_MAXIMAL,
+        max_retries=TENTATIVES_MAX,
+    ))
+
+# ============================================================================
+# LLAMAINDEX
+# ============================================================================
+
+def llm_llamaindex(temperature=0.1, max_tokens=2000, modele=None, delai=None, tentatives=None):
+    """LLM LlamaIndex (une instance par modèle et réglage de température / longueur / délai)"""
+    modele = modele or MODELE_CHAT
+    delai = DELAI_MAXIMAL if delai is None else delai
+    tentatives = TENTATIVES_MAX if tentatives is None else tentatives
+
+    def fabrique():
+        from llama_index.llms.openai import OpenAI as LlamaOpenAI
+
+        return LlamaOpenAI(
+            model=modele,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            api_base=URL_API,
+            timeout=delai,
+            max_retries=tentatives,
+            http_client=client_http(),
+        )
+
+    return _obtenir(("llm_llamaindex", modele, temperature, max_tokens, delai, tentatives), fabrique)
+
+
+def embedding_llamaindex():
+    """Modèle d'embedding LlamaIndex"""
+    def fabrique():
+        from llama_index.embeddings.openai import OpenAIEmbedding
+
+        return OpenAIEmbedding(
+            model=MODELE_EMBEDDING,
+            api_base=URL_API,
+            timeout=DELAI_MAXIMAL,
+            max_retries=TENTATIVES_MAX,
+            http_client=client_http(),
+        )
+
+    return _obtenir("embedding_llamaindex", fabrique)
+
+# ============================================================================
+# LANGCHAIN
+# ============================================================================
+
+def _options_langchain():
+    """Paramètres communs ; http_client / http_async_client n'existent que dans langchain_openai"""
+    options = {
+        "openai_api_key": os.getenv("OPENAI_API_KEY"),
+        "openai_api_base": URL_API,
+        "request_timeout": DELAI_MAXIMAL,
+        "max_retries": TENTATIVES_MAX,
+    }
+    try:
+        import langchain_openai  # noqa: F401
+        options["http_client"] = client_http()
+        options["http_async_client"] = client_http_async()
+    except ImportError:
+        pass
+    return options
+
+
+def chat_langchain(temperature=0.7, streaming=True, modele=None, max_tokens=None, delai=None, tentatives=None):
+    """Modèle de chat LangChain (streaming activé : les jetons ne sont émis que si un callback les demande)"""
+    modele = modele or MODELE_CHAT
+    delai = DELAI_MAXIMAL if delai is None else delai
+    tentatives = TENTATIVES_MAX if tentatives is None else tentatives
+
+    def fabrique():
+        try:
+            from langchain_openai import ChatOpenAI
+        except ImportError:
+            from langchain.chat_models import ChatOpenAI
+
+        options = dict(_options_langchain(), request_timeout=delai, max_retries=tentatives)
+        return ChatOpenAI(model=modele, temperature=temperature, streaming=streaming, max_tokens=max_tokens, **options)
+
+    return _obtenir(("chat_langchain", modele, temperature, streaming, max_tokens, delai, tentatives), fabrique)
+
+
+def embeddings_langchain():
+    """Modèle d'embeddings LangChain"""
+    def fabrique():
+        try:
+            from langchain_openai import OpenAIEmbeddings
+        except ImportError:
+            from langchain.embeddings import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(model=MODELE_EMBEDDING, **_options_langchain())
+
+    return _obtenir("embeddings_langchain", fabrique)
@@ -0,0 +1,147 @@
+"""
+Coalescence des requêtes identiques en cours (« single-flight »).
+
+Quand plusieurs sessions posent la même question au même moment (publication
+d'un rapport), une seule exécute la recherche et l'appel au LLM : les autres
+attendent ce vol et reçoivent son résultat. Le texte diffusé au fil de l'eau
+par la session qui exécute est recopié dans l'affichage de chaque session en
+attente, chacune depuis son propre thread (les appels st.* restent locaux).
+
+La clé regroupe la question normalisée, l'empreinte de la recherche (version
+de l'index, documents) et les paramètres du modèle. Le cache de réponses
+prend le relais une fois le vol terminé.
+
+Si la session qui exécute est interrompue (page quittée, nouveau message),
+le vol est abandonné : une des sessions en attente le reprend. Une erreur de
+l'appel est en revanche partagée, sans nouvelle tentative en rafale.
+"""
+
+import json
+import time
+import hashlib
+import threading
+
+from cache_reponses import normaliser_question
+
+# Ré-affichage périodique dans les sessions en attente : c'est lors d'un
+# affichage que Streamlit signale l'arrêt de leur script
+INTERVALLE_SIGNE_DE_VIE = 0.5
+
+
+def cle_coalescence(question, empreinte_recherche, **parametres):
+    """Clé d'un vol : question normalisée, empreinte de la recherche et paramètres du modèle"""
+    contenu = json.dumps(
+        [normaliser_question(question), empreinte_recherche, parametres], sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(contenu.encode("utf-8")).hexdigest()
+
+
+class _Vol:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.texte = ""
+        self.version = 0
+        self.termine = False
+        self.abandonne = False
+        self.resultat = None
+        self.erreur = None
+
+
+class DiffusionVol:
+    """
+    Emplacement passé à la fabrique de la session qui exécute : le texte est
+    affiché dans sa zone et mis à disposition des sessions en attente.
+    """
+
+    def __init__(self, vol, zone=None):
+        self._vol = vol
+        self._zone = zone
+
+    def markdown(self, texte):
+        if self._zone is not None:
+            self._zone.markdown(texte)
+        with self._vol.condition:
+            self._vol.texte = texte
+            self._vol.version += 1
+            self._vol.condition.notify_all()
+
+
+class CoalesceurRequetes:
+    """Vols en cours par clé, partagés par toutes les sessions du processus"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._vols = {}
+        self._statistiques = {"executees": 0, "coalescees": 0, "abandonnees": 0}
+
+    def executer(self, cle, fabrique, zone=None):
+        """
+        Exécute fabrique(diffusion) une seule fois pour toutes les requêtes simultanées de même clé.
+        zone : emplacement (st.empty()) où le texte diffusé est affiché ; retourne (résultat, partagé).
+        """
+        while True:
+            with self._verrou:
+                vol = self._vols.get(cle)
+                meneur = vol is None
+                if meneur:
+                    vol = self._vols[cle] = _Vol()
+                    self._statistiques["executees"] += 1
+
+            if meneur:
+                return self._mener(cle, vol, fabrique, zone), False
+
+            self._suivre(vol, zone)
+            if not vol.abandonne:
+                with self._verrou:
+                    self._statistiques["coalescees"] += 1
+                if vol.erreur is not None:
+                    raise vol.erreur
+                return vol.resultat, True
+            # Session qui exécutait interrompue : le vol est repris par l'une des sessions en attente
+
+    def _mener(self, cle, vol, fabrique, zone):
+        try:
+            resultat = fabrique(DiffusionVol(vol, zone))
+        except Exception as erreur:
+            self._terminer(cle, vol, erreur=erreur)
+            raise
+        except BaseException:
+            # Arrêt du script Streamlit (StopException, RerunException) : rien à partager
+            self._terminer(cle, vol, abandonne=True)
+            raise
+        self._terminer(cle, vol, resultat=resultat)
+        return resultat
+
+    def _terminer(self, cle, vol, resultat=None, erreur=None, abandonne=False):
+        with self._verrou:
+            del self._vols[cle]
+            if abandonne:
+                self._statistiques["abandonnees"] += 1
+        with vol.condition:
+            vol.resultat, vol.erreur, vol.abandonne = resultat, erreur, abandonne
+            vol.termine = True
+            vol.condition.notify_all()
+
+    def _suivre(self, vol, zone):
+        """Attend la fin du vol en recopiant le texte diffusé dans `zone`"""
+        affichee, dernier_affichage = 0, time.monotonic()
+        while True:
+            with vol.condition:
+                if not vol.termine and vol.version == affichee:
+                    vol.condition.wait(INTERVALLE_SIGNE_DE_VIE)
+                termine, texte, version = vol.termine, vol.texte, vol.version
+            if termine:
+                return
+            maintenant = time.monotonic()
+            if version != affichee or maintenant - dernier_affichage >= INTERVALLE_SIGNE_DE_VIE:
+                if zone is not None:
+                    zone.markdown(texte or "⏳ Réponse en cours pour une question identique...")
+                affichee, dernier_affichage = version, maintenant
+
+    def statistiques(self):
+        """Vols exécutés, requêtes servies par un vol déjà en cours, vols abandonnés, vols en cours"""
+        with self._verrou:
+            statistiques = dict(self._statistiques, en_cours=len(self._vols))
+        total = statistiques["executees"] + statistiques["coalescees"]
+        statistiques["taux_coalescence"] = statistiques["coalescees"] / total if total else 0.0
+        return statistiques
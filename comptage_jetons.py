@@ -0,0 +1,47 @@
+"""
+Comptage des jetons (tokens) d'un texte, compatible tiktoken.
+
+L'encodage tiktoken est téléchargé au premier usage ; s'il n'est pas
+disponible (pas de réseau, tiktoken absent), le nombre de jetons est estimé
+à partir de la taille du texte en octets (≈ 4 octets par jeton, estimation
+prudente pour le français accentué).
+"""
+
+import os
+import math
+from functools import lru_cache
+
+ENCODAGE = os.getenv("TIKTOKEN_ENCODING", "cl100k_base")
+OCTETS_PAR_JETON = 4
+
+
+@lru_cache(maxsize=1)
+def _encodeur():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(ENCODAGE)
+    except Exception:
+        return None
+
+
+def compter_jetons(texte):
+    """Nombre de jetons du texte (exact avec tiktoken, estimé sinon)"""
+    if not texte:
+        return 0
+    encodeur = _encodeur()
+    if encodeur is not None:
+        return len(encodeur.encode(texte, disallowed_special=()))
+    return math.ceil(len(texte.encode("utf-8")) / OCTETS_PAR_JETON)
+
+
+def tronquer_jetons(texte, jetons, suffixe="…"):
+    """Texte réduit à au plus `jetons` jetons (suffixe compris)"""
+    if compter_jetons(texte) <= jetons:
+        return texte
+    disponibles = max(jetons - compter_jetons(suffixe), 0)
+    encodeur = _encodeur()
+    if encodeur is not None:
+        return encodeur.decode(encodeur.encode(texte, disallowed_special=())[:disponibles]) + suffixe
+    octets = texte.encode("utf-8")[:disponibles * OCTETS_PAR_JETON]
+    return octets.decode("utf-8", errors="ignore") + suffixe
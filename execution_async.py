@@ -0,0 +1,111 @@
+"""
+Exécution asynchrone des requêtes de l'agent sur une boucle asyncio partagée.
+
+Une seule boucle, dans un thread dédié, sert toutes les conversations du
+processus : pendant qu'une requête attend OpenAI ou Tavily, les autres
+avancent. Le thread du script Streamlit soumet la coroutine puis attend son
+résultat en relayant l'affichage (les appels st.* ne sont possibles que
+depuis ce thread).
+
+Annulation :
+  - un nouveau message d'une session annule sa requête encore en cours ;
+  - si l'utilisateur quitte la page ou relance le script, Streamlit
+    interrompt le thread du script au prochain affichage : la requête est
+    alors annulée sur la boucle (appels HTTP en cours compris).
+"""
+
+import time
+import asyncio
+import threading
+import concurrent.futures
+
+INTERVALLE_AFFICHAGE = 0.05
+# Ré-affichage périodique même sans nouveau texte : c'est lors d'un affichage
+# que Streamlit signale l'arrêt du script (page quittée, nouveau message)
+INTERVALLE_SIGNE_DE_VIE = 0.5
+
+
+class ZoneRelais:
+    """
+    Remplace un emplacement st.empty() dans la boucle asyncio : le texte est
+    mémorisé, puis recopié dans le vrai emplacement par le thread du script.
+    """
+
+    def __init__(self, texte=""):
+        self.texte = texte
+        self.version = 0
+
+    def markdown(self, texte):
+        self.texte = texte
+        self.version += 1
+
+
+class BoucleAsync:
+    """Boucle asyncio de fond partagée par les sessions ; une requête en cours par session"""
+
+    def __init__(self):
+        self._boucle = asyncio.new_event_loop()
+        self._verrou = threading.Lock()
+        self._en_cours = {}
+        self._thread = threading.Thread(target=self._executer, name="boucle-agent", daemon=True)
+        self._thread.start()
+
+    def _executer(self):
+        asyncio.set_event_loop(self._boucle)
+        self._boucle.run_forever()
+
+    @property
+    def boucle(self):
+        return self._boucle
+
+    def soumettre(self, cle, coroutine):
+        """Planifie la coroutine ; annule la requête précédente de la même clé (session)"""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._boucle)
+        with self._verrou:
+            precedente = self._en_cours.get(cle)
+            self._en_cours[cle] = future
+        if precedente is not None and not precedente.done():
+            precedente.cancel()
+        future.add_done_callback(lambda f: self._oublier(cle, f))
+        return future
+
+    def _oublier(self, cle, future):
+        with self._verrou:
+            if self._en_cours.get(cle) is future:
+                del self._en_cours[cle]
+
+    def annuler(self, cle):
+        with self._verrou:
+            future = self._en_cours.pop(cle, None)
+        if future is not None:
+            future.cancel()
+
+    def requetes_en_cours(self):
+        with self._verrou:
+            return len(self._en_cours)
+
+    def executer(self, cle, fabrique, zone, texte_attente=""):
+        """
+        Exécute fabrique(relais) sur la boucle et attend le résultat dans le thread appelant.
+        Le texte écrit dans le relais par la coroutine est recopié dans `zone` ; si l'attente
+        est interrompue (Streamlit arrête le script), la requête est annulée.
+        """
+        relais = ZoneRelais(texte_attente)
+        future = self.soumettre(cle, fabrique(relais))
+        affichee, dernier_affichage = None, 0.0
+        try:
+            # wait() plutôt que result(timeout) : un TimeoutError levé par la coroutine (délai d'un
+            # palier du routeur) ne doit pas être pris pour la fin de l'intervalle d'affichage
+            while not concurrent.futures.wait([future], timeout=INTERVALLE_AFFICHAGE).done:
+                maintenant = time.monotonic()
+                if relais.version != affichee or maintenant - dernier_affichage >= INTERVALLE_SIGNE_DE_VIE:
+                    affichee, dernier_affichage = relais.version, maintenant
+                    zone.markdown(relais.texte)
+            return future.result()
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def arreter(self):
+        self._boucle.call_soon_threadsafe(self._boucle.stop)
+        self._thread.join(timeout=5)
@@ -0,0 +1,267 @@
+"""
+Indexation incrémentale des documents financiers.
+
+L'index vectoriel LlamaIndex est persisté sur disque avec un manifeste
+(chemin, taille, date de modification, SHA-256) : au démarrage on relit
+l'index stocké et seuls les fichiers nouveaux ou modifiés sont analysés et
+vectorisés, les fichiers supprimés sont retirés de l'index.
+"""
+
+import os
+import json
+import time
+import hashlib
+
+from filelock import FileLock
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+REPERTOIRE_DOCUMENTS = "documents"
+REPERTOIRE_STOCKAGE = os.getenv("INDEX_STORAGE_DIR", "storage")
+FICHIER_MANIFESTE = "manifeste.json"
+VERSION_MANIFESTE = 2
+
+# ============================================================================
+# MANIFESTE DES FICHIERS
+# ============================================================================
+
+def calculer_sha256(chemin, taille_bloc=1024 * 1024):
+    """Calcule l'empreinte SHA-256 d'un fichier par blocs"""
+    empreinte = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(taille_bloc), b""):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+def decrire_fichier(chemin, entree_precedente=None):
+    """
+    Décrit un fichier (taille, mtime, SHA-256).
+    Le hash n'est recalculé que si la taille ou la date de modification a changé.
+    """
+    stat = os.stat(chemin)
+    if (
+        entree_precedente
+        and entree_precedente.get("taille") == stat.st_size
+        and entree_precedente.get("mtime") == stat.st_mtime
+    ):
+        sha256 = entree_precedente["sha256"]
+    else:
+        sha256 = calculer_sha256(chemin)
+
+    return {
+        "taille": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": sha256,
+    }
+
+
+def lister_fichiers(documents_path=REPERTOIRE_DOCUMENTS):
+    """Liste les fichiers (chemins relatifs) du dossier de documents"""
+    if not os.path.exists(documents_path):
+        return []
+    return sorted(
+        os.path.join(documents_path, f)
+        for f in os.listdir(documents_path)
+        if os.path.isfile(os.path.join(documents_path, f)) and not f.startswith(".")
+    )
+
+
+def scanner_documents(documents_path=REPERTOIRE_DOCUMENTS, fichiers_connus=None):
+    """Construit l'état courant {chemin: description} du dossier de documents"""
+    fichiers_connus = fichiers_connus or {}
+    return {
+        chemin: decrire_fichier(chemin, fichiers_connus.get(chemin))
+        for chemin in lister_fichiers(documents_path)
+    }
+
+
+def comparer_etats(fichiers_connus, fichiers_actuels):
+    """Retourne (ajoutés, modifiés, supprimés) entre deux états du dossier"""
+    ajoutes = [c for c in fichiers_actuels if c not in fichiers_connus]
+    supprimes = [c for c in fichiers_connus if c not in fichiers_actuels]
+    modifies = [
+        c for c in fichiers_actuels
+        if c in fichiers_connus and fichiers_connus[c]["sha256"] != fichiers_actuels[c]["sha256"]
+    ]
+    return ajoutes, modifies, supprimes
+
+
+def charger_manifeste(repertoire_stockage=REPERTOIRE_STOCKAGE):
+    """Charge le manifeste persisté (None s'il est absent ou illisible)"""
+    chemin = os.path.join(repertoire_stockage, FICHIER_MANIFESTE)
+    try:
+        with open(chemin, "r", encoding="utf-8") as f:
+            manifeste = json.load(f)
+        if manifeste.get("version") != VERSION_MANIFESTE:
+            return None
+        return manifeste
+    except (OSError, ValueError):
+        return None
+
+
+def sauvegarder_manifeste(manifeste, repertoire_stockage=REPERTOIRE_STOCKAGE):
+    """Écrit le manifeste de façon atomique (fichier temporaire puis remplacement)"""
+    os.makedirs(repertoire_stockage, exist_ok=True)
+    chemin = os.path.join(repertoire_stockage, FICHIER_MANIFESTE)
+    chemin_tmp = chemin + ".tmp"
+    with open(chemin_tmp, "w", encoding="utf-8") as f:
+        json.dump(manifeste, f, ensure_ascii=False, indent=2)
+    os.replace(chemin_tmp, chemin)
+
+# ============================================================================
+# INDEX LLAMAINDEX PERSISTÉ
+# ============================================================================
+
+def nom_modele_embedding():
+    """Identifie le modèle d'embedding courant (un changement impose une reconstruction)"""
+    from llama_index.core.settings import Settings
+
+    modele = Settings.embed_model
+    return f"{type(modele).__name__}:{getattr(modele, 'model_name', '')}"
+
+
+def lire_fichiers(chemins):
+    """Analyse une liste de fichiers avec LlamaIndex, regroupés par fichier"""
+    from llama_index.core import SimpleDirectoryReader
+
+    if not chemins:
+        return {}
+
+    # llama-index-core 0.10.0 n'applique pas ses lecteurs par défaut (PDF lus en binaire) :
+    # on les fournit explicitement
+    try:
+        from llama_index.readers.file import DocxReader, PDFReader
+        lecteurs = {".pdf": PDFReader(), ".docx": DocxReader()}
+    except ImportError:
+        lecteurs = None
+
+    documents = SimpleDirectoryReader(
+        input_files=chemins, filename_as_id=True, file_extractor=lecteurs
+    ).load_data()
+    par_fichier = {chemin: [] for chemin in chemins}
+    noms = {os.path.basename(chemin): chemin for chemin in chemins}
+    for doc in documents:
+        chemin = noms.get(doc.metadata.get("file_name"))
+        if chemin is not None:
+            par_fichier[chemin].append(doc)
+    return par_fichier
+
+
+def creer_vector_store(repertoire_stockage=REPERTOIRE_STOCKAGE):
+    """Vector store LlamaIndex selon VECTOR_BACKEND (None : SimpleVectorStore par défaut)"""
+    from stockage_vectoriel import StockageVectorielPlat, VectorStorePlatLlamaIndex, backend_plat_actif
+
+    if not backend_plat_actif():
+        return None
+    return VectorStorePlatLlamaIndex(StockageVectorielPlat(os.path.join(repertoire_stockage, "vecteurs_plats")))
+
+
+def charger_ou_construire_index(documents_path=REPERTOIRE_DOCUMENTS, repertoire_stockage=REPERTOIRE_STOCKAGE):
+    """
+    Charge l'index persisté et le met à jour de façon incrémentale.
+    Retourne (index, rapport) ; index vaut None si le dossier est vide.
+    """
+    from llama_index.core import VectorStoreIndex, StorageContext, load_index_from_storage
+    from stockage_vectoriel import BACKEND_VECTORIEL
+
+    debut = time.perf_counter()
+    os.makedirs(repertoire_stockage, exist_ok=True)
+
+    # Un seul processus met à jour le stockage à la fois
+    with FileLock(os.path.join(repertoire_stockage, ".indexation.lock")):
+        manifeste = charger_manifeste(repertoire_stockage)
+        modele = nom_modele_embedding()
+        vector_store = creer_vector_store(repertoire_stockage)
+
+        index = None
+        if (
+            manifeste
+            and manifeste.get("modele_embedding") == modele
+            and manifeste.get("backend", "") == BACKEND_VECTORIEL
+        ):
+            try:
+                storage_context = StorageContext.from_defaults(
+                    persist_dir=repertoire_stockage, vector_store=vector_store
+                )
+                index = load_index_from_storage(storage_context)
+            except Exception:
+                index = None
+
+        if index is None:
+            manifeste = {
+                "version": VERSION_MANIFESTE,
+                "modele_embedding": modele,
+                "backend": BACKEND_VECTORIEL,
+                "fichiers": {},
+            }
+            if vector_store is not None:
+                # Le stockage plat se réécrit à côté : les lecteurs en cours gardent l'ancienne génération
+                vector_store.stockage.vider()
+
+        fichiers_connus = manifeste["fichiers"]
+        fichiers_actuels = scanner_documents(documents_path, fichiers_connus)
+        ajoutes, modifies, supprimes = comparer_etats(fichiers_connus, fichiers_actuels)
+
+        rapport = {
+            "ajoutes": len(ajoutes),
+            "modifies": len(modifies),
+            "supprimes": len(supprimes),
+            "inchanges": len(fichiers_actuels) - len(ajoutes) - len(modifies),
+            "reconstruit": index is None,
+        }
+
+        if index is None and not fichiers_actuels:
+            rapport["duree"] = time.perf_counter() - debut
+            return None, rapport
+
+        # Retirer les fichiers supprimés ou modifiés
+        if index is not None:
+            for chemin in supprimes + modifies:
+                for doc_id in fichiers_connus[chemin].get("doc_ids", []):
+                    index.delete_ref_doc(doc_id, delete_from_docstore=True)
+
+        # Analyser et vectoriser uniquement les fichiers nouveaux ou modifiés
+        a_indexer = lire_fichiers(ajoutes + modifies)
+        nouveaux_documents = [doc for docs in a_indexer.values() for doc in docs]
+        if index is None:
+            index = VectorStoreIndex.from_documents(
+                nouveaux_documents, storage_context=StorageContext.from_defaults(vector_store=vector_store)
+            )
+        else:
+            for doc in nouveaux_documents:
+                index.insert(doc)
+
+        nouveaux_fichiers = {}
+        for chemin, description in fichiers_actuels.items():
+            if chemin in a_indexer:
+                description["doc_ids"] = [doc.doc_id for doc in a_indexer[chemin]]
+            else:
+                description["doc_ids"] = fichiers_connus[chemin].get("doc_ids", [])
+            nouveaux_fichiers[chemin] = description
+
+        changements = rapport["reconstruit"] or ajoutes or modifies or supprimes
+        # Les mtime peuvent changer sans modification de contenu : le manifeste est réécrit dans tous les cas
+        manifeste["fichiers"] = nouveaux_fichiers
+        if changements:
+            index.storage_context.persist(persist_dir=repertoire_stockage)
+        sauvegarder_manifeste(manifeste, repertoire_stockage)
+
+    rapport["duree"] = time.perf_counter() - debut
+    if not nouveaux_fichiers:
+        return None, rapport
+    return index, rapport
+
+# ============================================================================
+# IDENTIFIANTS DÉTERMINISTES DE FRAGMENTS
+# ============================================================================
+
+def identifiant_fragment(source, page, position, contenu):
+    """
+    Identifiant stable d'un fragment : source + page + position + hash du contenu.
+    Un même fragment garde le même identifiant d'un démarrage à l'autre.
+    """
+    empreinte = hashlib.sha256(contenu.encode("utf-8")).hexdigest()[:16]
+    return f"{os.path.basename(source)}:{page}:{position}:{empreinte}"
@@ -0,0 +1,199 @@
+"""
+Mémoire de conversation par session, persistée dans SQLite.
+
+Chaque session garde :
+  - une fenêtre glissante des derniers messages, transmis tels quels au LLM ;
+  - un résumé compact des messages sortis de la fenêtre (une ligne par
+    message : la question, la première phrase de la réponse).
+Le résumé et la fenêtre ont chacun un budget de jetons strict : la taille du
+prompt reste constante quelle que soit la longueur de la conversation. Le
+résumé est extractif (aucun appel au LLM). Les messages sont conservés dans
+la base ; seuls les plus récents sont relus.
+
+La session est identifiée par une chaîne stable (paramètre d'URL dans les
+applications) : la conversation survit aux reruns Streamlit et aux redémarrages.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+
+from comptage_jetons import compter_jetons, tronquer_jetons
+
+CHEMIN_MEMOIRE = os.getenv("CONVERSATION_MEMORY_PATH", os.path.join("storage", "conversations.sqlite"))
+BUDGET_FENETRE = int(os.getenv("CONVERSATION_WINDOW_TOKENS", "1500"))
+BUDGET_RESUME = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "300"))
+MESSAGES_FENETRE = 6
+
+_FIN_PHRASE = re.compile(r"(?<=[.!?])\s")
+_MISE_EN_FORME = re.compile(r"[#*_`>|]+")
+
+
+def ligne_resume(role, contenu):
+    """Une ligne du résumé : question tronquée, ou première phrase de la réponse"""
+    # Les titres markdown (« ## Analyse ») ne disent rien du contenu
+    lignes = [ligne for ligne in contenu.splitlines() if not ligne.lstrip().startswith("#")]
+    texte = " ".join(_MISE_EN_FORME.sub(" ", " ".join(lignes)).split())
+    if role == "user":
+        return "Q : " + tronquer_jetons(texte, 40)
+    return "R : " + tronquer_jetons(_FIN_PHRASE.split(texte, 1)[0], 50)
+
+
+class MemoireConversation:
+    """Messages et résumé de chaque session ; thread-safe, partageable entre sessions"""
+
+    def __init__(self, chemin=CHEMIN_MEMOIRE, budget_fenetre=BUDGET_FENETRE,
+                 budget_resume=BUDGET_RESUME, messages_fenetre=MESSAGES_FENETRE):
+        dossier = os.path.dirname(chemin)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        self.budget_fenetre = budget_fenetre
+        self.budget_resume = budget_resume
+        self.messages_fenetre = messages_fenetre
+
+        self._verrou = threading.Lock()
+        self._connexion = sqlite3.connect(chemin, timeout=30, check_same_thread=False)
+        self._connexion.execute("PRAGMA journal_mode=WAL")
+        self._connexion.executescript(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, session TEXT NOT NULL, role TEXT NOT NULL,"
+            " contenu TEXT NOT NULL, jetons INTEGER NOT NULL, horodatage REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS messages_session ON messages (session, id);"
+            "CREATE TABLE IF NOT EXISTS resumes ("
+            " session TEXT PRIMARY KEY, resume TEXT NOT NULL, dernier_id INTEGER NOT NULL);"
+        )
+        self._connexion.commit()
+
+    @property
+    def budget(self):
+        """Nombre maximal de jetons restitués (résumé + fenêtre)"""
+        return self.budget_fenetre + self.budget_resume
+
+    def _resume(self, session):
+        ligne = self._connexion.execute(
+            "SELECT resume, dernier_id FROM resumes WHERE session = ?", (session,)
+        ).fetchone()
+        return ligne if ligne else ("", 0)
+
+    def _fenetre(self, session, dernier_id):
+        """Messages non résumés, du plus ancien au plus récent : [(id, role, contenu, jetons)]"""
+        return self._connexion.execute(
+            "SELECT id, role, contenu, jetons FROM messages WHERE session = ? AND id > ? ORDER BY id",
+            (session, dernier_id),
+        ).fetchall()
+
+    def ajouter(self, session, role, contenu):
+        """Enregistre un message ('user' ou 'assistant') et résume ceux qui sortent de la fenêtre"""
+        with self._verrou:
+            self._connexion.execute(
+                "INSERT INTO messages (session, role, contenu, jetons, horodatage) VALUES (?, ?, ?, ?, ?)",
+                (session, role, contenu, compter_jetons(contenu), time.time()),
+            )
+            resume, dernier_id = self._resume(session)
+            fenetre = self._fenetre(session, dernier_id)
+
+            # Les plus anciens messages passent dans le résumé tant que la fenêtre dépasse son budget
+            sortants = []
+            while fenetre and (
+                len(fenetre) > self.messages_fenetre
+                or sum(message[3] for message in fenetre) > self.budget_fenetre
+            ):
+                sortants.append(fenetre.pop(0))
+            # La fenêtre commence toujours par une question (pas de réponse orpheline)
+            while sortants and fenetre and fenetre[0][1] != "user":
+                sortants.append(fenetre.pop(0))
+            if sortants:
+                lignes = resume.splitlines() + [ligne_resume(role, contenu) for _, role, contenu, _ in sortants]
+                # Les lignes les plus anciennes du résumé disparaissent en premier
+                while lignes and compter_jetons("\n".join(lignes)) > self.budget_resume:
+                    lignes.pop(0)
+                self._connexion.execute(
+                    "INSERT OR REPLACE INTO resumes (session, resume, dernier_id) VALUES (?, ?, ?)",
+                    (session, "\n".join(lignes), sortants[-1][0]),
+                )
+            self._connexion.commit()
+
+    def ajouter_echange(self, session, question, reponse):
+        self.ajouter(session, "user", question)
+        self.ajouter(session, "assistant", reponse)
+
+    def contexte(self, session):
+        """(résumé, [(role, contenu)] de la fenêtre), dans le budget de jetons"""
+        with self._verrou:
+            resume, dernier_id = self._resume(session)
+            fenetre = self._fenetre(session, dernier_id)
+        return resume, [(role, contenu) for _, role, contenu, _ in fenetre]
+
+    def jetons(self, session):
+        """Taille en jetons du contexte restitué pour la session"""
+        resume, fenetre = self.contexte(session)
+        return compter_jetons(resume) + sum(compter_jetons(contenu) for _, contenu in fenetre)
+
+    def effacer(self, session):
+        with self._verrou:
+            self._connexion.execute("DELETE FROM messages WHERE session = ?", (session,))
+            self._connexion.execute("DELETE FROM resumes WHERE session = ?", (session,))
+            self._connexion.commit()
+
+# ============================================================================
+# ADAPTATEURS LLAMAINDEX / LANGCHAIN
+# ============================================================================
+
+def historique_llamaindex(memoire, session):
+    """(résumé, [ChatMessage]) pour ChatMemoryBuffer.from_defaults(chat_history=...)"""
+    from llama_index.core.llms import ChatMessage
+
+    resume, fenetre = memoire.contexte(session)
+    return resume, [ChatMessage(role=role, content=contenu) for role, contenu in fenetre]
+
+
+try:
+    try:
+        from langchain_core.memory import BaseMemory
+        from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+    except ImportError:
+        from langchain.schema import AIMessage, BaseMemory, HumanMessage, SystemMessage
+
+    class MemoireLangChain(BaseMemory):
+        """
+        Mémoire LangChain adossée à MemoireConversation.
+        enregistrer=False : lecture seule (chaîne appelée par l'agent, qui enregistre déjà l'échange).
+        """
+
+        memoire: object
+        session: str
+        memory_key: str = "chat_history"
+        enregistrer: bool = True
+
+        @property
+        def memory_variables(self):
+            return [self.memory_key]
+
+        def load_memory_variables(self, inputs):
+            resume, fenetre = self.memoire.contexte(self.session)
+            messages = [SystemMessage(content=f"Résumé de la conversation : {resume}")] if resume else []
+            messages += [
+                HumanMessage(content=contenu) if role == "user" else AIMessage(content=contenu)
+                for role, contenu in fenetre
+            ]
+            return {self.memory_key: messages}
+
+        def save_context(self, inputs, outputs):
+            if not self.enregistrer:
+                return
+            question = inputs.get("input", inputs.get("question"))
+            if question is None:
+                question = next(v for k, v in inputs.items() if k != self.memory_key)
+            # ConversationalRetrievalChain renvoie aussi les sources : seule la réponse est gardée
+            reponse = outputs.get("output", outputs.get("answer"))
+            if reponse is None:
+                reponse = next(iter(outputs.values()))
+            self.memoire.ajouter_echange(self.session, str(question), str(reponse))
+
+        def clear(self):
+            self.memoire.effacer(self.session)
+
+except ImportError:
+    pass
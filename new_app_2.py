@@ -9,11 +9,35 @@ st.set_page_config(
 
 import os
 import json
+import uuid
+import asyncio
+import concurrent.futures
 from datetime import datetime
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# "outils" : appel de fonctions natif (agent_outils.py) ; "react" : agent ReAct LangChain
+MODE_AGENT = os.getenv("AGENT_MODE", "outils").lower()
+# 0 : étapes de l'agent déterministes, servies par le cache exact de cache_llm.py quand elles se répètent
+TEMPERATURE_AGENT = float(os.getenv("AGENT_TEMPERATURE", "0.7"))
+# Palier rapide du routage (routage_modeles.py) : questions factuelles courtes
+CONSIGNE_CONCISE = "Pour une question factuelle, réponds en quelques phrases, sans analyse développée."
+
+from indexation import identifiant_fragment
+from service_index import ServiceIndex
+from pipeline_ingestion import executer_pipeline, lister_documents
+from cache_embeddings import EmbeddingsEnCache
+from recherche_hybride import IndexBM25, associer_bm25, bm25_associe
+from tableaux_financiers import BaseTableaux
+from clients_llm import chat_langchain, client_openai_async, embeddings_langchain
+from memoire_conversation import MemoireConversation
+from execution_async import BoucleAsync
+from agent_outils import PROMPT_SYSTEME, AgentOutils
+from routage_modeles import RouteurModeles
+from rejeu_llm import envelopper_recherche
+from calcul_securise import evaluer_lot, formater_valeur
+
 # =============================================================================
 # GESTION DES IMPORTS SIMPLIFIÉE
 # =============================================================================
@@ -33,29 +57,24 @@ TAVILY_AVAILABLE = False
 try:
     # Essayer les nouveaux imports d'abord (langchain-community)
     try:
-        from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
         from langchain_community.vectorstores import Chroma
         LANGCHAIN_NEW = True
     except ImportError:
         # Fallback aux anciens imports
-        from langchain.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
         from langchain.vectorstores import Chroma
         LANGCHAIN_NEW = False
     
     # Imports communs
     from langchain.text_splitter import RecursiveCharacterTextSplitter
-    from langchain.memory import ConversationBufferMemory
     from langchain.chains import ConversationalRetrievalChain
     from langchain.agents import initialize_agent, Tool, AgentType
     
-    # Gestion OpenAI
-    try:
-        from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-        OPENAI_NEW = True
-    except ImportError:
-        from langchain.embeddings import OpenAIEmbeddings
-        from langchain.chat_models import ChatOpenAI
-        OPENAI_NEW = False
+    # Composants du projet qui dépendent de LangChain
+    from recherche_hybride import RetrieverHybrideLangChain
+    from stockage_vectoriel import VectorStorePlatLangChain, backend_plat_actif
+    from affichage_flux import GestionnaireFluxAgent
+    from memoire_conversation import MemoireLangChain
+    from assemblage_contexte import RetrieverContexteLangChain
     
     HAS_LANGCHAIN = True
     
@@ -69,26 +88,31 @@ try:
 except ImportError:
     TAVILY_AVAILABLE = False
 
+# Client asynchrone (tavily-python >= 0.3.4)
+try:
+    from tavily import AsyncTavilyClient
+    TAVILY_ASYNC = True
+except ImportError:
+    TAVILY_ASYNC = False
+
 # =============================================================================
 # OUTILS DE BASE - VERSION SIMPLIFIÉE SANS PYDANTIC
 # =============================================================================
 
 class CalculatorTool:
     name = "calculator"
-    description = "Effectue des calculs mathématiques. Exemple: '2 + 2' ou '15 * 3.5'"
+    description = "Effectue des calculs mathématiques. Exemple: '2 + 2' ou '15 * 3.5' (plusieurs calculs séparés par ';')"
     
     def run(self, expression: str) -> str:
-        try:
-            # Sécurité : seulement les caractères mathématiques autorisés
-            allowed_chars = set("0123456789+-*/.() ")
-            if not all(c in allowed_chars for c in expression):
-                return "❌ Caractères non autorisés. Utilisez seulement: chiffres, +, -, *, /, ., (, )"
-            
-            expression = expression.replace(',', '.')
-            result = eval(expression)
-            return f"🧮 {expression} = {result}"
-        except Exception as e:
-            return f"❌ Erreur de calcul: {str(e)}"
+        # Évaluateur borné (liste blanche d'opérateurs, limites de taille et de temps) : pas d'eval()
+        expressions = [morceau.strip() for morceau in expression.replace("\n", ";").split(";") if morceau.strip()]
+        if not expressions:
+            return "❌ Erreur de calcul: expression vide"
+        return "\n".join(
+            f"🧮 {resultat['expression']} = {formater_valeur(resultat['valeur'])}" if resultat["erreur"] is None
+            else f"❌ Erreur de calcul ({resultat['expression']}): {resultat['erreur']}"
+            for resultat in evaluer_lot(expressions)
+        )
 
 class WeatherTool:
     name = "weather"
@@ -123,28 +147,86 @@ class WebSearchTool:
             return "❌ Bibliothèque Tavily non installée. Exécutez: pip install tavily-python"
         
         try:
-            tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+            tavily_client = envelopper_recherche(TavilyClient(api_key=os.getenv("TAVILY_API_KEY")))
             response = tavily_client.search(query=query, max_results=3)
-            
-            if not response.get('results'):
-                return f"❌ Aucun résultat trouvé pour: '{query}'"
-            
-            result_text = f"🔍 **Résultats pour '{query}':**\n\n"
-            for i, result in enumerate(response['results'][:3], 1):
-                title = result.get('title', 'Sans titre')
-                content = result.get('content', 'Pas de contenu')
-                url = result.get('url', '')
-                
-                result_text += f"**{i}. {title}**\n"
-                result_text += f"{content[:150]}...\n"
-                if url:
-                    result_text += f"*Source: {url}*\n"
-                result_text += "\n"
-            
-            return result_text
+            return self.formater_resultats(query, response)
             
         except Exception as e:
             return f"❌ Erreur de recherche: {str(e)}"
+    
+    async def arun(self, query: str) -> str:
+        """Version asynchrone : la recherche n'immobilise pas la boucle des autres conversations"""
+        if not TAVILY_ASYNC:
+            return await asyncio.to_thread(self.run, query)
+        
+        if not os.getenv("TAVILY_API_KEY"):
+            return "❌ Clé API Tavily manquante. Ajoutez TAVILY_API_KEY dans .env"
+        
+        try:
+            tavily_client = envelopper_recherche(AsyncTavilyClient(api_key=os.getenv("TAVILY_API_KEY")))
+            response = await tavily_client.search(query=query, max_results=3)
+            return self.formater_resultats(query, response)
+        except Exception as e:
+            return f"❌ Erreur de recherche: {str(e)}"
+    
+    def formater_resultats(self, query: str, response: dict) -> str:
+        if not response.get('results'):
+            return f"❌ Aucun résultat trouvé pour: '{query}'"
+        
+        result_text = f"🔍 **Résultats pour '{query}':**\n\n"
+        for i, result in enumerate(response['results'][:3], 1):
+            title = result.get('title', 'Sans titre')
+            content = result.get('content', 'Pas de contenu')
+            url = result.get('url', '')
+            
+            result_text += f"**{i}. {title}**\n"
+            result_text += f"{content[:150]}...\n"
+            if url:
+                result_text += f"*Source: {url}*\n"
+            result_text += "\n"
+        
+        return result_text
+
+# =============================================================================
+# INDEX PARTAGÉ ENTRE LES SESSIONS
+# =============================================================================
+
+@st.cache_resource(show_spinner=False)
+def obtenir_service_index():
+    """Vector store unique partagé (en lecture seule) par toutes les sessions du processus"""
+    return ServiceIndex()
+
+@st.cache_resource(show_spinner=False)
+def obtenir_tableaux():
+    """Base des indicateurs extraits des tableaux PDF, partagée par les sessions"""
+    base = BaseTableaux()
+    # Disponible même sans clé OpenAI (le vector store n'est alors pas construit)
+    base.synchroniser()
+    return base
+
+@st.cache_resource(show_spinner=False)
+def obtenir_boucle():
+    """Boucle asyncio unique qui exécute les requêtes de l'agent de toutes les sessions"""
+    return BoucleAsync()
+
+@st.cache_resource(show_spinner=False)
+def obtenir_routeur():
+    """Routage des messages vers un palier de modèle, statistiques par palier partagées par les sessions"""
+    return RouteurModeles()
+
+@st.cache_resource(show_spinner=False)
+def obtenir_memoire():
+    """Mémoire des conversations (résumé + fenêtre glissante), persistée par session"""
+    return MemoireConversation()
+
+def identifiant_session():
+    """Identifiant de conversation stable, conservé dans l'URL (?session=...) pour survivre aux redémarrages"""
+    if "session_memoire" not in st.session_state:
+        parametres = st.experimental_get_query_params()
+        session = parametres.get("session", [None])[0] or uuid.uuid4().hex
+        st.experimental_set_query_params(**dict(parametres, session=session))
+        st.session_state.session_memoire = session
+    return st.session_state.session_memoire
 
 # =============================================================================
 # CLASSE PRINCIPALE DE L'ASSISTANT
@@ -153,9 +235,17 @@ class WebSearchTool:
 class CompleteAssistant:
     def __init__(self):
         self.vector_store = None
+        self.version_index = 0
         self.qa_chain = None
         self.agent = None
-        self.memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True) if HAS_LANGCHAIN else None
+        # Agents par palier de modèle (voir agent_palier) et routage du dernier message
+        self.outils = None
+        self.agents = {}
+        self.routage = None
+        self.retriever_contexte = None
+        self.session = identifiant_session()
+        # Historique borné (résumé + derniers messages) relu depuis SQLite : le prompt ne grossit pas
+        self.memory = MemoireLangChain(memoire=obtenir_memoire(), session=self.session) if HAS_LANGCHAIN else None
         self.todo_list = self.load_todo_list()
         self.calendar_events = self.load_calendar()
         
@@ -199,47 +289,39 @@ class CompleteAssistant:
         except Exception as e:
             st.sidebar.error(f"❌ Erreur sauvegarde calendrier: {e}")
     
-    def load_documents(self, documents_path="documents"):
-        """Charge les documents"""
+    def load_documents(self, decouper, traiter_lot, documents_path="documents"):
+        """
+        Charge les documents en parallèle (un processus par cœur) et transmet
+        les fragments par lots à traiter_lot, sans garder tout le corpus en mémoire
+        """
         if not HAS_LANGCHAIN:
-            return []
-            
-        documents = []
+            return None
         
         if not os.path.exists(documents_path):
             os.makedirs(documents_path)
-            return documents
+            return None
         
-        files = os.listdir(documents_path)
+        files, non_supportes = lister_documents(documents_path)
+        for file_path in non_supportes:
+            st.sidebar.warning(f"⚠️ Format non supporté: {os.path.basename(file_path)}")
         if not files:
-            return documents
+            return None
         
         st.sidebar.info(f"📁 {len(files)} fichier(s) dans 'documents/'")
-        
-        for file in files:
-            file_path = os.path.join(documents_path, file)
-            try:
-                if file.endswith('.pdf'):
-                    loader = PyPDFLoader(file_path)
-                    docs = loader.load()
-                    documents.extend(docs)
-                    st.sidebar.success(f"✅ PDF: {file}")
-                elif file.endswith('.docx'):
-                    loader = Docx2txtLoader(file_path)
-                    docs = loader.load()
-                    documents.extend(docs)
-                    st.sidebar.success(f"✅ DOCX: {file}")
-                elif file.endswith('.txt') or file.endswith('.md'):
-                    loader = TextLoader(file_path, encoding='utf-8')
-                    docs = loader.load()
-                    documents.extend(docs)
-                    st.sidebar.success(f"✅ TXT/MD: {file}")
-                else:
-                    st.sidebar.warning(f"⚠️ Format non supporté: {file}")
-            except Exception as e:
-                st.sidebar.error(f"❌ Erreur avec {file}: {str(e)}")
-        
-        return documents
+        barre = st.sidebar.progress(0.0)
+        
+        def progression(traites, total, file_path, erreur):
+            barre.progress(traites / total, text=f"{traites}/{total} - {os.path.basename(file_path)}")
+            if erreur:
+                st.sidebar.error(f"❌ Erreur avec {os.path.basename(file_path)}: {erreur}")
+        
+        rapport = executer_pipeline(files, decouper, traiter_lot, progression=progression)
+        rapport["sources"] = [f for f in files if f not in rapport["erreurs"]]
+        barre.empty()
+        st.sidebar.success(
+            f"✅ {len(rapport['sources'])} document(s), {rapport['pages']} pages en {rapport['duree']:.1f}s"
+        )
+        return rapport
     
     def setup_rag(self):
         """Configure RAG"""
@@ -250,37 +332,116 @@ class CompleteAssistant:
             st.sidebar.warning("❌ OPENAI_API_KEY manquante pour RAG")
             return
         
-        documents = self.load_documents()
-        
-        if not documents:
-            st.sidebar.info("📝 Aucun document trouvé. Ajoutez des fichiers dans le dossier 'documents/'")
-            return
-        
         try:
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-            chunks = text_splitter.split_documents(documents)
+            # Le vector store est construit une fois par processus et partagé par toutes les sessions
+            service = obtenir_service_index()
+            service.initialiser(self.construire_vector_store)
+            self.vector_store, self.version_index = service.obtenir_avec_version()
             
-            embeddings = OpenAIEmbeddings(openai_api_key=os.getenv("OPENAI_API_KEY"))
-            self.vector_store = Chroma.from_documents(chunks, embeddings, persist_directory="./chroma_db")
+            if not self.vector_store:
+                st.sidebar.info("📝 Aucun document trouvé. Ajoutez des fichiers dans le dossier 'documents/'")
+                return
             
-            llm = ChatOpenAI(
-                temperature=0.7, 
-                openai_api_key=os.getenv("OPENAI_API_KEY"),
-                model="gpt-3.5-turbo"
-            )
+            # Même modèle (et même pool de connexions) que l'agent, partagé par toutes les sessions
+            llm = chat_langchain()
             
+            # La chaîne reste propre à la session ; elle lit la conversation pour comprendre
+            # les questions de suite, mais c'est l'agent qui enregistre l'échange
             self.qa_chain = ConversationalRetrievalChain.from_llm(
                 llm=llm,
-                retriever=self.vector_store.as_retriever(search_kwargs={"k": 3}),
-                memory=self.memory,
+                retriever=self.creer_retriever(),
+                memory=MemoireLangChain(memoire=obtenir_memoire(), session=identifiant_session(), enregistrer=False),
                 return_source_documents=True
             )
             
-            st.sidebar.success(f"🔍 RAG activé - {len(chunks)} fragments")
+            st.sidebar.success(f"🔍 RAG activé - {service.empreinte_memoire()['vecteurs']} fragments")
             
         except Exception as e:
             st.sidebar.error(f"❌ Erreur RAG: {str(e)}")
     
+    def creer_retriever(self):
+        """Retriever hybride (vecteurs + BM25) si l'index BM25 est disponible, puis fusion des chevauchements et budget de jetons"""
+        bm25 = bm25_associe(self.vector_store)
+        if bm25 is None:
+            retriever = self.vector_store.as_retriever(search_kwargs={"k": 5})
+        else:
+            retriever = RetrieverHybrideLangChain(vector_store=self.vector_store, bm25=bm25, k=5)
+        self.retriever_contexte = RetrieverContexteLangChain(retriever=retriever)
+        return self.retriever_contexte
+    
+    def construire_vector_store(self):
+        """Charge les documents et synchronise le vector store persisté (Chroma ou stockage plat)"""
+        # Réutiliser la collection persistée au lieu de la recréer à chaque démarrage
+        # Les embeddings passent par le cache disque : seuls les textes inédits sont envoyés à OpenAI
+        embeddings = EmbeddingsEnCache(embeddings_langchain())
+        if backend_plat_actif():
+            # VECTOR_BACKEND=plat : matrice mappée en mémoire, sans serveur ni HNSW
+            vector_store = VectorStorePlatLangChain(embedding_function=embeddings)
+        else:
+            vector_store = Chroma(embedding_function=embeddings, persist_directory="./chroma_db")
+        
+        existants = vector_store.get(include=["metadatas"])
+        ids_existants = set(existants["ids"])
+        ids_courants = set()
+        compteur = {"ajoutes": 0}
+        bm25 = IndexBM25()
+        
+        def indexer_lot(chunks):
+            # Seuls les fragments absents de la collection sont vectorisés
+            fragments = self.identifier_fragments(chunks)
+            ids_courants.update(fragments)
+            # Tous les fragments alimentent l'index BM25 construit à côté du vector store
+            for identifiant, chunk in fragments.items():
+                bm25.ajouter(identifiant, chunk.page_content, chunk)
+            nouveaux_ids = [identifiant for identifiant in fragments if identifiant not in ids_existants]
+            if nouveaux_ids:
+                vector_store.add_documents([fragments[i] for i in nouveaux_ids], ids=nouveaux_ids)
+                ids_existants.update(nouveaux_ids)
+            compteur["ajoutes"] += len(nouveaux_ids)
+        
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
+        rapport = self.load_documents(text_splitter.split_documents, indexer_lot)
+        
+        # Les tableaux chiffrés des PDF alimentent la base interrogée sans LLM
+        obtenir_tableaux().synchroniser()
+        
+        sources_chargees = set(rapport["sources"]) if rapport else set()
+        supprimes = self.supprimer_fragments_obsoletes(vector_store, existants, ids_courants, sources_chargees)
+        if compteur["ajoutes"] or supprimes:
+            st.sidebar.info(f"🔄 Index mis à jour: +{compteur['ajoutes']} / -{supprimes} fragments")
+        
+        if not ids_courants:
+            return None
+        associer_bm25(vector_store, bm25)
+        return vector_store
+    
+    def identifier_fragments(self, chunks):
+        """Associe à chaque fragment son identifiant déterministe"""
+        return {
+            identifiant_fragment(
+                chunk.metadata.get("source", ""),
+                chunk.metadata.get("page", 0),
+                chunk.metadata.get("start_index", 0),
+                chunk.page_content,
+            ): chunk
+            for chunk in chunks
+        }
+    
+    def supprimer_fragments_obsoletes(self, vector_store, existants, ids_courants, sources_chargees):
+        """Supprime les fragments qui ne sont plus produits par les documents"""
+        # Ne pas supprimer les fragments d'un fichier qui a simplement échoué au chargement
+        obsoletes = [
+            identifiant
+            for identifiant, metadata in zip(existants["ids"], existants["metadatas"])
+            if identifiant not in ids_courants and (
+                (metadata or {}).get("source") in sources_chargees
+                or not os.path.exists((metadata or {}).get("source", ""))
+            )
+        ]
+        if obsoletes:
+            vector_store.delete(ids=obsoletes)
+        return len(obsoletes)
+    
     def todo_tool_function(self, action: str) -> str:
         """Fonction pour gérer la todo list"""
         action_lower = action.lower()
@@ -383,26 +544,42 @@ class CompleteAssistant:
     
     def rag_tool_function(self, question: str) -> str:
         """Fonction pour la recherche dans les documents"""
+        # L'index partagé a été ré-indexé depuis : reconstruire la chaîne sur le nouvel index
+        if obtenir_service_index().version != self.version_index:
+            self.setup_rag()
+        
         if not self.qa_chain:
             return "❌ RAG non disponible. Aucun document chargé ou problème de configuration."
         
         try:
-            result = self.qa_chain({"question": question})
-            response = f"📄 **Réponse basée sur vos documents:**\n\n{result['answer']}"
-            
-            if 'source_documents' in result and result['source_documents']:
-                sources = []
-                for doc in result['source_documents'][:2]:
-                    source = doc.metadata.get('source', 'Document')
-                    sources.append(f"• {os.path.basename(source)}")
-                
-                if sources:
-                    response += f"\n\n**Sources:**\n" + "\n".join(sources)
-            
-            return response
+            return self.formater_reponse_rag(self.qa_chain({"question": question}))
         except Exception as e:
             return f"❌ Erreur de recherche: {str(e)}"
     
+    async def rag_tool_async(self, question: str) -> str:
+        """Recherche dans les documents sur la boucle asynchrone (la chaîne est à jour : vérifié avant l'envoi)"""
+        if not self.qa_chain:
+            return "❌ RAG non disponible. Aucun document chargé ou problème de configuration."
+        
+        try:
+            return self.formater_reponse_rag(await self.qa_chain.acall({"question": question}))
+        except Exception as e:
+            return f"❌ Erreur de recherche: {str(e)}"
+    
+    def formater_reponse_rag(self, result: dict) -> str:
+        response = f"📄 **Réponse basée sur vos documents:**\n\n{result['answer']}"
+        
+        if 'source_documents' in result and result['source_documents']:
+            sources = []
+            for doc in result['source_documents'][:2]:
+                source = doc.metadata.get('source', 'Document')
+                sources.append(f"• {os.path.basename(source)}")
+            
+            if sources:
+                response += f"\n\n**Sources:**\n" + "\n".join(sources)
+        
+        return response
+    
     def setup_agent(self):
         """Configure l'agent"""
         if not HAS_LANGCHAIN:
@@ -414,84 +591,176 @@ class CompleteAssistant:
             return
         
         try:
-            llm = ChatOpenAI(
-                temperature=0.7, 
-                openai_api_key=os.getenv("OPENAI_API_KEY"),
-                model="gpt-3.5-turbo"
-            )
-            
-            # Créer les outils
-            tools = []
-            
-            # Outil Calculatrice
-            tools.append(Tool(
-                name="calculator",
-                description="Effectue des calculs mathématiques. Exemple: '2 + 2' ou '15 * 3.5'",
-                func=CalculatorTool().run
-            ))
-            
-            # Outil Météo
-            tools.append(Tool(
-                name="weather",
-                description="Donne la météo d'une ville. Exemple: 'Paris' ou 'Lyon'",
-                func=WeatherTool().run
-            ))
-            
-            # Outil Recherche Web
+            # Outils créés une fois, partagés par les agents des différents paliers de modèle
+            self.outils = self.creer_outils()
+            self.agent = self.agent_palier(obtenir_routeur().paliers["standard"])
+            mode = "appel de fonctions" if MODE_AGENT == "outils" else "ReAct"
+            st.sidebar.success(f"🤖 Agent ({mode}) initialisé avec {len(self.outils)} outils")
+        except Exception as e:
+            st.sidebar.error(f"❌ Erreur lors de l'initialisation de l'agent: {str(e)}")
+    
+    def creer_outils(self):
+        """Outils de l'agent : {nom: fonction} (appel de fonctions) ou liste de Tool LangChain (ReAct)"""
+        if MODE_AGENT == "outils":
+            outils = {
+                "calculator": CalculatorTool().run,
+                "weather": WeatherTool().run,
+            }
             if os.getenv("TAVILY_API_KEY"):
-                tools.append(Tool(
-                    name="web_search",
-                    description="Recherche des informations actuelles sur internet",
-                    func=WebSearchTool().run
-                ))
-            
-            # Outil Todo List
+                outils["web_search"] = WebSearchTool().arun
+            outils["todo_list"] = self.todo_tool_function
+            outils["calendar"] = self.calendar_tool_function
+            if self.vector_store:
+                outils["document_search"] = self.rag_tool_async
+            return outils
+        
+        tools = []
+        
+        # Outil Calculatrice
+        tools.append(Tool(
+            name="calculator",
+            description=CalculatorTool.description,
+            func=CalculatorTool().run
+        ))
+        
+        # Outil Météo
+        tools.append(Tool(
+            name="weather",
+            description="Donne la météo d'une ville. Exemple: 'Paris' ou 'Lyon'",
+            func=WeatherTool().run
+        ))
+        
+        # Outil Recherche Web
+        if os.getenv("TAVILY_API_KEY"):
+            recherche_web = WebSearchTool()
             tools.append(Tool(
-                name="todo_list",
-                description="Gère la liste de tâches. Utilisez: 'voir', 'ajouter [tâche]', 'terminer [numéro]', 'supprimer [numéro]'",
-                func=self.todo_tool_function
+                name="web_search",
+                description="Recherche des informations actuelles sur internet",
+                func=recherche_web.run,
+                coroutine=recherche_web.arun
             ))
-            
-            # Outil Calendrier
+        
+        # Outil Todo List
+        tools.append(Tool(
+            name="todo_list",
+            description="Gère la liste de tâches. Utilisez: 'voir', 'ajouter [tâche]', 'terminer [numéro]', 'supprimer [numéro]'",
+            func=self.todo_tool_function
+        ))
+        
+        # Outil Calendrier
+        tools.append(Tool(
+            name="calendar",
+            description="Gère le calendrier. Utilisez: 'voir' ou 'ajouter [événement]'",
+            func=self.calendar_tool_function
+        ))
+        
+        # Outil RAG si disponible
+        if self.vector_store:
             tools.append(Tool(
-                name="calendar",
-                description="Gère le calendrier. Utilisez: 'voir' ou 'ajouter [événement]'",
-                func=self.calendar_tool_function
+                name="document_search",
+                description="Recherche dans vos documents (PDF, DOCX, TXT, MD)",
+                func=self.rag_tool_function,
+                coroutine=self.rag_tool_async
             ))
-            
-            # Outil RAG si disponible
-            if self.vector_store:
-                tools.append(Tool(
-                    name="document_search",
-                    description="Recherche dans vos documents (PDF, DOCX, TXT, MD)",
-                    func=self.rag_tool_function
-                ))
-            
-            # Créer l'agent
-            self.agent = initialize_agent(
-                tools=tools,
-                llm=llm,
-                agent=AgentType.CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-                verbose=True,
-                memory=self.memory,
-                handle_parsing_errors=True
-            )
-            
-            st.sidebar.success(f"🤖 Agent initialisé avec {len(tools)} outils")
-            
-        except Exception as e:
-            st.sidebar.error(f"❌ Erreur lors de l'initialisation de l'agent: {str(e)}")
+        return tools
     
-    def process_message(self, message: str) -> str:
-        """Traite les messages"""
+    def agent_palier(self, palier):
+        """
+        Agent sur le modèle, la longueur de réponse et le délai d'un palier du routeur (créé une fois).
+        Palier concis : consigne de réponse brève ajoutée au prompt de l'agent à appel de fonctions
+        (le prompt de l'agent ReAct est fixé par LangChain : seuls modèle, longueur et délai changent).
+        """
+        cle = (palier["modele"], palier["jetons_reponse"], palier["delai"], palier["tentatives"], palier["concis"])
+        if cle not in self.agents:
+            if MODE_AGENT == "outils":
+                self.agents[cle] = AgentOutils(
+                    client_openai_async().with_options(timeout=palier["delai"], max_retries=palier["tentatives"]),
+                    palier["modele"], self.outils, temperature=TEMPERATURE_AGENT, jetons_reponse=palier["jetons_reponse"],
+                    prompt_systeme=f"{PROMPT_SYSTEME} {CONSIGNE_CONCISE}" if palier["concis"] else PROMPT_SYSTEME
+                )
+            else:
+                # Streaming activé : les jetons de la réponse finale sont transmis au callback d'affichage
+                llm = chat_langchain(
+                    temperature=TEMPERATURE_AGENT, streaming=True, modele=palier["modele"],
+                    max_tokens=palier["jetons_reponse"], delai=palier["delai"], tentatives=palier["tentatives"]
+                )
+                self.agents[cle] = initialize_agent(
+                    tools=self.outils,
+                    llm=llm,
+                    agent=AgentType.CHAT_ZERO_SHOT_REACT_DESCRIPTION,
+                    verbose=True,
+                    memory=self.memory,
+                    handle_parsing_errors=True
+                )
+        return self.agents[cle]
+    
+    def process_message(self, message: str, zone, streaming: bool = True) -> str:
+        """
+        Traite les messages. L'agent s'exécute sur la boucle asynchrone partagée ; zone (st.empty())
+        affiche l'attente puis, si streaming, la réponse finale au fil de l'eau.
+        """
+        self.routage = None
+        if self.retriever_contexte:
+            # Mesures de contexte propres à ce message (l'agent n'interroge pas forcément les documents)
+            self.retriever_contexte.rapport = None
+        
+        # Question chiffrée couverte par les tableaux des rapports : réponse directe, sans appel au LLM
+        reponse_directe = obtenir_tableaux().repondre(message)
+        if reponse_directe:
+            if self.memory:
+                self.memory.save_context({"input": message}, {"output": reponse_directe})
+            return reponse_directe
+        
         if not self.agent:
             return "🤖 Agent non initialisé. Vérifiez la configuration (OpenAI API key et installation des dépendances)."
         
+        # L'index partagé a été ré-indexé depuis : reconstruire la chaîne ici (les appels st.* ne
+        # sont pas possibles depuis la boucle asynchrone)
+        if self.vector_store is not None and obtenir_service_index().version != self.version_index:
+            self.setup_rag()
+        
+        # Palier de modèle choisi avant l'appel ; un échec (délai, erreur de l'API) est rejoué sur le palier de repli
+        routeur = obtenir_routeur()
+        classement = routeur.choisir(message, documents=self.vector_store is not None)
+        
+        def executer_palier(nom_palier, palier):
+            agent = self.agent_palier(palier)
+            try:
+                reponse = obtenir_boucle().executer(
+                    self.session,
+                    lambda relais: self.traiter_message_async(message, relais if streaming else None, agent),
+                    zone,
+                    texte_attente="🤔 Réflexion..."
+                )
+            except concurrent.futures.CancelledError:
+                # Annulation par un nouveau message : pas de repli
+                reponse = None
+            return {"reponse": reponse, "agent": agent}
+        
         try:
-            response = self.agent.run(input=message)
-            return response
+            resultat, nom_palier = routeur.executer(classement, executer_palier)
         except Exception as e:
             return f"❌ Erreur: {str(e)}"
+        if resultat["reponse"] is None:
+            return "⏹️ Requête annulée : un nouveau message a été envoyé."
+        self.routage = {"classement": classement, "palier": nom_palier, "agent": resultat["agent"]}
+        return resultat["reponse"]
+    
+    async def traiter_message_async(self, message: str, relais=None, agent=None) -> str:
+        """Exécution de l'agent (celui du palier choisi) sur la boucle asynchrone (LLM, retriever et outils asynchrones)"""
+        agent = agent or self.agent
+        if isinstance(agent, AgentOutils):
+            # Même mémoire bornée que l'agent ReAct : résumé + derniers messages de la session
+            memoire = obtenir_memoire()
+            resume, fenetre = memoire.contexte(self.session)
+            historique = [{"role": "system", "content": f"Résumé de la conversation : {resume}"}] if resume else []
+            historique += [{"role": role, "content": contenu} for role, contenu in fenetre]
+            reponse = await agent.executer(message, historique, relais)
+            await asyncio.to_thread(memoire.ajouter_echange, self.session, message, reponse)
+            return reponse
+        
+        callbacks = [GestionnaireFluxAgent(relais)] if relais is not None else []
+        return await agent.arun(input=message, callbacks=callbacks)
 
 # =============================================================================
 # APPLICATION STREAMLIT
@@ -542,6 +811,29 @@ def main():
             st.success("✅ Agent actif")
         else:
             st.error("❌ Agent non initialisé")
+        st.caption(f"⚙️ {obtenir_boucle().requetes_en_cours()} requête(s) de l'agent en cours (toutes sessions)")
+        stats_paliers = {nom: stats for nom, stats in obtenir_routeur().statistiques().items() if stats["appels"]}
+        if stats_paliers:
+            st.caption("🧭 Routage : " + " · ".join(
+                f"{nom} {stats['appels']} appel(s)"
+                + (f", p50 {stats['p50']:.1f} s" if stats["p50"] is not None else "")
+                + (f", {stats['erreurs']} erreur(s)" if stats["erreurs"] else "")
+                + (f", {stats['replis']} repli(s)" if stats["replis"] else "")
+                for nom, stats in stats_paliers.items()
+            ))
+        
+        service = obtenir_service_index()
+        empreinte = service.empreinte_memoire()
+        if empreinte["vecteurs"]:
+            st.caption(
+                f"🧠 Index partagé v{service.version} : {empreinte['vecteurs']} vecteurs "
+                f"× {empreinte['dimension']} dim, ~{empreinte['octets'] / 1024 / 1024:.1f} Mo"
+            )
+        if HAS_LANGCHAIN and os.getenv("OPENAI_API_KEY") and st.button("📚 Ré-indexer les documents"):
+            with st.spinner("Ré-indexation en cours..."):
+                service.reconstruire(st.session_state.assistant.construire_vector_store)
+        
+        streaming = st.checkbox("⚡ Afficher la réponse au fil de l'eau", value=True)
         
         st.header("🛠️ Outils Disponibles")
         st.write("• 🧮 Calculatrice")
@@ -563,6 +855,7 @@ def main():
         st.code("Voir calendrier")
         
         if st.button("🔄 Redémarrer"):
+            obtenir_memoire().effacer(identifiant_session())
             for key in list(st.session_state.keys()):
                 del st.session_state[key]
             st.rerun()
@@ -591,9 +884,32 @@ def main():
             st.markdown(prompt)
             
         with st.chat_message("assistant"):
-            with st.spinner("🤔 Réflexion..."):
-                response = st.session_state.assistant.process_message(prompt)
-                st.markdown(response)
+            # Affiche l'attente puis, en streaming, la réponse finale dès son premier jeton
+            zone = st.empty()
+            response = st.session_state.assistant.process_message(prompt, zone, streaming=streaming)
+            zone.markdown(response)
+            routage = st.session_state.assistant.routage
+            if routage:
+                classement = routage["classement"]
+                st.caption(
+                    f"🧭 Palier {routage['palier']} ({obtenir_routeur().paliers[routage['palier']]['modele']}) : "
+                    + ", ".join(classement["motifs"])
+                    + (f" · repli après échec du palier {classement['palier']}"
+                       if routage["palier"] != classement["palier"] else "")
+                )
+            agent = routage["agent"] if routage else None
+            if isinstance(agent, AgentOutils) and agent.mesures:
+                st.caption(
+                    f"🔁 {agent.mesures['tours']} aller(s)-retour(s) LLM, {agent.mesures['appels_outils']} appel(s) d'outils, "
+                    f"{agent.mesures['jetons_prompt'] + agent.mesures['jetons_reponse']} jetons"
+                )
+            retriever_contexte = st.session_state.assistant.retriever_contexte
+            if retriever_contexte and retriever_contexte.rapport:
+                rapport = retriever_contexte.rapport
+                st.caption(
+                    f"🧩 Contexte : {rapport['jetons_envoyes']} jetons envoyés ({rapport['passages']} passage(s)), "
+                    f"{rapport['jetons_economises']} économisés sur {rapport['jetons_bruts']}"
+                )
         
         st.session_state.messages.append({"role": "assistant", "content": response})
 
@@ -0,0 +1,163 @@
+"""
+Pipeline d'ingestion parallèle et en flux des documents.
+
+    processus (analyse des fichiers) -> file bornée de pages -> découpage -> lots -> vectorisation
+
+Un pool de processus analyse les fichiers, les pages transitent par une file
+bornée jusqu'au découpage, et les fragments sont envoyés par lots à la
+vectorisation. Le nombre de fichiers en cours et la taille de la file sont
+limités : la mémoire reste bornée quelle que soit la taille du corpus. Une
+erreur sur un fichier est consignée sans interrompre les autres.
+"""
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+EXTENSIONS_SUPPORTEES = (".pdf", ".docx", ".txt", ".md")
+
+_FIN = object()
+
+# ============================================================================
+# ANALYSE D'UN FICHIER (exécutée dans un processus du pool)
+# ============================================================================
+
+def analyser_fichier(chemin):
+    """Analyse un fichier et retourne ses pages (Documents LangChain)"""
+    try:
+        from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+    except ImportError:
+        from langchain.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader
+
+    if chemin.endswith(".pdf"):
+        loader = PyPDFLoader(chemin)
+    elif chemin.endswith(".docx"):
+        loader = Docx2txtLoader(chemin)
+    elif chemin.endswith((".txt", ".md")):
+        loader = TextLoader(chemin, encoding="utf-8")
+    else:
+        raise ValueError(f"Format non supporté: {os.path.basename(chemin)}")
+    return loader.load()
+
+
+def lister_documents(documents_path="documents"):
+    """Sépare les fichiers du dossier en (supportés, non supportés)"""
+    supportes, non_supportes = [], []
+    for fichier in sorted(os.listdir(documents_path)):
+        chemin = os.path.join(documents_path, fichier)
+        if not os.path.isfile(chemin):
+            continue
+        (supportes if fichier.endswith(EXTENSIONS_SUPPORTEES) else non_supportes).append(chemin)
+    return supportes, non_supportes
+
+# ============================================================================
+# PIPELINE
+# ============================================================================
+
+def _produire_pages(chemins, nb_processus, file_pages, arret, echec):
+    """
+    Soumet les fichiers au pool (au plus 2 par processus en cours) et pousse les pages dans la file.
+    _FIN est toujours envoyé ; une exception hors analyse d'un fichier (pool cassé…) est gardée dans echec.
+    """
+    try:
+        _soumettre_fichiers(chemins, nb_processus, file_pages, arret)
+    except BaseException as e:
+        echec.append(e)
+    finally:
+        file_pages.put(_FIN)
+
+
+def _soumettre_fichiers(chemins, nb_processus, file_pages, arret):
+    en_attente = list(reversed(chemins))
+    en_cours = {}
+
+    with ProcessPoolExecutor(max_workers=nb_processus) as pool:
+        while (en_attente or en_cours) and not arret.is_set():
+            while en_attente and len(en_cours) < 2 * nb_processus:
+                chemin = en_attente.pop()
+                en_cours[pool.submit(analyser_fichier, chemin)] = chemin
+
+            termines, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+            for future in termines:
+                chemin = en_cours.pop(future)
+                try:
+                    pages = future.result()
+                except Exception as e:
+                    file_pages.put(("fichier", chemin, str(e)))
+                    continue
+                for page in pages:
+                    # Bloque quand la file est pleine : le découpage impose son rythme
+                    file_pages.put(("page", chemin, page))
+                file_pages.put(("fichier", chemin, None))
+
+        if arret.is_set():
+            for future in en_cours:
+                future.cancel()
+
+
+def executer_pipeline(chemins, decouper, traiter_lot, taille_lot=64, nb_processus=None,
+                      taille_file=256, progression=None):
+    """
+    Analyse les fichiers en parallèle et transmet les fragments par lots.
+
+    decouper(pages) -> fragments ; traiter_lot(fragments) est appelé dans le thread appelant.
+    progression(fichiers_traites, total, chemin, erreur) est appelée après chaque fichier.
+    Retourne un rapport {fichiers, pages, fragments, erreurs, duree}.
+    """
+    debut = time.perf_counter()
+    nb_processus = nb_processus or os.cpu_count() or 1
+    nb_processus = max(1, min(nb_processus, len(chemins)))
+    rapport = {"fichiers": 0, "pages": 0, "fragments": 0, "erreurs": {}, "duree": 0.0}
+    if not chemins:
+        return rapport
+
+    file_pages = queue.Queue(maxsize=taille_file)
+    arret = threading.Event()
+    echec = []
+    producteur = threading.Thread(
+        target=_produire_pages, args=(chemins, nb_processus, file_pages, arret, echec), daemon=True
+    )
+    producteur.start()
+
+    lot = []
+    try:
+        while True:
+            element = file_pages.get()
+            if element is _FIN:
+                if echec:
+                    # Le producteur s'est arrêté avant la fin : l'erreur remonte à l'appelant
+                    raise echec[0]
+                break
+            nature, chemin, contenu = element
+
+            if nature == "page":
+                rapport["pages"] += 1
+                lot.extend(decouper([contenu]))
+                if len(lot) >= taille_lot:
+                    traiter_lot(lot)
+                    rapport["fragments"] += len(lot)
+                    lot = []
+            else:
+                rapport["fichiers"] += 1
+                if contenu is not None:
+                    rapport["erreurs"][chemin] = contenu
+                if progression:
+                    progression(rapport["fichiers"], len(chemins), chemin, contenu)
+
+        if lot:
+            traiter_lot(lot)
+            rapport["fragments"] += len(lot)
+    finally:
+        # En cas d'erreur côté vectorisation, libérer le producteur bloqué sur la file pleine
+        arret.set()
+        while producteur.is_alive():
+            try:
+                file_pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        producteur.join()
+
+    rapport["duree"] = time.perf_counter() - debut
+    return rapport
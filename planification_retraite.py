@@ -0,0 +1,199 @@
+"""
+Planification de retraite stochastique : épargne puis retraits, sur de nombreuses trajectoires.
+
+agent_planificateur_retraite capitalisait l'épargne à 5 % fixes et comparait
+le résultat à « 20 fois le revenu souhaité » : aucune place pour la
+volatilité ni pour l'ordre des rendements, qui décide pourtant de la ruine
+une fois les retraits commencés (une baisse en début de retraite pèse bien
+plus qu'en fin). Ici :
+  - chaque trajectoire enchaîne la phase d'épargne (apport mensuel) et la
+    phase de retraits (complément de revenu mensuel) jusqu'à AGE_FIN ; les
+    montants sont en euros d'aujourd'hui (rendement réel, net d'inflation) ;
+  - les rendements mensuels sont ceux du simulateur d'investissement
+    (simulation_investissement.tirer_rendements : normale, Student,
+    bootstrap), tirés par blocs de taille bornée en mémoire ;
+  - probabilité de ruine : part des trajectoires dont le capital s'épuise
+    avant AGE_FIN ;
+  - taux de retrait sûr : avec G_k le facteur de croissance cumulé depuis le
+    départ, une trajectoire supporte un retrait mensuel W tant que
+    W × Σ_k 1/G_k ≤ capital au départ. Le taux soutenable de chaque
+    trajectoire s'obtient donc en une passe, sans recherche ; le taux sûr est
+    celui que supportent (1 − RETRAITE_MAX_RUIN) des trajectoires ;
+  - le balayage de sensibilité (âge de départ × taux d'épargne) est calculé
+    dans la même passe que le scénario principal : tous les scénarios
+    partagent les mêmes rendements (écarts entre cases dus aux paramètres,
+    pas au tirage) et avancent d'un mois en une opération vectorielle
+    (scénarios × trajectoires).
+
+Configuration (variables d'environnement, lues au premier import) :
+  RETRAITE_PATHS     trajectoires simulées par défaut (10000)
+  RETRAITE_END_AGE   âge jusqu'auquel le capital doit durer (95)
+  RETRAITE_MAX_RUIN  probabilité de ruine tolérée pour le taux de retrait sûr (0.05)
+"""
+
+import os
+import re
+import time
+
+import numpy as np
+
+from simulation_investissement import MEMOIRE_BLOC_MO, PERCENTILES, montants, taille_bloc, tirer_rendements
+
+CHEMINS = int(os.getenv("RETRAITE_PATHS", "10000"))
+AGE_FIN = int(os.getenv("RETRAITE_END_AGE", "95"))
+RUINE_MAX = float(os.getenv("RETRAITE_MAX_RUIN", "0.05"))
+
+# ============================================================================
+# PARAMÈTRES D'UNE QUESTION
+# ============================================================================
+
+_AGE_ACTUEL = re.compile(r"(?:j'ai|j’ai|âgée?\s+de)\s*(\d{2})\s*ans\b", re.IGNORECASE)
+_AGE_RETRAITE = re.compile(r"\bà\s*(\d{2})\s*ans\b", re.IGNORECASE)
+_REVENU = re.compile(r"(?:revenu|salaire|gagne)\w*\D{0,20}$", re.IGNORECASE)
+_TAUX = re.compile(r"(\d+(?:[.,]\d+)?)\s*%")
+
+
+def parametres_retraite(question, age_actuel=40, age_retraite=65, epargne_actuelle=50000.0, revenu=50000.0,
+                        taux_epargne=20.0, rendement=5.0, pension=0.0):
+    """
+    Paramètres lus dans la question, valeurs par défaut sinon (taux en %) :
+    {'age_actuel', 'age_retraite', 'epargne_actuelle', 'revenu', 'taux_epargne', 'rendement', 'pension'}.
+    « j'ai 45 ans » ; « à 62 ans » : départ ; « salaire de 40000€ » : revenu annuel ;
+    « 200€ par mois » : épargne mensuelle ; autre montant : épargne actuelle ; « 6% » : rendement.
+    """
+    parametres = {"age_actuel": age_actuel, "age_retraite": age_retraite, "epargne_actuelle": epargne_actuelle,
+                  "revenu": revenu, "taux_epargne": taux_epargne, "rendement": rendement, "pension": pension}
+    actuel = _AGE_ACTUEL.search(question)
+    if actuel:
+        parametres["age_actuel"] = int(actuel.group(1))
+    for depart in _AGE_RETRAITE.finditer(question):
+        if not actuel or depart.start(1) != actuel.start(1):
+            parametres["age_retraite"] = int(depart.group(1))
+            break
+
+    epargne_mensuelle, capital_lu = None, False
+    for montant in montants(question):
+        if montant["mensuel"]:
+            epargne_mensuelle = montant["valeur"]
+        elif _REVENU.search(question[:montant["debut"]]):
+            parametres["revenu"] = montant["valeur"]
+        elif not capital_lu:
+            parametres["epargne_actuelle"], capital_lu = montant["valeur"], True
+    if epargne_mensuelle is not None and parametres["revenu"] > 0:
+        parametres["taux_epargne"] = round(epargne_mensuelle * 12 / parametres["revenu"] * 100, 1)
+    taux = _TAUX.search(question)
+    if taux:
+        parametres["rendement"] = float(taux.group(1).replace(",", "."))
+    return parametres
+
+# ============================================================================
+# SIMULATION
+# ============================================================================
+
+def grille_sensibilite(age_actuel, age_retraite, taux_epargne, age_fin=AGE_FIN):
+    """Âges de départ (± 4 ans par pas de 2) et taux d'épargne en % (± 10 points par pas de 5) autour du scénario"""
+    ages = sorted({min(max(age_retraite + ecart, age_actuel), age_fin - 1) for ecart in (-4, -2, 0, 2, 4)})
+    taux = sorted({max(taux_epargne + ecart, 0.0) for ecart in (-10, -5, 0, 5, 10)})
+    return ages, taux
+
+
+def _simuler_bloc(generateur, chemins, mois, loi, rendement_reel, volatilite, historique,
+                  capital, flux, departs, departs_distincts, dates):
+    """
+    Un bloc de trajectoires pour tous les scénarios (colonnes de flux) :
+    capital final par scénario, capital annuel et au départ du scénario principal (colonne 0),
+    somme des facteurs d'actualisation par âge de départ distinct.
+    """
+    rendements = tirer_rendements(generateur, mois, chemins, loi, rendement_reel, volatilite, historique)
+    valeurs = np.full((flux.shape[1], chemins), capital, dtype=np.float32)
+    actualisation = np.ones((len(departs_distincts), chemins), dtype=np.float32)
+    retraits = np.zeros((len(departs_distincts), chemins), dtype=np.float32)
+    annuelles = np.empty((len(dates), chemins), dtype=np.float32)
+    au_depart = np.full(chemins, capital, dtype=np.float32)
+    rang = 0
+    for mois_courant, rendement in enumerate(rendements, start=1):
+        croissance = rendement + np.float32(1)
+        valeurs *= croissance
+        valeurs += flux[mois_courant - 1][:, None]
+        # Capital épuisé : il reste à zéro (aucun retrait ne le fait repartir)
+        np.maximum(valeurs, 0, out=valeurs)
+        # Âges de départ triés : ceux déjà en retraite forment un préfixe
+        en_retraite = np.searchsorted(departs_distincts, mois_courant, side="left")
+        if en_retraite:
+            actualisation[:en_retraite] /= croissance
+            retraits[:en_retraite] += actualisation[:en_retraite]
+        if mois_courant == departs[0]:
+            au_depart = valeurs[0].copy()
+        if rang < len(dates) and mois_courant == dates[rang]:
+            annuelles[rang] = valeurs[0]
+            rang += 1
+    return valeurs, annuelles, au_depart, retraits
+
+
+def simuler_retraite(age_actuel, age_retraite, epargne_actuelle, revenu, taux_epargne, rendement_annuel,
+                     volatilite, pension=0.0, taux_remplacement=0.7, inflation=0.02, age_fin=AGE_FIN,
+                     loi="normale", historique=None, ages_balayage=(), taux_balayage=(), chemins=CHEMINS,
+                     percentiles=PERCENTILES, graine=0, memoire_mo=MEMOIRE_BLOC_MO):
+    """
+    Accumulation puis décumulation, en euros d'aujourd'hui (taux en fractions, montants annuels).
+    Retrait annuel : revenu × taux_remplacement − pension. Le balayage croise ages_balayage et
+    taux_balayage (fractions) avec les mêmes rendements que le scénario principal.
+    Retourne {'ages', 'bandes' {percentile: capital par âge}, 'capital_retraite', 'capital_final'
+    {percentile: valeur}, 'probabilite_ruine', 'taux_retrait_sur', 'retrait_annuel', 'balayage'
+    {'ages', 'taux', 'probabilite_ruine' (âges × taux), 'taux_retrait_sur' par âge}, 'chemins', 'duree'}.
+    """
+    if not age_actuel <= age_retraite < age_fin:
+        raise ValueError("Il faut âge actuel ≤ âge de départ < âge de fin de simulation")
+    if loi == "bootstrap" and (historique is None or len(historique) == 0):
+        raise ValueError("Le bootstrap demande des rendements historiques")
+    debut = time.perf_counter()
+    mois = (age_fin - age_actuel) * 12
+    retrait_annuel = max(revenu * taux_remplacement - pension, 0.0)
+    # Rendement réel : la croissance du capital au-delà de l'inflation
+    rendement_reel = (1 + rendement_annuel) / (1 + inflation) - 1
+
+    # Scénario principal puis chaque case du balayage : (mois de départ, apport mensuel)
+    scenarios = [(age_retraite, taux_epargne)] + [(age, taux) for age in ages_balayage for taux in taux_balayage]
+    departs = np.array([(age - age_actuel) * 12 for age, _ in scenarios])
+    if departs.min() < 0 or departs.max() >= mois:
+        raise ValueError("Âges du balayage hors de l'intervalle âge actuel – âge de fin")
+    numeros = np.arange(1, mois + 1)[:, None]
+    flux = np.where(numeros <= departs, np.array([taux * revenu / 12 for _, taux in scenarios]),
+                    -retrait_annuel / 12).astype(np.float32)
+    departs_distincts = np.unique(departs)
+    dates = np.arange(12, mois + 1, 12)
+
+    par_bloc = taille_bloc(mois, memoire_mo)
+    resultats = [
+        _simuler_bloc(np.random.default_rng(graine_bloc), min(par_bloc, chemins - depart), mois, loi,
+                      rendement_reel, volatilite, historique, epargne_actuelle, flux, departs,
+                      departs_distincts, dates)
+        for depart, graine_bloc in zip(range(0, chemins, par_bloc),
+                                       np.random.SeedSequence(graine).spawn(-(-chemins // par_bloc)))
+    ]
+    finales, annuelles, au_depart, retraits = (np.concatenate(partie, axis=-1) for partie in zip(*resultats))
+
+    ruine = (finales <= 0).mean(axis=1)
+    # Taux soutenable par trajectoire (retrait annuel / capital au départ), puis quantile RUINE_MAX
+    taux_surs = np.percentile(12 / retraits, RUINE_MAX * 100, axis=1)
+    taux_par_depart = dict(zip(departs_distincts.tolist(), taux_surs.tolist()))
+    percentiles = list(percentiles)
+    return {
+        "ages": np.arange(age_actuel, age_fin + 1),
+        "bandes": dict(zip(percentiles, np.concatenate(
+            [np.full((len(percentiles), 1), epargne_actuelle), np.percentile(annuelles, percentiles, axis=1)],
+            axis=1))),
+        "capital_retraite": dict(zip(percentiles, np.percentile(au_depart, percentiles).tolist())),
+        "capital_final": dict(zip(percentiles, np.percentile(finales[0], percentiles).tolist())),
+        "probabilite_ruine": float(ruine[0]),
+        "taux_retrait_sur": taux_par_depart[departs[0]],
+        "retrait_annuel": retrait_annuel,
+        "balayage": {
+            "ages": list(ages_balayage),
+            "taux": list(taux_balayage),
+            "probabilite_ruine": ruine[1:].reshape(len(ages_balayage), len(taux_balayage)).tolist(),
+            "taux_retrait_sur": [taux_par_depart[(age - age_actuel) * 12] for age in ages_balayage],
+        },
+        "chemins": chemins,
+        "duree": time.perf_counter() - debut,
+    }
@@ -0,0 +1,231 @@
+"""
+Recherche hybride : BM25 (mots exacts) + similarité vectorielle, fusion RRF.
+
+Les questions sur les rapports contiennent des jetons exacts (noms de
+sociétés, « T1 2024 », montants) que la recherche dense seule rate souvent.
+Un index inversé BM25 est construit en mémoire à côté de l'index vectoriel,
+avec une tokenisation française insensible aux accents, et les deux
+classements sont fusionnés par Reciprocal Rank Fusion.
+"""
+
+import re
+import math
+import weakref
+import unicodedata
+from typing import Any
+from collections import Counter, defaultdict
+
+from indexation import identifiant_fragment
+
+MOTS_VIDES = frozenset("""
+a au aux avec ce ces dans de des du elle en et eux il je la le les leur lui ma mais me meme mes moi mon
+ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre vous
+c d j l m n s t y est sont ete etre avoir quel quelle quels quelles comment combien
+""".split())
+
+_JETON = re.compile(r"\d+(?:[.,]\d+)*|[a-z0-9]+")
+
+# ============================================================================
+# TOKENISATION
+# ============================================================================
+
+class _TableNormalisation(dict):
+    """Caractère -> minuscule sans accent, calculé à la première rencontre de chaque caractère"""
+
+    def __missing__(self, code):
+        decompose = unicodedata.normalize("NFKD", chr(code).lower())
+        self[code] = "".join(c for c in decompose if not unicodedata.combining(c))
+        return self[code]
+
+
+_TABLE_NORMALISATION = _TableNormalisation()
+
+
+def normaliser(texte):
+    """Minuscules sans accents ('Frères' -> 'freres')"""
+    # str.translate parcourt le texte en C ; la table ne grandit qu'avec l'alphabet rencontré
+    return texte.translate(_TABLE_NORMALISATION)
+
+
+def tokeniser(texte):
+    """Jetons normalisés (les décimales '18,3' et '18.3' sont unifiées), sans mots vides"""
+    return [
+        jeton.replace(",", ".")
+        for jeton in _JETON.findall(normaliser(texte))
+        if jeton not in MOTS_VIDES
+    ]
+
+# ============================================================================
+# INDEX BM25
+# ============================================================================
+
+class IndexBM25:
+    """Index inversé BM25 en mémoire"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)
+        self.termes = {}
+        self.longueurs = {}
+        self.contenus = {}
+        self.longueur_totale = 0
+
+    def __len__(self):
+        return len(self.longueurs)
+
+    def ajouter(self, doc_id, texte, contenu=None):
+        """Indexe un texte ; contenu est l'objet renvoyé par la recherche (nœud, Document...)"""
+        if doc_id in self.longueurs:
+            self.supprimer(doc_id)
+        frequences = Counter(tokeniser(texte))
+        for terme, tf in frequences.items():
+            self.postings[terme][doc_id] = tf
+        self.termes[doc_id] = list(frequences)
+        longueur = sum(frequences.values())
+        self.longueurs[doc_id] = longueur
+        self.longueur_totale += longueur
+        self.contenus[doc_id] = contenu
+
+    def supprimer(self, doc_id):
+        longueur = self.longueurs.pop(doc_id, None)
+        if longueur is None:
+            return
+        self.longueur_totale -= longueur
+        self.contenus.pop(doc_id, None)
+        for terme in self.termes.pop(doc_id, []):
+            documents = self.postings[terme]
+            documents.pop(doc_id, None)
+            if not documents:
+                del self.postings[terme]
+
+    def rechercher(self, requete, k=10):
+        """Retourne [(doc_id, score)] par score BM25 décroissant"""
+        n = len(self.longueurs)
+        if not n:
+            return []
+        longueur_moyenne = self.longueur_totale / n
+        scores = defaultdict(float)
+        for terme in set(tokeniser(requete)):
+            documents = self.postings.get(terme)
+            if not documents:
+                continue
+            idf = math.log(1 + (n - len(documents) + 0.5) / (len(documents) + 0.5))
+            for doc_id, tf in documents.items():
+                normalisation = self.k1 * (1 - self.b + self.b * self.longueurs[doc_id] / longueur_moyenne)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + normalisation)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def fusion_rrf(classements, k=60):
+    """Reciprocal Rank Fusion de plusieurs listes d'identifiants ordonnées"""
+    scores = defaultdict(float)
+    for classement in classements:
+        for rang, doc_id in enumerate(classement):
+            scores[doc_id] += 1.0 / (k + rang + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+# ============================================================================
+# INDEX BM25 ASSOCIÉ À CHAQUE INDEX VECTORIEL
+# ============================================================================
+
+# Un index BM25 par objet index / vector store : il disparaît avec lui après un échange
+_INDEX_BM25 = weakref.WeakKeyDictionary()
+
+
+def associer_bm25(index_vectoriel, bm25):
+    _INDEX_BM25[index_vectoriel] = bm25
+    return bm25
+
+
+def bm25_associe(index_vectoriel):
+    return _INDEX_BM25.get(index_vectoriel)
+
+
+def construire_bm25_llamaindex(index):
+    """Construit l'index BM25 des nœuds d'un index LlamaIndex"""
+    bm25 = IndexBM25()
+    for node_id, node in index.docstore.docs.items():
+        bm25.ajouter(node_id, node.get_content(), node)
+    return associer_bm25(index, bm25)
+
+
+def cle_document(document):
+    """Identifiant commun aux résultats denses et BM25 d'un Document LangChain"""
+    return identifiant_fragment(
+        document.metadata.get("source", ""),
+        document.metadata.get("page", 0),
+        document.metadata.get("start_index", 0),
+        document.page_content,
+    )
+
+# ============================================================================
+# RETRIEVER LLAMAINDEX
+# ============================================================================
+
+try:
+    from llama_index.core.retrievers import BaseRetriever as _BaseRetrieverLlamaIndex
+    from llama_index.core.schema import NodeWithScore
+
+    class RetrieverHybride(_BaseRetrieverLlamaIndex):
+        """Retriever LlamaIndex : vecteurs + BM25 fusionnés par RRF"""
+
+        def __init__(self, index, top_k=3, candidats=10, **kwargs):
+            super().__init__(**kwargs)
+            self._retriever_dense = index.as_retriever(similarity_top_k=candidats)
+            self._bm25 = bm25_associe(index) or construire_bm25_llamaindex(index)
+            self._docstore = index.docstore
+            self._top_k = top_k
+            self._candidats = candidats
+
+        def _retrieve(self, query_bundle):
+            denses = self._retriever_dense.retrieve(query_bundle)
+            noeuds = {resultat.node.node_id: resultat.node for resultat in denses}
+            lexicaux = self._bm25.rechercher(query_bundle.query_str, self._candidats)
+            for node_id, _ in lexicaux:
+                if node_id not in noeuds:
+                    noeuds[node_id] = self._bm25.contenus.get(node_id) or self._docstore.get_node(node_id)
+
+            fusion = fusion_rrf([
+                [resultat.node.node_id for resultat in denses],
+                [node_id for node_id, _ in lexicaux],
+            ])
+            return [NodeWithScore(node=noeuds[node_id], score=score) for node_id, score in fusion[:self._top_k]]
+
+except ImportError:
+    pass
+
+# ============================================================================
+# RETRIEVER LANGCHAIN
+# ============================================================================
+
+try:
+    try:
+        from langchain_core.retrievers import BaseRetriever as _BaseRetrieverLangChain
+    except ImportError:
+        from langchain.schema import BaseRetriever as _BaseRetrieverLangChain
+
+    class RetrieverHybrideLangChain(_BaseRetrieverLangChain):
+        """Retriever LangChain : vector store + BM25 fusionnés par RRF"""
+
+        vector_store: Any
+        bm25: Any
+        k: int = 3
+        candidats: int = 10
+
+        class Config:
+            arbitrary_types_allowed = True
+
+        def _get_relevant_documents(self, query, *, run_manager=None):
+            denses = self.vector_store.similarity_search(query, k=self.candidats)
+            cles_denses = [cle_document(doc) for doc in denses]
+            documents = dict(zip(cles_denses, denses))
+            lexicaux = self.bm25.rechercher(query, self.candidats)
+            for doc_id, _ in lexicaux:
+                documents.setdefault(doc_id, self.bm25.contenus[doc_id])
+
+            fusion = fusion_rrf([cles_denses, [doc_id for doc_id, _ in lexicaux]])
+            return [documents[doc_id] for doc_id, _ in fusion[:self.k]]
+
+except ImportError:
+    pass
@@ -0,0 +1,572 @@
+"""
+Enregistrement et rejeu des appels OpenAI et de la recherche web ; backends factices.
+
+Tous les clients de clients_llm.py (SDK openai, LlamaIndex, LangChain)
+passent par le même client HTTP : un transport inséré dans ce client voit
+chaque requête de chat (streaming compris) et d'embedding, quelle que soit la
+bibliothèque appelante (openai 1.x, dont le client HTTP est un client httpx).
+  - enregistrer : les requêtes partent vers l'API et les réponses sont
+    écrites dans une cassette (fichier JSON) ;
+  - rejouer : les réponses sont lues dans la cassette, sans réseau ; une
+    requête absente renvoie une erreur 404 explicite ;
+  - factice : réponses déterministes calculées localement (texte dérivé de
+    la question, appels d'outils selon des mots-clés, embeddings par hachage
+    des mots), avec une latence simulée.
+La recherche web (Tavily) est enveloppée de la même façon. Les appels et les
+jetons (usage des réponses) sont comptés par nature : voir releve().
+
+Configuration (variables d'environnement, lues au premier import) :
+  LLM_REPLAY_MODE        'enregistrer', 'rejouer' ou 'factice' (désactivé si vide)
+  LLM_CASSETTE           fichier de la cassette (benchmarks/cassettes/defaut.json)
+  LLM_REPLAY_DELAYS      1 : le rejeu respecte la durée enregistrée de chaque appel
+  LLM_FAKE_LATENCY_MS    latence d'un appel de chat factice (0)
+  LLM_FAKE_EMBEDDING_LATENCY_MS / LLM_FAKE_SEARCH_LATENCY_MS
+"""
+
+import os
+import re
+import json
+import time
+import zlib
+import base64
+import asyncio
+import hashlib
+import inspect
+import threading
+
+import httpx
+import numpy as np
+import openai
+
+from comptage_jetons import compter_jetons, tronquer_jetons
+
+MODE_REJEU = os.getenv("LLM_REPLAY_MODE", "").lower()
+CHEMIN_CASSETTE = os.getenv("LLM_CASSETTE", os.path.join("benchmarks", "cassettes", "defaut.json"))
+RESPECTER_DELAIS = os.getenv("LLM_REPLAY_DELAYS", "0") == "1"
+LATENCE_CHAT = float(os.getenv("LLM_FAKE_LATENCY_MS", "0")) / 1000
+LATENCE_EMBEDDING = float(os.getenv("LLM_FAKE_EMBEDDING_LATENCY_MS", "0")) / 1000
+LATENCE_RECHERCHE = float(os.getenv("LLM_FAKE_SEARCH_LATENCY_MS", "0")) / 1000
+DIMENSION_FACTICE = 1536
+
+# En-têtes de transport qui ne décrivent plus le corps une fois celui-ci décodé
+_ENTETES_IGNORES = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+_MOTS = re.compile(r"\w+")
+
+# ============================================================================
+# MESURES
+# ============================================================================
+
+_verrou_mesures = threading.Lock()
+_mesures = {}
+
+
+def _comptabiliser(nature, duree, jetons_prompt=0, jetons_reponse=0):
+    with _verrou_mesures:
+        mesure = _mesures.setdefault(
+            nature, {"appels": 0, "jetons_prompt": 0, "jetons_reponse": 0, "duree": 0.0}
+        )
+        mesure["appels"] += 1
+        mesure["jetons_prompt"] += jetons_prompt
+        mesure["jetons_reponse"] += jetons_reponse
+        mesure["duree"] += duree
+
+
+def releve():
+    """Copie des compteurs : {nature: {appels, jetons_prompt, jetons_reponse, duree}}"""
+    with _verrou_mesures:
+        return {nature: dict(mesure) for nature, mesure in _mesures.items()}
+
+
+def _nature(chemin):
+    if chemin.endswith("/chat/completions"):
+        return "chat"
+    if chemin.endswith("/embeddings"):
+        return "embeddings"
+    return "autre"
+
+
+def _usage(contenu):
+    """Usage d'une réponse JSON ou du dernier fragment d'un flux SSE qui en porte un"""
+    texte = contenu.decode("utf-8", errors="replace")
+    if texte.lstrip().startswith("{"):
+        try:
+            return json.loads(texte).get("usage") or {}
+        except ValueError:
+            return {}
+    usage = {}
+    for ligne in texte.splitlines():
+        if ligne.startswith("data: {"):
+            try:
+                usage = json.loads(ligne[6:]).get("usage") or usage
+            except ValueError:
+                pass
+    return usage
+
+
+def _usage_estime(requete, contenu):
+    """Flux sans usage (stream_options absent) : jetons des messages envoyés et du texte reçu"""
+    try:
+        messages = json.loads(requete or b"{}").get("messages", [])
+    except ValueError:
+        messages = []
+    recu = []
+    for ligne in contenu.decode("utf-8", errors="replace").splitlines():
+        if ligne.startswith("data: {"):
+            try:
+                for choix in json.loads(ligne[6:]).get("choices") or []:
+                    recu.append((choix.get("delta") or {}).get("content") or "")
+            except ValueError:
+                pass
+    return {
+        "prompt_tokens": sum(4 + compter_jetons(_texte(m.get("content"))) for m in messages),
+        "completion_tokens": compter_jetons("".join(recu)),
+    }
+
+
+def _comptabiliser_reponse(chemin, requete, contenu, duree):
+    usage = _usage(contenu)
+    if not usage and _nature(chemin) == "chat":
+        usage = _usage_estime(requete, contenu)
+    _comptabiliser(
+        _nature(chemin), duree,
+        usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+    )
+
+# ============================================================================
+# CASSETTE
+# ============================================================================
+
+class ErreurCassette(LookupError):
+    """Appel absent de la cassette en mode rejeu"""
+
+
+def cle_requete(nature, contenu):
+    """Empreinte stable d'une requête : le JSON est normalisé (ordre des clés)"""
+    if isinstance(contenu, (bytes, str)):
+        try:
+            contenu = json.loads(contenu or "null")
+        except ValueError:
+            contenu = contenu.decode("utf-8", errors="replace") if isinstance(contenu, bytes) else contenu
+    normalise = json.dumps(contenu, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{nature}\n{normalise}".encode("utf-8")).hexdigest()[:32]
+
+
+class Cassette:
+    """Réponses enregistrées, indexées par empreinte de requête (fichier JSON)"""
+
+    def __init__(self, chemin=CHEMIN_CASSETTE):
+        self.chemin = chemin
+        self._verrou = threading.Lock()
+        self._interactions = {}
+        if os.path.exists(chemin):
+            with open(chemin, encoding="utf-8") as fichier:
+                self._interactions = json.load(fichier).get("interactions", {})
+
+    def __len__(self):
+        return len(self._interactions)
+
+    def lire(self, cle):
+        with self._verrou:
+            interaction = self._interactions.get(cle)
+        if interaction is None:
+            raise ErreurCassette(
+                f"Appel absent de la cassette {self.chemin} ({cle}) : "
+                "enregistrez-le avec LLM_REPLAY_MODE=enregistrer"
+            )
+        return interaction
+
+    def ecrire(self, cle, interaction):
+        with self._verrou:
+            self._interactions[cle] = interaction
+            dossier = os.path.dirname(self.chemin)
+            if dossier:
+                os.makedirs(dossier, exist_ok=True)
+            temporaire = f"{self.chemin}.tmp"
+            with open(temporaire, "w", encoding="utf-8") as fichier:
+                json.dump({"version": 1, "interactions": self._interactions}, fichier, ensure_ascii=False, indent=1)
+            os.replace(temporaire, self.chemin)
+
+
+_cassettes = {}
+_verrou_cassettes = threading.Lock()
+
+
+def obtenir_cassette(chemin=CHEMIN_CASSETTE):
+    """Une instance par fichier, partagée par les transports synchrone et asynchrone"""
+    with _verrou_cassettes:
+        if chemin not in _cassettes:
+            _cassettes[chemin] = Cassette(chemin)
+        return _cassettes[chemin]
+
+# ============================================================================
+# TRANSPORTS HTTP
+# ============================================================================
+
+def _reponse(statut, contenu, request, type_contenu="application/json"):
+    return httpx.Response(statut, headers={"content-type": type_contenu}, content=contenu, request=request)
+
+
+class _Enregistreur:
+    """Logique commune des transports d'enregistrement / rejeu"""
+
+    def __init__(self, mode, cassette, transport=None, respecter_delais=RESPECTER_DELAIS):
+        self.mode = mode
+        self.cassette = cassette
+        self.transport = transport
+        self.respecter_delais = respecter_delais
+
+    def _cle(self, request):
+        return cle_requete(f"{request.method} {request.url.path}", request.read())
+
+    def _rejouer(self, request):
+        """(réponse, durée enregistrée)"""
+        try:
+            interaction = self.cassette.lire(self._cle(request))
+        except ErreurCassette as erreur:
+            # Erreur HTTP non réessayée par les SDK, avec un message lisible
+            contenu = json.dumps({"error": {"message": str(erreur), "type": "cassette"}}).encode("utf-8")
+            return _reponse(404, contenu, request), 0.0
+        contenu = interaction["corps"].encode("utf-8")
+        _comptabiliser_reponse(request.url.path, request.read(), contenu, interaction["duree"])
+        return _reponse(interaction["statut"], contenu, request, interaction["type"]), interaction["duree"]
+
+    def _conserver(self, request, reponse, contenu, duree):
+        """Enregistre la réponse réelle (corps décodé) et la renvoie à l'appelant"""
+        entetes = {nom: valeur for nom, valeur in reponse.headers.items() if nom.lower() not in _ENTETES_IGNORES}
+        if reponse.status_code < 500:
+            self.cassette.ecrire(self._cle(request), {
+                "requete": f"{request.method} {request.url.path}",
+                "statut": reponse.status_code,
+                "type": reponse.headers.get("content-type", "application/json"),
+                "corps": contenu.decode("utf-8", errors="replace"),
+                "duree": round(duree, 4),
+            })
+        _comptabiliser_reponse(request.url.path, request.read(), contenu, duree)
+        return httpx.Response(reponse.status_code, headers=entetes, content=contenu, request=request)
+
+
+class TransportCassette(_Enregistreur, httpx.BaseTransport):
+    """Transport synchrone : enregistre (autour du transport réel) ou rejoue"""
+
+    def handle_request(self, request):
+        if self.mode == "rejouer":
+            reponse, duree = self._rejouer(request)
+            if self.respecter_delais:
+                time.sleep(duree)
+            return reponse
+        debut = time.perf_counter()
+        reponse = self.transport.handle_request(request)
+        try:
+            contenu = reponse.read()
+        finally:
+            reponse.close()
+        return self._conserver(request, reponse, contenu, time.perf_counter() - debut)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+class TransportCassetteAsync(_Enregistreur, httpx.AsyncBaseTransport):
+    """Transport asynchrone : enregistre (autour du transport réel) ou rejoue"""
+
+    async def handle_async_request(self, request):
+        if self.mode == "rejouer":
+            reponse, duree = self._rejouer(request)
+            if self.respecter_delais:
+                await asyncio.sleep(duree)
+            return reponse
+        debut = time.perf_counter()
+        reponse = await self.transport.handle_async_request(request)
+        try:
+            contenu = await reponse.aread()
+        finally:
+            await reponse.aclose()
+        return self._conserver(request, reponse, contenu, time.perf_counter() - debut)
+
+    async def aclose(self):
+        if self.transport is not None:
+            await self.transport.aclose()
+
+# ============================================================================
+# BACKEND FACTICE
+# ============================================================================
+
+# Outil appelé par le LLM factice quand la question contient l'un de ces mots
+_MOTS_OUTILS = {
+    "calculator": re.compile(r"\d\s*[-+*/x×]\s*\d|calcul", re.IGNORECASE),
+    "weather": re.compile(r"météo|temps qu'il fait|température", re.IGNORECASE),
+    "web_search": re.compile(r"actualit|recherche sur internet|news", re.IGNORECASE),
+    "todo_list": re.compile(r"tâche|todo", re.IGNORECASE),
+    "calendar": re.compile(r"calendrier|agenda|événement", re.IGNORECASE),
+    "document_search": re.compile(r"rapport|document|chiffre d'affaires|résultat net|marge", re.IGNORECASE),
+}
+
+
+def vecteur_factice(texte, dimension=DIMENSION_FACTICE):
+    """Embedding déterministe par hachage des mots : des textes proches ont des vecteurs proches"""
+    vecteur = np.zeros(dimension, dtype=np.float32)
+    for mot in _MOTS.findall(texte.lower()):
+        empreinte = zlib.crc32(mot.encode("utf-8"))
+        vecteur[empreinte % dimension] += 1.0 if empreinte >> 31 else -1.0
+    norme = np.linalg.norm(vecteur)
+    if norme == 0:
+        vecteur[0] = norme = 1.0
+    return vecteur / norme
+
+
+def _texte(contenu):
+    """Contenu d'un message : chaîne ou liste de parties {"type": "text", "text": ...}"""
+    if isinstance(contenu, list):
+        return " ".join(partie.get("text", "") for partie in contenu if isinstance(partie, dict))
+    return contenu or ""
+
+
+def reponse_chat_factice(corps):
+    """(texte ou None, [(nom_outil, arguments_json)], usage) pour une requête chat/completions"""
+    messages = corps.get("messages", [])
+    outils = corps.get("tools") or []
+    question = next((_texte(m.get("content")) for m in reversed(messages) if m.get("role") == "user"), "")
+
+    appels = []
+    if outils and messages and messages[-1].get("role") == "user":
+        for outil in outils:
+            fonction = outil.get("function", {})
+            motif = _MOTS_OUTILS.get(fonction.get("name"))
+            if motif and motif.search(question):
+                parametre = (fonction.get("parameters", {}).get("required") or ["input"])[0]
+                appels.append((fonction["name"], json.dumps({parametre: question}, ensure_ascii=False)))
+
+    texte = None
+    if not appels:
+        # Dernier contexte reçu (passages RAG, résultats d'outils) : la réponse en reprend le début
+        contexte = next(
+            (_texte(m.get("content")) for m in reversed(messages) if m.get("role") in ("system", "tool")), ""
+        )
+        texte = f"Réponse simulée à « {tronquer_jetons(question.strip(), 30)} »."
+        if contexte:
+            texte += " D'après le contexte : " + tronquer_jetons(" ".join(contexte.split()), 80)
+        if any("Final Answer" in _texte(m.get("content")) for m in messages if m.get("role") == "system"):
+            # Format attendu par les agents ReAct de LangChain
+            texte = f"Thought: I now know the final answer\nFinal Answer: {texte}"
+
+    jetons_prompt = sum(4 + compter_jetons(_texte(m.get("content"))) for m in messages)
+    if outils:
+        jetons_prompt += compter_jetons(json.dumps(outils, ensure_ascii=False))
+    jetons_reponse = compter_jetons(texte) if texte else sum(compter_jetons(a) + 4 for _, a in appels)
+    usage = {"prompt_tokens": jetons_prompt, "completion_tokens": jetons_reponse,
+             "total_tokens": jetons_prompt + jetons_reponse}
+    return texte, appels, usage
+
+
+def _chat_factice(corps):
+    """Corps de réponse (JSON ou flux SSE) et type de contenu"""
+    texte, appels, usage = reponse_chat_factice(corps)
+    modele = corps.get("model", "factice")
+    fin = "tool_calls" if appels else "stop"
+    tool_calls = [
+        {"index": i, "id": f"appel_{i}", "type": "function", "function": {"name": nom, "arguments": arguments}}
+        for i, (nom, arguments) in enumerate(appels)
+    ]
+
+    if not corps.get("stream"):
+        message = {"role": "assistant", "content": texte}
+        if tool_calls:
+            message["tool_calls"] = [{k: v for k, v in appel.items() if k != "index"} for appel in tool_calls]
+        return json.dumps({
+            "id": "chatcmpl-factice", "object": "chat.completion", "created": 0, "model": modele,
+            "choices": [{"index": 0, "message": message, "finish_reason": fin, "logprobs": None}],
+            "usage": usage,
+        }, ensure_ascii=False), "application/json"
+
+    avec_usage = bool((corps.get("stream_options") or {}).get("include_usage"))
+
+    def fragment(delta, fin_fragment=None, usage_fragment=None, choix=True):
+        donnees = {
+            "id": "chatcmpl-factice", "object": "chat.completion.chunk", "created": 0, "model": modele,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": fin_fragment, "logprobs": None}] if choix else [],
+        }
+        if avec_usage:
+            donnees["usage"] = usage_fragment
+        return "data: " + json.dumps(donnees, ensure_ascii=False) + "\n\n"
+
+    flux = [fragment({"role": "assistant", "content": ""})]
+    flux += [fragment({"content": morceau}) for morceau in re.findall(r"\S+\s*|\s+", texte or "")]
+    flux += [fragment({"tool_calls": [appel]}) for appel in tool_calls]
+    flux.append(fragment({}, fin))
+    if avec_usage:
+        flux.append(fragment(None, usage_fragment=usage, choix=False))
+    flux.append("data: [DONE]\n\n")
+    return "".join(flux), "text/event-stream"
+
+
+def _embeddings_factices(corps):
+    entrees = corps.get("input", [])
+    if isinstance(entrees, str) or (entrees and isinstance(entrees[0], int)):
+        entrees = [entrees]
+    donnees = []
+    for i, entree in enumerate(entrees):
+        # Entrée déjà découpée en jetons : les identifiants tiennent lieu de mots
+        texte = entree if isinstance(entree, str) else " ".join(map(str, entree))
+        vecteur = vecteur_factice(texte)
+        if corps.get("encoding_format") == "base64":
+            vecteur = base64.b64encode(vecteur.astype("<f4").tobytes()).decode("ascii")
+        else:
+            vecteur = vecteur.tolist()
+        donnees.append({"object": "embedding", "index": i, "embedding": vecteur})
+    jetons = sum(compter_jetons(e) if isinstance(e, str) else len(e) for e in entrees)
+    return json.dumps({
+        "object": "list", "data": donnees, "model": corps.get("model", "factice"),
+        "usage": {"prompt_tokens": jetons, "total_tokens": jetons},
+    }), "application/json"
+
+
+class _Factice:
+    """Réponses calculées localement ; latence simulée par nature d'appel"""
+
+    def __init__(self, latence_chat=LATENCE_CHAT, latence_embedding=LATENCE_EMBEDDING):
+        self.latences = {"chat": latence_chat, "embeddings": latence_embedding}
+
+    def _repondre(self, request):
+        """(réponse, latence à simuler)"""
+        nature = _nature(request.url.path)
+        corps = json.loads(request.read() or b"{}")
+        if nature == "chat":
+            contenu, type_contenu = _chat_factice(corps)
+        elif nature == "embeddings":
+            contenu, type_contenu = _embeddings_factices(corps)
+        else:
+            message = {"error": {"message": f"Point d'accès non simulé : {request.url.path}", "type": "factice"}}
+            return _reponse(404, json.dumps(message).encode("utf-8"), request), 0.0
+        contenu = contenu.encode("utf-8")
+        latence = self.latences[nature]
+        _comptabiliser_reponse(request.url.path, request.read(), contenu, latence)
+        return _reponse(200, contenu, request, type_contenu), latence
+
+
+class TransportFactice(_Factice, httpx.BaseTransport):
+    def handle_request(self, request):
+        reponse, latence = self._repondre(request)
+        if latence:
+            time.sleep(latence)
+        return reponse
+
+
+class TransportFacticeAsync(_Factice, httpx.AsyncBaseTransport):
+    async def handle_async_request(self, request):
+        reponse, latence = self._repondre(request)
+        if latence:
+            await asyncio.sleep(latence)
+        return reponse
+
+
+def _verifier_client_httpx(classe_client):
+    # Un transport httpx ne s'insère pas dans le client d'une autre bibliothèque HTTP
+    if MODE_REJEU and not (isinstance(classe_client, type)
+                           and issubclass(classe_client, (httpx.Client, httpx.AsyncClient))):
+        raise RuntimeError(f"LLM_REPLAY_MODE demande openai 1.x (client httpx) ; openai {openai.__version__} "
+                           "est installé")
+
+
+def transport_rejeu(limits):
+    """Transport du client HTTP partagé selon LLM_REPLAY_MODE ; None : transport par défaut"""
+    _verifier_client_httpx(openai.DefaultHttpxClient)
+    if MODE_REJEU == "factice":
+        return TransportFactice()
+    if MODE_REJEU in ("enregistrer", "rejouer"):
+        reel = httpx.HTTPTransport(limits=limits) if MODE_REJEU == "enregistrer" else None
+        return TransportCassette(MODE_REJEU, obtenir_cassette(), reel)
+    return None
+
+
+def transport_rejeu_async(limits):
+    """Équivalent asynchrone de transport_rejeu"""
+    _verifier_client_httpx(openai.DefaultAsyncHttpxClient)
+    if MODE_REJEU == "factice":
+        return TransportFacticeAsync()
+    if MODE_REJEU in ("enregistrer", "rejouer"):
+        reel = httpx.AsyncHTTPTransport(limits=limits) if MODE_REJEU == "enregistrer" else None
+        return TransportCassetteAsync(MODE_REJEU, obtenir_cassette(), reel)
+    return None
+
+# ============================================================================
+# RECHERCHE WEB (TAVILY)
+# ============================================================================
+
+def resultats_recherche_factices(query, max_results=3, **_):
+    return {
+        "query": query,
+        "results": [
+            {
+                "title": f"Résultat simulé {i} : {query}",
+                "url": f"https://exemple.org/recherche/{i}",
+                "content": f"Contenu simulé n°{i} sur « {query} » : les marchés restent attentifs aux banques centrales.",
+                "score": round(1.0 / i, 3),
+            }
+            for i in range(1, max_results + 1)
+        ],
+    }
+
+
+class _RechercheEnregistree:
+    def __init__(self, client, mode=MODE_REJEU, cassette=None):
+        self._client = client
+        self.mode = mode
+        self.cassette = cassette if cassette is not None else obtenir_cassette()
+
+    def _cle(self, parametres):
+        return cle_requete("tavily search", parametres)
+
+    def _conserver(self, parametres, reponse, duree):
+        self.cassette.ecrire(self._cle(parametres), {
+            "requete": "tavily search", "statut": 200, "type": "application/json",
+            "corps": json.dumps(reponse, ensure_ascii=False), "duree": round(duree, 4),
+        })
+        _comptabiliser("recherche", duree)
+        return reponse
+
+    def _rejouer(self, parametres):
+        """(réponse, durée à simuler)"""
+        if self.mode == "factice":
+            _comptabiliser("recherche", LATENCE_RECHERCHE)
+            return resultats_recherche_factices(**parametres), LATENCE_RECHERCHE
+        interaction = self.cassette.lire(self._cle(parametres))
+        _comptabiliser("recherche", interaction["duree"])
+        return json.loads(interaction["corps"]), interaction["duree"] if RESPECTER_DELAIS else 0.0
+
+
+class RechercheEnregistree(_RechercheEnregistree):
+    """Client Tavily synchrone dont les recherches passent par la cassette (ou le backend factice)"""
+
+    def search(self, **parametres):
+        if self.mode != "enregistrer":
+            reponse, duree = self._rejouer(parametres)
+            if duree:
+                time.sleep(duree)
+            return reponse
+        debut = time.perf_counter()
+        reponse = self._client.search(**parametres)
+        return self._conserver(parametres, reponse, time.perf_counter() - debut)
+
+
+class RechercheEnregistreeAsync(_RechercheEnregistree):
+    """Client Tavily asynchrone dont les recherches passent par la cassette (ou le backend factice)"""
+
+    async def search(self, **parametres):
+        if self.mode != "enregistrer":
+            reponse, duree = self._rejouer(parametres)
+            if duree:
+                await asyncio.sleep(duree)
+            return reponse
+        debut = time.perf_counter()
+        reponse = await self._client.search(**parametres)
+        return self._conserver(parametres, reponse, time.perf_counter() - debut)
+
+
+def envelopper_recherche(client):
+    """Client Tavily tel quel, ou enveloppé selon LLM_REPLAY_MODE"""
+    if MODE_REJEU not in ("enregistrer", "rejouer", "factice"):
+        return client
+    if inspect.iscoroutinefunction(client.search):
+        return RechercheEnregistreeAsync(client)
+    return RechercheEnregistree(client)
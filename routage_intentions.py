@@ -0,0 +1,128 @@
+"""
+Routage des questions vers un agent en une seule passe (automate compilé).
+
+detecter_agent cherchait chaque mot-clé de chaque agent par une sous-chaîne
+distincte, après avoir parcouru les salutations et essayé les expressions de
+calcul ; le script principal refaisait ensuite ces mêmes recherches pour
+produire la réponse. Ici :
+  - tous les mots-clés (salutations et agents) sont normalisés (minuscules,
+    sans accents) et compilés une fois dans une seule expression régulière
+    en forme d'arbre de préfixes : un parcours du texte trouve tous les mots,
+    aux frontières de mots (« temps » ne correspond plus à « printemps ») ;
+  - un mot-clé terminé par « * » couvre toute la famille de mots
+    (« calcul* » : calcul, calculer, calculez) ; sinon seuls le singulier et
+    le pluriel (s, x) correspondent ;
+  - le résultat porte la réponse déjà calculée (salutation, calcul, valeur
+    des tableaux), réutilisée telle quelle par l'appelant.
+"""
+
+import re
+
+from recherche_hybride import normaliser
+
+_CHIFFRE = re.compile(r"\d")
+
+# ============================================================================
+# AUTOMATE
+# ============================================================================
+
+def _expression_arbre(noeud):
+    """Expression régulière d'un arbre de préfixes ; les branches les plus longues sont essayées d'abord"""
+    branches = [re.escape(caractere) + _expression_arbre(enfant) for caractere, enfant in sorted(noeud.items()) if caractere]
+    if "" in noeud:
+        branches.append("")
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+class AutomateMotsCles:
+    """Mots-clés compilés en une seule expression ; paires (mot-clé, étiquette) en entrée"""
+
+    def __init__(self, paires):
+        self._etiquettes = {}
+        self._familles = set()
+        racine = {}
+        for mot, etiquette in paires:
+            famille = mot.endswith("*")
+            mot = " ".join(normaliser(mot.rstrip("*")).split())
+            if famille:
+                self._familles.add(mot)
+            self._etiquettes.setdefault(mot, []).append(etiquette)
+            noeud = racine
+            for caractere in mot:
+                noeud = noeud.setdefault(caractere, {})
+            noeud[""] = {}
+        self._expression = re.compile(r"\b(" + _expression_arbre(racine) + r")(\w*)") if racine else None
+
+    def trouver(self, texte_normalise):
+        """[(mot-clé, étiquette)] dans l'ordre du texte (texte déjà passé par normaliser())"""
+        if self._expression is None:
+            return []
+        trouves = []
+        for correspondance in self._expression.finditer(texte_normalise):
+            mot, suite = correspondance.groups()
+            if suite and suite not in ("s", "x") and mot not in self._familles:
+                continue
+            trouves.extend((mot, etiquette) for etiquette in self._etiquettes[mot])
+        return trouves
+
+# ============================================================================
+# ROUTEUR
+# ============================================================================
+
+class RouteurIntentions:
+    """
+    Agent d'une question et réponse déjà calculée.
+    mots_agents : {agent: [mots-clés]}, l'ordre départage les égalités ;
+    salutations : {salutation: réponse}, la première présente l'emporte ;
+    calcul(question) / donnees(question) : réponse directe ou None.
+    """
+
+    def __init__(self, mots_agents, salutations, calcul=None, donnees=None, agent_defaut="assistant"):
+        self.agents = list(mots_agents)
+        self.salutations = list(salutations.items())
+        self.calcul = calcul
+        self.donnees = donnees
+        self.agent_defaut = agent_defaut
+        paires = [(mot, ("salutation", rang)) for rang, mot in enumerate(salutations)]
+        paires += [(mot, (agent, None)) for agent, mots in mots_agents.items() for mot in mots]
+        self._automate = AutomateMotsCles(paires)
+
+    def router(self, question):
+        """
+        {'agent', 'reponse', 'scores', 'mots'} : réponse déjà calculée pour les agents
+        salutation, calcul_simple et donnees_chiffrees (None pour les autres).
+        """
+        trouves = self._automate.trouver(normaliser(question))
+        scores = dict.fromkeys(self.agents, 0)
+        salutation = None
+        for _, (categorie, rang) in trouves:
+            if categorie == "salutation":
+                salutation = rang if salutation is None else min(salutation, rang)
+            else:
+                scores[categorie] += 1
+        mots = [mot for mot, _ in trouves]
+
+        def resultat(agent, reponse=None):
+            return {"agent": agent, "reponse": reponse, "scores": scores, "mots": mots}
+
+        if salutation is not None:
+            return resultat("salutation", self.salutations[salutation][1])
+        # Pas de chiffre, pas de calcul : les expressions ne sont essayées que si elles peuvent réussir
+        if self.calcul is not None and _CHIFFRE.search(question):
+            reponse = self.calcul(question)
+            if reponse:
+                return resultat("calcul_simple", reponse)
+        if self.donnees is not None:
+            reponse = self.donnees(question)
+            if reponse:
+                return resultat("donnees_chiffrees", reponse)
+
+        agent = max(self.agents, key=scores.get) if self.agents else self.agent_defaut
+        return resultat(agent if scores.get(agent) else self.agent_defaut)
+
+    def salutation(self, question):
+        """Réponse à une salutation présente dans la question, ou None"""
+        rangs = [rang for _, (categorie, rang) in self._automate.trouver(normaliser(question)) if categorie == "salutation"]
+        return self.salutations[min(rangs)][1] if rangs else None
@@ -0,0 +1,201 @@
+"""
+Routage des requêtes de l'assistant vers un palier de modèle (coût / latence).
+
+Toutes les questions partaient vers le même modèle avec le même prompt
+d'analyse détaillée et max_tokens=2000 : « Quel est le chiffre d'affaires
+2023 ? » attendait une analyse en trois parties. Chaque requête est classée
+à partir de signaux gratuits, avant tout appel :
+  - longueur de la question (jetons) et nature (question factuelle, demande
+    d'analyse ou de comparaison) ;
+  - agent détecté ;
+  - confiance de la recherche : similarité du meilleur passage trouvé.
+Trois paliers :
+  - rapide   : réponse courte et directe (prompt concis, peu de jetons),
+               sur un modèle léger si OPENAI_FAST_MODEL en désigne un ;
+  - standard : modèle de chat habituel, analyse structurée ;
+  - avance   : modèle plus capable pour les analyses longues ou multiples.
+Le routeur sert l'assistant de app_complete.py et l'agent de new_app_2.py
+(un agent par palier : modèle, longueur de réponse et délai du palier).
+Si l'appel échoue (délai dépassé, erreur de l'API), la requête est rejouée
+sur le modèle du palier de repli, avec le même format de réponse. Latence, erreurs, replis et qualité (réponses
+appuyées sur des sources) sont suivis par palier.
+Le délai du palier rapide est un délai de lecture court : en streaming, c'est
+l'attente maximale du premier jeton (puis entre deux fragments) ; sans
+streaming, elle borne la réponse concise entière. Un modèle
+rapide qui ne répond pas en quelques secondes est abandonné tôt, et le repli
+(réponse concise) coûte moins qu'une attente : le p95 des questions
+factuelles reste sous celui d'avant le routage.
+
+Configuration (variables d'environnement, lues au premier import) :
+  MODEL_ROUTING            0 : désactivé, toutes les requêtes au palier standard
+  OPENAI_FAST_MODEL        modèle du palier rapide (OPENAI_CHAT_MODEL)
+  OPENAI_STRONG_MODEL      modèle du palier avancé (gpt-4-turbo-preview)
+  ROUTER_FAST_MAX_TOKENS   longueur maximale d'une réponse rapide (500)
+  ROUTER_FAST_TIMEOUT      délai d'attente du premier jeton au palier rapide, en secondes (2.5)
+  ROUTER_CONFIDENCE        similarité à partir de laquelle la recherche est jugée sûre (0.8)
+Les modèles doivent être connus de la version de llama-index-llms-openai
+installée : un nom inconnu y est traité comme un modèle de complétion.
+"""
+
+import os
+import re
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+from assemblage_contexte import JETONS_REPONSE
+from clients_llm import DELAI_MAXIMAL, MODELE_CHAT, TENTATIVES_MAX
+from comptage_jetons import compter_jetons
+
+ROUTAGE_ACTIF = os.getenv("MODEL_ROUTING", "1") != "0"
+MODELE_RAPIDE = os.getenv("OPENAI_FAST_MODEL", MODELE_CHAT)
+MODELE_AVANCE = os.getenv("OPENAI_STRONG_MODEL", "gpt-4-turbo-preview")
+SEUIL_CONFIANCE = float(os.getenv("ROUTER_CONFIDENCE", "0.8"))
+
+# Le palier rapide ne réessaie pas : le repli sur le palier standard est plus court qu'une attente
+PALIERS = {
+    "rapide": {
+        "modele": MODELE_RAPIDE, "jetons_reponse": int(os.getenv("ROUTER_FAST_MAX_TOKENS", "500")),
+        "delai": float(os.getenv("ROUTER_FAST_TIMEOUT", "2.5")), "tentatives": 0, "concis": True,
+    },
+    "standard": {
+        "modele": MODELE_CHAT, "jetons_reponse": JETONS_REPONSE,
+        "delai": DELAI_MAXIMAL, "tentatives": TENTATIVES_MAX, "concis": False,
+    },
+    "avance": {
+        "modele": MODELE_AVANCE, "jetons_reponse": 3000,
+        "delai": DELAI_MAXIMAL, "tentatives": TENTATIVES_MAX, "concis": False,
+    },
+}
+REPLIS = {"rapide": ["standard"], "standard": ["rapide"], "avance": ["standard"]}
+
+# Au-delà, une demande d'analyse porte sur plusieurs sujets
+JETONS_QUESTION_LONGUE = 40
+# En deçà, une question factuelle est une simple consultation
+JETONS_QUESTION_COURTE = 30
+# Agents de app_complete.py sans LLM ou aux réponses très courtes
+AGENTS_LEGERS = {"salutation", "calcul_simple", "donnees_chiffrees"}
+
+_ANALYSE = re.compile(
+    r"analy|compar|[ée]volution|strat[ée]gi|recommand|risque|pourquoi|expliqu|synth[èe]s|perspective"
+    r"|tendance|sc[ée]nario|diagnostic|forces|faiblesses|swot|conseill|[ée]valu",
+    re.IGNORECASE,
+)
+_FACTUEL = re.compile(
+    r"^\s*(quel(le)?s?|combien|qui|quand|o[uù]|donne|indique|montant)\b|chiffre d'affaires|r[ée]sultat net"
+    r"|montant|effectif|dividende|ebitda|marge|\b(19|20)\d{2}\b",
+    re.IGNORECASE,
+)
+
+# ============================================================================
+# CLASSEMENT
+# ============================================================================
+
+def classer_requete(question, agent="assistant", confiance=None, documents=True):
+    """
+    Palier d'une requête : {'palier', 'motifs', 'jetons_question', 'confiance'}.
+    confiance : similarité du meilleur passage trouvé (None si pas de recherche).
+    """
+    jetons = compter_jetons(question)
+    analyse = bool(_ANALYSE.search(question))
+    factuel = bool(_FACTUEL.search(question))
+    plusieurs = question.count("?") > 1 or bool(re.search(r"\bet (de|des|du|la|le|les) ", question, re.IGNORECASE))
+
+    if agent in AGENTS_LEGERS:
+        palier, motifs = "rapide", [f"agent {agent}"]
+    elif analyse and (jetons > JETONS_QUESTION_LONGUE or plusieurs):
+        palier, motifs = "avance", ["analyse longue ou sur plusieurs sujets"]
+    elif analyse:
+        palier, motifs = "standard", ["demande d'analyse"]
+    elif factuel and jetons <= JETONS_QUESTION_COURTE and not plusieurs:
+        if documents and confiance is not None and confiance < SEUIL_CONFIANCE:
+            palier, motifs = "standard", [f"question factuelle, recherche peu sûre ({confiance:.2f})"]
+        else:
+            palier, motifs = "rapide", ["question factuelle courte"]
+            if confiance is not None:
+                motifs.append(f"recherche sûre ({confiance:.2f})")
+    else:
+        palier, motifs = "standard", ["question ouverte"]
+    return {"palier": palier, "motifs": motifs, "jetons_question": jetons, "confiance": confiance}
+
+# ============================================================================
+# ROUTEUR
+# ============================================================================
+
+class RouteurModeles:
+    """Choix du palier, exécution avec repli et statistiques par palier (partagé par les sessions)"""
+
+    def __init__(self, paliers=PALIERS, replis=REPLIS, actif=ROUTAGE_ACTIF, historique=500):
+        self.paliers = paliers
+        self.replis = replis
+        self.actif = actif
+        self._verrou = threading.Lock()
+        self._mesures = {
+            nom: {"appels": 0, "erreurs": 0, "replis": 0, "latences": deque(maxlen=historique),
+                  "qualites": deque(maxlen=historique)}
+            for nom in paliers
+        }
+
+    def choisir(self, question, agent="assistant", confiance=None, documents=True):
+        """Classement de la requête (voir classer_requete) ; palier standard si le routage est désactivé"""
+        if not self.actif:
+            return {"palier": "standard", "motifs": ["routage désactivé"], "jetons_question": None,
+                    "confiance": confiance}
+        return classer_requete(question, agent, confiance, documents)
+
+    def executer(self, classement, appel, qualite=None):
+        """
+        appel(nom_palier, palier) sur le palier choisi, puis sur ses replis en cas d'exception.
+        qualite(résultat) : note entre 0 et 1 (ou None) ; retourne (résultat, palier utilisé).
+        """
+        choisi = self.paliers[classement["palier"]]
+        ordre = [classement["palier"], *self.replis.get(classement["palier"], [])]
+        derniere_erreur = None
+        for rang, nom in enumerate(ordre):
+            # Un repli change de modèle et de délai, pas de format de réponse
+            palier = dict(self.paliers[nom], concis=choisi["concis"], jetons_reponse=choisi["jetons_reponse"])
+            debut = time.perf_counter()
+            try:
+                resultat = appel(nom, palier)
+            except Exception as erreur:
+                self._enregistrer(nom, time.perf_counter() - debut, repli=rang > 0, erreur=True)
+                derniere_erreur = erreur
+                continue
+            self._enregistrer(
+                nom, time.perf_counter() - debut, repli=rang > 0,
+                qualite=qualite(resultat) if qualite else None
+            )
+            return resultat, nom
+        raise derniere_erreur
+
+    def _enregistrer(self, nom, duree, repli=False, erreur=False, qualite=None):
+        with self._verrou:
+            mesure = self._mesures[nom]
+            mesure["appels"] += 1
+            mesure["replis"] += repli
+            if erreur:
+                mesure["erreurs"] += 1
+                return
+            mesure["latences"].append(duree)
+            if qualite is not None:
+                mesure["qualites"].append(qualite)
+
+    def statistiques(self):
+        """Par palier : appels, erreurs, replis servis, latence p50 / p95 (s) et qualité moyenne"""
+        with self._verrou:
+            resultats = {}
+            for nom, mesure in self._mesures.items():
+                latences = np.array(mesure["latences"])
+                resultats[nom] = {
+                    "modele": self.paliers[nom]["modele"],
+                    "appels": mesure["appels"],
+                    "erreurs": mesure["erreurs"],
+                    "taux_erreur": mesure["erreurs"] / mesure["appels"] if mesure["appels"] else 0.0,
+                    "replis": mesure["replis"],
+                    "p50": float(np.percentile(latences, 50)) if len(latences) else None,
+                    "p95": float(np.percentile(latences, 95)) if len(latences) else None,
+                    "qualite": float(np.mean(mesure["qualites"])) if mesure["qualites"] else None,
+                }
+            return resultats
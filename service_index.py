@@ -0,0 +1,116 @@
+"""
+Service d'index partagé par toutes les sessions Streamlit d'un même processus.
+
+L'index est construit une seule fois, lu sans verrou par les sessions
+(lecture seule) et remplacé de façon atomique après une ré-indexation.
+À instancier via st.cache_resource pour n'avoir qu'une instance par processus.
+"""
+
+import sys
+import time
+import threading
+
+
+class ServiceIndex:
+    """Conteneur thread-safe d'un index vectoriel partagé"""
+
+    def __init__(self):
+        # (index, version, date de mise à jour) remplacé d'un bloc : une lecture est toujours cohérente
+        self._etat = (None, 0, None)
+        self._initialise = False
+        self._verrou_ecriture = threading.Lock()
+        # Sérialise les constructions ; les lectures n'attendent jamais
+        self._verrou_construction = threading.Lock()
+
+    @property
+    def initialise(self):
+        return self._initialise
+
+    @property
+    def version(self):
+        return self._etat[1]
+
+    @property
+    def mis_a_jour(self):
+        return self._etat[2]
+
+    def obtenir(self):
+        """Retourne l'index courant (instantané à utiliser pour toute la requête)"""
+        return self._etat[0]
+
+    def obtenir_avec_version(self):
+        """Retourne (index, version) lus de façon cohérente"""
+        index, version, _ = self._etat
+        return index, version
+
+    def remplacer(self, nouvel_index):
+        """Remplace l'index de façon atomique ; les requêtes en cours gardent l'ancien"""
+        with self._verrou_ecriture:
+            self._etat = (nouvel_index, self._etat[1] + 1, time.time())
+            self._initialise = True
+
+    def initialiser(self, constructeur):
+        """
+        Construit l'index une seule fois, même si plusieurs sessions arrivent en même temps.
+        Un constructeur qui ne retourne rien (pas de documents, erreur) sera rappelé par la session suivante.
+        """
+        if not self._initialise:
+            with self._verrou_construction:
+                if not self._initialise:
+                    index = constructeur()
+                    if index is not None:
+                        self.remplacer(index)
+        return self.obtenir()
+
+    def reconstruire(self, constructeur):
+        """Construit un nouvel index hors ligne puis l'échange avec l'index courant"""
+        with self._verrou_construction:
+            self.remplacer(constructeur())
+        return self.obtenir()
+
+    def empreinte_memoire(self):
+        """Estime la mémoire occupée par l'index : {'vecteurs', 'dimension', 'octets'}"""
+        return estimer_memoire(self.obtenir())
+
+
+def _taille_textes(textes):
+    return sum(sys.getsizeof(texte) for texte in textes if texte)
+
+
+def estimer_memoire(index):
+    """Estime l'empreinte mémoire d'un index LlamaIndex ou d'un vector store Chroma / plat"""
+    empreinte = {"vecteurs": 0, "dimension": 0, "octets": 0}
+    if index is None:
+        return empreinte
+
+    # Vector store Chroma (LangChain) : vecteurs float32 dans l'index HNSW
+    collection = getattr(index, "_collection", None)
+    if collection is not None:
+        n = collection.count()
+        if n:
+            echantillon = collection.get(limit=1, include=["embeddings"])["embeddings"]
+            dimension = len(echantillon[0]) if echantillon else 0
+            empreinte.update(vecteurs=n, dimension=dimension, octets=n * dimension * 4)
+        return empreinte
+
+    vector_store = getattr(index, "vector_store", index)
+    stockage = getattr(vector_store, "stockage", None)
+    if stockage is not None:
+        # Stockage plat (LangChain ou LlamaIndex) : matrice float32 mappée, partagée entre processus
+        empreinte.update(stockage.empreinte())
+    else:
+        # Index LlamaIndex en mémoire (SimpleVectorStore + docstore)
+        donnees = getattr(vector_store, "_data", None)
+        embeddings = getattr(donnees, "embedding_dict", None) or {}
+        if embeddings:
+            dimension = len(next(iter(embeddings.values())))
+            # Listes Python de floats : pointeur (8 octets) + objet float (24 octets)
+            octets = len(embeddings) * (sys.getsizeof([]) + dimension * 32)
+            empreinte.update(vecteurs=len(embeddings), dimension=dimension, octets=octets)
+
+    docstore = getattr(index, "docstore", None)
+    if docstore is not None:
+        empreinte["octets"] += _taille_textes(
+            getattr(node, "text", "") for node in docstore.docs.values()
+        )
+    return empreinte
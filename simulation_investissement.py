@@ -0,0 +1,254 @@
+"""
+Projection d'un investissement : trajectoire déterministe et Monte Carlo vectorisé.
+
+agent_simulateur_investissement bouclait en Python sur 20 ans × 12 mois pour
+une seule trajectoire à 7 %, avec des paramètres fixes. Ici :
+  - la trajectoire déterministe est calculée en forme fermée
+    (capital × (1+r)^t + apport × ((1+r)^t − 1) / r) ;
+  - le Monte Carlo tire des rendements mensuels pour des centaines de
+    milliers de trajectoires : loi normale, loi de Student (queues épaisses)
+    ou rééchantillonnage de rendements historiques (bootstrap) ;
+  - les lois symétriques utilisent des variables antithétiques : moitié
+    moins de tirages, variance de la moyenne réduite ;
+  - la récurrence V_t = V_{t-1} × (1 + r_t) + apport (apport en fin de mois,
+    comme l'ancienne boucle) avance d'un mois pour toutes les trajectoires à
+    la fois : une opération vectorielle par mois, rendements rangés mois ×
+    trajectoires pour des lignes contiguës ;
+  - les trajectoires sont traitées par blocs de taille bornée en mémoire ;
+    chaque bloc produit ses percentiles aux dates du graphique, moyennés
+    ensuite (blocs de plusieurs dizaines de milliers de trajectoires : écart
+    négligeable devant l'erreur Monte Carlo). Moyenne et probabilité de perte
+    sont exactes ;
+  - au-delà de MC_POOL_MIN_PATHS trajectoires, les blocs peuvent être
+    répartis sur un pool de processus. Chaque bloc a sa propre graine
+    (SeedSequence) : le résultat est identique avec ou sans pool.
+
+Configuration (variables d'environnement, lues au premier import) :
+  MC_PATHS           trajectoires simulées par défaut (100000)
+  MC_CHUNK_MB        mémoire de travail d'un bloc de trajectoires en Mo (64)
+  MC_WORKERS         processus pour les grandes simulations (0 : un seul cœur)
+  MC_POOL_MIN_PATHS  trajectoires à partir desquelles le pool est utilisé (1000000)
+"""
+
+import os
+import re
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+CHEMINS = int(os.getenv("MC_PATHS", "100000"))
+MEMOIRE_BLOC_MO = float(os.getenv("MC_CHUNK_MB", "64"))
+PROCESSUS = int(os.getenv("MC_WORKERS", "0"))
+CHEMINS_POOL_MIN = int(os.getenv("MC_POOL_MIN_PATHS", "1000000"))
+
+LOIS = {
+    "normale": "Normale",
+    "student": "Student (queues épaisses)",
+    "bootstrap": "Historique (bootstrap)",
+}
+PERCENTILES = (5, 25, 50, 75, 95)
+# Degrés de liberté de la loi de Student : queues nettement plus épaisses que la normale
+DEGRES_LIBERTE = 4
+# Une perte mensuelle ne peut pas dépasser 100 % : les tirages extrêmes sont bornés
+RENDEMENT_MENSUEL_MIN = -0.95
+
+# ============================================================================
+# PARAMÈTRES D'UNE QUESTION
+# ============================================================================
+
+# Séparateur de milliers seulement par groupes de trois chiffres : « en 2025 10000€ » donne 10000, pas 202510000
+_MONTANT = re.compile(r"(?<![\d.,])((?:\d{1,3}(?:[ \u00a0\u202f]\d{3})+|\d+)(?:[.,]\d+)?)\s*(k)?\s*(?:€|euros?\b)",
+                      re.IGNORECASE)
+# Périodicité cherchée dans les quelques mots qui suivent le montant (« 500€ placés chaque mois »),
+# sans franchir un autre nombre ni la fin de la phrase
+_MENSUEL = re.compile(r"^[^\d€.?!;]{0,25}?(?:/\s*mois|par\s+mois|mensuel\w*|chaque\s+mois|tous\s+les\s+mois)",
+                      re.IGNORECASE)
+_DUREE = re.compile(r"(\d+)\s*ans\b", re.IGNORECASE)
+_TAUX = re.compile(r"(\d+(?:[.,]\d+)?)\s*%")
+
+
+def _nombre(texte):
+    return float(re.sub(r"\s", "", texte).replace(",", "."))
+
+
+def montants(question):
+    """Montants en euros de la question : [{'valeur', 'mensuel', 'debut'}] (« 15 000 € », « 2k€ », « 300€ par mois », « 500€ placés chaque mois »)"""
+    return [
+        {
+            "valeur": _nombre(montant.group(1)) * (1000 if montant.group(2) else 1),
+            "mensuel": bool(_MENSUEL.match(question[montant.end():])),
+            "debut": montant.start(),
+        }
+        for montant in _MONTANT.finditer(question)
+    ]
+
+
+def parametres_investissement(question, capital=10000.0, apport_mensuel=500.0, annees=20, rendement=7.0):
+    """
+    Paramètres lus dans la question, valeurs par défaut sinon :
+    {'capital', 'apport_mensuel', 'annees', 'rendement'} (rendement annuel en %).
+    « 10000€ » : capital ; « 500€ par mois », « 500€ placés chaque mois » : apport ; « 20 ans » ; « 7% ».
+    """
+    parametres = {"capital": capital, "apport_mensuel": apport_mensuel, "annees": annees, "rendement": rendement}
+    capital_lu = False
+    for montant in montants(question):
+        if montant["mensuel"]:
+            parametres["apport_mensuel"] = montant["valeur"]
+        elif not capital_lu:
+            parametres["capital"], capital_lu = montant["valeur"], True
+    duree = _DUREE.search(question)
+    if duree:
+        parametres["annees"] = int(duree.group(1))
+    taux = _TAUX.search(question)
+    if taux:
+        parametres["rendement"] = _nombre(taux.group(1))
+    return parametres
+
+# ============================================================================
+# TRAJECTOIRE DÉTERMINISTE
+# ============================================================================
+
+def projection_deterministe(capital, apport_mensuel, mois, rendement_annuel):
+    """Valeur à la fin de chaque mois 0..mois, rendement constant (fraction annuelle, capitalisé chaque mois)"""
+    taux = rendement_annuel / 12
+    t = np.arange(mois + 1)
+    if taux == 0:
+        return capital + apport_mensuel * t
+    croissance = (1 + taux) ** t
+    return capital * croissance + apport_mensuel * (croissance - 1) / taux
+
+# ============================================================================
+# MONTE CARLO
+# ============================================================================
+
+def _khi2_reduit(generateur, forme):
+    """χ²(ν) / ν : somme de ν/2 exponentielles si ν est pair (plus rapide que standard_gamma)"""
+    if DEGRES_LIBERTE % 2 == 0:
+        somme = generateur.standard_exponential(forme, dtype=np.float32)
+        for _ in range(DEGRES_LIBERTE // 2 - 1):
+            somme += generateur.standard_exponential(forme, dtype=np.float32)
+        return somme * np.float32(2 / DEGRES_LIBERTE)
+    return generateur.standard_gamma(DEGRES_LIBERTE / 2, forme, dtype=np.float32) * np.float32(2 / DEGRES_LIBERTE)
+
+
+def tirer_rendements(generateur, mois, chemins, loi, rendement_annuel, volatilite, historique=None):
+    """
+    Rendements mensuels (mois × chemins, float32) de moyenne rendement_annuel / 12.
+    Lois symétriques : variables antithétiques (la seconde moitié des trajectoires
+    reprend les tirages de la première au signe près) ; deux fois moins de tirages,
+    variance de la moyenne réduite.
+    """
+    moyenne = rendement_annuel / 12
+    if loi == "bootstrap":
+        # Forme et volatilité historiques, recentrées sur le rendement attendu
+        historique = np.asarray(historique, dtype=np.float32)
+        historique = historique - historique.mean() + np.float32(moyenne)
+        rendements = historique[generateur.integers(0, len(historique), (mois, chemins), dtype=np.int32)]
+        return np.maximum(rendements, RENDEMENT_MENSUEL_MIN, out=rendements)
+    if loi not in LOIS:
+        raise ValueError(f"Loi inconnue : {loi} ({', '.join(LOIS)})")
+
+    moitie = (chemins + 1) // 2
+    tirages = generateur.standard_normal((mois, moitie), dtype=np.float32)
+    if loi == "student":
+        # Student(ν) = Z / √(χ²/ν), de variance ν / (ν − 2) : ramenée à 1 pour garder la volatilité demandée
+        tirages /= np.sqrt(_khi2_reduit(generateur, (mois, moitie)))
+        tirages *= np.float32(math.sqrt((DEGRES_LIBERTE - 2) / DEGRES_LIBERTE))
+    rendements = np.empty((mois, 2 * moitie), dtype=np.float32)
+    rendements[:, :moitie] = tirages
+    np.negative(tirages, out=rendements[:, moitie:])
+    rendements = rendements[:, :chemins]
+    rendements *= np.float32(volatilite / math.sqrt(12))
+    rendements += np.float32(moyenne)
+    return np.maximum(rendements, RENDEMENT_MENSUEL_MIN, out=rendements)
+
+
+def valeurs_trajectoires(rendements, capital, apport_mensuel, dates):
+    """
+    Valeur de chaque trajectoire aux mois `dates` (1..mois) : V_t = V_{t-1} × (1 + r_t) + apport.
+    Une opération vectorielle sur toutes les trajectoires par mois (mois × chemins contigu).
+    """
+    valeurs = np.full(rendements.shape[1], capital, dtype=np.float32)
+    resultats = np.empty((len(dates), rendements.shape[1]), dtype=np.float32)
+    rang = 0
+    for mois, rendement in enumerate(rendements, start=1):
+        valeurs *= rendement + np.float32(1)
+        valeurs += np.float32(apport_mensuel)
+        if mois == dates[rang]:
+            resultats[rang] = valeurs
+            rang += 1
+            if rang == len(dates):
+                break
+    return resultats
+
+
+def _simuler_bloc(graine, chemins, mois, dates, loi, capital, apport_mensuel, rendement_annuel, volatilite,
+                  historique, percentiles, seuil_perte):
+    """Un bloc de trajectoires (exécutable dans un processus du pool) : percentiles, somme, pertes"""
+    generateur = np.random.default_rng(graine)
+    rendements = tirer_rendements(generateur, mois, chemins, loi, rendement_annuel, volatilite, historique)
+    valeurs = valeurs_trajectoires(rendements, capital, apport_mensuel, dates)
+    finales = valeurs[-1]
+    return {
+        "chemins": chemins,
+        "percentiles": np.percentile(valeurs, percentiles, axis=1),
+        "somme": float(finales.sum(dtype=np.float64)),
+        "pertes": int(np.count_nonzero(finales < seuil_perte)),
+    }
+
+
+def taille_bloc(mois, memoire_mo=MEMOIRE_BLOC_MO):
+    """Trajectoires par bloc : les rendements du bloc (float32, mois × chemins) tiennent dans memoire_mo"""
+    return max(1000, int(memoire_mo * 2 ** 20 / (mois * 4)))
+
+
+def simuler(capital, apport_mensuel, annees, rendement_annuel, volatilite, loi="normale", chemins=CHEMINS,
+            historique=None, percentiles=PERCENTILES, pas=12, graine=0, processus=None, memoire_mo=MEMOIRE_BLOC_MO):
+    """
+    Monte Carlo de la valeur du placement (rendement_annuel et volatilite en fractions).
+    Retourne {'mois', 'bandes' {percentile: valeurs}, 'deterministe', 'apports', 'moyenne_finale',
+    'probabilite_perte', 'chemins', 'blocs', 'processus', 'duree'} ; les valeurs sont données
+    tous les `pas` mois (et au dernier mois).
+    """
+    if annees < 1:
+        raise ValueError("La durée de placement doit être d'au moins un an")
+    if loi == "bootstrap" and (historique is None or len(historique) == 0):
+        raise ValueError("Le bootstrap demande des rendements historiques")
+    debut = time.perf_counter()
+    mois = int(round(annees * 12))
+    dates = np.unique(np.append(np.arange(pas, mois + 1, pas), mois))
+    seuil_perte = capital + apport_mensuel * mois
+
+    par_bloc = taille_bloc(mois, memoire_mo)
+    tailles = [min(par_bloc, chemins - depart) for depart in range(0, chemins, par_bloc)]
+    graines = np.random.SeedSequence(graine).spawn(len(tailles))
+    arguments = [
+        (graine_bloc, taille, mois, dates, loi, capital, apport_mensuel, rendement_annuel, volatilite,
+         historique, list(percentiles), seuil_perte)
+        for graine_bloc, taille in zip(graines, tailles)
+    ]
+    processus = PROCESSUS if processus is None else processus
+    if processus > 1 and chemins >= CHEMINS_POOL_MIN and len(arguments) > 1:
+        with ProcessPoolExecutor(max_workers=processus) as pool:
+            blocs = list(pool.map(_simuler_bloc, *zip(*arguments)))
+    else:
+        processus = 1
+        blocs = [_simuler_bloc(*args) for args in arguments]
+
+    poids = np.array([bloc["chemins"] for bloc in blocs], dtype=np.float64)
+    bandes = np.tensordot(poids / poids.sum(), np.stack([bloc["percentiles"] for bloc in blocs]), axes=1)
+    depart = np.array([capital])
+    return {
+        "mois": np.concatenate([[0], dates]),
+        "bandes": {p: np.concatenate([depart, bande]) for p, bande in zip(percentiles, bandes)},
+        "deterministe": projection_deterministe(capital, apport_mensuel, mois, rendement_annuel)[np.concatenate([[0], dates])],
+        "apports": capital + apport_mensuel * np.concatenate([[0], dates]),
+        "moyenne_finale": sum(bloc["somme"] for bloc in blocs) / chemins,
+        "probabilite_perte": sum(bloc["pertes"] for bloc in blocs) / chemins,
+        "chemins": chemins,
+        "blocs": len(blocs),
+        "processus": processus,
+        "duree": time.perf_counter() - debut,
+    }
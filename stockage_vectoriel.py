@@ -0,0 +1,464 @@
+"""
+Stockage vectoriel plat en mémoire mappée, alternative légère à Chroma.
+
+Les embeddings (float32, normalisés) sont écrits bout à bout dans un fichier
+binaire ouvert en np.memmap ; un journal JSONL à côté décrit chaque ligne
+(identifiant, document d'origine, texte, métadonnées) et les suppressions.
+La recherche top-k est un produit matrice-vecteur NumPy suivi d'un
+argpartition. Les fichiers sont mappés en lecture seule : plusieurs
+processus qui ouvrent le même stockage partagent les mêmes pages du cache
+système au lieu d'en garder chacun une copie.
+
+    <répertoire>/entete.json              dimension + génération courante
+    <répertoire>/vecteurs.<gen>.f32       matrice n x dimension (float32)
+    <répertoire>/metadonnees.<gen>.jsonl  journal des ajouts et suppressions
+
+Les écritures sont des ajouts en fin de fichier : un lecteur qui a déjà mappé
+les n premières lignes n'est jamais perturbé. Le compactage (retrait des
+lignes supprimées) écrit une nouvelle génération puis remplace l'en-tête de
+façon atomique. Les écritures prennent un verrou de fichier (.ecriture.lock) :
+deux processus Streamlit n'entrelacent pas leurs ajouts, et chacun relit le
+journal si un autre l'a modifié depuis son dernier chargement.
+"""
+
+import os
+import json
+import uuid
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from filelock import FileLock
+
+# Backend vectoriel des deux applications : "plat" pour ce stockage, sinon le backend historique
+BACKEND_VECTORIEL = os.getenv("VECTOR_BACKEND", "").lower()
+REPERTOIRE_INDEX_PLAT = os.getenv("FLAT_INDEX_DIR", "index_plat")
+
+FICHIER_ENTETE = "entete.json"
+FICHIER_VERROU = ".ecriture.lock"
+
+# ============================================================================
+# STOCKAGE
+# ============================================================================
+
+def _normaliser(vecteurs):
+    vecteurs = np.asarray(vecteurs, dtype=np.float32)
+    normes = np.linalg.norm(vecteurs, axis=-1, keepdims=True)
+    normes[normes == 0] = 1.0
+    return vecteurs / normes
+
+
+def backend_plat_actif():
+    return BACKEND_VECTORIEL == "plat"
+
+
+class StockageVectorielPlat:
+    """Matrice d'embeddings mappée en mémoire + journal de métadonnées"""
+
+    def __init__(self, repertoire=REPERTOIRE_INDEX_PLAT):
+        self.repertoire = repertoire
+        os.makedirs(repertoire, exist_ok=True)
+        self._verrou = threading.Lock()
+        self._verrou_fichier = FileLock(os.path.join(repertoire, FICHIER_VERROU))
+        self._charger()
+
+    # --- fichiers -----------------------------------------------------------
+
+    def _chemin(self, nom):
+        return os.path.join(self.repertoire, nom)
+
+    def _chemins_generation(self, generation):
+        return (
+            self._chemin(f"vecteurs.{generation}.f32"),
+            self._chemin(f"metadonnees.{generation}.jsonl"),
+        )
+
+    def _ecrire_entete(self, dimension, generation):
+        chemin = self._chemin(FICHIER_ENTETE)
+        with open(chemin + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"dimension": dimension, "generation": generation}, f)
+        os.replace(chemin + ".tmp", chemin)
+
+    def _lire_entete(self):
+        try:
+            with open(self._chemin(FICHIER_ENTETE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"dimension": 0, "generation": 0}
+
+    def _taille_journal_disque(self):
+        try:
+            return os.path.getsize(self._fichier_metadonnees)
+        except OSError:
+            return 0
+
+    def _charger(self):
+        """Relit l'en-tête et rejoue le journal de la génération courante"""
+        entete = self._lire_entete()
+        self.dimension = entete["dimension"]
+        self.generation = entete["generation"]
+        self._fichier_vecteurs, self._fichier_metadonnees = self._chemins_generation(self.generation)
+
+        ids, references, textes, metadonnees, suppressions = [], [], [], [], []
+        self._journal_propre = True
+        if os.path.exists(self._fichier_metadonnees):
+            with open(self._fichier_metadonnees, "r", encoding="utf-8") as f:
+                for ligne in f:
+                    if not ligne.endswith("\n"):
+                        # Dernière ligne tronquée par un arrêt brutal : ignorée
+                        self._journal_propre = False
+                        break
+                    entree = json.loads(ligne)
+                    if entree["op"] == "ajout":
+                        ids.append(entree["id"])
+                        references.append(entree.get("ref"))
+                        textes.append(entree.get("texte"))
+                        metadonnees.append(entree.get("metadata") or {})
+                    else:
+                        # Une suppression ne concerne que les lignes écrites avant elle
+                        suppressions.append((len(ids), entree["ids"]))
+
+        # Les vecteurs sont écrits avant le journal : des lignes en trop sont orphelines
+        lignes_disponibles = 0
+        if self.dimension and os.path.exists(self._fichier_vecteurs):
+            lignes_disponibles = os.path.getsize(self._fichier_vecteurs) // (4 * self.dimension)
+        n = min(len(ids), lignes_disponibles)
+
+        self._ids = ids[:n]
+        self._references = references[:n]
+        self._textes = textes[:n]
+        self._metadonnees = metadonnees[:n]
+        # Rejeu dans l'ordre : un identifiant ré-ajouté pointe vers sa dernière ligne
+        self._lignes = {}
+        actifs = np.zeros(n, dtype=bool)
+        suivante = 0
+        for position, supprimes in suppressions + [(n, [])]:
+            for ligne in range(suivante, min(position, n)):
+                ancienne = self._lignes.get(self._ids[ligne])
+                if ancienne is not None:
+                    actifs[ancienne] = False
+                self._lignes[self._ids[ligne]] = ligne
+                actifs[ligne] = True
+            suivante = max(suivante, min(position, n))
+            for identifiant in supprimes:
+                ligne = self._lignes.pop(identifiant, None)
+                if ligne is not None:
+                    actifs[ligne] = False
+        # (matrice mappée, masque des lignes actives) remplacés d'un bloc : lecture sans verrou
+        self._etat = (self._mapper(n), actifs)
+        self._taille_journal = self._taille_journal_disque()
+
+    @contextmanager
+    def _ecriture(self):
+        """Verrous du thread et du fichier ; état relu si un autre processus a écrit entre-temps"""
+        with self._verrou, self._verrou_fichier:
+            entete = self._lire_entete()
+            if (
+                entete["generation"] != self.generation
+                or entete["dimension"] != self.dimension
+                or self._taille_journal_disque() != self._taille_journal
+            ):
+                self._charger()
+            yield
+
+    def _mapper(self, n):
+        if not n:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.memmap(self._fichier_vecteurs, dtype=np.float32, mode="r", shape=(n, self.dimension))
+
+    def _journaliser(self, entrees):
+        with open(self._fichier_metadonnees, "a", encoding="utf-8") as f:
+            if not self._journal_propre:
+                f.write("\n")
+                self._journal_propre = True
+            f.writelines(json.dumps(entree, ensure_ascii=False) + "\n" for entree in entrees)
+            f.flush()
+            os.fsync(f.fileno())
+        self._taille_journal = self._taille_journal_disque()
+
+    # --- écriture -----------------------------------------------------------
+
+    def ajouter(self, vecteurs, ids=None, references=None, textes=None, metadonnees=None):
+        """Ajoute (ou remplace) des vecteurs ; retourne leurs identifiants"""
+        vecteurs = _normaliser(vecteurs)
+        if vecteurs.ndim != 2 or not len(vecteurs):
+            return []
+        nombre = len(vecteurs)
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in range(nombre)]
+        references = references or [None] * nombre
+        textes = textes or [None] * nombre
+        metadonnees = metadonnees or [{}] * nombre
+
+        with self._ecriture():
+            if not self.dimension:
+                self.dimension = vecteurs.shape[1]
+                self._ecrire_entete(self.dimension, self.generation)
+            elif vecteurs.shape[1] != self.dimension:
+                raise ValueError(f"Dimension {vecteurs.shape[1]} incompatible avec l'index ({self.dimension})")
+
+            _, actifs = self._etat
+            n = len(self._ids)
+            # Écriture à la position attendue : écrase d'éventuelles lignes orphelines
+            mode = "r+b" if os.path.exists(self._fichier_vecteurs) else "wb"
+            with open(self._fichier_vecteurs, mode) as f:
+                f.seek(n * self.dimension * 4)
+                f.write(vecteurs.tobytes())
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            self._journaliser(
+                {"op": "ajout", "id": i, "ref": r, "texte": t, "metadata": m}
+                for i, r, t, m in zip(ids, references, textes, metadonnees)
+            )
+
+            actifs = np.concatenate([actifs, np.ones(nombre, dtype=bool)])
+            for decalage, identifiant in enumerate(ids):
+                ancienne = self._lignes.get(identifiant)
+                if ancienne is not None:
+                    actifs[ancienne] = False
+                self._lignes[identifiant] = n + decalage
+            self._ids.extend(ids)
+            self._references.extend(references)
+            self._textes.extend(textes)
+            self._metadonnees.extend(metadonnees)
+            self._etat = (self._mapper(n + nombre), actifs)
+        return ids
+
+    def supprimer(self, ids):
+        """Marque des vecteurs comme supprimés ; retourne le nombre supprimé"""
+        with self._ecriture():
+            presents = [identifiant for identifiant in ids if identifiant in self._lignes]
+            if not presents:
+                return 0
+            self._journaliser([{"op": "suppression", "ids": presents}])
+            matrice, actifs = self._etat
+            actifs = actifs.copy()
+            for identifiant in presents:
+                actifs[self._lignes.pop(identifiant)] = False
+            self._etat = (matrice, actifs)
+        return len(presents)
+
+    def supprimer_reference(self, reference):
+        """Supprime tous les vecteurs issus d'un document d'origine"""
+        return self.supprimer([i for i, ligne in self._lignes.items() if self._references[ligne] == reference])
+
+    def vider(self):
+        """Repart d'un stockage vide (nouvelle génération)"""
+        with self._ecriture():
+            self._changer_generation([], 0)
+
+    def compacter(self, seuil=0.3):
+        """Réécrit le stockage sans les lignes supprimées si elles dépassent le seuil"""
+        with self._ecriture():
+            matrice, actifs = self._etat
+            if not len(actifs) or 1 - actifs.mean() < seuil:
+                return False
+            self._changer_generation(np.flatnonzero(actifs), self.dimension)
+        return True
+
+    def _changer_generation(self, lignes, dimension):
+        """Écrit les lignes conservées dans une nouvelle génération puis bascule l'en-tête"""
+        matrice, _ = self._etat
+        ancienne_generation = self._chemins_generation(self.generation)
+        generation = self.generation + 1
+        fichier_vecteurs, fichier_metadonnees = self._chemins_generation(generation)
+
+        with open(fichier_vecteurs, "wb") as f:
+            for debut in range(0, len(lignes), 4096):
+                f.write(np.ascontiguousarray(matrice[lignes[debut:debut + 4096]]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(fichier_metadonnees, "w", encoding="utf-8") as f:
+            for ligne in lignes:
+                f.write(json.dumps({
+                    "op": "ajout", "id": self._ids[ligne], "ref": self._references[ligne],
+                    "texte": self._textes[ligne], "metadata": self._metadonnees[ligne],
+                }, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Bascule atomique ; les lecteurs déjà ouverts gardent l'ancienne génération mappée
+        self._ecrire_entete(dimension, generation)
+        for chemin in ancienne_generation:
+            try:
+                os.remove(chemin)
+            except OSError:
+                pass
+        self._charger()
+
+    # --- lecture ------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._lignes)
+
+    def rechercher(self, vecteur, k=4, ids=None, references=None):
+        """
+        Retourne [(ligne, score)] des k vecteurs les plus proches (similarité cosinus).
+        ids / references restreignent la recherche à certains vecteurs ou documents.
+        """
+        matrice, actifs = self._etat
+        if not len(matrice) or k <= 0:
+            return []
+        masque = actifs
+        if ids is not None or references is not None:
+            masque = np.zeros(len(actifs), dtype=bool)
+            for ligne in self._lignes_de(ids, references):
+                masque[ligne] = actifs[ligne]
+
+        scores = matrice @ _normaliser(vecteur)
+        scores = np.where(masque, scores, -np.inf)
+        k = min(k, int(masque.sum()))
+        if not k:
+            return []
+        meilleurs = np.argpartition(-scores, k - 1)[:k]
+        meilleurs = meilleurs[np.argsort(-scores[meilleurs])]
+        return [(int(ligne), float(scores[ligne])) for ligne in meilleurs]
+
+    def _lignes_de(self, ids, references):
+        if ids is not None:
+            yield from (self._lignes[i] for i in ids if i in self._lignes)
+        if references is not None:
+            references = set(references)
+            yield from (ligne for ligne in self._lignes.values() if self._references[ligne] in references)
+
+    def identifiant(self, ligne):
+        return self._ids[ligne]
+
+    def texte(self, ligne):
+        return self._textes[ligne]
+
+    def metadonnees(self, ligne):
+        return self._metadonnees[ligne]
+
+    def lister(self):
+        """Retourne (ids, métadonnées) des vecteurs actifs"""
+        lignes = sorted(self._lignes.values())
+        return [self._ids[l] for l in lignes], [self._metadonnees[l] for l in lignes]
+
+    def empreinte(self):
+        """{'vecteurs', 'dimension', 'octets'} ; les octets sont mappés (partagés entre processus)"""
+        matrice, _ = self._etat
+        return {"vecteurs": len(self), "dimension": self.dimension, "octets": matrice.size * 4}
+
+# ============================================================================
+# ADAPTATEUR LLAMAINDEX
+# ============================================================================
+
+try:
+    from llama_index.core.vector_stores.types import VectorStore, VectorStoreQueryResult
+
+    class VectorStorePlatLlamaIndex(VectorStore):
+        """Vector store LlamaIndex ; les textes restent dans le docstore de l'index"""
+
+        stores_text = False
+        is_embedding_query = True
+
+        def __init__(self, stockage):
+            self.stockage = stockage
+
+        @property
+        def client(self):
+            return self.stockage
+
+        def add(self, nodes, **add_kwargs):
+            if not nodes:
+                return []
+            return self.stockage.ajouter(
+                [node.get_embedding() for node in nodes],
+                ids=[node.node_id for node in nodes],
+                references=[node.ref_doc_id for node in nodes],
+            )
+
+        def delete(self, ref_doc_id, **delete_kwargs):
+            self.stockage.supprimer_reference(ref_doc_id)
+
+        def query(self, query, **kwargs):
+            if query.filters is not None:
+                raise ValueError("Les filtres de métadonnées ne sont pas pris en charge par le stockage plat")
+            resultats = self.stockage.rechercher(
+                query.query_embedding, query.similarity_top_k, ids=query.node_ids, references=query.doc_ids
+            )
+            return VectorStoreQueryResult(
+                similarities=[score for _, score in resultats],
+                ids=[self.stockage.identifiant(ligne) for ligne, _ in resultats],
+            )
+
+        def persist(self, persist_path, fs=None):
+            # Les écritures sont déjà sur disque : on en profite pour compacter
+            self.stockage.compacter()
+
+except ImportError:
+    pass
+
+# ============================================================================
+# ADAPTATEUR LANGCHAIN
+# ============================================================================
+
+try:
+    try:
+        from langchain_core.documents import Document
+        from langchain_core.vectorstores import VectorStore as _VectorStoreLangChain
+    except ImportError:
+        from langchain.schema import Document
+        from langchain.vectorstores.base import VectorStore as _VectorStoreLangChain
+
+    class VectorStorePlatLangChain(_VectorStoreLangChain):
+        """Vector store LangChain, mêmes appels que Chroma dans l'application (get, delete, add_documents)"""
+
+        def __init__(self, embedding_function, persist_directory=REPERTOIRE_INDEX_PLAT):
+            self._embedding_function = embedding_function
+            self.stockage = StockageVectorielPlat(persist_directory)
+
+        @property
+        def embeddings(self):
+            return self._embedding_function
+
+        @classmethod
+        def from_texts(cls, texts, embedding, metadatas=None, ids=None,
+                       persist_directory=REPERTOIRE_INDEX_PLAT, **kwargs):
+            vector_store = cls(embedding_function=embedding, persist_directory=persist_directory)
+            vector_store.add_texts(texts, metadatas=metadatas, ids=ids)
+            return vector_store
+
+        def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+            texts = list(texts)
+            if not texts:
+                return []
+            return self.stockage.ajouter(
+                self._embedding_function.embed_documents(texts),
+                ids=ids,
+                references=[(m or {}).get("source") for m in metadatas] if metadatas else None,
+                textes=texts,
+                metadonnees=list(metadatas) if metadatas else None,
+            )
+
+        def delete(self, ids=None, **kwargs):
+            return self.stockage.supprimer(ids or []) > 0
+
+        def get(self, include=None, **kwargs):
+            """Même forme de résultat que Chroma.get : {'ids', 'metadatas'}"""
+            ids, metadonnees = self.stockage.lister()
+            return {"ids": ids, "metadatas": metadonnees}
+
+        def similarity_search_by_vector_with_score(self, embedding, k=4):
+            return [
+                (Document(page_content=self.stockage.texte(ligne) or "",
+                          metadata=dict(self.stockage.metadonnees(ligne))), score)
+                for ligne, score in self.stockage.rechercher(embedding, k)
+            ]
+
+        def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+            return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+        def similarity_search_with_score(self, query, k=4, **kwargs):
+            return self.similarity_search_by_vector_with_score(self._embedding_function.embed_query(query), k)
+
+        def similarity_search(self, query, k=4, **kwargs):
+            return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+        def _select_relevance_score_fn(self):
+            # Similarité cosinus [-1, 1] ramenée sur [0, 1]
+            return lambda score: (score + 1) / 2
+
+except ImportError:
+    pass
@@ -0,0 +1,167 @@
+"""
+Surveillance en tâche de fond du dossier documents/ et ré-indexation incrémentale.
+
+Un thread compare périodiquement le dossier au manifeste de l'index
+(ajouts, modifications, suppressions). Les documents modifiés ou supprimés
+sont aussitôt marqués comme supprimés (tombstones) : les requêtes les
+ignorent même si l'index en service les contient encore. La mise à jour
+(seuls les fichiers changés sont vectorisés) est construite à côté de
+l'index en service puis échangée de façon atomique : les requêtes en cours
+ne sont jamais bloquées.
+"""
+
+import time
+import threading
+from typing import List, Optional
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from recherche_hybride import construire_bm25_llamaindex
+from indexation import (
+    REPERTOIRE_DOCUMENTS,
+    REPERTOIRE_STOCKAGE,
+    charger_manifeste,
+    charger_ou_construire_index,
+    comparer_etats,
+    scanner_documents,
+)
+
+
+class FiltreTombstones(BaseNodePostprocessor):
+    """Écarte des résultats les fragments des documents supprimés ou remplacés"""
+
+    _surveillant: "SurveillantDocuments" = PrivateAttr()
+
+    def __init__(self, surveillant, **kwargs):
+        super().__init__(**kwargs)
+        self._surveillant = surveillant
+
+    @classmethod
+    def class_name(cls):
+        return "FiltreTombstones"
+
+    def _postprocess_nodes(
+        self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None
+    ) -> List[NodeWithScore]:
+        tombstones = self._surveillant.tombstones
+        if not tombstones:
+            return nodes
+        return [node for node in nodes if node.node.ref_doc_id not in tombstones]
+
+
+class SurveillantDocuments:
+    """Thread de fond qui maintient l'index partagé à jour"""
+
+    def __init__(self, service, documents_path=REPERTOIRE_DOCUMENTS,
+                 repertoire_stockage=REPERTOIRE_STOCKAGE, intervalle=5.0, delai_stabilite=2.0, tableaux=None):
+        self.service = service
+        # Base des tableaux chiffrés (BaseTableaux) resynchronisée avec l'index
+        self.tableaux = tableaux
+        self.documents_path = documents_path
+        self.repertoire_stockage = repertoire_stockage
+        self.intervalle = intervalle
+        # Un fichier encore en cours d'écriture n'est pris en compte qu'une fois stable
+        self.delai_stabilite = delai_stabilite
+
+        # Ensemble remplacé d'un bloc (jamais modifié en place) : lecture sans verrou
+        self.tombstones = frozenset()
+        self.en_attente = {}
+        self.derniere_verification = None
+        self.derniere_mise_a_jour = None
+        self.dernier_rapport = None
+        self.derniere_erreur = None
+
+        self._verrou = threading.Lock()
+        self._arret = threading.Event()
+        self._thread = None
+
+    def demarrer(self):
+        """Démarre le thread de surveillance (sans effet s'il tourne déjà)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._arret.clear()
+            self._thread = threading.Thread(target=self._boucle, name="surveillance-documents", daemon=True)
+            self._thread.start()
+
+    def arreter(self):
+        self._arret.set()
+
+    def filtre_tombstones(self):
+        """Post-processeur à passer au chat engine"""
+        return FiltreTombstones(self)
+
+    def etat(self):
+        """Fraîcheur de l'index et file des ingestions en attente, pour l'interface"""
+        with self._verrou:
+            return {
+                "en_attente": dict(self.en_attente),
+                "derniere_verification": self.derniere_verification,
+                "derniere_mise_a_jour": self.derniere_mise_a_jour or self.service.mis_a_jour,
+                "dernier_rapport": self.dernier_rapport,
+                "erreur": self.derniere_erreur,
+            }
+
+    def _boucle(self):
+        while not self._arret.is_set():
+            try:
+                if self.verifier():
+                    self.appliquer()
+                self.derniere_erreur = None
+            except Exception as e:
+                self.derniere_erreur = str(e)
+            self._arret.wait(self.intervalle)
+
+    def verifier(self):
+        """Détecte les changements du dossier ; retourne True si une mise à jour est prête"""
+        manifeste = charger_manifeste(self.repertoire_stockage) or {"fichiers": {}}
+        fichiers_connus = manifeste["fichiers"]
+        fichiers_actuels = scanner_documents(self.documents_path, fichiers_connus)
+        ajoutes, modifies, supprimes = comparer_etats(fichiers_connus, fichiers_actuels)
+
+        maintenant = time.time()
+        en_attente = {}
+        for chemin in ajoutes:
+            en_attente[chemin] = "ajout"
+        for chemin in modifies:
+            en_attente[chemin] = "modification"
+        for chemin in supprimes:
+            en_attente[chemin] = "suppression"
+
+        # Les anciennes versions disparaissent des réponses dès la détection
+        tombstones = set(self.tombstones)
+        for chemin in modifies + supprimes:
+            tombstones.update(fichiers_connus[chemin].get("doc_ids", []))
+
+        stables = all(
+            maintenant - fichiers_actuels[chemin]["mtime"] >= self.delai_stabilite
+            for chemin in ajoutes + modifies
+        )
+
+        with self._verrou:
+            self.tombstones = frozenset(tombstones)
+            self.en_attente = en_attente
+            self.derniere_verification = maintenant
+        return bool(en_attente) and stables
+
+    def appliquer(self):
+        """Construit l'index mis à jour à côté de l'index en service puis l'échange"""
+        resultat = {}
+
+        def construire():
+            index, rapport = charger_ou_construire_index(self.documents_path, self.repertoire_stockage)
+            if index is not None:
+                construire_bm25_llamaindex(index)
+            if self.tableaux is not None:
+                self.tableaux.synchroniser(self.documents_path)
+            resultat["rapport"] = rapport
+            return index
+
+        self.service.reconstruire(construire)
+
+        with self._verrou:
+            # Les fragments marqués ont été retirés du nouvel index
+            self.tombstones = frozenset()
+            self.en_attente = {}
+            self.derniere_mise_a_jour = time.time()
+            self.dernier_rapport = resultat.get("rapport")
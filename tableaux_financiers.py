@@ -0,0 +1,317 @@
+"""
+Extraction des tableaux chiffrés des rapports PDF vers une base SQLite.
+
+Les rapports annuels et trimestriels sont surtout des tableaux de chiffres.
+Plutôt que de les aplatir en texte et de demander au LLM de relire les
+nombres, les tableaux sont extraits avec pdfplumber et rangés en colonnes
+(société, période, indicateur, valeur, unité, source). Une question chiffrée
+(« CA T1 2024 d'EcoEnergy Group ») est alors résolue par une requête SQL en
+quelques millisecondes ; les autres questions passent par le RAG habituel.
+
+L'extraction est incrémentale : un fichier n'est relu que si son SHA-256 a
+changé depuis la dernière synchronisation.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+
+from indexation import REPERTOIRE_DOCUMENTS, REPERTOIRE_STOCKAGE, calculer_sha256, lister_fichiers
+from recherche_hybride import normaliser, tokeniser
+
+CHEMIN_TABLEAUX = os.getenv("FINANCIAL_TABLES_PATH", os.path.join(REPERTOIRE_STOCKAGE, "tableaux.sqlite"))
+
+# "2023", "T1 2024"
+_PERIODE = re.compile(r"\b(?:t([1-4])\s*)?((?:19|20)\d{2})\b", re.IGNORECASE)
+_TRIMESTRES_EN_LETTRES = {"premier": 1, "1er": 1, "deuxieme": 2, "second": 2, "troisieme": 3, "quatrieme": 4}
+_TRIMESTRE_EN_LETTRES = re.compile(r"\b(premier|1er|deuxieme|second|troisieme|quatrieme) trimestre\s+((?:19|20)\d{2})\b")
+# "42.5", "32.9M", "+24.4%", "5.2x", "68 j"
+_VALEUR = re.compile(r"^([+-]?\d+(?:[.,]\d+)?)\s*(%|M|x|j)?$")
+_UNITE_LIBELLE = re.compile(r"\s*\(([^)]*)\)\s*$")
+_TITRE_SECTION = re.compile(r"^\d+\.\s")
+_PREFIXES_FICHIER = re.compile(r"^rapport_(?:financier_)?(?:annuel|trimestriel)_", re.IGNORECASE)
+_SUFFIXES_FICHIER = re.compile(r"_rapport_.*$", re.IGNORECASE)
+
+# Colonnes d'un tableau qui ne sont pas des valeurs d'une période
+_COLONNES_IGNOREES = ("evolution", "variation", "vs", "/", "cible", "part")
+
+# Termes des questions -> indicateur tel qu'il apparaît (normalisé) dans les tableaux
+ALIAS_INDICATEURS = {
+    "ca": "chiffre d'affaires",
+    "revenus": "chiffre d'affaires",
+    "ventes": "chiffre d'affaires",
+    "benefice net": "resultat net",
+    "benefice": "resultat net",
+    "dette": "dette financiere",
+    "endettement": "ratio d'endettement",
+    "capitaux propres": "fonds propres",
+    "total actif": "actif total",
+    "actif total": "total actif",
+    "total bilan": "actif total",
+}
+
+# Questions qui demandent une analyse et non une valeur : laissées au LLM
+MOTS_ANALYSE = ("pourquoi", "comment", "explique", "analyse", "compare", "evolution", "tendance", "strategie", "risque")
+
+# ============================================================================
+# EXTRACTION
+# ============================================================================
+
+def nom_societe(chemin):
+    """Nom de la société d'après le nom du fichier ('rapport_annuel_EcoEnergy_Group.pdf' -> 'EcoEnergy Group')"""
+    nom = os.path.splitext(os.path.basename(chemin))[0]
+    nom = _SUFFIXES_FICHIER.sub("", _PREFIXES_FICHIER.sub("", nom))
+    return nom.replace("_", " ").strip()
+
+
+def analyser_periode(texte):
+    """'T1 2024' -> ('T1 2024', 2024, 1) ; '2023' -> ('2023', 2023, 0) ; None sinon"""
+    texte = normaliser(texte)
+    correspondance = _TRIMESTRE_EN_LETTRES.search(texte)
+    if correspondance:
+        trimestre, annee = _TRIMESTRES_EN_LETTRES[correspondance.group(1)], int(correspondance.group(2))
+    else:
+        correspondance = _PERIODE.search(texte)
+        if not correspondance:
+            return None
+        trimestre, annee = int(correspondance.group(1) or 0), int(correspondance.group(2))
+    return (f"T{trimestre} {annee}" if trimestre else str(annee)), annee, trimestre
+
+
+def analyser_valeur(texte):
+    """'32.9M' -> (32.9, 'M') ; None si la cellule n'est pas un nombre simple"""
+    correspondance = _VALEUR.match((texte or "").strip())
+    if not correspondance:
+        return None
+    return float(correspondance.group(1).replace(",", ".")), correspondance.group(2) or ""
+
+
+def _separer_unite(libelle):
+    """"Chiffre d'affaires (M EUR)" -> ("Chiffre d'affaires", "M EUR")"""
+    correspondance = _UNITE_LIBELLE.search(libelle)
+    if not correspondance:
+        return libelle.strip(), ""
+    return libelle[:correspondance.start()].strip(), correspondance.group(1).strip()
+
+
+def _unite_de_section(page, haut_tableau):
+    """Unité annoncée par le titre de section au-dessus du tableau ('(en millions d'euros)')"""
+    texte = page.crop((0, 0, page.width, haut_tableau)).extract_text() or ""
+    titres = [ligne for ligne in texte.splitlines() if _TITRE_SECTION.match(ligne)]
+    if titres and "millions d'eur" in normaliser(titres[-1]):
+        return "M EUR"
+    return ""
+
+
+def _colonnes_periodes(entete):
+    """Colonnes de l'en-tête qui portent une période : {indice: (période, année, trimestre, préfixe, unité)}"""
+    colonnes = {}
+    for indice, cellule in enumerate(entete[1:], start=1):
+        cellule = (cellule or "").replace("\n", " ")
+        if not cellule or any(mot in normaliser(cellule) for mot in _COLONNES_IGNOREES):
+            continue
+        libelle, unite = _separer_unite(cellule)
+        periode = analyser_periode(libelle)
+        if periode is None:
+            continue
+        # 'CA T1 2024 (M EUR)' : le texte autour de la période qualifie l'indicateur
+        colonnes[indice] = (*periode, " ".join(_PERIODE.sub("", libelle).split()), unite)
+    return colonnes
+
+
+def extraire_indicateurs(chemin):
+    """Extrait les valeurs des tableaux d'un PDF : une ligne par (indicateur, période)"""
+    import pdfplumber
+
+    societe = nom_societe(chemin)
+    indicateurs = []
+    with pdfplumber.open(chemin) as pdf:
+        for numero_page, page in enumerate(pdf.pages, start=1):
+            for tableau in page.find_tables():
+                lignes = tableau.extract()
+                if len(lignes) < 2:
+                    continue
+                colonnes = _colonnes_periodes(lignes[0])
+                if not colonnes:
+                    continue
+                unite_section = None
+                for ligne in lignes[1:]:
+                    libelle_ligne = (ligne[0] or "").replace("\n", " ").strip()
+                    if not libelle_ligne:
+                        continue
+                    metrique, unite_ligne = _separer_unite(libelle_ligne)
+                    for indice, (periode, annee, trimestre, prefixe, unite_colonne) in colonnes.items():
+                        if indice >= len(ligne):
+                            continue
+                        valeur = analyser_valeur(ligne[indice])
+                        if valeur is None:
+                            continue
+                        nombre, unite_valeur = valeur
+                        unite = unite_valeur or unite_ligne or unite_colonne
+                        if not unite:
+                            if unite_section is None:
+                                unite_section = _unite_de_section(page, tableau.bbox[1])
+                            unite = unite_section
+                        if unite == "M":
+                            unite = "M EUR"
+                        nom_metrique = f"{prefixe} {metrique}" if prefixe else metrique
+                        indicateurs.append({
+                            "source": chemin,
+                            "page": numero_page,
+                            "societe": societe,
+                            "periode": periode,
+                            "annee": annee,
+                            "trimestre": trimestre,
+                            "metrique": nom_metrique,
+                            "valeur": nombre,
+                            "unite": unite,
+                            "texte": ligne[indice].strip(),
+                        })
+    return indicateurs
+
+# ============================================================================
+# BASE SQLITE
+# ============================================================================
+
+class BaseTableaux:
+    """Indicateurs extraits des tableaux, interrogeables par société / indicateur / période"""
+
+    def __init__(self, chemin=CHEMIN_TABLEAUX):
+        dossier = os.path.dirname(chemin)
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+        self._verrou = threading.Lock()
+        self._connexion = sqlite3.connect(chemin, timeout=30, check_same_thread=False)
+        self._connexion.execute("PRAGMA journal_mode=WAL")
+        self._connexion.executescript(
+            "CREATE TABLE IF NOT EXISTS fichiers (source TEXT PRIMARY KEY, sha256 TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS indicateurs ("
+            " source TEXT NOT NULL, page INTEGER, societe TEXT NOT NULL, societe_cle TEXT NOT NULL,"
+            " periode TEXT NOT NULL, annee INTEGER NOT NULL, trimestre INTEGER NOT NULL,"
+            " metrique TEXT NOT NULL, metrique_cle TEXT NOT NULL, valeur REAL NOT NULL, unite TEXT, texte TEXT);"
+            "CREATE INDEX IF NOT EXISTS idx_indicateurs ON indicateurs (societe_cle, metrique_cle, annee, trimestre);"
+        )
+        self._connexion.commit()
+        self._charger_vocabulaire()
+
+    def _charger_vocabulaire(self):
+        """Sociétés et indicateurs connus, pour reconnaître les questions sans requête SQL"""
+        with self._verrou:
+            self.societes = dict(self._connexion.execute(
+                "SELECT DISTINCT societe_cle, societe FROM indicateurs"
+            ).fetchall())
+            self.metriques = {cle for (cle,) in self._connexion.execute(
+                "SELECT DISTINCT metrique_cle FROM indicateurs"
+            )}
+
+    def synchroniser(self, documents_path=REPERTOIRE_DOCUMENTS):
+        """Extrait les tableaux des PDF nouveaux ou modifiés et retire ceux des fichiers supprimés"""
+        debut = time.perf_counter()
+        with self._verrou:
+            connus = dict(self._connexion.execute("SELECT source, sha256 FROM fichiers").fetchall())
+        actuels = {chemin: calculer_sha256(chemin) for chemin in lister_fichiers(documents_path)
+                   if chemin.lower().endswith(".pdf")}
+        a_extraire = [c for c, sha256 in actuels.items() if connus.get(c) != sha256]
+        supprimes = [c for c in connus if c not in actuels]
+
+        rapport = {"extraits": 0, "supprimes": len(supprimes), "inchanges": len(actuels) - len(a_extraire),
+                   "indicateurs": 0, "erreurs": {}}
+        extraits = {}
+        for chemin in a_extraire:
+            try:
+                extraits[chemin] = extraire_indicateurs(chemin)
+            except Exception as e:
+                rapport["erreurs"][chemin] = str(e)
+
+        with self._verrou:
+            for chemin in supprimes + list(extraits):
+                self._connexion.execute("DELETE FROM indicateurs WHERE source = ?", (chemin,))
+                self._connexion.execute("DELETE FROM fichiers WHERE source = ?", (chemin,))
+            for chemin, indicateurs in extraits.items():
+                self._connexion.executemany(
+                    "INSERT INTO indicateurs (source, page, societe, societe_cle, periode, annee, trimestre,"
+                    " metrique, metrique_cle, valeur, unite, texte) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(i["source"], i["page"], i["societe"], normaliser(i["societe"]), i["periode"], i["annee"],
+                      i["trimestre"], i["metrique"], normaliser(i["metrique"]), i["valeur"], i["unite"], i["texte"])
+                     for i in indicateurs],
+                )
+                self._connexion.execute("INSERT INTO fichiers (source, sha256) VALUES (?, ?)",
+                                        (chemin, actuels[chemin]))
+                rapport["indicateurs"] += len(indicateurs)
+            self._connexion.commit()
+        rapport["extraits"] = len(extraits)
+
+        if extraits or supprimes:
+            self._charger_vocabulaire()
+        rapport["duree"] = time.perf_counter() - debut
+        return rapport
+
+    def rechercher(self, societe_cle, metrique_cle, periode=None):
+        """Retourne la valeur de l'indicateur (dict) pour la période, ou la plus récente si periode est None"""
+        requete = (
+            "SELECT societe, periode, metrique, valeur, unite, texte, source, page FROM indicateurs"
+            " WHERE societe_cle = ? AND metrique_cle = ?"
+        )
+        parametres = [societe_cle, metrique_cle]
+        if periode is not None:
+            requete += " AND annee = ? AND trimestre = ?"
+            parametres += [periode[1], periode[2]]
+        requete += " ORDER BY annee DESC, trimestre DESC LIMIT 1"
+        with self._verrou:
+            ligne = self._connexion.execute(requete, parametres).fetchone()
+        if ligne is None:
+            return None
+        colonnes = ("societe", "periode", "metrique", "valeur", "unite", "texte", "source", "page")
+        return dict(zip(colonnes, ligne))
+
+    def comprendre(self, question):
+        """Reconnaît (société, [indicateurs candidats], période) dans une question ; None si elle n'est pas chiffrée"""
+        texte = normaliser(question)
+        if any(mot in texte for mot in MOTS_ANALYSE):
+            return None
+        # Comparaison sur les jetons sans mots vides : 'rotation des stocks' ~ 'Rotation stocks'
+        jetons = f" {' '.join(tokeniser(texte))} "
+
+        # Nom complet de la société exigé (« Rapport 2023 » ne doit pas capter toute question sur un rapport) ;
+        # une clé réduite à des mots vides n'est jamais reconnue. Le nom le plus long l'emporte.
+        societes = sorted(
+            ((len(jetons_societe), cle) for cle in self.societes
+             for jetons_societe in [tokeniser(cle)]
+             if jetons_societe and f" {' '.join(jetons_societe)} " in jetons),
+            reverse=True,
+        )
+        if not societes:
+            return None
+        societe_cle = societes[0][1]
+
+        # Indicateurs cités, le plus long d'abord ('marge ebitda' avant 'ebitda')
+        candidats = [(m, m) for m in self.metriques] + list(ALIAS_INDICATEURS.items())
+        trouves = sorted(
+            {(len(terme), m) for terme, m in candidats if f" {' '.join(tokeniser(terme))} " in jetons},
+            reverse=True,
+        )
+        if not trouves:
+            return None
+        return societe_cle, [m for _, m in trouves], analyser_periode(texte)
+
+    def repondre(self, question):
+        """Réponse directe à une question chiffrée, ou None pour laisser la main au RAG"""
+        comprise = self.comprendre(question)
+        if comprise is None:
+            return None
+        societe_cle, metriques, periode = comprise
+        resultat = next(
+            (r for r in (self.rechercher(societe_cle, m, periode) for m in metriques) if r is not None), None
+        )
+        if resultat is None:
+            return None
+
+        valeur = re.sub(r"\s*(%|M|x|j)$", "", resultat["texte"])
+        if resultat["unite"]:
+            valeur = f"{valeur} {resultat['unite']}"
+        return (
+            f"📊 **{resultat['societe']} — {resultat['metrique']} {resultat['periode']}** : **{valeur}**\n\n"
+            f"*Source : {os.path.basename(resultat['source'])}, page {resultat['page']}*"
+        )
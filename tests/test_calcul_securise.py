@@ -0,0 +1,89 @@
+from decimal import Decimal
+
+import pytest
+
+from calcul_securise import ErreurCalcul, ExpressionInvalide, evaluer, evaluer_lot, formater_valeur
+
+
+@pytest.mark.parametrize("expression", [
+    "x",
+    "x + 1",
+    "(1).real",
+    "__import__('os')",
+    "abs(1)",
+    "[1, 2]",
+    "1 if 1 else 2",
+    "'a' * 3",
+    "True + 1",
+    "1 < 2",
+    "2 3",
+])
+def test_liste_blanche_refuse(expression):
+    with pytest.raises(ExpressionInvalide):
+        evaluer(expression)
+
+
+def test_notations_usuelles():
+    assert evaluer("2 × 3 ÷ 4") == Decimal("1.5")
+    assert evaluer("2^10") == 1024
+    assert evaluer("1,5 + 1") == Decimal("2.5")
+    assert evaluer("0.1 + 0.2") == Decimal("0.3")
+
+
+@pytest.mark.parametrize("expression", ["9**9**9**9", "10**100000", "2**(2**20)"])
+def test_calcul_demesure_refuse(expression):
+    with pytest.raises(ErreurCalcul):
+        evaluer(expression)
+    with pytest.raises(ErreurCalcul):
+        evaluer(expression, decimal_actif=False)
+
+
+@pytest.mark.parametrize("expression", ["1/0", "0/0", "1 // 0", "5 % 0", "0 % 0", "1/(2-2)", "0**-1", "0.0**-2"])
+def test_division_par_zero(expression):
+    with pytest.raises(ErreurCalcul, match="Division par zéro"):
+        evaluer(expression)
+    with pytest.raises(ErreurCalcul, match="Division par zéro"):
+        evaluer(expression, decimal_actif=False)
+
+
+def test_resultat_non_fini():
+    with pytest.raises(ErreurCalcul):
+        evaluer("1e308 * 10", decimal_actif=False)
+    assert evaluer("1e308 * 10") == Decimal("1E+309")
+
+
+def test_produit_entier_borne():
+    with pytest.raises(ErreurCalcul, match="chiffres"):
+        evaluer("(10**999)*(10**999)", decimal_actif=False)
+
+
+def test_lot_isole_les_erreurs():
+    resultats = evaluer_lot(["1+1", "1/0", "x", "9**9**9**9", "2*3"])
+    assert [resultat["expression"] for resultat in resultats] == ["1+1", "1/0", "x", "9**9**9**9", "2*3"]
+    assert resultats[0] == {"expression": "1+1", "valeur": 2, "erreur": None}
+    assert resultats[4] == {"expression": "2*3", "valeur": 6, "erreur": None}
+    for resultat in resultats[1:4]:
+        assert resultat["valeur"] is None and resultat["erreur"]
+    assert "Division par zéro" in resultats[1]["erreur"]
+
+
+@pytest.mark.parametrize("expression, attendu", [
+    ("100/7*7", "100"),
+    ("1/3*3", "1"),
+    ("10/3", "3.3333333333"),
+    ("2/3", "0.6666666667"),
+    ("0.1 + 0.2", "0.3"),
+    ("2.50 * 2", "5"),
+    ("1000 * 1000", "1000000"),
+    ("-1/3 * 0.00000000001", "0"),
+    ("-7/2", "-3.5"),
+])
+def test_affichage_arrondi(expression, attendu):
+    assert formater_valeur(evaluer(expression)) == attendu
+    assert formater_valeur(evaluer(expression, decimal_actif=False)) == attendu
+
+
+def test_affichage_grands_nombres():
+    assert formater_valeur(evaluer("10**40")) == "1" + "0" * 40
+    assert formater_valeur(2 ** 100) == str(2 ** 100)
+    assert formater_valeur(Decimal("1.23456"), decimales=2) == "1.23"
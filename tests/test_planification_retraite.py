@@ -0,0 +1,18 @@
+from planification_retraite import parametres_retraite
+
+
+def test_parametres_retraite_montants():
+    parametres = parametres_retraite(
+        "J'ai 45 ans, salaire de 40 000€, j'épargne 200€ par mois, 30000€ de côté, départ à 62 ans"
+    )
+    assert parametres["age_actuel"] == 45 and parametres["age_retraite"] == 62
+    assert parametres["revenu"] == 40000.0
+    assert parametres["epargne_actuelle"] == 30000.0
+    assert parametres["taux_epargne"] == 6.0
+
+
+def test_parametres_retraite_annee_avant_montant():
+    # « en 2030 » ne se fond pas dans le montant qui suit
+    parametres = parametres_retraite("J'ai 50 ans, en 2030 j'aurai 80000€ d'épargne, départ à 64 ans")
+    assert parametres["epargne_actuelle"] == 80000.0
+    assert parametres["age_retraite"] == 64
@@ -0,0 +1,30 @@
+import pytest
+
+from app_complete import MOTS_AGENTS, SALUTATIONS, effectuer_calcul_simple
+from routage_intentions import RouteurIntentions
+
+
+@pytest.fixture(scope="module")
+def routeur():
+    return RouteurIntentions(MOTS_AGENTS, SALUTATIONS, calcul=effectuer_calcul_simple)
+
+
+@pytest.mark.parametrize("question, agent", [
+    # « capital » et « taux » seuls envoyaient ces questions vers l'investissement et la calculatrice
+    ("Mon capital à 65 ans", "retraite"),
+    ("La BCE va-t-elle baisser ses taux ?", "recherche"),
+    ("La FED va-t-elle relever ses taux ?", "recherche"),
+    ("Quand la BCE décide-t-elle ?", "calendrier"),
+    ("Quel taux pour un prêt de 10000€ ?", "calculatrice"),
+    ("Simuler un placement de 300€ par mois sur 25 ans", "investissement"),
+    ("Combien épargner pour partir à la retraite à 60 ans ?", "retraite"),
+    ("Les résultats du printemps de BioPharma sont-ils bons ?", "assistant"),
+])
+def test_agent(routeur, question, agent):
+    assert routeur.router(question)["agent"] == agent
+
+
+def test_salutation_et_calcul(routeur):
+    assert routeur.router("Bonjour")["agent"] == "salutation"
+    intention = routeur.router("125 * 48")
+    assert intention["agent"] == "calcul_simple" and "6000" in intention["reponse"]
@@ -0,0 +1,18 @@
+from service_index import ServiceIndex
+
+
+def test_initialiser_reessaie_apres_un_index_absent():
+    service = ServiceIndex()
+    assert service.initialiser(lambda: None) is None
+    assert not service.initialise and service.version == 0
+
+    index = object()
+    assert service.initialiser(lambda: index) is index
+    assert service.initialise and service.version == 1
+
+
+def test_initialiser_ne_reconstruit_pas():
+    service, appels = ServiceIndex(), []
+    for _ in range(3):
+        service.initialiser(lambda: appels.append(1) or object())
+    assert len(appels) == 1
@@ -0,0 +1,49 @@
+import pytest
+
+from simulation_investissement import montants, parametres_investissement, projection_deterministe, simuler
+
+
+@pytest.mark.parametrize("question, attendu", [
+    ("Si j'investis en 2025 10000€ à 5%",
+     {"capital": 10000.0, "apport_mensuel": 500.0, "annees": 20, "rendement": 5.0}),
+    ("Combien rapporteront 500€ placés chaque mois pendant 10 ans ?",
+     {"capital": 10000.0, "apport_mensuel": 500.0, "annees": 10, "rendement": 7.0}),
+    ("Que deviendront 1000€ placés chaque mois à 6% ?",
+     {"capital": 10000.0, "apport_mensuel": 1000.0, "annees": 20, "rendement": 6.0}),
+    ("15 000 € puis 300€ par mois pendant 25 ans à 5,5%",
+     {"capital": 15000.0, "apport_mensuel": 300.0, "annees": 25, "rendement": 5.5}),
+    ("J'ai 2k€ et j'ajoute 150 €/mois",
+     {"capital": 2000.0, "apport_mensuel": 150.0, "annees": 20, "rendement": 7.0}),
+    ("Placer 25 000 euros pendant 12 ans",
+     {"capital": 25000.0, "apport_mensuel": 500.0, "annees": 12, "rendement": 7.0}),
+    ("1 250,50 € mensuels à 4 %",
+     {"capital": 10000.0, "apport_mensuel": 1250.5, "annees": 20, "rendement": 4.0}),
+])
+def test_parametres_investissement(question, attendu):
+    assert parametres_investissement(question) == attendu
+
+
+def test_nombres_voisins_non_fusionnes():
+    assert [montant["valeur"] for montant in montants("En 2025 10000€, en 2030 20 000€")] == [10000.0, 20000.0]
+    assert [montant["valeur"] for montant in montants("entre 12 1234€")] == [1234.0]
+
+
+def test_periodicite_limitee_au_montant():
+    # « par mois » appartient au second montant, pas au premier
+    assert [montant["mensuel"] for montant in montants("10000€ puis 200€ par mois")] == [False, True]
+    assert [montant["mensuel"] for montant in montants("10000€. Et par mois ?")] == [False]
+
+
+@pytest.mark.parametrize("rendement", [0.0, 0.05])
+def test_projection_deterministe(rendement):
+    valeur, attendu = 10000.0, [10000.0]
+    for _ in range(120):
+        valeur = valeur * (1 + rendement / 12) + 500
+        attendu.append(valeur)
+    assert projection_deterministe(10000.0, 500.0, 120, rendement) == pytest.approx(attendu)
+
+
+def test_duree_nulle_refusee():
+    assert parametres_investissement("Simuler 10000€ sur 0 ans")["annees"] == 0
+    with pytest.raises(ValueError, match="au moins un an"):
+        simuler(10000.0, 500.0, 0, 0.07, 0.15, chemins=100)